@@ -0,0 +1,76 @@
+"""add incremental adisyon totals (counter columns + delta triggers)
+
+Revision ID: 2026_10_17_0000
+Revises: 2026_04_09_0000
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Trigger fonksiyonları runtime şeması ile aynı kaynaktan gelir (env.py backend'i sys.path'e ekler)
+from app.db.schema import ADISYON_TOTALS_TRIGGER_STATEMENTS
+
+
+# revision identifiers, used by Alembic.
+revision = "2026_10_17_0000"
+down_revision = "2026_04_09_0000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        ALTER TABLE adisyons
+            ADD COLUMN IF NOT EXISTS siparis_sayisi INT DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS aktif_siparis_sayisi INT DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS aktif_toplam NUMERIC(10,2) DEFAULT 0
+    """)
+
+    # Mevcut adisyonları trigger'lar devreye girmeden önce tek seferde doldur
+    op.execute("""
+        UPDATE adisyons a
+        SET toplam_tutar = COALESCE(s.toplam, 0),
+            siparis_sayisi = COALESCE(s.siparis_sayisi, 0),
+            aktif_siparis_sayisi = COALESCE(s.aktif_sayisi, 0),
+            aktif_toplam = COALESCE(s.aktif_toplam, 0),
+            odeme_toplam = COALESCE(o.toplam, 0)
+        FROM adisyons a2
+        LEFT JOIN LATERAL (
+            SELECT SUM(tutar) FILTER (WHERE durum <> 'iptal') AS toplam,
+                   COUNT(*) FILTER (WHERE durum <> 'iptal') AS siparis_sayisi,
+                   COUNT(*) FILTER (WHERE durum IN ('yeni', 'hazirlaniyor', 'hazir')) AS aktif_sayisi,
+                   SUM(tutar) FILTER (WHERE durum IN ('yeni', 'hazirlaniyor', 'hazir')) AS aktif_toplam
+            FROM siparisler
+            WHERE adisyon_id = a2.id
+        ) s ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT SUM(tutar) AS toplam
+            FROM odemeler
+            WHERE adisyon_id = a2.id
+              AND iptal = FALSE
+              AND (a2.acilis_zamani IS NULL OR created_at >= a2.acilis_zamani)
+        ) o ON TRUE
+        WHERE a.id = a2.id
+    """)
+
+    for stmt in ADISYON_TOTALS_TRIGGER_STATEMENTS:
+        op.execute(stmt)
+
+    # bakiye/iskonto_tutari'yi BEFORE UPDATE trigger'ı üzerinden yeniden türet
+    op.execute("UPDATE adisyons SET bakiye = bakiye")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_odemeler_adisyon_delta ON odemeler")
+    op.execute("DROP TRIGGER IF EXISTS trg_siparisler_adisyon_delta ON siparisler")
+    op.execute("DROP TRIGGER IF EXISTS trg_adisyons_derive_bakiye ON adisyons")
+    op.execute("DROP FUNCTION IF EXISTS adisyon_odeme_delta()")
+    op.execute("DROP FUNCTION IF EXISTS adisyon_siparis_delta()")
+    op.execute("DROP FUNCTION IF EXISTS adisyon_derive_bakiye()")
+    op.execute("""
+        ALTER TABLE adisyons
+            DROP COLUMN IF EXISTS siparis_sayisi,
+            DROP COLUMN IF EXISTS aktif_siparis_sayisi,
+            DROP COLUMN IF EXISTS aktif_toplam
+    """)
@@ -0,0 +1,34 @@
+"""add siparisler.mutfak_seq replay cursor for kitchen push feed
+
+Revision ID: 2026_10_17_0001
+Revises: 2026_10_17_0000
+Create Date: 2026-10-17 00:01:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Sequence/trigger/index runtime şeması ile aynı kaynaktan gelir (env.py backend'i sys.path'e ekler)
+from app.db.schema import KITCHEN_FEED_STATEMENTS
+
+
+# revision identifiers, used by Alembic.
+revision = "2026_10_17_0001"
+down_revision = "2026_10_17_0000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE siparisler ADD COLUMN IF NOT EXISTS mutfak_seq BIGINT")
+    # Mevcut siparişler NULL kalır: cursor'lar bu migration'dan sonraki değişikliklerden başlar
+    for stmt in KITCHEN_FEED_STATEMENTS:
+        op.execute(stmt)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_siparisler_mutfak_seq ON siparisler")
+    op.execute("DROP FUNCTION IF EXISTS siparis_mutfak_seq_bump()")
+    op.execute("DROP INDEX IF EXISTS idx_siparisler_sube_mutfak_seq")
+    op.execute("ALTER TABLE siparisler DROP COLUMN IF EXISTS mutfak_seq")
+    op.execute("DROP SEQUENCE IF EXISTS siparis_mutfak_seq")
@@ -0,0 +1,37 @@
+"""add daily_product_sales rollup maintained by siparisler trigger
+
+Revision ID: 2026_10_17_0002
+Revises: 2026_10_17_0001
+Create Date: 2026-10-17 00:02:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Tablo/fonksiyon/trigger runtime şeması ile aynı kaynaktan gelir (env.py backend'i sys.path'e ekler)
+from app.db.schema import DAILY_PRODUCT_SALES_STATEMENTS
+
+
+# revision identifiers, used by Alembic.
+revision = "2026_10_17_0002"
+down_revision = "2026_10_17_0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for stmt in DAILY_PRODUCT_SALES_STATEMENTS:
+        op.execute(stmt)
+    # Geçmiş siparişler: scripts/backfill_daily_product_sales.py (şube başına, uzun sürebilir)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_siparisler_daily_product_sales ON siparisler")
+    op.execute("DROP FUNCTION IF EXISTS daily_product_sales_delta()")
+    op.execute("DROP FUNCTION IF EXISTS daily_product_sales_apply(BIGINT, TIMESTAMPTZ, JSONB, NUMERIC, INT)")
+    op.execute("DROP FUNCTION IF EXISTS siparis_sepet_kalemleri(JSONB, NUMERIC)")
+    op.execute("DROP FUNCTION IF EXISTS siparis_sepet_satirlari(JSONB, NUMERIC)")
+    op.execute("DROP FUNCTION IF EXISTS neso_try_numeric(TEXT)")
+    op.execute("DROP INDEX IF EXISTS idx_menu_sube_urun_key")
+    op.execute("DROP FUNCTION IF EXISTS neso_urun_key(TEXT)")
+    op.execute("DROP TABLE IF EXISTS daily_product_sales")
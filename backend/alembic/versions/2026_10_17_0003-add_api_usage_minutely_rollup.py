@@ -0,0 +1,35 @@
+"""add api_usage_minutely rollup and trim api_usage_logs indexes
+
+Revision ID: 2026_10_17_0003
+Revises: 2026_10_17_0002
+Create Date: 2026-10-17 00:03:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Tablo/index'ler runtime şeması ile aynı kaynaktan gelir (env.py backend'i sys.path'e ekler)
+from app.db.schema import API_USAGE_ROLLUP_STATEMENTS
+
+
+# revision identifiers, used by Alembic.
+revision = "2026_10_17_0003"
+down_revision = "2026_10_17_0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Mevcut api_usage_logs satırları ilk çalıştırmada özete aktarılır
+    for stmt in API_USAGE_ROLLUP_STATEMENTS:
+        op.execute(stmt)
+
+
+def downgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS idx_api_usage_logs_isletme ON api_usage_logs (isletme_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_api_usage_logs_api_type ON api_usage_logs (api_type)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_api_usage_logs_endpoint ON api_usage_logs (endpoint)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_api_usage_logs_status ON api_usage_logs (status)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_api_usage_logs_created_at ON api_usage_logs (created_at DESC)")
+    op.execute("DROP INDEX IF EXISTS idx_api_usage_logs_errors")
+    op.execute("DROP TABLE IF EXISTS api_usage_minutely")
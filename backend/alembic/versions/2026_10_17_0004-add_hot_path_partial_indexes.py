@@ -0,0 +1,40 @@
+"""add partial/covering indexes for active order and open adisyon paths
+
+Revision ID: 2026_10_17_0004
+Revises: 2026_10_17_0003
+Create Date: 2026-10-17 00:04:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Index listesi runtime şeması ile aynı kaynaktan gelir (env.py backend'i sys.path'e ekler)
+from app.db.schema import HOT_PATH_INDEX_STATEMENTS
+
+
+# revision identifiers, used by Alembic.
+revision = "2026_10_17_0004"
+down_revision = "2026_10_17_0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for stmt in HOT_PATH_INDEX_STATEMENTS:
+        op.execute(stmt)
+
+
+def downgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS idx_siparisler_durum ON siparisler (durum)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_siparisler_masa ON siparisler (masa)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_siparisler_sube ON siparisler (sube_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_siparisler_sube_durum ON siparisler (sube_id, durum)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_odemeler_sube ON odemeler (sube_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_adisyons_durum ON adisyons (durum)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_adisyons_sube_aktif ON adisyons (sube_id, durum) WHERE durum = 'acik'")
+    op.execute("DROP INDEX IF EXISTS idx_adisyons_sube_masa_acik")
+    op.execute("DROP INDEX IF EXISTS idx_odemeler_sube_masa_aktif")
+    op.execute("DROP INDEX IF EXISTS idx_odemeler_adisyon_aktif")
+    op.execute("DROP INDEX IF EXISTS idx_siparisler_mutfak_aktif")
+    op.execute("DROP INDEX IF EXISTS idx_siparisler_adisyon_aktif")
+    op.execute("DROP INDEX IF EXISTS idx_siparisler_sube_masa_aktif")
@@ -0,0 +1,56 @@
+"""add siparis_kalemleri order line table maintained by siparisler trigger
+
+Revision ID: 2026_10_17_0005
+Revises: 2026_10_17_0004
+Create Date: 2026-10-17 00:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Tablo/fonksiyon/trigger runtime şeması ile aynı kaynaktan gelir (env.py backend'i sys.path'e ekler)
+from app.db.schema import ORDER_LINE_STATEMENTS
+
+
+# revision identifiers, used by Alembic.
+revision = "2026_10_17_0005"
+down_revision = "2026_10_17_0004"
+branch_labels = None
+depends_on = None
+
+# Geçmiş siparişler bu büyüklükte id aralıklarıyla doldurulur (tek dev statement yok)
+BACKFILL_BATCH = 5000
+
+
+def upgrade() -> None:
+    for stmt in ORDER_LINE_STATEMENTS:
+        op.execute(stmt)
+
+    # Okuyan uçlar (analitik, raporlar, top ürünler) sadece siparis_kalemleri'ne bakar;
+    # geçmiş siparişlerin kalemleri deploy anında hazır olmalı
+    bind = op.get_bind()
+    bounds = bind.execute(sa.text("SELECT MIN(id) AS lo, MAX(id) AS hi FROM siparisler")).first()
+    if bounds is None or bounds.lo is None:
+        return
+    start = int(bounds.lo)
+    while start <= int(bounds.hi):
+        bind.execute(
+            sa.text(
+                """
+                SELECT siparis_kalemleri_yaz(s.id, s.sube_id, s.created_at, s.durum, s.sepet, s.tutar)
+                FROM siparisler s
+                WHERE s.id >= :lo AND s.id < :hi
+                  AND NOT EXISTS (SELECT 1 FROM siparis_kalemleri k WHERE k.siparis_id = s.id)
+                """
+            ),
+            {"lo": start, "hi": start + BACKFILL_BATCH},
+        )
+        start += BACKFILL_BATCH
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_siparisler_kalemleri ON siparisler")
+    op.execute("DROP FUNCTION IF EXISTS siparis_kalemleri_sync()")
+    op.execute("DROP FUNCTION IF EXISTS siparis_kalemleri_yaz(BIGINT, BIGINT, TIMESTAMPTZ, TEXT, JSONB, NUMERIC)")
+    # siparis_sepet_satirlari / neso_try_numeric günlük özetin de ayrıştırıcısı (0002'ye ait)
+    op.execute("DROP TABLE IF EXISTS siparis_kalemleri")
@@ -0,0 +1,63 @@
+"""add menu_id / stok_id keys to receteler and normalized name unique indexes
+
+Revision ID: 2026_10_17_0006
+Revises: 2026_10_17_0005
+Create Date: 2026-10-17 00:06:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Kolon/trigger/backfill runtime şeması ile aynı kaynaktan gelir (env.py backend'i sys.path'e ekler)
+from app.db.schema import (
+    NAME_KEY_DUPLICATES_SQL,
+    NAME_KEY_UNIQUE_INDEXES,
+    RECIPE_KEY_STATEMENTS,
+    RECIPE_UNMATCHED_SQL,
+)
+
+
+# revision identifiers, used by Alembic.
+revision = "2026_10_17_0006"
+down_revision = "2026_10_17_0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for stmt in RECIPE_KEY_STATEMENTS:
+        op.execute(stmt)
+
+    bind = op.get_bind()
+    # Çakışan normalize adlar varsa unique index atlanır (migration durmaz), çakışmalar yazdırılır
+    for table, stmt in NAME_KEY_UNIQUE_INDEXES.items():
+        duplicates = bind.execute(sa.text(NAME_KEY_DUPLICATES_SQL.format(table=table))).fetchall()
+        if duplicates:
+            print(f"[RECETE] {table}: {len(duplicates)} çakışan normalize ad, unique index atlandı")
+            for row in duplicates:
+                print(f"  sube_id={row.sube_id} ad_key={row.ad_key!r} adlar={list(row.adlar)}")
+            continue
+        op.execute(stmt)
+
+    unmatched = bind.execute(sa.text(RECIPE_UNMATCHED_SQL)).fetchall()
+    if unmatched:
+        print(f"[RECETE] {len(unmatched)} reçete satırı eşleşmedi:")
+        for row in unmatched:
+            eksik = ", ".join(k for k, v in (("menu", row.menu_eksik), ("stok", row.stok_eksik)) if v)
+            print(f"  id={row.id} sube_id={row.sube_id} urun={row.urun!r} stok={row.stok!r} eksik={eksik}")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS uq_stok_kalemleri_sube_ad_key")
+    op.execute("DROP INDEX IF EXISTS uq_menu_sube_urun_key")
+    op.execute("DROP TRIGGER IF EXISTS trg_stok_link_receteler ON stok_kalemleri")
+    op.execute("DROP FUNCTION IF EXISTS stok_link_receteler()")
+    op.execute("DROP TRIGGER IF EXISTS trg_menu_link_receteler ON menu")
+    op.execute("DROP FUNCTION IF EXISTS menu_link_receteler()")
+    op.execute("DROP TRIGGER IF EXISTS trg_receteler_resolve_keys ON receteler")
+    op.execute("DROP FUNCTION IF EXISTS recete_resolve_keys()")
+    op.execute("DROP INDEX IF EXISTS idx_stok_kalemleri_sube_ad_key")
+    op.execute("DROP INDEX IF EXISTS idx_receteler_sube_stok_key")
+    op.execute("DROP INDEX IF EXISTS idx_receteler_sube_urun_key")
+    op.execute("ALTER TABLE receteler DROP COLUMN IF EXISTS stok_id")
+    op.execute("ALTER TABLE receteler DROP COLUMN IF EXISTS menu_id")
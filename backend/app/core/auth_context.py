@@ -0,0 +1,287 @@
+# backend/app/core/auth_context.py
+"""
+İstek başına auth/tenant çözümlemesi.
+
+DomainTenantMiddleware, TenantStatusMiddleware, SubscriptionLimitMiddleware ve
+deps.get_current_user aynı bilgiye ihtiyaç duyar: JWT payload'ı, kullanıcı,
+tenant durumu (işletme aktifliği, abonelik), abonelik limitleri ve domain
+eşlemesi. Bu modül bunları istek başına bir kez çözer:
+
+- JWT bir kez decode edilir,
+- kullanıcı + tenant + abonelik + domain eşlemesi tek sorguyla okunur,
+- sonuç (token, domain) anahtarıyla process içi LRU'da AUTH_CONTEXT_TTL_SECONDS
+  boyunca tutulur,
+- AuthContext request.state.auth_context'e yazılır; sonraki katmanlar yeniden
+  çözümlemez.
+
+Token deny list (logout) kontrolü cache'lenmez; Redis aktifse her istekte bir kez
+yapılır. Kullanıcı/tenant/abonelik/domain yazım uçları invalidate_auth_context ile
+yerel kopyaları düşürür; diğer worker'lar TTL sonunda güncellenir.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from jose import jwt, JWTError
+from starlette.requests import HTTPConnection
+
+from .config import settings
+from .lru import LRUCache
+from .security import ALGORITHM, SECRET_KEY
+
+logger = logging.getLogger(__name__)
+
+_cache = LRUCache(maxsize=settings.AUTH_CONTEXT_CACHE_SIZE, ttl=settings.AUTH_CONTEXT_TTL_SECONDS)
+
+# Çözümleme hataları (get_current_user bunları 401'e çevirir)
+ERROR_INVALID_TOKEN = "invalid_token"
+ERROR_NO_SUB = "no_sub"
+ERROR_REVOKED = "revoked"
+
+_TENANT_COLUMNS = """
+    i.id AS isletme_id,
+    i.aktif AS isletme_aktif,
+    i.allowed_ips,
+    s.status AS sub_status,
+    s.trial_bitis,
+    s.bitis_tarihi,
+    s.max_subeler,
+    s.max_kullanicilar,
+    s.max_menu_items
+"""
+
+
+class AuthContext:
+    """Bir isteğin çözümlenmiş kimlik ve tenant bilgisi (salt-okunur kullanın)"""
+
+    __slots__ = ("token", "payload", "error", "subdomain", "domain_tenant_id", "user", "tenant")
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        subdomain: Optional[str] = None,
+        domain_tenant_id: Optional[int] = None,
+        user: Optional[Dict[str, Any]] = None,
+        tenant: Optional[Dict[str, Any]] = None,
+    ):
+        self.token = token
+        self.payload = payload or {}
+        self.error = error
+        self.subdomain = subdomain
+        self.domain_tenant_id = domain_tenant_id
+        # {"id", "username", "role", "aktif", "tenant_id"} veya None
+        self.user = user
+        # Kullanıcının (yoksa token'ın) tenant'ı: işletme + abonelik durumu ve limitleri
+        self.tenant = tenant
+
+    @property
+    def role(self) -> str:
+        return ((self.user or {}).get("role") or "").lower()
+
+    @property
+    def user_tenant_id(self) -> Optional[int]:
+        return (self.user or {}).get("tenant_id")
+
+
+def _bearer_token(connection: HTTPConnection) -> Optional[str]:
+    auth_header = connection.headers.get("authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return None
+    return auth_header.replace("Bearer ", "") or None
+
+
+def _tenant_from_row(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if row.get("isletme_id") is None:
+        return None
+    return {
+        "id": row["isletme_id"],
+        "aktif": row["isletme_aktif"],
+        "allowed_ips": row["allowed_ips"],
+        "sub_status": row["sub_status"],
+        "trial_bitis": row["trial_bitis"],
+        "bitis_tarihi": row["bitis_tarihi"],
+        "max_subeler": row["max_subeler"],
+        "max_kullanicilar": row["max_kullanicilar"],
+        "max_menu_items": row["max_menu_items"],
+    }
+
+
+def _token_tenant_id(payload: Dict[str, Any]) -> Optional[int]:
+    value = payload.get("tenant_id")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return None
+
+
+async def _load(username: Optional[str], token_tid: Optional[int], subdomain: Optional[str]) -> Dict[str, Any]:
+    """Kullanıcı, tenant durumu/limitleri ve domain eşlemesini tek sorguda okur."""
+    from ..db.database import db
+
+    row = await db.fetch_one(
+        f"""
+        WITH d AS (
+            SELECT tc.isletme_id
+            FROM tenant_customizations tc
+            JOIN isletmeler di ON di.id = tc.isletme_id
+            WHERE CAST(:subdomain AS TEXT) IS NOT NULL
+              AND LOWER(tc.domain) = LOWER(CAST(:subdomain AS TEXT))
+              AND di.aktif = TRUE
+            ORDER BY (tc.domain = CAST(:subdomain AS TEXT)) DESC
+            LIMIT 1
+        ),
+        u AS (
+            SELECT id, username, role, aktif, tenant_id
+            FROM users
+            WHERE username = CAST(:username AS TEXT)
+            LIMIT 1
+        ),
+        t AS (
+            SELECT COALESCE((SELECT tenant_id FROM u), CAST(:token_tid AS BIGINT)) AS tid
+        )
+        SELECT
+            (SELECT isletme_id FROM d) AS domain_tenant_id,
+            u.id AS user_id, u.username, u.role, u.aktif, u.tenant_id AS user_tenant_id,
+            {_TENANT_COLUMNS}
+        FROM t
+        LEFT JOIN u ON TRUE
+        LEFT JOIN isletmeler i ON i.id = t.tid
+        LEFT JOIN subscriptions s ON s.isletme_id = i.id
+        LIMIT 1
+        """,
+        {"username": username, "token_tid": token_tid, "subdomain": subdomain},
+    )
+    row = dict(row) if row else {}
+    user = None
+    if row.get("user_id") is not None:
+        user = {
+            "id": row["user_id"],
+            "username": row["username"],
+            "role": row["role"],
+            "aktif": row["aktif"],
+            "tenant_id": row["user_tenant_id"],
+        }
+    return {
+        "user": user,
+        "tenant": _tenant_from_row(row),
+        "domain_tenant_id": row.get("domain_tenant_id"),
+    }
+
+
+async def resolve_auth_context(connection: HTTPConnection, token: Optional[str] = None) -> AuthContext:
+    """
+    İsteğin AuthContext'ini döndürür; ilk çağrıda çözümler ve request.state'e yazar.
+
+    Args:
+        connection: Request (middleware veya dependency)
+        token: Bearer token (None → Authorization header'ından)
+    """
+    if token is None:
+        token = _bearer_token(connection)
+    state = connection.state
+    ctx: Optional[AuthContext] = getattr(state, "auth_context", None)
+    if ctx is not None and ctx.token == token:
+        return ctx
+
+    from .domain_middleware import extract_subdomain
+
+    subdomain = extract_subdomain(connection.headers.get("host", ""))
+    payload: Dict[str, Any] = {}
+    error = None
+    if token:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            error = ERROR_INVALID_TOKEN
+        if error is None and not payload.get("sub"):
+            error = ERROR_NO_SUB
+        if error is None:
+            from ..services.cache import cache_service
+
+            if cache_service.is_enabled() and await cache_service.exists(f"denylist:{token}"):
+                error = ERROR_REVOKED
+
+    username = payload.get("sub") if error is None else None
+    if username is None and subdomain is None:
+        ctx = AuthContext(token=token, payload=payload, error=error)
+    else:
+        key = (token if username else None, subdomain)
+        resolved = _cache.get(key)
+        if resolved is None:
+            resolved = await _load(username, _token_tenant_id(payload) if username else None, subdomain)
+            _cache.set(key, resolved)
+        ctx = AuthContext(
+            token=token,
+            payload=payload,
+            error=error,
+            subdomain=subdomain,
+            domain_tenant_id=resolved["domain_tenant_id"],
+            user=resolved["user"],
+            tenant=resolved["tenant"],
+        )
+    state.auth_context = ctx
+    return ctx
+
+
+async def get_tenant_state(tenant_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Bir tenant'ın işletme/abonelik durumu ve limitleri (super admin tenant
+    switching ve domain tenant'ı için; aynı LRU'da tutulur).
+    """
+    key = ("tenant", tenant_id)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached.get("tenant")
+
+    from ..db.database import db
+
+    row = await db.fetch_one(
+        f"""
+        SELECT {_TENANT_COLUMNS}
+        FROM isletmeler i
+        LEFT JOIN subscriptions s ON s.isletme_id = i.id
+        WHERE i.id = :tid
+        LIMIT 1
+        """,
+        {"tid": tenant_id},
+    )
+    tenant = _tenant_from_row(dict(row)) if row else None
+    _cache.set(key, {"tenant": tenant, "user": None, "domain_tenant_id": None})
+    return tenant
+
+
+def invalidate_auth_context(
+    token: Optional[str] = None,
+    username: Optional[str] = None,
+    tenant_id: Optional[int] = None,
+) -> int:
+    """
+    Yerel auth cache kayıtlarını düşürür (argümansız çağrı → hepsi).
+    Kullanıcı, işletme, abonelik ve domain yazımlarından sonra çağrılır.
+
+    Returns:
+        Silinen kayıt sayısı
+    """
+    if token is None and username is None and tenant_id is None:
+        n = len(_cache)
+        _cache.clear()
+        return n
+
+    def _match(key, value) -> bool:
+        if token is not None and isinstance(key, tuple) and key[0] == token:
+            return True
+        user = value.get("user") or {}
+        if username is not None and user.get("username") == username:
+            return True
+        if tenant_id is not None:
+            tenant = value.get("tenant") or {}
+            return tenant_id in (tenant.get("id"), user.get("tenant_id"), value.get("domain_tenant_id"))
+        return False
+
+    return _cache.discard_where(_match)
+
+
+def auth_context_stats() -> Dict[str, Any]:
+    return _cache.stats()
@@ -0,0 +1,205 @@
+# backend/app/core/branch_access.py
+"""
+Şube çözümleme ve şube yetkileri için process içi indeks.
+
+deps.get_sube_id neredeyse her yetkili uçta çalışır; her dalı subeler'e (ve
+enforce_user_sube_access üzerinden user_sube_izinleri'ne) ayrı sorgu atıyordu.
+Bu modül iki tabloyu tek seferde belleğe alır:
+
+- aktif şube → işletme (tenant) eşlemesi,
+- tenant → aktif şubeleri (id sırasıyla; ilk eleman varsayılan şube),
+- kullanıcı → izinli şubeler (kaydı olmayan kullanıcı gevşek moddadır).
+
+İndeks startup'ta ısıtılır; şube ve şube izni yazımları invalidate_branch_access
+ile yerel kopyayı düşürür ve pg_notify ile diğer worker'lara haber verir.
+Bildirim kaçarsa BRANCH_ACCESS_TTL_SECONDS sonunda indeks yeniden okunur.
+İndekste olmayan bir şube/tenant sorulursa (başka worker'da yeni açılmış olabilir)
+en fazla BRANCH_ACCESS_MISS_RELOAD_SECONDS'ta bir yeniden yüklenir.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+BRANCH_ACCESS_CHANNEL = "neso_branch_access"
+
+
+class BranchIndex:
+    """Belirli bir anda okunmuş şube/izin görüntüsü (salt-okunur kullanın)"""
+
+    __slots__ = ("sube_tenant", "tenant_subeler", "user_subeler", "loaded_at")
+
+    def __init__(
+        self,
+        sube_tenant: Dict[int, Optional[int]],
+        tenant_subeler: Dict[int, Tuple[int, ...]],
+        user_subeler: Dict[str, FrozenSet[int]],
+    ):
+        self.sube_tenant = sube_tenant
+        self.tenant_subeler = tenant_subeler
+        self.user_subeler = user_subeler
+        self.loaded_at = time.monotonic()
+
+    def is_active(self, sube_id: int) -> bool:
+        return sube_id in self.sube_tenant
+
+    def tenant_of(self, sube_id: int) -> Optional[int]:
+        """Aktif şubenin işletme id'si (şube yoksa/pasifse None)"""
+        return self.sube_tenant.get(sube_id)
+
+    def first_sube(self, tenant_id: int) -> Optional[int]:
+        """Tenant'ın id sırasına göre ilk aktif şubesi"""
+        subeler = self.tenant_subeler.get(tenant_id)
+        return subeler[0] if subeler else None
+
+    def allowed_subeler(self, username: str) -> Optional[FrozenSet[int]]:
+        """Kullanıcının izinli şubeleri; izin kaydı yoksa None (gevşek mod)"""
+        return self.user_subeler.get(username)
+
+
+_index: Optional[BranchIndex] = None
+_stale = True
+_reload_lock = asyncio.Lock()
+_listening = False
+
+
+def _is_fresh(index: Optional[BranchIndex]) -> bool:
+    if index is None or _stale:
+        return False
+    return time.monotonic() - index.loaded_at < settings.BRANCH_ACCESS_TTL_SECONDS
+
+
+async def _load() -> BranchIndex:
+    from ..db.database import db, current_tenant_id
+
+    # İndeks tüm tenant'ları kapsar: istek içinden yüklenirken RLS tenant filtresi uygulanmasın
+    token = current_tenant_id.set(None)
+    try:
+        sube_rows = await db.fetch_all(
+            "SELECT id, isletme_id FROM subeler WHERE aktif = TRUE ORDER BY id ASC"
+        )
+        try:
+            izin_rows = await db.fetch_all("SELECT username, sube_id FROM user_sube_izinleri")
+        except Exception:
+            # Tablo yoksa mevcut gevşek davranışı koru
+            izin_rows = []
+    finally:
+        current_tenant_id.reset(token)
+
+    sube_tenant: Dict[int, Optional[int]] = {}
+    tenant_lists: Dict[int, list] = {}
+    for r in sube_rows:
+        sube_tenant[r["id"]] = r["isletme_id"]
+        if r["isletme_id"] is not None:
+            tenant_lists.setdefault(r["isletme_id"], []).append(r["id"])
+
+    user_lists: Dict[str, set] = {}
+    for r in izin_rows:
+        user_lists.setdefault(r["username"], set()).add(r["sube_id"])
+
+    return BranchIndex(
+        sube_tenant=sube_tenant,
+        tenant_subeler={tid: tuple(ids) for tid, ids in tenant_lists.items()},
+        user_subeler={u: frozenset(ids) for u, ids in user_lists.items()},
+    )
+
+
+async def _reload(previous: Optional[BranchIndex]) -> BranchIndex:
+    global _index, _stale
+    async with _reload_lock:
+        # Kilidi beklerken başka bir istek yeniden yüklediyse onu kullan
+        if _index is not previous and _is_fresh(_index):
+            return _index
+        _stale = False
+        try:
+            index = await _load()
+        except Exception as e:
+            _stale = True
+            if _index is None:
+                raise
+            # DB geçici olarak erişilemiyorsa son bilinen görüntüyle devam et
+            logger.warning(f"[BRANCH_ACCESS] İndeks yenilenemedi, önceki görüntü kullanılıyor: {e}")
+            return _index
+        _index = index
+        logger.debug(
+            f"[BRANCH_ACCESS] İndeks yüklendi: subeler={len(index.sube_tenant)}, "
+            f"tenantlar={len(index.tenant_subeler)}, izinli_kullanicilar={len(index.user_subeler)}"
+        )
+        return index
+
+
+async def get_branch_index(sube_id: Optional[int] = None, tenant_id: Optional[int] = None) -> BranchIndex:
+    """
+    Güncel indeksi döndürür. sube_id/tenant_id verilirse ve indekste yoksa
+    (yeni açılmış olabilir) hız sınırıyla bir kez yeniden yükler.
+    """
+    index = _index
+    if not _is_fresh(index):
+        index = await _reload(index)
+
+    missing = (sube_id is not None and sube_id not in index.sube_tenant) or (
+        tenant_id is not None and tenant_id not in index.tenant_subeler
+    )
+    if missing and time.monotonic() - index.loaded_at >= settings.BRANCH_ACCESS_MISS_RELOAD_SECONDS:
+        index = await _reload(index)
+    return index
+
+
+def _mark_stale() -> None:
+    global _stale
+    _stale = True
+
+
+async def _on_branch_access_event(channel: str, payload: Dict[str, Any]) -> None:
+    _mark_stale()
+
+
+async def invalidate_branch_access(reason: str = "") -> None:
+    """
+    Yerel indeksi düşürür ve diğer worker'lara bildirir.
+    subeler (ekle/güncelle/sil, tenant silme) ve user_sube_izinleri yazımlarından sonra çağrılır.
+    """
+    _mark_stale()
+    from ..db.database import db
+
+    try:
+        await db.execute(
+            "SELECT pg_notify(:channel, :payload)",
+            {"channel": BRANCH_ACCESS_CHANNEL, "payload": json.dumps({"reason": reason})},
+        )
+    except Exception as e:
+        # Diğer worker'lar TTL sonunda güncellenir
+        logger.warning(f"[BRANCH_ACCESS] Invalidation bildirimi gönderilemedi: {e}")
+
+
+async def warm_branch_access() -> None:
+    """Startup: indeksi yükler ve diğer worker'ların invalidation bildirimlerine abone olur."""
+    global _listening
+    if not _listening:
+        from ..services.event_bus import event_bus
+
+        await event_bus.register(BRANCH_ACCESS_CHANNEL, _on_branch_access_event)
+        await event_bus.start_listener()
+        _listening = True
+    index = await _reload(_index)
+    logger.info(
+        f"[BRANCH_ACCESS] İndeks ısıtıldı: subeler={len(index.sube_tenant)}, "
+        f"tenantlar={len(index.tenant_subeler)}, izinli_kullanicilar={len(index.user_subeler)}"
+    )
+
+
+def branch_access_stats() -> Dict[str, Any]:
+    index = _index
+    return {
+        "loaded": index is not None,
+        "stale": _stale,
+        "age_seconds": round(time.monotonic() - index.loaded_at, 1) if index else None,
+        "subeler": len(index.sube_tenant) if index else 0,
+        "tenantlar": len(index.tenant_subeler) if index else 0,
+        "izinli_kullanicilar": len(index.user_subeler) if index else 0,
+    }
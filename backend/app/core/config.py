@@ -1,6 +1,6 @@
 from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -36,6 +36,13 @@ class Settings(BaseSettings):
         default=0,  # 0 = disabled (for dev); prod'da env var ile 60 set edilmeli
         description="Production'da mutlaka 60+ olmalı. .env → RATE_LIMIT_PER_MINUTE=60"
     )
+    # Kimliği doğrulanmış istekler için tenant başına toplam limit (0 = kapalı)
+    RATE_LIMIT_TENANT_PER_MINUTE: int = 0
+    # Path prefix → IP başına dakikalık limit; en uzun eşleşen prefix uygulanır
+    # Örn. .env → RATE_LIMIT_ROUTE_POLICIES={"/assistant": 30, "/auth/token": 10}
+    RATE_LIMIT_ROUTE_POLICIES: Dict[str, int] = {}
+    # Redis yokken process içi limiter'ın tuttuğu en fazla anahtar (IP/tenant/route); doluysa LRU atılır
+    RATE_LIMIT_MEMORY_MAX_KEYS: int = 10000
     REQUEST_LOG_ENABLED: bool = True
     ADD_REQUEST_ID_HEADER: bool = True
 
@@ -78,6 +85,24 @@ class Settings(BaseSettings):
     DB_POOL_MAX_SIZE: int = 20  # Maximum connection sayısı (traffic spikes için)
     DB_COMMAND_TIMEOUT: int = 10  # Query timeout (saniye) - cross-region için artırıldı
     DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME: float = 300.0  # Inactive connection lifetime (saniye)
+    # RLS tenant ayarı istek başına bir kez (request-scoped bağlantı) uygulanır;
+    # kapalıysa her sorgu BEGIN + SET LOCAL + COMMIT ile sarılır.
+    DB_REQUEST_SCOPED_TENANT: bool = True
+    # Uzun süren (LLM/stream) uçlar istek boyunca havuzdan bağlantı tutmasın
+    DB_REQUEST_SCOPED_EXCLUDE_PREFIXES: List[str] = ["/assistant", "/customer-assistant", "/bi-assistant", "/ws"]
+    # İstek başına auth/tenant çözümlemesi (kullanıcı + tenant durumu + limitler + domain) için
+    # process içi LRU; yetki/durum değişiklikleri en geç bu süre sonunda diğer worker'lara yansır
+    AUTH_CONTEXT_TTL_SECONDS: float = 10.0
+    AUTH_CONTEXT_CACHE_SIZE: int = 4096
+    # Şube çözümleme/şube izinleri indeksi (core/branch_access); yazımlar pg_notify ile anında
+    # invalidate eder, TTL bildirimin kaçtığı durum için emniyet süresidir
+    BRANCH_ACCESS_TTL_SECONDS: float = 300.0
+    # İndekste olmayan şube/tenant sorulduğunda en fazla bu sıklıkla yeniden yüklenir
+    BRANCH_ACCESS_MISS_RELOAD_SECONDS: float = 2.0
+    # Abonelik limit kontrolü için tenant kullanım sayaçları (services/tenant_usage); yazımlar artımlı
+    # günceller, TTL ve zamanlanmış yeniden sayım kaymaları düzeltir
+    TENANT_USAGE_TTL_SECONDS: float = 3600.0
+    TENANT_USAGE_CACHE_SIZE: int = 4096
 
     # ---------- CORS ----------
     # Dev: localhost portları açık. Prod'da .env → CORS_ORIGINS=https://yourdomain.com
@@ -104,11 +129,21 @@ class Settings(BaseSettings):
     
     GOOGLE_API_KEY: Optional[str] = None
     GEMINI_MODEL: Optional[str] = "gemini-2.5-flash"
+    # Çözümlenmiş provider (tenant, asistan tipi) cache'i; ayar yazımları pg_notify ile anında invalidate eder
+    LLM_PROVIDER_CACHE_TTL_SECONDS: float = 300.0
+    LLM_PROVIDER_CACHE_SIZE: int = 1024
+    # API key başına paylaşılan HTTP client havuzu
+    LLM_HTTP_MAX_CONNECTIONS: int = 20
+    LLM_HTTP_MAX_KEEPALIVE: int = 10
 
     # Sesli asistan altyapısı için bayraklar
     ASSISTANT_ENABLE_LLM: bool = True
     ASSISTANT_ENABLE_TTS: bool = False  # Sunucu TTS kapalı (arayüzde kullanılmıyor); gerekirse env ile True yapılabilir
     ASSISTANT_ENABLE_STT: bool = True   # Client-side tarayıcı SpeechRecognition; sunucu STT için ileride
+    # Akışlı sohbet (/chat/stream): bu uzunluktan kısa cümleler sonrakiyle birleştirilip TTS'e öyle gönderilir
+    ASSISTANT_STREAM_MIN_SENTENCE_CHARS: int = 12
+    # Akışlı sohbette aynı anda sentezlenen en fazla cümle
+    ASSISTANT_STREAM_TTS_CONCURRENCY: int = 2
      
     # ---------- TTS (Text-to-Speech) API Ayarları ----------
     # TTS Provider: 'system' (pyttsx3), 'google', 'azure', 'aws', 'openai'
@@ -133,6 +168,33 @@ class Settings(BaseSettings):
     CACHE_TTL_SHORT: int = 60
     CACHE_TTL_MEDIUM: int = 300
     CACHE_TTL_LONG: int = 1800
+    # Şube bazlı in-process menü snapshot'ı (siparis/public/assistant ortak); yazımlarda ayrıca invalidate edilir
+    MENU_SNAPSHOT_TTL_SECONDS: int = 120
+    # Asistan bilgi snapshot'ı (menü+reçete+stok+özellik haritası+prompt); reçete/stok yazımlarında ayrıca invalidate edilir
+    ASSISTANT_KNOWLEDGE_TTL_SECONDS: int = 300
+    # Asistan konuşma deposu (mesaj geçmişi, dil, masa/şube bağlamı): LRU + TTL ve yaklaşık bayt sınırı
+    # auto | redis | memory (auto → Redis aktifse redis; çok worker'da konuşma worker'lar arası taşınır)
+    CONVERSATION_STORE_BACKEND: str = "auto"
+    CONVERSATION_TTL_SECONDS: int = 7200
+    CONVERSATION_STORE_MAX_SESSIONS: int = 5000
+    CONVERSATION_STORE_MAX_BYTES: int = 32 * 1024 * 1024
+    # Asistan yanıt önbelleği (müşteri + BI): bilgi/veri parmak izi değişince eski yanıtlar eşleşmez
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL_SECONDS: int = 1800
+    # BI yanıtları satış verisine bağlı; daha kısa tutulur
+    RESPONSE_CACHE_BI_TTL_SECONDS: int = 300
+    # Yakın kopya arama (intent_detector fuzzy + trigram skorları, ikisi de eşiği geçmeli)
+    RESPONSE_CACHE_NEAR_DUPLICATE: bool = True
+    RESPONSE_CACHE_FUZZY_THRESHOLD: float = 0.95
+    RESPONSE_CACHE_PHONETIC_THRESHOLD: float = 0.7
+    # Versiyon başına yakın kopya taramasında tutulan son soru sayısı
+    RESPONSE_CACHE_INDEX_SIZE: int = 50
+    # Mutfak WS replay: cursor'dan sonra en fazla bu kadar değişiklik gönderilir, fazlası için tam yeniden yükleme (resync)
+    KITCHEN_REPLAY_LIMIT: int = 500
+    # Replay güvenlik penceresi: mutfak_seq yazımda (nextval) alınır, commit sırası farklı olabilir;
+    # cursor'dan bu kadar geri gidilerek geç commit edilen siparişler de gönderilir (istemci id+seq ile tekilleştirir).
+    # Pencere limite sayılmaz; eşzamanlı açık sipariş transaction'larını kapsayacak kadar küçük tutulmalı
+    KITCHEN_REPLAY_OVERLAP: int = 100
 
     # ---------- Redis Cache ----------
     REDIS_ENABLED: bool = False
@@ -140,9 +202,59 @@ class Settings(BaseSettings):
     REDIS_POOL_SIZE: int = 20
     REDIS_SOCKET_TIMEOUT: int = 5
 
+    # ---------- WebSocket fan-out ----------
+    # Çok worker/node'da broadcast'leri diğer worker'lara taşır: auto | redis | postgres | memory | none
+    # auto → Redis aktifse redis, değilse Postgres LISTEN/NOTIFY
+    WS_BROKER_BACKEND: str = "auto"
+    WS_BROKER_CHANNEL: str = "neso_ws"
+    # Bağlantı başına giden kuyruk: dolarsa veya tek gönderim süreyi aşarsa istemci düşürülür
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+    # Broker'a giden yayın kuyruğu (arka plan publisher boşaltır); doluysa yayın sadece yerelde kalır
+    WS_BROKER_QUEUE_SIZE: int = 1024
+
     # ---------- Backup / Scheduler ----------
     BACKUP_ENABLED: bool = False
     BACKUP_SCHEDULE_CRON: str = "0 2 * * *"  # Her gün 02:00
+    # Adisyonsuz aktif siparişleri açık adisyona bağlayan onarım görevi (0 = kapalı)
+    ORPHAN_REPAIR_INTERVAL_MINUTES: int = 5
+    # Artımlı adisyon toplamlarının kaynak tablolarla mutabakatı (sapma raporu + düzeltme, 0 = kapalı)
+    ADISYON_RECONCILE_INTERVAL_MINUTES: int = 15
+    # Tenant kullanım sayaçlarının (şube/kullanıcı/menü) DB ile yeniden sayımı (0 = kapalı)
+    TENANT_USAGE_RECOUNT_INTERVAL_MINUTES: int = 10
+
+    # ---------- Audit log yazımı ----------
+    # log_action kayıtları kuyruğa alınır; arka plan worker'ı batch halinde yazar
+    AUDIT_QUEUE_MAX_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 200
+    AUDIT_FLUSH_INTERVAL_MS: int = 500
+    # Kuyruk doluyken istek en fazla bu kadar bekler, sonra kayıt düşürülür (dropped sayacı)
+    AUDIT_ENQUEUE_TIMEOUT_MS: int = 50
+
+    # ---------- API kullanım ölçümü ----------
+    # LLM/REST çağrıları bellekte (tenant, api_type, model, endpoint, dakika) bazında toplanır,
+    # api_usage_minutely tablosuna bu aralıkla yazılır
+    API_USAGE_FLUSH_INTERVAL_SECONDS: float = 10.0
+    # Başarılı çağrıların api_usage_logs'a ham satır olarak yazılma oranı (0 = hiç, 1 = hepsi)
+    API_USAGE_RAW_SAMPLE_RATE: float = 0.0
+    # Hatalı çağrılar her zaman ham satır olarak yazılsın (superadmin "son hatalar" listesi)
+    API_USAGE_RAW_LOG_ERRORS: bool = True
+    # Flush bekleyen ham satır / rollup anahtarı üst sınırı (DB erişilemezken bellek şişmesin)
+    API_USAGE_MAX_BUFFERED: int = 10000
+
+    # ---------- Tablo bölümleme (partitioning) ----------
+    # siparisler/odemeler/audit_logs/api_usage_logs aylık bölümlemeye
+    # scripts/partition_tables.py ile geçirilir (opt-in). Bakım görevi sadece
+    # bölümlenmiş tablolarda çalışır: ileri ayların bölümlerini açar, eskileri arşivler.
+    PARTITION_MAINTENANCE_INTERVAL_MINUTES: int = 360  # 0 = kapalı
+    # Şimdiki aydan sonra kaç ayın bölümü önceden açık tutulsun
+    PARTITION_PREMAKE_MONTHS: int = 3
+    # Tablo başına saklama süresi (ay); listede olmayan tablo süresiz saklanır
+    # Örn: {"audit_logs": 12, "api_usage_logs": 6}
+    PARTITION_RETENTION_MONTHS: Dict[str, int] = {}
+    # Süresi dolan bölüm: "detach" → ayrılıp PARTITION_ARCHIVE_SCHEMA'ya taşınır, "drop" → silinir
+    PARTITION_ARCHIVE_MODE: str = "detach"
+    PARTITION_ARCHIVE_SCHEMA: str = "archive"
 
     @field_validator("CORS_ORIGINS", mode="before")
     @classmethod
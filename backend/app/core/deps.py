@@ -3,7 +3,7 @@ from typing import Dict, Any, Mapping, Optional, Set
 
 from fastapi import Depends, HTTPException, status, Header, Query, Request, Response
 from fastapi.security import OAuth2PasswordBearer
-from starlette.requests import Request as StarletteRequest
+from starlette.requests import HTTPConnection, Request as StarletteRequest
 from jose import jwt, JWTError
 
 from ..db.database import db
@@ -27,6 +27,35 @@ def decode_token(token: str) -> Dict[str, Any]:
         )
 
 
+# ---------------------------
+# Request-scoped DB bağlantısı
+# ---------------------------
+async def request_db_scope(connection: HTTPConnection):
+    """
+    Uygulama seviyesi dependency: HTTP isteği için request-scoped tenant bağlantısı
+    açar (bağlantı get_current_user tenant'ı belirleyince ayrılır) ve istek sonunda
+    tenant ayarını sıfırlayıp bağlantıyı havuza bırakır.
+    WebSocket'ler ve DB_REQUEST_SCOPED_EXCLUDE_PREFIXES altındaki uzun süren uçlar
+    sorgu başına SET LOCAL yolunu kullanmaya devam eder.
+    """
+    from .config import settings
+
+    path = connection.scope.get("path", "")
+    if (
+        connection.scope.get("type") != "http"
+        or not settings.DB_REQUEST_SCOPED_TENANT
+        or any(path.startswith(p) for p in settings.DB_REQUEST_SCOPED_EXCLUDE_PREFIXES)
+    ):
+        yield
+        return
+
+    binding = db.begin_request_scope()
+    try:
+        yield
+    finally:
+        await db.end_request_scope(binding)
+
+
 # ---------------------------
 # Kimlik ve Rol
 # ---------------------------
@@ -40,41 +69,40 @@ async def get_current_user(
     Super admin için X-Tenant-Id header'ını veya tenant_id query parameter'ını kontrol eder (tenant switching).
     Dönüş: {"id": ..., "username": ..., "role": ..., "aktif": ..., "tenant_id": ..., "switched_tenant_id": ...}
     """
-    from ..services.cache import cache_service
-    if cache_service.is_enabled():
-        is_denied = await cache_service.exists(f"denylist:{token}")
-        if is_denied:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has been revoked. Please log in again.",
-            )
+    from .auth_context import ERROR_NO_SUB, ERROR_REVOKED, resolve_auth_context
 
-    payload = decode_token(token)
-    sub = payload.get("sub")
-    if not sub:
+    # JWT decode + kullanıcı/tenant okuması istek başına bir kez (middleware'ler de aynı bağlamı kullanır)
+    ctx = await resolve_auth_context(request, token)
+    if ctx.error == ERROR_REVOKED:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked. Please log in again.",
+        )
+    if ctx.error == ERROR_NO_SUB:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token (no sub)",
         )
+    if ctx.error:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+        )
+    payload = ctx.payload
+    sub = payload.get("sub")
 
     # Token'dan tenant_id al (super_admin için None olabilir)
     token_tenant_id = payload.get("tenant_id")
 
-    # sub'u senin yapına göre yorumla:
-    # - eğer 'sub' username ise username ile çek
-    # - eğer 'sub' user_id ise id ile çek
-    # Burada username varsaydım. Gerekirse id tabanlı sorguya çeviririz.
-    row = await db.fetch_one(
-        "SELECT id, username, role, aktif, tenant_id FROM users WHERE username = :u",
-        {"u": sub},
-    )
+    row = ctx.user
     if not row or row["aktif"] is False:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found or inactive",
         )
 
-    user_dict = dict(row) if hasattr(row, 'keys') else row
+    # Bağlamdaki kayıt LRU ile paylaşılır; kopyası üzerinde çalış
+    user_dict = dict(row)
     
     # Domain-based tenant routing: request.state.tenant_id varsa öncelik ver (DomainTenantMiddleware'den gelmişse)
     domain_tenant_id = None
@@ -133,15 +161,11 @@ async def get_current_user(
 
                         # Tenant'ın var olduğunu ve aktif olduğunu kontrol et
                         try:
-                            tenant_check = await db.fetch_one(
-                                "SELECT id, aktif FROM isletmeler WHERE id = :tid",
-                                {"tid": switched_tenant_id},
-                            )
-                            # tenant_check'ü dict'e çevir
-                            tenant_check_dict = dict(tenant_check) if tenant_check and hasattr(tenant_check, 'keys') else (tenant_check if tenant_check else {})
-                            tenant_aktif = tenant_check_dict.get("aktif") if isinstance(tenant_check_dict, dict) else (getattr(tenant_check, "aktif", False) if tenant_check else False)
+                            from .auth_context import get_tenant_state
+
+                            tenant_check = await get_tenant_state(switched_tenant_id)
                             
-                            if not tenant_check or not tenant_aktif:
+                            if not tenant_check or not tenant_check.get("aktif"):
                                 # Tenant yoksa veya pasifse, switched_tenant_id'yi None yap
                                 logging.warning(f"[get_current_user] Tenant {switched_tenant_id} not found or inactive")
                                 switched_tenant_id = None
@@ -164,8 +188,12 @@ async def get_current_user(
     effective_tid = switched_tenant_id if user_dict.get("role") == "super_admin" and switched_tenant_id else tenant_id
     if effective_tid:
         try:
-            tenant_data = await db.fetch_one("SELECT allowed_ips FROM isletmeler WHERE id = :tid", {"tid": effective_tid})
-            tenant_dict = dict(tenant_data) if tenant_data and hasattr(tenant_data, 'keys') else (tenant_data if tenant_data else {})
+            if ctx.tenant and ctx.tenant.get("id") == effective_tid:
+                tenant_dict = ctx.tenant
+            else:
+                from .auth_context import get_tenant_state
+
+                tenant_dict = await get_tenant_state(effective_tid) or {}
             if tenant_dict and tenant_dict.get("allowed_ips"):
                 allowed_ips_raw = tenant_dict["allowed_ips"]
                 import json
@@ -191,6 +219,8 @@ async def get_current_user(
     # SADECE BURADA TENANT ISOLATION AKTİVE EDİLİR: Tüm alt katmanlı işlemlere RLS tetikler
     from ..db.database import current_tenant_id
     current_tenant_id.set(effective_tid)
+    # Request-scoped modda tenant ayarı istek bağlantısına burada bir kez uygulanır
+    await db.bind_request_tenant(effective_tid)
     
     return user_dict
 
@@ -327,35 +357,37 @@ def get_current_isletme_sahibi(current_user: Dict[str, Any] = Depends(get_curren
 # ---------------------------
 # Şube Erişim Kontrolü
 # ---------------------------
-async def enforce_user_sube_access(username: str, sube_id: int) -> None:
+async def enforce_user_sube_access(username: str, sube_id: int, role: Optional[str] = None) -> None:
     """
     Kullanıcıya tanımlı şube izinleri varsa sadece o şubelere erişsin.
     Hiç izin kaydı yoksa (tablo boşsa) gevşek mod: tüm şubelere izin.
+    İzinler core/branch_access indeksinden okunur; role verilmezse users'tan bakılır.
     """
     # Super admin için bypass
-    try:
-        role_row = await db.fetch_one(
-            "SELECT role FROM users WHERE username = :u",
-            {"u": username},
-        )
-        if role_row and str(role_row["role"] or "").lower() == "super_admin":
-            return
-    except Exception:
-        # users tablosu yoksa/uyumsuzsa, mevcut gevşek davranışa düş
-        pass
+    if role is None:
+        try:
+            role_row = await db.fetch_one(
+                "SELECT role FROM users WHERE username = :u",
+                {"u": username},
+            )
+            role = role_row["role"] if role_row else None
+        except Exception:
+            # users tablosu yoksa/uyumsuzsa, mevcut gevşek davranışa düş
+            role = None
+    if str(role or "").lower() == "super_admin":
+        return
+
+    from .branch_access import get_branch_index
 
     try:
-        rows = await db.fetch_all(
-            "SELECT sube_id FROM user_sube_izinleri WHERE username = :u",
-            {"u": username},
-        )
+        index = await get_branch_index()
     except Exception:
-        # Tablo yoksa mevcut gevşek davranışı koru
+        # İndeks yüklenemiyorsa mevcut gevşek davranışı koru
         return
-    if not rows:
+    allowed = index.allowed_subeler(username)
+    if not allowed:
         # Gevşek mod: kayıt yoksa tüm şubeler serbest (mevcut davranış)
         return
-    allowed = {r["sube_id"] for r in rows}
     if sube_id not in allowed:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -377,256 +409,104 @@ async def get_sube_id(
     - İkisi de yoksa: Super admin tenant switching yapıyorsa o tenant'ın ilk şubesini, yoksa 1 (DEMO varsayılanı)
     Ayrıca şubenin aktifliğini ve kullanıcının erişim iznini doğrular.
     Super admin tenant switching yapıyorsa, sadece o tenant'ın şubelerine erişebilir.
+    Aktif şubeler ve şube izinleri core/branch_access indeksinden çözülür (kararlı durumda DB'ye gidilmez).
     """
+    import logging
+    from .branch_access import get_branch_index
+
     sube_id = x_sube_id if x_sube_id is not None else sube_id_q
-    
+
     # Super admin tenant switching yapıyorsa, tenant_id'yi al
     switched_tenant_id = current.get("switched_tenant_id")
     tenant_id = current.get("tenant_id")
     effective_tenant_id = switched_tenant_id if switched_tenant_id else tenant_id
-    
+
     role = (current.get("role") or "").lower()
     username = current.get("username", "unknown")
     is_super_admin = role == "super_admin"
-    
-    import logging
-    logging.info(f"[get_sube_id] Başlangıç: username={username}, role={role}, sube_id={sube_id}, tenant_id={tenant_id}, switched_tenant_id={switched_tenant_id}, effective_tenant_id={effective_tenant_id}")
-    
+
+    logging.debug(f"[get_sube_id] Başlangıç: username={username}, role={role}, sube_id={sube_id}, tenant_id={tenant_id}, switched_tenant_id={switched_tenant_id}, effective_tenant_id={effective_tenant_id}")
+
+    index = await get_branch_index(sube_id=sube_id, tenant_id=effective_tenant_id or None)
+
     # Super admin tenant switching yapıyorsa, şubenin o tenant'a ait olduğunu kontrol et
     if is_super_admin and effective_tenant_id and sube_id is not None:
-        # Gönderilen sube_id'nin o tenant'a ait olup olmadığını kontrol et
-        sube_check = await db.fetch_one(
-            "SELECT id FROM subeler WHERE id = :sid AND isletme_id = :tid AND aktif = TRUE",
-            {"sid": sube_id, "tid": effective_tenant_id},
-        )
-        if not sube_check:
+        if not index.is_active(sube_id) or index.tenant_of(sube_id) != effective_tenant_id:
             # Gönderilen sube_id o tenant'a ait değil, o tenant'ın ilk şubesini bul
-            row = await db.fetch_one(
-                """
-                SELECT id FROM subeler 
-                WHERE isletme_id = :tid AND aktif = TRUE 
-                ORDER BY id ASC 
-                LIMIT 1
-                """,
-                {"tid": effective_tenant_id},
-            )
-            if row:
-                sube_id = row["id"]
-                import logging
+            sube_id = index.first_sube(effective_tenant_id)
+            if sube_id is not None:
                 logging.info(f"[get_sube_id] Tenant {effective_tenant_id} için şube bulundu: {sube_id}")
             else:
-                # Tenant'ın şubesi yoksa, hata verme - backend'de varsayılan şube kullanılacak
+                # Tenant'ın şubesi yoksa, hata verme - aşağıda varsayılan şube atanacak
                 # Ama bu durumda menu boş dönecek (normal davranış)
-                import logging
                 logging.warning(f"[get_sube_id] Tenant {effective_tenant_id} için aktif şube bulunamadı")
-                # sube_id'yi None yap, aşağıda varsayılan şube atanacak ama tenant kontrolü yapılmayacak
-                sube_id = None
-    
+
     # Super admin tenant switching yapıyorsa ve sube_id belirtilmemişse, o tenant'ın ilk şubesini bul
     if sube_id is None and is_super_admin and effective_tenant_id:
-        row = await db.fetch_one(
-            """
-            SELECT id FROM subeler 
-            WHERE isletme_id = :tid AND aktif = TRUE 
-            ORDER BY id ASC 
-            LIMIT 1
-            """,
-            {"tid": effective_tenant_id},
-        )
-        if row:
-            sube_id = row["id"]
-            import logging
+        sube_id = index.first_sube(effective_tenant_id)
+        if sube_id is not None:
             logging.info(f"[get_sube_id] Tenant {effective_tenant_id} için otomatik şube bulundu: {sube_id}")
         else:
             # Tenant'ın şubesi yoksa, varsayılan şube kullan ama tenant kontrolü yapma
-            import logging
             logging.warning(f"[get_sube_id] Tenant {effective_tenant_id} için şube bulunamadı, varsayılan şube kullanılacak")
             sube_id = 1  # DEMO varsayılanı - ama aşağıda tenant kontrolü yapılmayacak
-    
+
     # Normal kullanıcılar (garson, operator, vb.) için: sube_id belirtilmemişse ve tenant_id varsa, o tenant'ın ilk şubesini bul
     if sube_id is None and not is_super_admin and effective_tenant_id:
-        row = await db.fetch_one(
-            """
-            SELECT id FROM subeler 
-            WHERE isletme_id = :tid AND aktif = TRUE 
-            ORDER BY id ASC 
-            LIMIT 1
-            """,
-            {"tid": effective_tenant_id},
-        )
-        if row:
-            # row'u dict'e çevir (Record objesi olabilir)
-            row_dict = dict(row) if hasattr(row, 'keys') else row
-            sube_id = row_dict.get("id") if isinstance(row_dict, dict) else (getattr(row, "id", None) if row else None)
-            import logging
+        sube_id = index.first_sube(effective_tenant_id)
+        if sube_id is not None:
             logging.info(f"[get_sube_id] Kullanıcı (role={role}) için tenant {effective_tenant_id}'nin şubesi bulundu: {sube_id}")
         else:
             # Tenant'ın şubesi yoksa, hata ver (varsayılan şube kullanma)
-            import logging
             logging.error(f"[get_sube_id] Kullanıcı (role={role}) için tenant {effective_tenant_id}'nin aktif şubesi bulunamadı")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Tenant {effective_tenant_id} için aktif şube bulunamadı. Lütfen yöneticinizle iletişime geçin.",
             )
-    
+
     if sube_id is None:
         # Eğer super_admin değilse ve tenant_id de yoksa, varsayılan şube kullan
         if not is_super_admin:
-            import logging
             logging.warning(f"[get_sube_id] Kullanıcı (role={role}) için sube_id ve tenant_id belirtilmemiş, varsayılan şube kullanılacak")
         sube_id = 1  # DEMO varsayılanı
 
-    # Super admin tenant switching yapıyorsa (effective_tenant_id varsa), şubenin o tenant'a ait olduğunu kontrol et
-    # Ama "Tüm İşletmeler" seçildiğinde (effective_tenant_id null) tenant kontrolü yapma
-    # Ayrıca, eğer tenant'ın şubesi yoksa (yukarıda bulunamadıysa), tenant kontrolü yapma
-    tenant_check_needed = is_super_admin and effective_tenant_id
-    
-    # Normal kullanıcılar için: Gönderilen sube_id'nin tenant'a ait olup olmadığını kontrol et
-    # Eğer değilse, tenant'ın kendi şubesini bul
-    if not is_super_admin and effective_tenant_id and sube_id is not None:
-        import logging
-        logging.info(f"[get_sube_id] Normal kullanıcı için şube kontrolü başlıyor: sube_id={sube_id}, effective_tenant_id={effective_tenant_id}")
-        # Gönderilen sube_id'nin tenant'a ait olup olmadığını kontrol et
-        try:
-            sube_check = await db.fetch_one(
-                "SELECT id, isletme_id FROM subeler WHERE id = :sid AND aktif = TRUE",
-                {"sid": sube_id},
-            )
-            logging.info(f"[get_sube_id] Şube sorgusu sonucu: sube_check={sube_check}")
-        except Exception as e:
-            import logging
-            logging.error(f"[get_sube_id] Şube sorgusu hatası: {e}", exc_info=True)
-            sube_check = None
-        
-        if sube_check:
-            # sube_check'ü dict'e çevir
-            sube_check_dict = dict(sube_check) if hasattr(sube_check, 'keys') else sube_check
-            sube_isletme_id = sube_check_dict.get("isletme_id") if isinstance(sube_check_dict, dict) else (getattr(sube_check, "isletme_id", None) if sube_check else None)
-            
-            # Şube var, tenant'a ait mi kontrol et
-            if sube_isletme_id != effective_tenant_id:
-                # Gönderilen sube_id başka tenant'a ait, tenant'ın kendi şubesini bul
-                import logging
-                logging.warning(f"[get_sube_id] Gönderilen sube_id={sube_id} tenant {effective_tenant_id}'e ait değil (isletme_id={sube_isletme_id}), tenant'ın şubesi aranıyor...")
-                tenant_sube_row = await db.fetch_one(
-                    """
-                    SELECT id FROM subeler 
-                    WHERE isletme_id = :tid AND aktif = TRUE 
-                    ORDER BY id ASC 
-                    LIMIT 1
-                    """,
-                    {"tid": effective_tenant_id},
-                )
-                if tenant_sube_row:
-                    # tenant_sube_row'u dict'e çevir
-                    tenant_sube_dict = dict(tenant_sube_row) if hasattr(tenant_sube_row, 'keys') else tenant_sube_row
-                    new_sube_id = tenant_sube_dict.get("id") if isinstance(tenant_sube_dict, dict) else (getattr(tenant_sube_row, "id", None) if tenant_sube_row else None)
-                    if new_sube_id:
-                        sube_id = new_sube_id
-                        import logging
-                        logging.info(f"[get_sube_id] Tenant {effective_tenant_id}'nin şubesi bulundu: {sube_id}")
-                else:
-                    # Tenant'ın şubesi yok, hata ver
-                    import logging
-                    logging.error(f"[get_sube_id] Tenant {effective_tenant_id} için aktif şube bulunamadı")
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Tenant {effective_tenant_id} için aktif şube bulunamadı. Lütfen yöneticinizle iletişime geçin.",
-                    )
-        else:
-            # Şube bulunamadı veya pasif, tenant'ın kendi şubesini bul
-            import logging
-            logging.warning(f"[get_sube_id] Gönderilen sube_id={sube_id} bulunamadı veya pasif, tenant'ın şubesi aranıyor...")
-            tenant_sube_row = await db.fetch_one(
-                """
-                SELECT id FROM subeler 
-                WHERE isletme_id = :tid AND aktif = TRUE 
-                ORDER BY id ASC 
-                LIMIT 1
-                """,
-                {"tid": effective_tenant_id},
-            )
-            if tenant_sube_row:
-                # tenant_sube_row'u dict'e çevir
-                tenant_sube_dict = dict(tenant_sube_row) if hasattr(tenant_sube_row, 'keys') else tenant_sube_row
-                new_sube_id = tenant_sube_dict.get("id") if isinstance(tenant_sube_dict, dict) else (getattr(tenant_sube_row, "id", None) if tenant_sube_row else None)
-                if new_sube_id:
-                    sube_id = new_sube_id
-                    import logging
-                    logging.info(f"[get_sube_id] Tenant {effective_tenant_id}'nin şubesi bulundu: {sube_id}")
-            else:
+    # Normal kullanıcılar için: Gönderilen sube_id tenant'a ait değilse veya pasifse tenant'ın kendi şubesini kullan
+    if not is_super_admin and effective_tenant_id:
+        if not index.is_active(sube_id) or index.tenant_of(sube_id) != effective_tenant_id:
+            logging.warning(f"[get_sube_id] Gönderilen sube_id={sube_id} tenant {effective_tenant_id}'e ait değil veya pasif (isletme_id={index.tenant_of(sube_id)}), tenant'ın şubesi aranıyor...")
+            tenant_sube_id = index.first_sube(effective_tenant_id)
+            if tenant_sube_id is None:
                 # Tenant'ın şubesi yok, hata ver
-                import logging
                 logging.error(f"[get_sube_id] Tenant {effective_tenant_id} için aktif şube bulunamadı")
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Tenant {effective_tenant_id} için aktif şube bulunamadı. Lütfen yöneticinizle iletişime geçin.",
                 )
-    
-    # Şube aktif mi ve tenant_id kontrolü
-    # NOT: query ve params'ı burada tanımlıyoruz çünkü normal kullanıcı kontrolünden sonra sube_id güncellenmiş olabilir
-    import logging
-    logging.info(f"[get_sube_id] Final şube kontrolü: sube_id={sube_id}")
-    query = "SELECT id, isletme_id FROM subeler WHERE id = :id AND aktif = TRUE"
-    params = {"id": sube_id}
-    
-    # Önce şubenin var olup olmadığını kontrol et
-    try:
-        row = await db.fetch_one(query, params)
-        logging.info(f"[get_sube_id] Şube sorgusu sonucu: row={row}")
-    except Exception as e:
-        logging.error(f"[get_sube_id] Şube sorgusu hatası: {e}", exc_info=True)
-        row = None
-    if not row:
+            sube_id = tenant_sube_id
+            logging.info(f"[get_sube_id] Tenant {effective_tenant_id}'nin şubesi bulundu: {sube_id}")
+
+    # Şube aktif mi? (varsayılan şube 1 henüz indekste değilse bir kez yeniden yüklenir)
+    if not index.is_active(sube_id):
+        index = await get_branch_index(sube_id=sube_id)
+    if not index.is_active(sube_id):
         # Şube yok veya pasif
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Geçersiz veya pasif sube_id",
         )
-    
-    # row'u dict'e çevir (Record objesi olabilir)
-    row_dict = dict(row) if hasattr(row, 'keys') else row
-    
-    # Şube var, şimdi tenant kontrolü yap (eğer gerekliyse)
-    if tenant_check_needed:
-        # Şubenin tenant'a ait olduğunu kontrol et
-        row_isletme_id = row_dict.get("isletme_id") if isinstance(row_dict, dict) else (getattr(row, "isletme_id", None) if row else None)
-        if row_isletme_id != effective_tenant_id:
-            # Şube başka bir tenant'a ait - o tenant'ın ilk şubesini tekrar bul
-            tenant_sube = await db.fetch_one(
-                """
-                SELECT id FROM subeler 
-                WHERE isletme_id = :tid AND aktif = TRUE 
-                ORDER BY id ASC 
-                LIMIT 1
-                """,
-                {"tid": effective_tenant_id},
-            )
-            if tenant_sube:
-                # tenant_sube'yi dict'e çevir
-                tenant_sube_dict = dict(tenant_sube) if hasattr(tenant_sube, 'keys') else tenant_sube
-                sube_id = tenant_sube_dict.get("id") if isinstance(tenant_sube_dict, dict) else (getattr(tenant_sube, "id", None) if tenant_sube else None)
-                if sube_id:
-                    # Yeni şube ID'si ile tekrar kontrol et
-                    row = await db.fetch_one(
-                        "SELECT id, isletme_id FROM subeler WHERE id = :id AND aktif = TRUE",
-                        {"id": sube_id},
-                    )
-                    if not row:
-                        raise HTTPException(
-                            status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="Geçersiz veya pasif sube_id",
-                        )
-                    # row'u tekrar dict'e çevir
-                    row_dict = dict(row) if hasattr(row, 'keys') else row
-            else:
-                # Tenant'ın şubesi yok - bu durumda hata verme, sadece boş sonuç dönecek
-                import logging
-                logging.warning(f"[get_sube_id] Tenant {effective_tenant_id} için şube bulunamadı, varsayılan şube kullanılacak")
-                # sube_id'yi olduğu gibi bırak, menu endpoint'i boş sonuç dönecek
+
+    # Super admin tenant switching yapıyorsa (effective_tenant_id varsa), şubenin o tenant'a ait olduğunu kontrol et
+    # Ama "Tüm İşletmeler" seçildiğinde (effective_tenant_id null) tenant kontrolü yapma
+    if is_super_admin and effective_tenant_id and index.tenant_of(sube_id) != effective_tenant_id:
+        tenant_sube_id = index.first_sube(effective_tenant_id)
+        if tenant_sube_id is not None:
+            sube_id = tenant_sube_id
+        else:
+            # Tenant'ın şubesi yok - bu durumda hata verme, sadece boş sonuç dönecek
+            logging.warning(f"[get_sube_id] Tenant {effective_tenant_id} için şube bulunamadı, varsayılan şube kullanılacak")
 
     # Şube erişim izni
-    await enforce_user_sube_access(current["username"], sube_id)
+    await enforce_user_sube_access(username, sube_id, role=role)
     return sube_id
 
 
@@ -8,8 +8,6 @@ from starlette.requests import Request
 from typing import Optional
 import logging
 
-from ..db.database import db
-
 logger = logging.getLogger(__name__)
 
 
@@ -48,52 +46,6 @@ def extract_subdomain(host: str) -> Optional[str]:
     return subdomain.lower()
 
 
-async def get_tenant_id_from_domain(domain_or_subdomain: str) -> Optional[int]:
-    """
-    Domain veya subdomain'den tenant_id'yi bul
-    """
-    try:
-        # Önce exact domain match dene
-        row = await db.fetch_one(
-            """
-            SELECT tc.isletme_id, i.aktif
-            FROM tenant_customizations tc
-            JOIN isletmeler i ON tc.isletme_id = i.id
-            WHERE tc.domain = :domain
-            LIMIT 1
-            """,
-            {"domain": domain_or_subdomain}
-        )
-        
-        if row:
-            tenant_dict = dict(row) if hasattr(row, 'keys') else row
-            if tenant_dict.get("aktif"):
-                return tenant_dict.get("isletme_id")
-        
-        # Subdomain'den de dene (domain olarak kaydedilmiş olabilir)
-        # Örnek: tenant_customizations.domain = "fistikkafe" ve subdomain = "fistikkafe"
-        row2 = await db.fetch_one(
-            """
-            SELECT tc.isletme_id, i.aktif
-            FROM tenant_customizations tc
-            JOIN isletmeler i ON tc.isletme_id = i.id
-            WHERE LOWER(tc.domain) = LOWER(:subdomain)
-            LIMIT 1
-            """,
-            {"subdomain": domain_or_subdomain}
-        )
-        
-        if row2:
-            tenant_dict2 = dict(row2) if hasattr(row2, 'keys') else row2
-            if tenant_dict2.get("aktif"):
-                return tenant_dict2.get("isletme_id")
-        
-        return None
-    except Exception as e:
-        logger.warning(f"Error getting tenant from domain: {e}")
-        return None
-
-
 class DomainTenantMiddleware(BaseHTTPMiddleware):
     """
     Subdomain veya custom domain'den tenant'ı tespit eder
@@ -110,15 +62,14 @@ class DomainTenantMiddleware(BaseHTTPMiddleware):
         if path.startswith(("/auth/", "/public/", "/health", "/docs", "/redoc", "/openapi.json", "/", "/ping", "/media/")):
             return await call_next(request)
         
-        # Host header'ından subdomain'i çıkar
-        host = request.headers.get("host", "")
-        subdomain = extract_subdomain(host)
-        
-        tenant_id = None
+        # Subdomain → tenant eşlemesi istek başına auth çözümlemesiyle birlikte okunur
+        from .auth_context import resolve_auth_context
+
+        ctx = await resolve_auth_context(request)
+        subdomain = ctx.subdomain
         
         if subdomain:
-            # Subdomain'den tenant'ı bul
-            tenant_id = await get_tenant_id_from_domain(subdomain)
+            tenant_id = ctx.domain_tenant_id
             
             if tenant_id:
                 # Request state'e ekle (diğer middleware'ler ve endpoint'ler kullanabilir)
@@ -0,0 +1,134 @@
+# backend/app/core/lru.py
+"""
+Process içi, boyutu sınırlı LRU + TTL cache.
+
+core.cache / services.cache paylaşımlı (Redis) cache'lerdir; bu sınıf ise her
+istekte tekrar eden küçük çözümlemeler (auth bağlamı, yetki haritaları vb.) için
+ağ gidiş-dönüşü olmadan, worker belleğinde tutulan kısa ömürlü kopyalar içindir.
+asyncio tek thread'de çalıştığından kilit gerekmez.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class LRUCache:
+    """
+    En fazla maxsize kayıt tutar; doluyken en uzun süre kullanılmayan kayıt atılır.
+    Her kayıt ttl saniye sonra geçersiz sayılır (ttl=None → süresiz).
+
+    weigher verilirse her kaydın ağırlığı (ör. yaklaşık bayt) set anında hesaplanır;
+    toplam maxweight'i aşarsa yine en eski kayıtlardan başlayarak atılır. Değer
+    yerinde değiştiyse ağırlığın güncellenmesi için tekrar set edilmelidir.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = None,
+        maxweight: Optional[int] = None,
+        weigher: Optional[Callable[[Any], int]] = None,
+    ):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self.maxweight = maxweight
+        self.weigher = weigher
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._weights: Dict[Hashable, int] = {}
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not None
+
+    def _lookup(self, key: Hashable) -> Optional[Tuple[float, Any]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, _ = entry
+        if expires_at and expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _remove(self, key: Hashable) -> Tuple[float, Any]:
+        self.weight -= self._weights.pop(key, 0)
+        return self._data.pop(key)
+
+    def _over_capacity(self) -> bool:
+        if len(self._data) > self.maxsize:
+            return True
+        # Tek kayıt sınırı aşsa bile en son yazılan kayıt tutulur
+        return bool(self.maxweight) and self.weight > self.maxweight and len(self._data) > 1
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+        if self.weigher is not None:
+            weight = max(0, int(self.weigher(value)))
+            self.weight += weight - self._weights.get(key, 0)
+            self._weights[key] = weight
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while self._over_capacity():
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._data:
+            return default
+        return self._remove(key)[1]
+
+    def keys(self) -> List[Hashable]:
+        """Süresi dolmamış anahtarlar (LRU sırasını ve istatistikleri değiştirmez)."""
+        now = time.monotonic()
+        return [k for k, (expires_at, _) in self._data.items() if not expires_at or expires_at > now]
+
+    def discard_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """predicate(key, value) True dönen kayıtları siler; silinen sayısını döndürür."""
+        keys = [k for k, (_, v) in self._data.items() if predicate(k, v)]
+        for k in keys:
+            self._remove(k)
+        return len(keys)
+
+    def purge_expired(self) -> int:
+        """Süresi dolmuş kayıtları (okunmasalar da) siler; silinen sayısını döndürür."""
+        now = time.monotonic()
+        keys = [k for k, (expires_at, _) in self._data.items() if expires_at and expires_at <= now]
+        for k in keys:
+            self._remove(k)
+        self.expirations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._weights.clear()
+        self.weight = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "weight": self.weight,
+            "maxweight": self.maxweight,
+        }
@@ -2,8 +2,7 @@
 import time
 import uuid
 import logging
-from collections import deque, defaultdict
-from typing import Deque, Dict
+from typing import Any, List, Optional, Tuple
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response, JSONResponse
@@ -20,14 +19,60 @@ if not logger.handlers:
 class RequestIdAndRateLimitMiddleware(BaseHTTPMiddleware):
     """
     - Her isteğe X-Request-ID atar (response header'a yazar)
-    - Basit IP rate limit uygular (varsayılan 60/dk)
+    - Rate limit uygular (services/rate_limiter, GCRA; Redis varsa worker'lar arası ortak):
+        * IP başına RATE_LIMIT_PER_MINUTE
+        * path prefix bazlı IP limiti (RATE_LIMIT_ROUTE_POLICIES)
+        * tenant başına RATE_LIMIT_TENANT_PER_MINUTE (token'lı istekler)
     - Süre, durum, yol bilgisi loglar
     """
     def __init__(self, app):
         super().__init__(app)
-        self.window_seconds = 60
-        self.limit = int(settings.RATE_LIMIT_PER_MINUTE)
-        self.hits: Dict[str, Deque[float]] = defaultdict(deque)
+        from ..services.rate_limiter import RateLimitPolicy, rate_limiter
+
+        self.rate_limiter = rate_limiter
+        self.ip_policy = RateLimitPolicy("ip", int(settings.RATE_LIMIT_PER_MINUTE))
+        self.tenant_policy = RateLimitPolicy("tenant", int(settings.RATE_LIMIT_TENANT_PER_MINUTE))
+        # En uzun prefix önce eşleşsin
+        self.route_policies: List[Tuple[str, Any]] = sorted(
+            (
+                (prefix, RateLimitPolicy(f"route:{prefix}", int(limit)))
+                for prefix, limit in (settings.RATE_LIMIT_ROUTE_POLICIES or {}).items()
+                if int(limit) > 0
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+
+    def _route_policy(self, path: str):
+        for prefix, policy in self.route_policies:
+            if path.startswith(prefix):
+                return policy
+        return None
+
+    async def _check_rate_limits(self, request: Request, client_ip: str) -> Optional[Any]:
+        """Uygulanan policy'lerden ilk reddedenin sonucunu döndürür (hepsi geçerse None)."""
+        checks = []
+        route_policy = self._route_policy(request.url.path)
+        if route_policy is not None:
+            checks.append((route_policy, client_ip))
+        if self.ip_policy.limit > 0:
+            checks.append((self.ip_policy, client_ip))
+        if self.tenant_policy.limit > 0:
+            try:
+                # Auth bağlamı istek başına bir kez çözülür; sonraki middleware'ler aynısını kullanır
+                from .auth_context import resolve_auth_context
+
+                ctx = await resolve_auth_context(request)
+                if ctx.user and ctx.user_tenant_id:
+                    checks.append((self.tenant_policy, ctx.user_tenant_id))
+            except Exception as e:
+                logger.warning(f"[RATE_LIMIT] Tenant çözümlenemedi, tenant limiti atlandı: {e}")
+
+        for policy, identity in checks:
+            result = await self.rate_limiter.hit(policy, identity)
+            if not result.allowed:
+                return result
+        return None
 
     async def dispatch(self, request: Request, call_next):
         # OPTIONS preflight request'leri bypass (CORS için - rate limit'e dahil etme)
@@ -44,19 +89,21 @@ class RequestIdAndRateLimitMiddleware(BaseHTTPMiddleware):
         client_ip = request.client.host if request.client else "unknown"
 
         # --- Rate limit ---
-        now = time.time()
-        q = self.hits[client_ip]
-        # pencere dışındakileri düş
-        while q and now - q[0] > self.window_seconds:
-            q.popleft()
-        if self.limit > 0 and len(q) >= self.limit:
+        limited = await self._check_rate_limits(request, client_ip)
+        if limited is not None:
             # Kısıt aşıldı
+            headers = {
+                "Retry-After": str(limited.retry_after or 60),
+                "X-RateLimit-Limit": str(limited.limit),
+                "X-RateLimit-Remaining": "0",
+            }
+            if settings.ADD_REQUEST_ID_HEADER:
+                headers["X-Request-ID"] = req_id
             return JSONResponse(
                 status_code=429,
                 content={"detail": "Too Many Requests", "request_id": req_id},
-                headers={"X-Request-ID": req_id} if settings.ADD_REQUEST_ID_HEADER else None,
+                headers=headers,
             )
-        q.append(now)
 
         # --- Dev log ---
         if settings.REQUEST_LOG_ENABLED:
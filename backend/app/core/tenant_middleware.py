@@ -12,6 +12,8 @@ from typing import Optional, Dict, Any
 from datetime import datetime
 import logging
 
+from .auth_context import resolve_auth_context
+
 logger = logging.getLogger(__name__)
 
 
@@ -54,20 +56,19 @@ class TenantStatusMiddleware(BaseHTTPMiddleware):
         if self._should_bypass(request):
             return await call_next(request)
 
-        # Authorization header'dan tenant bilgisini al
-        tenant_info = await self._get_tenant_from_request(request)
+        # Kullanıcı + tenant durumu istek başına bir kez çözülür (request.state.auth_context)
+        ctx = await resolve_auth_context(request)
 
-        if tenant_info:
-            isletme_id = tenant_info.get("isletme_id")
-            role = tenant_info.get("role", "").lower()
+        if ctx.user:
+            isletme_id = ctx.user_tenant_id
 
             # Super admin bypass
-            if role == "super_admin":
+            if ctx.role == "super_admin":
                 return await call_next(request)
 
             # Tenant durumunu kontrol et
             if isletme_id:
-                status_check = await self._check_tenant_status(isletme_id)
+                status_check = self._check_tenant_status(isletme_id, ctx.tenant)
 
                 if not status_check["allowed"]:
                     return JSONResponse(
@@ -96,72 +97,10 @@ class TenantStatusMiddleware(BaseHTTPMiddleware):
 
         return False
 
-    async def _get_tenant_from_request(self, request: Request) -> Optional[Dict[str, Any]]:
-        """Request'ten tenant bilgisini çıkar (JWT token'dan)"""
+    def _check_tenant_status(self, isletme_id: int, tenant: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Tenant durumunu kontrol et (tenant: auth_context'te çözülmüş işletme + subscription)"""
         try:
-            from .deps import decode_token
-            from ..db.database import db
-
-            # Authorization header'ı al
-            auth_header = request.headers.get("authorization")
-            if not auth_header or not auth_header.startswith("Bearer "):
-                return None
-
-            token = auth_header.replace("Bearer ", "")
-
-            try:
-                payload = decode_token(token)
-            except Exception:
-                return None
-
-            username = payload.get("sub")
-            if not username:
-                return None
-
-            # Kullanıcı bilgilerini al
-            user_row = await db.fetch_one(
-                """
-                SELECT id, username, role, tenant_id as isletme_id
-                FROM users
-                WHERE username = :username
-                LIMIT 1
-                """,
-                {"username": username},
-            )
-
-            if not user_row:
-                return None
-
-            return {
-                "user_id": user_row["id"],
-                "username": user_row["username"],
-                "role": user_row["role"],
-                "isletme_id": user_row["isletme_id"],
-            }
-
-        except Exception as e:
-            logger.error(f"Error getting tenant from request: {e}")
-            return None
-
-    async def _check_tenant_status(self, isletme_id: int) -> Dict[str, Any]:
-        """Tenant durumunu kontrol et"""
-        try:
-            from ..db.database import db
-
-            # İşletme ve subscription bilgilerini al
-            row = await db.fetch_one(
-                """
-                SELECT
-                    i.aktif as isletme_aktif,
-                    s.status as sub_status,
-                    s.trial_bitis,
-                    s.bitis_tarihi
-                FROM isletmeler i
-                LEFT JOIN subscriptions s ON s.isletme_id = i.id
-                WHERE i.id = :isletme_id
-                """,
-                {"isletme_id": isletme_id},
-            )
+            row = tenant
 
             if not row:
                 return {
@@ -171,7 +110,7 @@ class TenantStatusMiddleware(BaseHTTPMiddleware):
                 }
 
             # İşletme aktif değilse
-            if not row["isletme_aktif"]:
+            if not row["aktif"]:
                 return {
                     "allowed": False,
                     "error_code": "TENANT_INACTIVE",
@@ -288,21 +227,19 @@ class SubscriptionLimitMiddleware(BaseHTTPMiddleware):
         if not limit_type:
             return await call_next(request)
 
-        # Tenant bilgisini al
-        tenant_info = await self._get_tenant_from_request(request)
-
-        if tenant_info:
-            role = tenant_info.get("role", "").lower()
+        # Kullanıcı + abonelik limitleri istek başına bir kez çözülür (request.state.auth_context)
+        ctx = await resolve_auth_context(request)
 
+        if ctx.user:
             # Super admin bypass
-            if role == "super_admin":
+            if ctx.role == "super_admin":
                 return await call_next(request)
 
-            isletme_id = tenant_info.get("isletme_id")
+            isletme_id = ctx.user_tenant_id
 
             if isletme_id:
                 # Limit kontrolü yap
-                limit_check = await self._check_limit(isletme_id, limit_type)
+                limit_check = await self._check_limit(isletme_id, limit_type, ctx.tenant)
 
                 if not limit_check["allowed"]:
                     return JSONResponse(
@@ -338,132 +275,58 @@ class SubscriptionLimitMiddleware(BaseHTTPMiddleware):
                 return limit_type
         return None
 
-    async def _get_tenant_from_request(self, request: Request) -> Optional[Dict[str, Any]]:
-        """Request'ten tenant bilgisini çıkar"""
-        try:
-            from .deps import decode_token
-            from ..db.database import db
-
-            auth_header = request.headers.get("authorization")
-            if not auth_header or not auth_header.startswith("Bearer "):
-                return None
-
-            token = auth_header.replace("Bearer ", "")
-
-            try:
-                payload = decode_token(token)
-            except Exception:
-                return None
-
-            username = payload.get("sub")
-            if not username:
-                return None
-
-            # Kullanıcı ve tenant bilgilerini al
-            user_row = await db.fetch_one(
-                """
-                SELECT id, username, role, tenant_id as isletme_id
-                FROM users
-                WHERE username = :username
-                LIMIT 1
-                """,
-                {"username": username},
-            )
-
-            if not user_row:
-                return None
-
-            return {
-                "user_id": user_row["id"],
-                "username": user_row["username"],
-                "role": user_row["role"],
-                "isletme_id": user_row["isletme_id"],
-            }
-
-        except Exception as e:
-            logger.error(f"Error getting tenant from request: {e}")
-            return None
+    # limit tipi → (abonelik limit kolonu, hata kodu, mesaj şablonu)
+    LIMIT_RULES = {
+        "subeler": (
+            "max_subeler",
+            "LIMIT_EXCEEDED_SUBELER",
+            "Şube limiti aşıldı. Mevcut plan: {limit} şube. Daha fazla şube eklemek için planınızı yükseltin.",
+        ),
+        "kullanicilar": (
+            "max_kullanicilar",
+            "LIMIT_EXCEEDED_KULLANICILAR",
+            "Kullanıcı limiti aşıldı. Mevcut plan: {limit} kullanıcı. Daha fazla kullanıcı eklemek için planınızı yükseltin.",
+        ),
+        "menu_items": (
+            "max_menu_items",
+            "LIMIT_EXCEEDED_MENU_ITEMS",
+            "Menü item limiti aşıldı. Mevcut plan: {limit} ürün. Daha fazla ürün eklemek için planınızı yükseltin.",
+        ),
+    }
 
-    async def _check_limit(self, isletme_id: int, limit_type: str) -> Dict[str, Any]:
-        """Limit kontrolü yap"""
+    async def _check_limit(self, isletme_id: int, limit_type: str, tenant: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Limit kontrolü yap: limitler auth_context'ten, mevcut kullanım services/tenant_usage
+        sayaçlarından gelir (kararlı durumda bellek içi karşılaştırma).
+        """
         try:
-            from ..db.database import db
-
-            # Subscription limitlerini al
-            sub_row = await db.fetch_one(
-                """
-                SELECT max_subeler, max_kullanicilar, max_menu_items
-                FROM subscriptions
-                WHERE isletme_id = :isletme_id
-                """,
-                {"isletme_id": isletme_id},
-            )
+            from ..services.tenant_usage import get_tenant_usage
+
+            # Subscription limitleri (subscription yoksa sub_status NULL)
+            sub_row = tenant if tenant and tenant.get("sub_status") is not None else None
 
             if not sub_row:
                 # Subscription yoksa izin ver (backward compatibility)
                 logger.warning(f"İşletme {isletme_id} için subscription bulunamadı, limit kontrolü atlanıyor")
                 return {"allowed": True}
 
-            # Limit tipine göre kontrol yap
-            if limit_type == "subeler":
-                max_limit = sub_row["max_subeler"]
-                current = await db.fetch_one(
-                    "SELECT COUNT(*) as count FROM subeler WHERE isletme_id = :id AND aktif = TRUE",
-                    {"id": isletme_id},
-                )
-                current_count = current["count"] if current else 0
-
-                if current_count >= max_limit:
-                    return {
-                        "allowed": False,
-                        "error_code": "LIMIT_EXCEEDED_SUBELER",
-                        "detail": f"Şube limiti aşıldı. Mevcut plan: {max_limit} şube. Daha fazla şube eklemek için planınızı yükseltin.",
-                        "current": current_count,
-                        "limit": max_limit,
-                    }
+            rule = self.LIMIT_RULES.get(limit_type)
+            if rule is None:
+                return {"allowed": True}
+            limit_column, error_code, detail = rule
 
-            elif limit_type == "kullanicilar":
-                max_limit = sub_row["max_kullanicilar"]
-                current = await db.fetch_one(
-                    """
-                    SELECT COUNT(id) as count
-                    FROM users
-                    WHERE tenant_id = :id AND aktif = TRUE
-                    """,
-                    {"id": isletme_id},
-                )
-                current_count = current["count"] if current else 0
-
-                if current_count >= max_limit:
-                    return {
-                        "allowed": False,
-                        "error_code": "LIMIT_EXCEEDED_KULLANICILAR",
-                        "detail": f"Kullanıcı limiti aşıldı. Mevcut plan: {max_limit} kullanıcı. Daha fazla kullanıcı eklemek için planınızı yükseltin.",
-                        "current": current_count,
-                        "limit": max_limit,
-                    }
+            max_limit = sub_row[limit_column]
+            usage = await get_tenant_usage(isletme_id)
+            current_count = usage[limit_type]
 
-            elif limit_type == "menu_items":
-                max_limit = sub_row["max_menu_items"]
-                current = await db.fetch_one(
-                    """
-                    SELECT COUNT(*) as count
-                    FROM menu m
-                    JOIN subeler s ON m.sube_id = s.id
-                    WHERE s.isletme_id = :id AND m.aktif = TRUE
-                    """,
-                    {"id": isletme_id},
-                )
-                current_count = current["count"] if current else 0
-
-                if current_count >= max_limit:
-                    return {
-                        "allowed": False,
-                        "error_code": "LIMIT_EXCEEDED_MENU_ITEMS",
-                        "detail": f"Menü item limiti aşıldı. Mevcut plan: {max_limit} ürün. Daha fazla ürün eklemek için planınızı yükseltin.",
-                        "current": current_count,
-                        "limit": max_limit,
-                    }
+            if current_count >= max_limit:
+                return {
+                    "allowed": False,
+                    "error_code": error_code,
+                    "detail": detail.format(limit=max_limit),
+                    "current": current_count,
+                    "limit": max_limit,
+                }
 
             # Limit aşılmamış
             return {"allowed": True}
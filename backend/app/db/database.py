@@ -1,6 +1,7 @@
 # backend/app/db/database.py
 from databases import Database
 from ..core.config import settings
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,36 +26,155 @@ _db_url = _normalize_db_url(settings.DATABASE_URL)
 # Global Context Variable for Tenant Isolation
 current_tenant_id = contextvars.ContextVar('current_tenant_id', default=None)
 
+class _RequestTenantBinding:
+    """
+    Bir HTTP isteğine ait (request-scoped) bağlantı ve o bağlantıya session
+    seviyesinde uygulanmış tenant ayarı. Sadece isteği işleyen task için geçerlidir;
+    istek içinden açılan arka plan task'ları eski (sorgu başına SET LOCAL) yolu kullanır.
+    """
+
+    __slots__ = ("task", "tenant_id", "connection", "active")
+
+    def __init__(self):
+        self.task = None
+        self.tenant_id = None
+        self.connection = None
+        self.active = False
+
+
+_request_binding = contextvars.ContextVar('request_tenant_binding', default=None)
+
+
 class TenantAwareDatabase(Database):
     """
     Transparently injects Postgres Row-Level Security (RLS) setting.
     When current_tenant_id is set, all queries are wrapped in a transaction
     with SET LOCAL app.current_tenant = X to prevent cross-tenant data leaks.
+
+    Request-scoped mod (DB_REQUEST_SCOPED_TENANT): istek başında bir bağlantı
+    ayrılır, tenant ayarı bu bağlantıya tek sefer session seviyesinde yazılır ve
+    isteğin tüm sorguları aynı bağlantıyı ek BEGIN/SET LOCAL/COMMIT turu olmadan
+    kullanır. İstek bitince ayar RESET edilip bağlantı havuza döner.
     """
+
+    def _bound_binding(self, tid):
+        binding = _request_binding.get()
+        if (
+            binding is not None
+            and binding.active
+            and binding.tenant_id == tid
+            and binding.task is asyncio.current_task()
+        ):
+            return binding
+        return None
+
+    def _tenant_for_query(self, tid):
+        """
+        Sorgu için SET LOCAL ile uygulanacak tenant değeri; gerek yoksa None.
+        Bağlı bağlantı başka bir tenant'a ayarlıysa (veya context tenant'sız ise)
+        session ayarı SET LOCAL ile bu sorgu için ezilir.
+        """
+        if tid is not None:
+            return str(tid)
+        binding = _request_binding.get()
+        if binding is not None and binding.active and binding.task is asyncio.current_task():
+            return ""
+        return None
+
     async def fetch_all(self, query: str, values=None, **kwargs):
         tid = current_tenant_id.get()
-        if tid is not None:
+        if self._bound_binding(tid) is not None:
+            return await super().fetch_all(query, values, **kwargs)
+        local_tid = self._tenant_for_query(tid)
+        if local_tid is not None:
             async with self.transaction():
-                await super().execute(f"SET LOCAL app.current_tenant = '{tid}'")
+                await super().execute(f"SET LOCAL app.current_tenant = '{local_tid}'")
                 return await super().fetch_all(query, values, **kwargs)
         return await super().fetch_all(query, values, **kwargs)
 
     async def fetch_one(self, query: str, values=None, **kwargs):
         tid = current_tenant_id.get()
-        if tid is not None:
+        if self._bound_binding(tid) is not None:
+            return await super().fetch_one(query, values, **kwargs)
+        local_tid = self._tenant_for_query(tid)
+        if local_tid is not None:
             async with self.transaction():
-                await super().execute(f"SET LOCAL app.current_tenant = '{tid}'")
+                await super().execute(f"SET LOCAL app.current_tenant = '{local_tid}'")
                 return await super().fetch_one(query, values, **kwargs)
         return await super().fetch_one(query, values, **kwargs)
 
     async def execute(self, query: str, values=None, **kwargs):
         tid = current_tenant_id.get()
-        if tid is not None:
+        if self._bound_binding(tid) is not None:
+            return await super().execute(query, values, **kwargs)
+        local_tid = self._tenant_for_query(tid)
+        if local_tid is not None:
             async with self.transaction():
-                await super().execute(f"SET LOCAL app.current_tenant = '{tid}'")
+                await super().execute(f"SET LOCAL app.current_tenant = '{local_tid}'")
                 return await super().execute(query, values, **kwargs)
         return await super().execute(query, values, **kwargs)
 
+    # ---------- Request-scoped bağlantı ----------
+    def begin_request_scope(self) -> _RequestTenantBinding:
+        """
+        İstek için (henüz bağlantı ayırmadan) bir binding oluşturur.
+        Bağlantı ilk bind_request_tenant çağrısında ayrılır.
+        """
+        binding = _RequestTenantBinding()
+        _request_binding.set(binding)
+        return binding
+
+    async def bind_request_tenant(self, tid) -> None:
+        """
+        İstek bağlantısına tenant ayarını session seviyesinde uygular (istek başına
+        bir kez). Request-scoped binding yoksa (ws, background job, hariç tutulan
+        path'ler) hiçbir şey yapmaz; sorgular SET LOCAL yoluna devam eder.
+        """
+        binding = _request_binding.get()
+        if binding is None or tid is None:
+            return
+        task = asyncio.current_task()
+        if binding.task is not None and binding.task is not task:
+            return
+        if binding.active and binding.tenant_id == tid:
+            return
+
+        if binding.connection is None:
+            connection = self.connection()
+            await connection.__aenter__()
+            binding.connection = connection
+            binding.task = task
+        try:
+            await super().fetch_one(
+                "SELECT set_config('app.current_tenant', :tid, false)",
+                {"tid": str(tid)},
+            )
+        except Exception as e:
+            # Ayar uygulanamadıysa SET LOCAL yolunda kal
+            binding.active = False
+            logger.warning(f"[DB] Request tenant ayarı uygulanamadı (tenant_id={tid}): {e}")
+            return
+        binding.tenant_id = tid
+        binding.active = True
+
+    async def end_request_scope(self, binding: _RequestTenantBinding) -> None:
+        """Session tenant ayarını sıfırlar ve istek bağlantısını havuza bırakır."""
+        was_active = binding.active
+        binding.active = False
+        connection = binding.connection
+        if connection is None:
+            return
+        binding.connection = None
+        try:
+            if was_active or binding.tenant_id is not None:
+                await connection.execute("RESET app.current_tenant")
+        except Exception as e:
+            # Havuzun release sırasındaki RESET ALL'u da ayarı temizler
+            logger.warning(f"[DB] Request tenant ayarı sıfırlanamadı: {e}")
+        finally:
+            await connection.__aexit__(None, None, None)
+
+
 db = TenantAwareDatabase(
     _db_url,
     min_size=min_size,
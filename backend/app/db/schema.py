@@ -97,6 +97,7 @@ ALTER TABLE siparisler ADD COLUMN IF NOT EXISTS adisyon_id BIGINT;
 ALTER TABLE siparisler ADD COLUMN IF NOT EXISTS created_by_username TEXT;
 ALTER TABLE siparisler ADD COLUMN IF NOT EXISTS started_at TIMESTAMPTZ;
 ALTER TABLE siparisler ADD COLUMN IF NOT EXISTS hazir_at TIMESTAMPTZ;
+ALTER TABLE siparisler ADD COLUMN IF NOT EXISTS mutfak_seq BIGINT;
 """
 
 ALTER_ODEMELER_COMPAT = """
@@ -116,6 +117,9 @@ CREATE TABLE IF NOT EXISTS adisyons (
     bakiye NUMERIC(10,2) DEFAULT 0,
     iskonto_orani NUMERIC(5,2) DEFAULT 0,
     iskonto_tutari NUMERIC(10,2) DEFAULT 0,
+    siparis_sayisi INT DEFAULT 0,
+    aktif_siparis_sayisi INT DEFAULT 0,
+    aktif_toplam NUMERIC(10,2) DEFAULT 0,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 """
@@ -135,6 +139,567 @@ CREATE TABLE IF NOT EXISTS odemeler (
 
 ALTER_ADISYON_COMPAT = """
 ALTER TABLE adisyons ADD COLUMN IF NOT EXISTS iskonto_tutari NUMERIC(10,2) DEFAULT 0;
+ALTER TABLE adisyons ADD COLUMN IF NOT EXISTS siparis_sayisi INT DEFAULT 0;
+ALTER TABLE adisyons ADD COLUMN IF NOT EXISTS aktif_siparis_sayisi INT DEFAULT 0;
+ALTER TABLE adisyons ADD COLUMN IF NOT EXISTS aktif_toplam NUMERIC(10,2) DEFAULT 0;
+"""
+
+# Adisyon toplamları artımlı (delta) olarak trigger'larla güncellenir.
+# - siparisler INSERT/UPDATE/DELETE: toplam_tutar, siparis_sayisi, aktif_* delta'ları
+# - odemeler INSERT/UPDATE/DELETE: odeme_toplam delta'sı (adisyon açılışından sonraki ödemeler)
+# - adisyons BEFORE INSERT/UPDATE: iskonto_tutari ve bakiye türetilmiş alan olarak hesaplanır
+# Plpgsql gövdeleri ';' içerdiği için her ifade ayrı ayrı çalıştırılır (split edilmez).
+ADISYON_TOTALS_TRIGGER_STATEMENTS = [
+    """
+    CREATE OR REPLACE FUNCTION adisyon_derive_bakiye() RETURNS trigger AS $$
+    BEGIN
+        NEW.toplam_tutar := COALESCE(NEW.toplam_tutar, 0);
+        NEW.odeme_toplam := COALESCE(NEW.odeme_toplam, 0);
+        NEW.iskonto_tutari := LEAST(
+            GREATEST(
+                CASE
+                    WHEN COALESCE(NEW.iskonto_tutari, 0) > 0 THEN NEW.iskonto_tutari
+                    ELSE ROUND(NEW.toplam_tutar * COALESCE(NEW.iskonto_orani, 0) / 100.0, 2)
+                END,
+                0
+            ),
+            NEW.toplam_tutar
+        );
+        NEW.bakiye := GREATEST(0, GREATEST(0, NEW.toplam_tutar - NEW.iskonto_tutari) - NEW.odeme_toplam);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_adisyons_derive_bakiye ON adisyons",
+    """
+    CREATE TRIGGER trg_adisyons_derive_bakiye
+    BEFORE INSERT OR UPDATE OF toplam_tutar, odeme_toplam, iskonto_orani, iskonto_tutari, bakiye
+    ON adisyons
+    FOR EACH ROW EXECUTE FUNCTION adisyon_derive_bakiye()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION adisyon_siparis_delta() RETURNS trigger AS $$
+    DECLARE
+        eski_aid BIGINT;
+        yeni_aid BIGINT;
+        eski_toplam NUMERIC := 0; eski_sayi INT := 0; eski_aktif_toplam NUMERIC := 0; eski_aktif_sayi INT := 0;
+        yeni_toplam NUMERIC := 0; yeni_sayi INT := 0; yeni_aktif_toplam NUMERIC := 0; yeni_aktif_sayi INT := 0;
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            eski_aid := NULLIF(OLD.adisyon_id, 0);
+            IF OLD.durum IS DISTINCT FROM 'iptal' THEN
+                eski_toplam := COALESCE(OLD.tutar, 0);
+                eski_sayi := 1;
+            END IF;
+            IF OLD.durum IN ('yeni', 'hazirlaniyor', 'hazir') THEN
+                eski_aktif_toplam := COALESCE(OLD.tutar, 0);
+                eski_aktif_sayi := 1;
+            END IF;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            yeni_aid := NULLIF(NEW.adisyon_id, 0);
+            IF NEW.durum IS DISTINCT FROM 'iptal' THEN
+                yeni_toplam := COALESCE(NEW.tutar, 0);
+                yeni_sayi := 1;
+            END IF;
+            IF NEW.durum IN ('yeni', 'hazirlaniyor', 'hazir') THEN
+                yeni_aktif_toplam := COALESCE(NEW.tutar, 0);
+                yeni_aktif_sayi := 1;
+            END IF;
+        END IF;
+
+        IF eski_aid IS NOT NULL AND eski_aid IS NOT DISTINCT FROM yeni_aid THEN
+            UPDATE adisyons
+               SET toplam_tutar = COALESCE(toplam_tutar, 0) + (yeni_toplam - eski_toplam),
+                   siparis_sayisi = COALESCE(siparis_sayisi, 0) + (yeni_sayi - eski_sayi),
+                   aktif_toplam = COALESCE(aktif_toplam, 0) + (yeni_aktif_toplam - eski_aktif_toplam),
+                   aktif_siparis_sayisi = COALESCE(aktif_siparis_sayisi, 0) + (yeni_aktif_sayi - eski_aktif_sayi)
+             WHERE id = eski_aid
+               AND (yeni_toplam <> eski_toplam OR yeni_sayi <> eski_sayi
+                    OR yeni_aktif_toplam <> eski_aktif_toplam OR yeni_aktif_sayi <> eski_aktif_sayi);
+        ELSE
+            IF eski_aid IS NOT NULL THEN
+                UPDATE adisyons
+                   SET toplam_tutar = COALESCE(toplam_tutar, 0) - eski_toplam,
+                       siparis_sayisi = COALESCE(siparis_sayisi, 0) - eski_sayi,
+                       aktif_toplam = COALESCE(aktif_toplam, 0) - eski_aktif_toplam,
+                       aktif_siparis_sayisi = COALESCE(aktif_siparis_sayisi, 0) - eski_aktif_sayi
+                 WHERE id = eski_aid;
+            END IF;
+            IF yeni_aid IS NOT NULL THEN
+                UPDATE adisyons
+                   SET toplam_tutar = COALESCE(toplam_tutar, 0) + yeni_toplam,
+                       siparis_sayisi = COALESCE(siparis_sayisi, 0) + yeni_sayi,
+                       aktif_toplam = COALESCE(aktif_toplam, 0) + yeni_aktif_toplam,
+                       aktif_siparis_sayisi = COALESCE(aktif_siparis_sayisi, 0) + yeni_aktif_sayi
+                 WHERE id = yeni_aid;
+            END IF;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_siparisler_adisyon_delta ON siparisler",
+    """
+    CREATE TRIGGER trg_siparisler_adisyon_delta
+    AFTER INSERT OR DELETE OR UPDATE OF durum, tutar, adisyon_id
+    ON siparisler
+    FOR EACH ROW EXECUTE FUNCTION adisyon_siparis_delta()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION adisyon_odeme_delta() RETURNS trigger AS $$
+    BEGIN
+        -- Sadece adisyon açılışından sonraki, iptal edilmemiş ödemeler sayılır
+        IF TG_OP IN ('UPDATE', 'DELETE') AND NULLIF(OLD.adisyon_id, 0) IS NOT NULL AND OLD.iptal IS NOT TRUE THEN
+            UPDATE adisyons
+               SET odeme_toplam = COALESCE(odeme_toplam, 0) - COALESCE(OLD.tutar, 0)
+             WHERE id = OLD.adisyon_id
+               AND (acilis_zamani IS NULL OR OLD.created_at >= acilis_zamani);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NULLIF(NEW.adisyon_id, 0) IS NOT NULL AND NEW.iptal IS NOT TRUE THEN
+            UPDATE adisyons
+               SET odeme_toplam = COALESCE(odeme_toplam, 0) + COALESCE(NEW.tutar, 0)
+             WHERE id = NEW.adisyon_id
+               AND (acilis_zamani IS NULL OR NEW.created_at >= acilis_zamani);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_odemeler_adisyon_delta ON odemeler",
+    """
+    CREATE TRIGGER trg_odemeler_adisyon_delta
+    AFTER INSERT OR DELETE OR UPDATE OF tutar, iptal, adisyon_id
+    ON odemeler
+    FOR EACH ROW EXECUTE FUNCTION adisyon_odeme_delta()
+    """,
+]
+
+# Mutfak akışı cursor'ı: siparişin mutfak ekranını ilgilendiren her değişikliğinde
+# (oluşturma, durum/masa/sepet/tutar) global bir sequence'tan monoton bir değer alır.
+# Yeniden bağlanan ekran sadece mutfak_seq > cursor olan siparişleri çeker.
+KITCHEN_FEED_STATEMENTS = [
+    "CREATE SEQUENCE IF NOT EXISTS siparis_mutfak_seq",
+    """
+    CREATE OR REPLACE FUNCTION siparis_mutfak_seq_bump() RETURNS trigger AS $$
+    BEGIN
+        NEW.mutfak_seq := nextval('siparis_mutfak_seq');
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_siparisler_mutfak_seq ON siparisler",
+    """
+    CREATE TRIGGER trg_siparisler_mutfak_seq
+    BEFORE INSERT OR UPDATE OF durum, masa, sepet, tutar
+    ON siparisler
+    FOR EACH ROW EXECUTE FUNCTION siparis_mutfak_seq_bump()
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_siparisler_sube_mutfak_seq ON siparisler (sube_id, mutfak_seq)",
+]
+
+# Günlük ürün satış özeti (analitik uçları sepet JSONB'sini satır satır açmak yerine buradan okur).
+# Satırlar trigger ile artımlı tutulur: sipariş 'odendi' olduğunda sepet kalemleri eklenir,
+# 'odendi'den çıktığında (iptal, düzeltme, silme) aynı kalemler geri düşülür.
+# Gün, işletmenin yerel saatine göre (DAILY_PRODUCT_SALES_TIMEZONE) created_at'ten türetilir.
+# Geçmiş veri: scripts/backfill_daily_product_sales.py
+DAILY_PRODUCT_SALES_TIMEZONE = "Europe/Istanbul"
+
+DAILY_PRODUCT_SALES_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_product_sales (
+        sube_id BIGINT NOT NULL,
+        gun DATE NOT NULL,
+        urun_key TEXT NOT NULL,
+        urun_adi TEXT NOT NULL,
+        kategori TEXT,
+        adet INT NOT NULL DEFAULT 0,
+        ciro NUMERIC(14,2) NOT NULL DEFAULT 0,
+        kalem_sayisi INT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ DEFAULT NOW(),
+        PRIMARY KEY (sube_id, gun, urun_key)
+    )
+    """,
+    # siparis.normalize_name'in SQL karşılığı (Türkçe karakterler + boşluk sadeleştirme)
+    """
+    CREATE OR REPLACE FUNCTION neso_urun_key(ad TEXT) RETURNS TEXT AS $$
+        SELECT regexp_replace(
+            lower(translate(btrim(COALESCE(ad, '')), 'ÇĞİÖŞÜÂÊÎÔÛçğıöşüâêîôû', 'CGIOSUAEIOUcgiosuaeiou')),
+            '\\s+', ' ', 'g'
+        )
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION neso_try_numeric(v TEXT) RETURNS NUMERIC AS $$
+        SELECT CASE WHEN btrim(v) ~ '^-?[0-9]+([.][0-9]+)?$' THEN btrim(v)::numeric END
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    # Tek sepet ayrıştırıcısı: order_lines.normalize_items'ın SQL karşılığı; sira = sepetteki
+    # 1 tabanlı konum. Fiyatı ve toplamı olmayan eski kalemlerde sipariş tutarı adetlere
+    # bölünür; ikram kalemlerinin fiyatı 0 kalır. siparis_kalemleri ve daily_product_sales
+    # aynı satırları kullanır, böylece ikisinin ciro/tutarı aynı siparişte tutarlıdır.
+    """
+    CREATE OR REPLACE FUNCTION siparis_sepet_satirlari(p_sepet JSONB, p_tutar NUMERIC)
+    RETURNS TABLE (
+        sira INT, urun_key TEXT, urun_adi TEXT, adet NUMERIC, birim_fiyat NUMERIC,
+        tutar NUMERIC, varyasyon TEXT, ikram BOOLEAN, ikram_tutar NUMERIC
+    ) AS $$
+        WITH kalem AS (
+            SELECT
+                e.sira::int AS sira,
+                btrim(COALESCE(NULLIF(btrim(e.v->>'urun'), ''), e.v->>'ad', '')) AS ad,
+                COALESCE(
+                    NULLIF(neso_try_numeric(e.v->>'adet'), 0),
+                    NULLIF(neso_try_numeric(e.v->>'miktar'), 0),
+                    NULLIF(neso_try_numeric(e.v->>'quantity'), 0),
+                    NULLIF(neso_try_numeric(e.v->>'qty'), 0)
+                ) AS adet_ham,
+                COALESCE(
+                    NULLIF(neso_try_numeric(e.v->>'fiyat'), 0),
+                    NULLIF(neso_try_numeric(e.v->>'birim_fiyat'), 0),
+                    NULLIF(neso_try_numeric(e.v->>'unit_price'), 0),
+                    NULLIF(neso_try_numeric(e.v->>'price'), 0)
+                ) AS fiyat,
+                COALESCE(
+                    NULLIF(neso_try_numeric(e.v->>'toplam'), 0),
+                    NULLIF(neso_try_numeric(e.v->>'tutar'), 0),
+                    NULLIF(neso_try_numeric(e.v->>'total'), 0)
+                ) AS toplam,
+                NULLIF(btrim(e.v->>'varyasyon'), '') AS varyasyon,
+                COALESCE(lower(btrim(e.v->>'ikram')) NOT IN ('', 'false', '0', 'hayır', 'hayir', 'no', 'null'), FALSE) AS ikram,
+                COALESCE(neso_try_numeric(e.v->>'ikram_edilen_tutar'), 0) AS ikram_tutar
+            FROM jsonb_array_elements(
+                CASE WHEN jsonb_typeof(p_sepet) = 'array' THEN p_sepet ELSE '[]'::jsonb END
+            ) WITH ORDINALITY AS e(v, sira)
+            WHERE jsonb_typeof(e.v) = 'object'
+        ),
+        kalem_adet AS (
+            SELECT k.*, CASE WHEN k.adet_ham > 0 THEN k.adet_ham ELSE 1 END AS adet
+            FROM kalem k
+            WHERE k.ad <> ''
+        ),
+        kalem_fiyat AS (
+            SELECT k.*,
+                   CASE
+                       WHEN k.fiyat IS NOT NULL THEN k.fiyat
+                       WHEN k.toplam IS NOT NULL THEN k.toplam / k.adet
+                       WHEN k.ikram THEN 0
+                       ELSE COALESCE(COALESCE(p_tutar, 0) / NULLIF(SUM(k.adet) OVER (), 0), 0)
+                   END AS birim
+            FROM kalem_adet k
+        )
+        SELECT sira, neso_urun_key(ad), ad, adet, round(birim, 2),
+               round(CASE WHEN fiyat IS NOT NULL THEN fiyat * adet ELSE COALESCE(toplam, birim * adet) END, 2),
+               varyasyon, ikram, ikram_tutar
+        FROM kalem_fiyat
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    # Günlük özet için ürün kalemleri: siparis_sepet_satirlari'nin görünümü (adet tabloda INT)
+    """
+    CREATE OR REPLACE FUNCTION siparis_sepet_kalemleri(p_sepet JSONB, p_tutar NUMERIC)
+    RETURNS TABLE (urun_key TEXT, urun_adi TEXT, adet INT, ciro NUMERIC) AS $$
+        SELECT urun_key, urun_adi, round(adet)::int, tutar
+        FROM siparis_sepet_satirlari(p_sepet, p_tutar)
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION daily_product_sales_apply(
+        p_sube_id BIGINT, p_created_at TIMESTAMPTZ, p_sepet JSONB, p_tutar NUMERIC, p_isaret INT
+    ) RETURNS void AS $$
+        INSERT INTO daily_product_sales AS d
+            (sube_id, gun, urun_key, urun_adi, kategori, adet, ciro, kalem_sayisi, updated_at)
+        SELECT
+            p_sube_id,
+            (COALESCE(p_created_at, NOW()) AT TIME ZONE '{DAILY_PRODUCT_SALES_TIMEZONE}')::date,
+            k.urun_key,
+            MAX(k.urun_adi),
+            (SELECT m.kategori FROM menu m
+              WHERE m.sube_id = p_sube_id AND neso_urun_key(m.ad) = k.urun_key
+              ORDER BY m.aktif DESC, m.id DESC LIMIT 1),
+            p_isaret * SUM(k.adet),
+            p_isaret * SUM(k.ciro),
+            p_isaret * COUNT(*),
+            NOW()
+        FROM siparis_sepet_kalemleri(p_sepet, p_tutar) k
+        GROUP BY k.urun_key
+        ON CONFLICT (sube_id, gun, urun_key) DO UPDATE
+           SET adet = d.adet + EXCLUDED.adet,
+               ciro = d.ciro + EXCLUDED.ciro,
+               kalem_sayisi = d.kalem_sayisi + EXCLUDED.kalem_sayisi,
+               urun_adi = EXCLUDED.urun_adi,
+               kategori = COALESCE(EXCLUDED.kategori, d.kategori),
+               updated_at = NOW()
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION daily_product_sales_delta() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE'
+           AND OLD.durum IS NOT DISTINCT FROM NEW.durum
+           AND OLD.sepet IS NOT DISTINCT FROM NEW.sepet
+           AND OLD.tutar IS NOT DISTINCT FROM NEW.tutar
+           AND OLD.sube_id IS NOT DISTINCT FROM NEW.sube_id
+           AND OLD.created_at IS NOT DISTINCT FROM NEW.created_at THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.durum = 'odendi' AND OLD.sube_id IS NOT NULL THEN
+            PERFORM daily_product_sales_apply(OLD.sube_id, OLD.created_at, OLD.sepet, OLD.tutar, -1);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.durum = 'odendi' AND NEW.sube_id IS NOT NULL THEN
+            PERFORM daily_product_sales_apply(NEW.sube_id, NEW.created_at, NEW.sepet, NEW.tutar, 1);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_siparisler_daily_product_sales ON siparisler",
+    """
+    CREATE TRIGGER trg_siparisler_daily_product_sales
+    AFTER INSERT OR DELETE OR UPDATE OF durum, sepet, tutar, sube_id, created_at
+    ON siparisler
+    FOR EACH ROW EXECUTE FUNCTION daily_product_sales_delta()
+    """,
+    # Kategori eşlemesi (daily_product_sales_apply) ve rollup → menü join'leri için
+    "CREATE INDEX IF NOT EXISTS idx_menu_sube_urun_key ON menu (sube_id, neso_urun_key(ad))",
+]
+
+# Sipariş kalemleri: sepet JSONB'sinin tipli satırları (services/order_lines.py).
+# Satırlar trigger ile yazılır: INSERT'te eklenir, sepet/tutar/şube/tarih değişince
+# yeniden yazılır, yalnız durum değişince güncellenir, silmede silinir.
+# siparisler'e FK yok: tablo bölümlenmiş olabilir (PK (id, created_at)); temizlik trigger'da.
+# menu_id, yazma anındaki menü eşleşmesidir (neso_urun_key); ürün adı değişse de korunur.
+# Geçmiş veri: migration 2026_10_17_0005 doldurur (startup değil); migration'sız kurulumda
+# veya yarıda kalan doldurma için scripts/backfill_siparis_kalemleri.py
+ORDER_LINE_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS siparis_kalemleri (
+        id BIGSERIAL PRIMARY KEY,
+        siparis_id BIGINT NOT NULL,
+        sube_id BIGINT,
+        sira INT NOT NULL,
+        menu_id BIGINT REFERENCES menu(id) ON DELETE SET NULL,
+        urun_key TEXT NOT NULL,
+        urun_adi TEXT NOT NULL,
+        adet NUMERIC(10,2) NOT NULL,
+        birim_fiyat NUMERIC(10,2) NOT NULL DEFAULT 0,
+        tutar NUMERIC(12,2) NOT NULL DEFAULT 0,
+        varyasyon TEXT,
+        ikram BOOLEAN NOT NULL DEFAULT FALSE,
+        ikram_tutar NUMERIC(12,2) NOT NULL DEFAULT 0,
+        durum TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        UNIQUE (siparis_id, sira)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION siparis_kalemleri_yaz(
+        p_siparis_id BIGINT, p_sube_id BIGINT, p_created_at TIMESTAMPTZ,
+        p_durum TEXT, p_sepet JSONB, p_tutar NUMERIC
+    ) RETURNS void AS $$
+        INSERT INTO siparis_kalemleri
+            (siparis_id, sube_id, sira, menu_id, urun_key, urun_adi, adet, birim_fiyat,
+             tutar, varyasyon, ikram, ikram_tutar, durum, created_at)
+        SELECT
+            p_siparis_id,
+            p_sube_id,
+            k.sira,
+            (SELECT m.id FROM menu m
+              WHERE m.sube_id = p_sube_id AND neso_urun_key(m.ad) = k.urun_key
+              ORDER BY m.aktif DESC, m.id DESC LIMIT 1),
+            k.urun_key, k.urun_adi, k.adet, k.birim_fiyat, k.tutar,
+            k.varyasyon, k.ikram, k.ikram_tutar,
+            p_durum,
+            COALESCE(p_created_at, NOW())
+        FROM siparis_sepet_satirlari(p_sepet, p_tutar) k
+        ON CONFLICT (siparis_id, sira) DO NOTHING
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION siparis_kalemleri_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE'
+           AND OLD.sepet IS NOT DISTINCT FROM NEW.sepet
+           AND OLD.tutar IS NOT DISTINCT FROM NEW.tutar
+           AND OLD.sube_id IS NOT DISTINCT FROM NEW.sube_id
+           AND OLD.created_at IS NOT DISTINCT FROM NEW.created_at THEN
+            IF OLD.durum IS DISTINCT FROM NEW.durum THEN
+                UPDATE siparis_kalemleri SET durum = NEW.durum WHERE siparis_id = NEW.id;
+            END IF;
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM siparis_kalemleri WHERE siparis_id = OLD.id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM siparis_kalemleri_yaz(NEW.id, NEW.sube_id, NEW.created_at, NEW.durum, NEW.sepet, NEW.tutar);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_siparisler_kalemleri ON siparisler",
+    """
+    CREATE TRIGGER trg_siparisler_kalemleri
+    AFTER INSERT OR DELETE OR UPDATE OF durum, sepet, tutar, sube_id, created_at
+    ON siparisler
+    FOR EACH ROW EXECUTE FUNCTION siparis_kalemleri_sync()
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_siparis_kalemleri_sube_created ON siparis_kalemleri (sube_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_siparis_kalemleri_sube_urun ON siparis_kalemleri (sube_id, urun_key, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_siparis_kalemleri_menu ON siparis_kalemleri (menu_id, created_at) WHERE menu_id IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_siparis_kalemleri_ikram ON siparis_kalemleri (sube_id, created_at) WHERE ikram",
+    # Menu ile aynı opt-in tenant izolasyonu (sube üzerinden)
+    "ALTER TABLE siparis_kalemleri ENABLE ROW LEVEL SECURITY",
+    "DROP POLICY IF EXISTS siparis_kalemleri_tenant_isolation ON siparis_kalemleri",
+    """
+    CREATE POLICY siparis_kalemleri_tenant_isolation ON siparis_kalemleri
+        USING (
+            current_setting('app.current_tenant', true) = ''
+            OR current_setting('app.current_tenant', true) IS NULL
+            OR sube_id IN (
+                SELECT id FROM subeler WHERE isletme_id = NULLIF(current_setting('app.current_tenant', true), '')::bigint
+            )
+        )
+    """,
+]
+
+# Reçete → menü / stok kalemi bağları (menu_id, stok_id).
+# Ad eşleme yazma anında bir kez yapılır (neso_urun_key): reçete yazılırken trigger
+# menu_id/stok_id'yi çözer; sonradan eklenen/yeniden adlandırılan menü ürünü veya stok
+# kalemi, henüz bağlanmamış reçeteleri bağlar. Okuma yolları FK üzerinden join eder.
+# Eşleşmeyen satırlar: scripts/report_recipe_keys.py (RECIPE_UNMATCHED_SQL)
+RECIPE_KEY_STATEMENTS = [
+    "ALTER TABLE receteler ADD COLUMN IF NOT EXISTS menu_id BIGINT REFERENCES menu(id) ON DELETE SET NULL",
+    "ALTER TABLE receteler ADD COLUMN IF NOT EXISTS stok_id BIGINT REFERENCES stok_kalemleri(id) ON DELETE SET NULL",
+    "CREATE INDEX IF NOT EXISTS idx_receteler_menu ON receteler (menu_id)",
+    "CREATE INDEX IF NOT EXISTS idx_receteler_stok ON receteler (stok_id)",
+    # Bağlanmamış reçeteleri menü/stok yazımında bulmak için
+    "CREATE INDEX IF NOT EXISTS idx_receteler_sube_urun_key ON receteler (sube_id, neso_urun_key(urun))",
+    "CREATE INDEX IF NOT EXISTS idx_receteler_sube_stok_key ON receteler (sube_id, neso_urun_key(stok))",
+    "CREATE INDEX IF NOT EXISTS idx_stok_kalemleri_sube_ad_key ON stok_kalemleri (sube_id, neso_urun_key(ad))",
+    """
+    CREATE OR REPLACE FUNCTION recete_resolve_keys() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.menu_id IS NULL
+           OR (TG_OP = 'UPDATE' AND NEW.menu_id IS NOT DISTINCT FROM OLD.menu_id
+               AND (NEW.urun IS DISTINCT FROM OLD.urun OR NEW.sube_id IS DISTINCT FROM OLD.sube_id)) THEN
+            NEW.menu_id := (
+                SELECT m.id FROM menu m
+                 WHERE m.sube_id = NEW.sube_id AND neso_urun_key(m.ad) = neso_urun_key(NEW.urun)
+                 ORDER BY m.aktif DESC, m.id DESC LIMIT 1
+            );
+        END IF;
+        IF NEW.stok_id IS NULL
+           OR (TG_OP = 'UPDATE' AND NEW.stok_id IS NOT DISTINCT FROM OLD.stok_id
+               AND (NEW.stok IS DISTINCT FROM OLD.stok OR NEW.sube_id IS DISTINCT FROM OLD.sube_id)) THEN
+            NEW.stok_id := (
+                SELECT sk.id FROM stok_kalemleri sk
+                 WHERE sk.sube_id = NEW.sube_id AND neso_urun_key(sk.ad) = neso_urun_key(NEW.stok)
+                 ORDER BY sk.id DESC LIMIT 1
+            );
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_receteler_resolve_keys ON receteler",
+    """
+    CREATE TRIGGER trg_receteler_resolve_keys
+    BEFORE INSERT OR UPDATE OF urun, stok, sube_id, menu_id, stok_id
+    ON receteler
+    FOR EACH ROW EXECUTE FUNCTION recete_resolve_keys()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION menu_link_receteler() RETURNS trigger AS $$
+    BEGIN
+        UPDATE receteler SET menu_id = NEW.id
+         WHERE sube_id = NEW.sube_id AND menu_id IS NULL
+           AND neso_urun_key(urun) = neso_urun_key(NEW.ad);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_menu_link_receteler ON menu",
+    """
+    CREATE TRIGGER trg_menu_link_receteler
+    AFTER INSERT OR UPDATE OF ad, sube_id
+    ON menu
+    FOR EACH ROW EXECUTE FUNCTION menu_link_receteler()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION stok_link_receteler() RETURNS trigger AS $$
+    BEGIN
+        UPDATE receteler SET stok_id = NEW.id
+         WHERE sube_id = NEW.sube_id AND stok_id IS NULL
+           AND neso_urun_key(stok) = neso_urun_key(NEW.ad);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_stok_link_receteler ON stok_kalemleri",
+    """
+    CREATE TRIGGER trg_stok_link_receteler
+    AFTER INSERT OR UPDATE OF ad, sube_id
+    ON stok_kalemleri
+    FOR EACH ROW EXECUTE FUNCTION stok_link_receteler()
+    """,
+    # Mevcut satırlar: yalnız bağlanmamış ve eşi bulunan satırlar yazılır; eşleşmeyenler
+    # her startup'ta NULL ile tekrar güncellenmez (bir kez bağlandıktan sonra no-op)
+    """
+    UPDATE receteler r
+       SET menu_id = k.menu_id
+      FROM (
+           SELECT r2.id, (
+                  SELECT m.id FROM menu m
+                   WHERE m.sube_id = r2.sube_id AND neso_urun_key(m.ad) = neso_urun_key(r2.urun)
+                   ORDER BY m.aktif DESC, m.id DESC LIMIT 1
+           ) AS menu_id
+             FROM receteler r2
+            WHERE r2.menu_id IS NULL
+      ) k
+     WHERE r.id = k.id AND r.menu_id IS NULL
+       AND k.menu_id IS NOT NULL AND r.menu_id IS DISTINCT FROM k.menu_id
+    """,
+    """
+    UPDATE receteler r
+       SET stok_id = k.stok_id
+      FROM (
+           SELECT r2.id, (
+                  SELECT sk.id FROM stok_kalemleri sk
+                   WHERE sk.sube_id = r2.sube_id AND neso_urun_key(sk.ad) = neso_urun_key(r2.stok)
+                   ORDER BY sk.id DESC LIMIT 1
+           ) AS stok_id
+             FROM receteler r2
+            WHERE r2.stok_id IS NULL
+      ) k
+     WHERE r.id = k.id AND r.stok_id IS NULL
+       AND k.stok_id IS NOT NULL AND r.stok_id IS DISTINCT FROM k.stok_id
+    """,
+]
+
+# Şube başına normalize ad tekilliği. Mevcut veride çakışma varsa index oluşmaz;
+# çakışmalar NAME_KEY_DUPLICATES_SQL ile raporlanır.
+NAME_KEY_UNIQUE_INDEXES = {
+    "menu": "CREATE UNIQUE INDEX IF NOT EXISTS uq_menu_sube_urun_key ON menu (sube_id, neso_urun_key(ad))",
+    "stok_kalemleri": (
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_stok_kalemleri_sube_ad_key "
+        "ON stok_kalemleri (sube_id, neso_urun_key(ad))"
+    ),
+}
+
+NAME_KEY_DUPLICATES_SQL = """
+SELECT sube_id, neso_urun_key(ad) AS ad_key, array_agg(ad ORDER BY id) AS adlar
+FROM {table}
+GROUP BY sube_id, neso_urun_key(ad)
+HAVING COUNT(*) > 1
+ORDER BY sube_id, ad_key
+"""
+
+RECIPE_UNMATCHED_SQL = """
+SELECT id, sube_id, urun, stok, (menu_id IS NULL) AS menu_eksik, (stok_id IS NULL) AS stok_eksik
+FROM receteler
+WHERE menu_id IS NULL OR stok_id IS NULL
+ORDER BY sube_id, urun, stok
 """
 
 CREATE_DISCOUNT_LOG = """
@@ -272,6 +837,71 @@ ALTER TABLE api_usage_logs ADD COLUMN IF NOT EXISTS cost_tl NUMERIC(10,2) DEFAUL
 ALTER TABLE api_usage_logs ADD COLUMN IF NOT EXISTS cost_usd NUMERIC(10,6) DEFAULT 0;
 """
 
+# API kullanımının dakikalık özeti (services/usage_metering yazar, superadmin raporları okur).
+# api_usage_logs'a artık sadece hatalar ve API_USAGE_RAW_SAMPLE_RATE oranında örneklenen
+# başarılı çağrılar yazılır; bu yüzden raporlama index'lerinin çoğu kaldırılır.
+# model/method boşsa '' tutulur (PRIMARY KEY NULL kabul etmez).
+API_USAGE_ROLLUP_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS api_usage_minutely (
+        bucket TIMESTAMPTZ NOT NULL,
+        isletme_id BIGINT NOT NULL REFERENCES isletmeler(id) ON DELETE CASCADE,
+        api_type TEXT NOT NULL,
+        model TEXT NOT NULL DEFAULT '',
+        endpoint TEXT NOT NULL,
+        method TEXT NOT NULL DEFAULT '',
+        call_count INT NOT NULL DEFAULT 0,
+        request_count INT NOT NULL DEFAULT 0,
+        success_count INT NOT NULL DEFAULT 0,
+        error_count INT NOT NULL DEFAULT 0,
+        prompt_tokens BIGINT NOT NULL DEFAULT 0,
+        completion_tokens BIGINT NOT NULL DEFAULT 0,
+        total_tokens BIGINT NOT NULL DEFAULT 0,
+        cost_usd NUMERIC(14,6) NOT NULL DEFAULT 0,
+        cost_tl NUMERIC(14,2) NOT NULL DEFAULT 0,
+        response_time_ms_sum BIGINT NOT NULL DEFAULT 0,
+        response_time_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (bucket, isletme_id, api_type, model, endpoint, method)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_api_usage_minutely_isletme_bucket ON api_usage_minutely (isletme_id, bucket DESC)",
+    # İlk kurulumda mevcut ham logları özete aktar (özet boş değilse hiçbir şey yapmaz)
+    """
+    INSERT INTO api_usage_minutely (
+        bucket, isletme_id, api_type, model, endpoint, method,
+        call_count, request_count, success_count, error_count,
+        prompt_tokens, completion_tokens, total_tokens, cost_usd, cost_tl,
+        response_time_ms_sum, response_time_count
+    )
+    SELECT
+        date_trunc('minute', created_at), isletme_id, api_type,
+        COALESCE(model, ''), endpoint, COALESCE(method, ''),
+        COUNT(*),
+        COALESCE(SUM(request_count), 0),
+        COUNT(*) FILTER (WHERE status = 'success'),
+        COUNT(*) FILTER (WHERE status = 'error'),
+        COALESCE(SUM(prompt_tokens), 0),
+        COALESCE(SUM(completion_tokens), 0),
+        COALESCE(SUM(total_tokens), 0),
+        COALESCE(SUM(cost_usd), 0),
+        COALESCE(SUM(cost_tl), 0),
+        COALESCE(SUM(response_time_ms), 0),
+        COUNT(response_time_ms)
+    FROM api_usage_logs
+    WHERE created_at IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM api_usage_minutely)
+    GROUP BY 1, 2, 3, 4, 5, 6
+    ON CONFLICT DO NOTHING
+    """,
+    # Son hatalar listesi için (status = 'error' ORDER BY created_at DESC)
+    "CREATE INDEX IF NOT EXISTS idx_api_usage_logs_errors ON api_usage_logs (created_at DESC) WHERE status = 'error'",
+    "DROP INDEX IF EXISTS idx_api_usage_logs_isletme",
+    "DROP INDEX IF EXISTS idx_api_usage_logs_api_type",
+    "DROP INDEX IF EXISTS idx_api_usage_logs_endpoint",
+    "DROP INDEX IF EXISTS idx_api_usage_logs_status",
+    "DROP INDEX IF EXISTS idx_api_usage_logs_created_at",
+]
+
 CREATE_USER_SUBE_IZIN = """
 CREATE TABLE IF NOT EXISTS user_sube_izinleri (
     username TEXT NOT NULL,
@@ -382,15 +1012,69 @@ CREATE TABLE IF NOT EXISTS giderler (
 );
 """
 
+# Sıcak yolların (kasa, adisyon, mutfak, siparis) sorgu şekline göre partial/covering index'ler.
+# Aktif sipariş (yeni/hazirlaniyor/hazir), iptal olmayan ödeme ve açık adisyon kümeleri
+# tablonun küçük bir kesiti olduğu için partial index'ler geçmiş büyüdükçe küçük kalır;
+# INCLUDE (tutar) toplamların index-only scan ile okunmasını sağlar.
+# Bunların kapsadığı eski tek kolonlu/düşük seçicilikli index'ler kaldırılır.
+# Plan kontrolü: scripts/explain_hot_queries.py
+HOT_PATH_INDEX_STATEMENTS = [
+    # kasa: masa hesabı, ödeme sonrası kapanış, /kasa/siparisler masa toplamları
+    """
+    CREATE INDEX IF NOT EXISTS idx_siparisler_sube_masa_aktif
+        ON siparisler (sube_id, masa, created_at, id) INCLUDE (tutar)
+        WHERE durum IN ('yeni', 'hazirlaniyor', 'hazir')
+    """,
+    # adisyon: açık adisyonun aktif siparişleri (iskonto, kapanış kontrolleri)
+    """
+    CREATE INDEX IF NOT EXISTS idx_siparisler_adisyon_aktif
+        ON siparisler (adisyon_id, sube_id) INCLUDE (tutar)
+        WHERE durum IN ('yeni', 'hazirlaniyor', 'hazir')
+    """,
+    # mutfak: kuyruk ve poll (sube_id, id > since)
+    """
+    CREATE INDEX IF NOT EXISTS idx_siparisler_mutfak_aktif
+        ON siparisler (sube_id, id) INCLUDE (created_at)
+        WHERE durum IN ('yeni', 'hazirlaniyor')
+    """,
+    # adisyon: ödeme toplamı/detayı (adisyon_id, sube_id, iptal = FALSE, created_at >= açılış)
+    """
+    CREATE INDEX IF NOT EXISTS idx_odemeler_adisyon_aktif
+        ON odemeler (adisyon_id, sube_id, created_at) INCLUDE (tutar)
+        WHERE iptal = FALSE
+    """,
+    # kasa: masa bazında ödeme toplamı
+    """
+    CREATE INDEX IF NOT EXISTS idx_odemeler_sube_masa_aktif
+        ON odemeler (sube_id, masa) INCLUDE (tutar)
+        WHERE iptal = FALSE
+    """,
+    # açık adisyon çözümü (sube + masa, en son açılan)
+    """
+    CREATE INDEX IF NOT EXISTS idx_adisyons_sube_masa_acik
+        ON adisyons (sube_id, masa, acilis_zamani DESC)
+        WHERE durum = 'acik'
+    """,
+    "DROP INDEX IF EXISTS idx_siparisler_durum",
+    "DROP INDEX IF EXISTS idx_siparisler_masa",
+    "DROP INDEX IF EXISTS idx_siparisler_sube",
+    "DROP INDEX IF EXISTS idx_siparisler_sube_durum",
+    "DROP INDEX IF EXISTS idx_odemeler_sube",
+    "DROP INDEX IF EXISTS idx_adisyons_durum",
+    "DROP INDEX IF EXISTS idx_adisyons_sube_aktif",
+    # Eski alembic revizyonlarından kalan eş/kapsanan index'ler
+    "DROP INDEX IF EXISTS idx_siparisler_sube_durum_open",
+    "DROP INDEX IF EXISTS idx_siparisler_created_at_desc",
+    "DROP INDEX IF EXISTS idx_odemeler_sube_created_at",
+    "DROP INDEX IF EXISTS idx_adisyons_durum_acik",
+    "DROP INDEX IF EXISTS idx_adisyons_sube_masa_durum",
+]
+
 CREATE_INDEXES = """
--- Siparisler index'leri
+-- Siparisler index'leri (aktif sipariş/açık adisyon erişimleri: HOT_PATH_INDEX_STATEMENTS)
 CREATE INDEX IF NOT EXISTS idx_siparisler_created_at ON siparisler (created_at);
-CREATE INDEX IF NOT EXISTS idx_siparisler_durum ON siparisler (durum);
-CREATE INDEX IF NOT EXISTS idx_siparisler_masa ON siparisler (masa);
 CREATE INDEX IF NOT EXISTS idx_siparisler_adisyon ON siparisler (adisyon_id);
-CREATE INDEX IF NOT EXISTS idx_siparisler_sube ON siparisler (sube_id);
 CREATE INDEX IF NOT EXISTS idx_siparisler_sube_created ON siparisler (sube_id, created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_siparisler_sube_durum ON siparisler (sube_id, durum);
 CREATE INDEX IF NOT EXISTS idx_siparisler_sube_durum_created ON siparisler (sube_id, durum, created_at DESC);
 
 -- Menu index'leri
@@ -401,13 +1085,11 @@ CREATE INDEX IF NOT EXISTS idx_menu_sube_kategori ON menu (sube_id, kategori, ak
 
 -- Odemeler index'leri
 CREATE INDEX IF NOT EXISTS idx_odemeler_created_at ON odemeler (created_at);
-CREATE INDEX IF NOT EXISTS idx_odemeler_sube ON odemeler (sube_id);
 CREATE INDEX IF NOT EXISTS idx_odemeler_adisyon ON odemeler (adisyon_id);
 CREATE INDEX IF NOT EXISTS idx_odemeler_sube_created ON odemeler (sube_id, created_at DESC);
 
 -- Adisyons index'leri
 CREATE INDEX IF NOT EXISTS idx_adisyons_sube_masa ON adisyons (sube_id, masa);
-CREATE INDEX IF NOT EXISTS idx_adisyons_durum ON adisyons (durum);
 CREATE INDEX IF NOT EXISTS idx_adisyons_sube_durum ON adisyons (sube_id, durum);
 
 -- İskonto kayıtları index'leri
@@ -441,14 +1123,9 @@ CREATE INDEX IF NOT EXISTS idx_api_keys_isletme ON api_keys (isletme_id);
 CREATE INDEX IF NOT EXISTS idx_api_keys_api_key ON api_keys (api_key);
 CREATE INDEX IF NOT EXISTS idx_api_keys_isletme_aktif ON api_keys (isletme_id, aktif) WHERE aktif = TRUE;
 
--- API usage logs index'leri
-CREATE INDEX IF NOT EXISTS idx_api_usage_logs_isletme ON api_usage_logs (isletme_id);
+-- API usage logs index'leri (raporlar api_usage_minutely'den okur; bkz. API_USAGE_ROLLUP_STATEMENTS)
 CREATE INDEX IF NOT EXISTS idx_api_usage_logs_isletme_created ON api_usage_logs (isletme_id, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_api_usage_logs_api_key ON api_usage_logs (api_key_id);
-CREATE INDEX IF NOT EXISTS idx_api_usage_logs_api_type ON api_usage_logs (api_type);
-CREATE INDEX IF NOT EXISTS idx_api_usage_logs_endpoint ON api_usage_logs (endpoint);
-CREATE INDEX IF NOT EXISTS idx_api_usage_logs_status ON api_usage_logs (status);
-CREATE INDEX IF NOT EXISTS idx_api_usage_logs_created_at ON api_usage_logs (created_at DESC);
 
 -- Users index'leri
 CREATE INDEX IF NOT EXISTS idx_users_tenant_id ON users (tenant_id);
@@ -738,6 +1415,39 @@ async def create_tables(db: Database):
             await db.execute(stmt)
         except Exception:
             pass  # Kolonlar zaten varsa hata olabilir
+    # Adisyon toplamları için delta trigger'ları (CREATE OR REPLACE, idempotent)
+    for stmt in ADISYON_TOTALS_TRIGGER_STATEMENTS:
+        try:
+            await db.execute(stmt)
+        except Exception as e:
+            logging.error(f"Migration error applying adisyon totals trigger: {e}")
+    # Mutfak akışı replay cursor'ı (sequence + trigger + index, idempotent)
+    for stmt in KITCHEN_FEED_STATEMENTS:
+        try:
+            await db.execute(stmt)
+        except Exception as e:
+            logging.error(f"Migration error applying kitchen feed cursor: {e}")
+    # Günlük ürün satış özeti (tablo + fonksiyonlar + trigger, idempotent)
+    for stmt in DAILY_PRODUCT_SALES_STATEMENTS:
+        try:
+            await db.execute(stmt)
+        except Exception as e:
+            logging.error(f"Migration error applying daily product sales rollup: {e}")
+    # Sipariş kalemleri (tablo + fonksiyonlar + trigger, idempotent)
+    row = await db.fetch_one("SELECT to_regclass('siparis_kalemleri') IS NOT NULL AS var")
+    order_lines_existed = bool(row and row["var"])
+    for stmt in ORDER_LINE_STATEMENTS:
+        try:
+            await db.execute(stmt)
+        except Exception as e:
+            logging.error(f"Migration error applying order lines: {e}")
+    if not order_lines_existed:
+        # Geçmiş doldurma startup'ta yapılmaz (uzun sürer, worker'lar yarışır): alembic 0005
+        # veya script; ikisi de kalemi olan siparişleri atlar, yarıda kalırsa kaldığı yerden sürer
+        logging.warning(
+            "[ORDER_LINES] siparis_kalemleri yeni oluşturuldu; geçmiş siparişler için "
+            "'alembic upgrade head' veya scripts/backfill_siparis_kalemleri.py çalıştırın"
+        )
     await db.execute(CREATE_USER_SUBE_IZIN)
     await db.execute(CREATE_USER_PERMISSIONS)
     await db.execute(CREATE_APP_SETTINGS)
@@ -767,6 +1477,18 @@ async def create_tables(db: Database):
             await db.execute(stmt)
         except Exception:
             pass
+    # Sıcak yol partial/covering index'leri (idempotent)
+    for stmt in HOT_PATH_INDEX_STATEMENTS:
+        try:
+            await db.execute(stmt)
+        except Exception as e:
+            logging.error(f"Migration error applying hot path index: {e}")
+    # API kullanım özeti (tablo + ilk aktarım + ham log index sadeleştirmesi, idempotent)
+    for stmt in API_USAGE_ROLLUP_STATEMENTS:
+        try:
+            await db.execute(stmt)
+        except Exception as e:
+            logging.error(f"Migration error applying api usage rollup: {e}")
     # unaccent fonksiyonlu unique index
     try:
         await db.execute("""
@@ -837,10 +1559,6 @@ async def create_tables(db: Database):
         await db.execute("CREATE INDEX IF NOT EXISTS idx_odemeler_tenant_time ON odemeler (tenant_id, created_at DESC);")
         await db.execute("CREATE INDEX IF NOT EXISTS idx_giderler_tenant_time ON giderler (tenant_id, tarih DESC);")
 
-        # Composite indexes for sube + status queries (frequently used together)
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_siparisler_sube_durum ON siparisler (sube_id, durum) WHERE durum != 'tamamlandi';")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_adisyons_sube_aktif ON adisyons (sube_id, durum) WHERE durum = 'acik';")
-
         # Menu performance indexes
         await db.execute("CREATE INDEX IF NOT EXISTS idx_menu_tenant_kategori ON menu (tenant_id, kategori);")
         await db.execute("CREATE INDEX IF NOT EXISTS idx_menu_tenant_aktif ON menu (tenant_id, aktif) WHERE aktif = true;")
@@ -908,6 +1626,27 @@ async def create_tables(db: Database):
     except Exception:
         pass
 
+    # Reçete menu_id/stok_id bağları (kolonlar + trigger'lar + bağlanmamış satırlar, idempotent)
+    for stmt in RECIPE_KEY_STATEMENTS:
+        try:
+            await db.execute(stmt)
+        except Exception as e:
+            logging.error(f"Migration error applying recipe keys: {e}")
+    for table, stmt in NAME_KEY_UNIQUE_INDEXES.items():
+        try:
+            await db.execute(stmt)
+        except Exception as e:
+            logging.warning(f"[RECETE] {table} normalize ad unique index oluşturulamadı (çakışan adlar var?): {e}")
+    try:
+        unmatched = await db.fetch_one(f"SELECT COUNT(*) AS n FROM ({RECIPE_UNMATCHED_SQL}) u")
+        if unmatched and unmatched["n"]:
+            logging.warning(
+                f"[RECETE] {unmatched['n']} reçete satırı menü/stok kaydıyla eşleşmedi "
+                f"(ayrıntı: scripts/report_recipe_keys.py)"
+            )
+    except Exception as e:
+        logging.error(f"Migration error checking recipe keys: {e}")
+
     await _ensure_ai_views(db)
     
     # Eğer hiç super_admin kullanıcısı yoksa, default super admin oluştur
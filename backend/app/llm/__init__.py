@@ -1,4 +1,13 @@
-from .providers import get_llm_provider
-
-__all__ = ["get_llm_provider"]
+from .providers import (
+    close_llm_clients,
+    get_llm_provider,
+    invalidate_llm_providers,
+    start_llm_provider_listener,
+)
 
+__all__ = [
+    "get_llm_provider",
+    "invalidate_llm_providers",
+    "start_llm_provider_listener",
+    "close_llm_clients",
+]
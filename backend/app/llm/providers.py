@@ -1,9 +1,151 @@
 from __future__ import annotations
 
 import asyncio
-from typing import AsyncIterator, Dict, Optional, List
+import hashlib
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
 
 from ..core.config import settings
+from ..core.lru import LRUCache
+
+# API key başına uzun ömürlü, bağlantı havuzlu HTTP client (her istekte yeni TLS el sıkışması yok)
+_http_clients: Dict[str, Any] = {}
+
+
+@asynccontextmanager
+async def _pooled_client(api_key: str):
+    """API key'in paylaşılan client'ını verir; blok sonunda kapatmaz (close_llm_clients kapatır)."""
+    import httpx
+
+    pool_key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    client = _http_clients.get(pool_key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=60,
+            limits=httpx.Limits(
+                max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+            ),
+        )
+        _http_clients[pool_key] = client
+    yield client
+
+
+async def close_llm_clients() -> None:
+    """Shutdown: havuzdaki HTTP client'ları kapatır."""
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logging.debug(f"[LLM_PROVIDER] HTTP client kapatma hatası: {e}")
+
+
+def _openai_sampling(task_type: str) -> Tuple[float, float]:
+    """Görev tipine göre (temperature, top_p)"""
+    if task_type == "bi_analysis":
+        return 0.3, 0.85
+    return 0.8, 0.9
+
+
+_OPENAI_MODEL_COSTS = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o": (2.50, 10.00),
+}
+
+
+def _openai_usage_info(model: str, usage: Dict[str, Any], response_time_ms: int) -> Dict[str, Any]:
+    """OpenAI usage alanından token + maliyet (USD, 1M token fiyatlarıyla) bilgisi"""
+    model_lower = model.lower()
+    cost_per_1m_input, cost_per_1m_output = next(
+        (v for k, v in _OPENAI_MODEL_COSTS.items() if k in model_lower),
+        (2.50, 10.00)
+    )
+    cost_usd = (usage.get("prompt_tokens", 0) / 1_000_000 * cost_per_1m_input) + (usage.get("completion_tokens", 0) / 1_000_000 * cost_per_1m_output)
+    return {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+        "cost_usd": round(cost_usd, 6),
+        "response_time_ms": response_time_ms,
+    }
+
+
+_GEMINI_COSTS = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+}
+
+
+def _gemini_usage_info(model: str, usage: Dict[str, Any], response_time_ms: int) -> Dict[str, Any]:
+    """Gemini usageMetadata alanından token + maliyet bilgisi"""
+    prompt_tokens = usage.get("promptTokenCount", 0)
+    completion_tokens = usage.get("candidatesTokenCount", 0)
+    g_cost_input, g_cost_output = next(
+        (v for k, v in _GEMINI_COSTS.items() if k in model.lower()),
+        (0.10, 0.40)
+    )
+    cost_usd = (prompt_tokens / 1_000_000 * g_cost_input) + (completion_tokens / 1_000_000 * g_cost_output)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": usage.get("totalTokenCount", 0),
+        "cost_usd": round(cost_usd, 7),
+        "response_time_ms": response_time_ms,
+    }
+
+
+def _gemini_generation_config(task_type: str) -> Dict[str, Any]:
+    is_bi = task_type == "bi_analysis"
+    gen_config: Dict[str, Any] = {
+        "temperature": 0.4 if is_bi else 0.8,
+        "topP": 0.95,
+        "maxOutputTokens": 2048 if is_bi else 1024,
+    }
+    # Gemini 2.5-flash varsayılan olarak "thinking" modunda çalışır ve yanıtı
+    # ciddi yavaşlatır. Müşteri sohbetinde düşünmeyi kapatıp hız kazanıyoruz;
+    # BI analizinde muhakeme faydalı olduğu için açık bırakıyoruz.
+    if not is_bi:
+        gen_config["thinkingConfig"] = {"thinkingBudget": 0}
+    return gen_config
+
+
+def _gemini_contents(messages: List[Dict[str, str]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """OpenAI tarzı mesajları Gemini contents + systemInstruction metnine çevirir."""
+    gemini_history: List[Dict[str, Any]] = []
+    system_instruction = None
+
+    for msg in messages:
+        if msg["role"] == "system":
+            system_instruction = msg["content"]
+        else:
+            role = "user" if msg["role"] == "user" else "model"
+
+            # Gemini STRICT RULE: Roles must alternate between 'user' and 'model'.
+            if gemini_history and gemini_history[-1]["role"] == role:
+                # If consecutive same-role messages occur, merege them.
+                gemini_history[-1]["parts"][0]["text"] += f"\n\n{msg['content']}"
+            else:
+                gemini_history.append({
+                    "role": role,
+                    "parts": [{"text": msg["content"]}]
+                })
+
+    # Gemini STRICT RULE: The history must start with a 'user' message
+    if gemini_history and gemini_history[0]["role"] == "model":
+        gemini_history.insert(0, {
+            "role": "user",
+            "parts": [{"text": "(Devam...)"}]
+        })
+    return gemini_history, system_instruction
 
 
 class LLMProvider:
@@ -13,6 +155,27 @@ class LLMProvider:
     async def chat(self, messages: List[Dict[str, str]]) -> str:
         raise NotImplementedError
 
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        task_type: str = "general",
+        usage: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Sohbet yanıtını parça parça verir. Varsayılan: chat() tamamlanınca yanıtı tek
+        parça olarak verir (akış desteklemeyen provider'lar). usage verilirse
+        kullanım bilgisi (token, maliyet) akış sonunda içine yazılır.
+        """
+        result = await self.chat(messages)
+        if isinstance(result, tuple):
+            text, info = result
+            if info and usage is not None:
+                usage.update(info)
+        else:
+            text = result
+        if text:
+            yield text
+
 
 class RuleBasedProvider(LLMProvider):
     def __init__(self, assistant_type: str = "general"):
@@ -107,7 +270,6 @@ class OpenAIProvider(LLMProvider):
 
     async def stream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
         import json
-        import httpx
 
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -125,9 +287,10 @@ class OpenAIProvider(LLMProvider):
             ],
         }
 
-        async with httpx.AsyncClient(timeout=30) as client:
+        async with _pooled_client(self.api_key) as client:
             async with client.stream(
-                "POST", "https://api.openai.com/v1/chat/completions", headers=headers, content=json.dumps(payload)
+                "POST", "https://api.openai.com/v1/chat/completions", headers=headers, content=json.dumps(payload),
+                timeout=30,
             ) as r:
                 r.raise_for_status()
                 async for line in r.aiter_lines():
@@ -144,19 +307,65 @@ class OpenAIProvider(LLMProvider):
                     except Exception:
                         continue
 
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        task_type: str = "general",
+        usage: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """chat() ile aynı istek, yanıt token token akar; usage verilirse akış sonunda doldurulur."""
+        import time
+
+        temperature, top_p = _openai_sampling(task_type)
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "top_p": top_p,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+        start_time = time.time()
+        try:
+            async with _pooled_client(self.api_key) as client:
+                async with client.stream(
+                    "POST", "https://api.openai.com/v1/chat/completions", headers=headers, content=json.dumps(payload),
+                    timeout=30,
+                ) as r:
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            obj = json.loads(data)
+                        except ValueError:
+                            continue
+                        # include_usage: son parçada choices boş, usage dolu gelir
+                        if obj.get("usage") and usage is not None:
+                            usage.update(_openai_usage_info(self.model, obj["usage"], int((time.time() - start_time) * 1000)))
+                        choices = obj.get("choices") or []
+                        delta = choices[0].get("delta", {}).get("content") if choices else None
+                        if delta:
+                            yield delta
+        except Exception as e:
+            safe_err = str(e).replace(self.api_key, "***") if self.api_key in str(e) else str(e)
+            logging.error(f"[OpenAI] Stream error: {safe_err}")
+            raise RuntimeError(f"LLM Provider Error: {safe_err[:120]}")
+
     async def chat(self, messages: List[Dict[str, str]], task_type: str = "general") -> tuple[str, Optional[Dict[str, Any]]]:
-        import httpx
         import json
         import time
         import logging
 
-        # Task-specific parameters
-        if task_type == "bi_analysis":
-            temperature = 0.3
-            top_p = 0.85
-        else:
-            temperature = 0.8
-            top_p = 0.9
+        temperature, top_p = _openai_sampling(task_type)
 
         payload = {
             "model": self.model,
@@ -171,7 +380,7 @@ class OpenAIProvider(LLMProvider):
         
         start_time = time.time()
         try:
-            async with httpx.AsyncClient(timeout=60) as client:
+            async with _pooled_client(self.api_key) as client:
                 resp = await client.post(
                     "https://api.openai.com/v1/chat/completions",
                     headers=headers,
@@ -195,28 +404,7 @@ class OpenAIProvider(LLMProvider):
             
             usage_info = None
             if "usage" in data:
-                usage = data["usage"]
-                _MODEL_COSTS = {
-                    "gpt-4o-mini": (0.15, 0.60),
-                    "gpt-4.1-mini": (0.40, 1.60),
-                    "gpt-4.1-nano": (0.10, 0.40),
-                    "gpt-4.1": (2.00, 8.00),
-                    "gpt-4o": (2.50, 10.00),
-                }
-                model_lower = self.model.lower()
-                cost_per_1m_input, cost_per_1m_output = next(
-                    (v for k, v in _MODEL_COSTS.items() if k in model_lower),
-                    (2.50, 10.00)
-                )
-                cost_usd = (usage.get("prompt_tokens", 0) / 1_000_000 * cost_per_1m_input) + (usage.get("completion_tokens", 0) / 1_000_000 * cost_per_1m_output)
-                
-                usage_info = {
-                    "prompt_tokens": usage.get("prompt_tokens", 0),
-                    "completion_tokens": usage.get("completion_tokens", 0),
-                    "total_tokens": usage.get("total_tokens", 0),
-                    "cost_usd": round(cost_usd, 6),
-                    "response_time_ms": response_time_ms,
-                }
+                usage_info = _openai_usage_info(self.model, data["usage"], response_time_ms)
             
             return response_text, usage_info
         except Exception as e:
@@ -241,7 +429,6 @@ class GeminiProvider(LLMProvider):
 
     async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 2048) -> AsyncIterator[str]:
         import json
-        import httpx
         
         url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:streamGenerateContent?key={self.api_key}"
         
@@ -271,8 +458,8 @@ class GeminiProvider(LLMProvider):
         if system_instruction:
             payload["systemInstruction"] = {"role": "system", "parts": [{"text": system_instruction}]}
 
-        async with httpx.AsyncClient(timeout=30) as client:
-            async with client.stream("POST", url, json=payload) as r:
+        async with _pooled_client(self.api_key) as client:
+            async with client.stream("POST", url, json=payload, timeout=30) as r:
                 r.raise_for_status()
                 async for line in r.aiter_lines():
                     if not line or not line.strip(): continue
@@ -289,8 +476,52 @@ class GeminiProvider(LLMProvider):
                     except Exception:
                         continue
 
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        task_type: str = "general",
+        usage: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """chat() ile aynı istek (SSE akışı, yedek modele düşmeden); usage verilirse akış sonunda doldurulur."""
+        import time
+
+        contents, system_instruction = _gemini_contents(messages)
+        payload: Dict[str, Any] = {
+            "contents": contents,
+            "generationConfig": _gemini_generation_config(task_type),
+        }
+        if system_instruction:
+            payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:streamGenerateContent?alt=sse&key={self.api_key}"
+
+        start_time = time.time()
+        try:
+            async with _pooled_client(self.api_key) as client:
+                async with client.stream("POST", url, json=payload, timeout=30) as r:
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        if not line or not line.startswith("data:"):
+                            continue
+                        try:
+                            obj = json.loads(line[5:].strip())
+                        except ValueError:
+                            continue
+                        # usageMetadata her parçada kümülatif gelir; sonuncusu geçerli
+                        if obj.get("usageMetadata") and usage is not None:
+                            usage.update(_gemini_usage_info(
+                                self.model, obj["usageMetadata"], int((time.time() - start_time) * 1000)
+                            ))
+                        for candidate in (obj.get("candidates") or [])[:1]:
+                            for part in (candidate.get("content") or {}).get("parts") or []:
+                                chunk = part.get("text")
+                                if chunk:
+                                    yield chunk
+        except Exception as e:
+            safe_err = str(e).replace(self.api_key, "***") if self.api_key in str(e) else str(e)
+            logging.error(f"[Gemini] Stream error: {safe_err}")
+            raise RuntimeError(f"LLM Provider Error: {safe_err[:120]}")
+
     async def chat(self, messages: List[Dict[str, str]], task_type: str = "general") -> tuple[str, Optional[Dict[str, Any]]]:
-        import httpx
         import json
         import time
         import logging
@@ -298,31 +529,7 @@ class GeminiProvider(LLMProvider):
         url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent?key={self.api_key}"
         
         # Convert OpenAI-style messages to Gemini format
-        gemini_history = []
-        system_instruction = None
-        
-        for msg in messages:
-            if msg["role"] == "system":
-                system_instruction = msg["content"]
-            else:
-                role = "user" if msg["role"] == "user" else "model"
-                
-                # Gemini STRICT RULE: Roles must alternate between 'user' and 'model'.
-                if gemini_history and gemini_history[-1]["role"] == role:
-                    # If consecutive same-role messages occur, merege them.
-                    gemini_history[-1]["parts"][0]["text"] += f"\n\n{msg['content']}"
-                else:
-                    gemini_history.append({
-                        "role": role,
-                        "parts": [{"text": msg["content"]}]
-                    })
-                    
-        # Gemini STRICT RULE: The history must start with a 'user' message
-        if gemini_history and gemini_history[0]["role"] == "model":
-            gemini_history.insert(0, {
-                "role": "user",
-                "parts": [{"text": "(Devam...)"}]
-            })
+        gemini_history, system_instruction = _gemini_contents(messages)
 
         payload = {
             "contents": gemini_history,
@@ -360,20 +567,9 @@ class GeminiProvider(LLMProvider):
             
             # Her deneme için temiz bir payload oluştur
             attempt_contents = json.loads(json.dumps(gemini_history))
-            is_bi = task_type == "bi_analysis"
-            gen_config = {
-                "temperature": 0.4 if is_bi else 0.8,
-                "topP": 0.95,
-                "maxOutputTokens": 2048 if is_bi else 1024,
-            }
-            # Gemini 2.5-flash varsayılan olarak "thinking" modunda çalışır ve yanıtı
-            # ciddi yavaşlatır. Müşteri sohbetinde düşünmeyi kapatıp hız kazanıyoruz;
-            # BI analizinde muhakeme faydalı olduğu için açık bırakıyoruz.
-            if not is_bi:
-                gen_config["thinkingConfig"] = {"thinkingBudget": 0}
             attempt_payload = {
                 "contents": attempt_contents,
-                "generationConfig": gen_config,
+                "generationConfig": _gemini_generation_config(task_type),
             }
 
             # v1beta'da systemInstruction desteklenir (role olmadan!)
@@ -383,7 +579,7 @@ class GeminiProvider(LLMProvider):
                 }
 
             try:
-                async with httpx.AsyncClient(timeout=60) as client:
+                async with _pooled_client(self.api_key) as client:
                     resp = await client.post(attempt_url, json=attempt_payload)
                     if resp.status_code in (404, 400, 403, 500, 502, 503, 504):
                         err_body = ""
@@ -404,30 +600,9 @@ class GeminiProvider(LLMProvider):
                 response_text = data["candidates"][0]["content"]["parts"][0]["text"]
                 response_time_ms = int((time.time() - start_time) * 1000)
 
-                usage = data.get("usageMetadata", {})
-                prompt_tokens = usage.get("promptTokenCount", 0)
-                completion_tokens = usage.get("candidatesTokenCount", 0)
-                total_tokens = usage.get("totalTokenCount", 0)
-
-                _GEMINI_COSTS = {
-                    "gemini-2.5-pro": (1.25, 10.00),
-                    "gemini-2.0-flash": (0.10, 0.40),
-                    "gemini-1.5-pro": (1.25, 5.00),
-                    "gemini-1.5-flash": (0.075, 0.30),
-                }
-                g_cost_input, g_cost_output = next(
-                    (v for k, v in _GEMINI_COSTS.items() if k in self.model.lower()),
-                    (0.10, 0.40)
+                return response_text, _gemini_usage_info(
+                    self.model, data.get("usageMetadata", {}), response_time_ms
                 )
-                cost_usd = (prompt_tokens / 1_000_000 * g_cost_input) + (completion_tokens / 1_000_000 * g_cost_output)
-
-                return response_text, {
-                    "prompt_tokens": prompt_tokens,
-                    "completion_tokens": completion_tokens,
-                    "total_tokens": total_tokens,
-                    "cost_usd": round(cost_usd, 7),
-                    "response_time_ms": response_time_ms,
-                }
             except Exception as e:
                 last_error = e
                 err_str = str(e)
@@ -440,13 +615,101 @@ class GeminiProvider(LLMProvider):
         raise RuntimeError(f"LLM Provider Error: {safe_err[:120]}")
 
 
+LLM_PROVIDER_CHANNEL = "neso_llm_providers"
+
+# (tenant_id, assistant_type) -> çözümlenmiş provider; ayar yazımları invalidate_llm_providers ile düşürür
+_providers = LRUCache(maxsize=settings.LLM_PROVIDER_CACHE_SIZE, ttl=settings.LLM_PROVIDER_CACHE_TTL_SECONDS)
+_listening = False
+
+
 async def get_llm_provider(tenant_id: Optional[int] = None, assistant_type: Optional[str] = None) -> LLMProvider:
     """
     Tenant-specific veya global API key ile LLM provider döndürür.
+
+    Çözümleme (tenant_customizations → platform_settings → app_settings → env) sonucu
+    (tenant, asistan tipi) bazında LLM_PROVIDER_CACHE_TTL_SECONDS boyunca saklanır;
+    provider'lar API key başına paylaşılan HTTP client kullanır. Ayar okuması geçici
+    bir hatayla düşüp env/kural tabanlı provider'a inildiyse sonuç saklanmaz
+    (bir DB hıçkırığı tenant'ın asistanını TTL boyunca düşürmesin).
     """
-    import logging
-    logging.info("[LLM_PROVIDER] Version 2.1 - Fallback Logic Active")
+    key: Tuple[Optional[int], Optional[str]] = (tenant_id, assistant_type)
+    provider = _providers.get(key)
+    if provider is None:
+        lookup_errors: List[Exception] = []
+        provider = await _resolve_llm_provider(tenant_id, assistant_type, lookup_errors)
+        if any(_is_transient_lookup_error(e) for e in lookup_errors):
+            logging.warning(f"[LLM_PROVIDER] Ayar okuması hatalı, provider cache'lenmedi: tenant={tenant_id}, tip={assistant_type}")
+        else:
+            _providers.set(key, provider)
+    return provider
+
+
+def _is_transient_lookup_error(error: Exception) -> bool:
+    """Eksik tablo/kolon (eski şema) kalıcıdır; diğer hatalar (bağlantı, zaman aşımı) geçici sayılır"""
+    from asyncpg.exceptions import UndefinedColumnError, UndefinedTableError
+
+    return not isinstance(error, (UndefinedColumnError, UndefinedTableError))
+
+
+def _drop_cached(tenant_id: Optional[int]) -> None:
+    if tenant_id is None:
+        _providers.clear()
+    else:
+        _providers.discard_where(lambda k, _: k[0] == tenant_id)
+
+
+async def _on_provider_event(channel: str, payload: Dict[str, Any]) -> None:
+    tenant_id = payload.get("tenant_id")
+    _drop_cached(int(tenant_id) if tenant_id is not None else None)
+
+
+async def invalidate_llm_providers(tenant_id: Optional[int] = None) -> None:
+    """
+    LLM anahtar/model ayarları değişince çözümlenmiş provider'ları düşürür ve
+    diğer worker'lara pg_notify ile bildirir.
+
+    Args:
+        tenant_id: Sadece bu işletme (None ise tümü; platform/uygulama ayarları herkesi etkiler)
+    """
+    _drop_cached(tenant_id)
     from ..db.database import db
+
+    try:
+        await db.execute(
+            "SELECT pg_notify(:channel, :payload)",
+            {"channel": LLM_PROVIDER_CHANNEL, "payload": json.dumps({"tenant_id": tenant_id})},
+        )
+    except Exception as e:
+        # Diğer worker'lar TTL sonunda güncellenir
+        logging.warning(f"[LLM_PROVIDER] Invalidation bildirimi gönderilemedi: {e}")
+
+
+async def start_llm_provider_listener() -> None:
+    """Startup: diğer worker'ların provider invalidation bildirimlerine abone olur."""
+    global _listening
+    if _listening:
+        return
+    from ..services.event_bus import event_bus
+
+    await event_bus.register(LLM_PROVIDER_CHANNEL, _on_provider_event)
+    await event_bus.start_listener()
+    _listening = True
+
+
+def llm_provider_stats() -> Dict[str, Any]:
+    return {"providers": _providers.stats(), "http_clients": len(_http_clients)}
+
+
+async def _resolve_llm_provider(
+    tenant_id: Optional[int],
+    assistant_type: Optional[str],
+    lookup_errors: Optional[List[Exception]] = None,
+) -> LLMProvider:
+    """lookup_errors verilirse ayar okumalarında yutulan hatalar oraya eklenir."""
+    from ..db.database import db
+
+    if lookup_errors is None:
+        lookup_errors = []
     
     api_key = None
     model = None
@@ -483,6 +746,7 @@ async def get_llm_provider(tenant_id: Optional[int] = None, assistant_type: Opti
                     model = row_gen["m"]
                     key_source = "tenant_general"
         except Exception as e:
+            lookup_errors.append(e)
             logging.warning(f"[LLM_PROVIDER] Tenant key lookup failed: {e}")
 
     # 2. Global Ayarlar (DB) kontrol et - platform_settings ve app_settings tabloları
@@ -509,7 +773,6 @@ async def get_llm_provider(tenant_id: Optional[int] = None, assistant_type: Opti
                         val = row["value"]
                         # app_settings JSONB ise ve string olarak kaydedilmişse temizle
                         if isinstance(val, str) and val.startswith('"') and val.endswith('"'):
-                            import json
                             try: val = json.loads(val)
                             except: pass
                         
@@ -526,6 +789,7 @@ async def get_llm_provider(tenant_id: Optional[int] = None, assistant_type: Opti
                             model = str(m_val)
                         break
                 except Exception as table_err:
+                    lookup_errors.append(table_err)
                     logging.debug(f"[LLM_PROVIDER] Table {table} lookup error: {table_err}")
                     continue
             
@@ -551,9 +815,12 @@ async def get_llm_provider(tenant_id: Optional[int] = None, assistant_type: Opti
                                     except: pass
                                 model = str(m_val)
                             break
-                    except: continue
+                    except Exception as table_err:
+                        lookup_errors.append(table_err)
+                        continue
 
         except Exception as e:
+            lookup_errors.append(e)
             logging.warning(f"[LLM_PROVIDER] Settings DB lookup failed: {e}")
 
     # 3. Global Env
@@ -2,7 +2,7 @@
 import os
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi  # << Swagger özelleştirme için
@@ -13,6 +13,7 @@ from .core.tenant_middleware import TenantStatusMiddleware, SubscriptionLimitMid
 from .core.domain_middleware import DomainTenantMiddleware
 from .core.security_middleware import SecurityHeadersMiddleware
 from .core.startup_checks import validate_startup
+from .core.deps import request_db_scope
 from .core.logging_config import setup_logging
 from .db.database import db
 from .db.schema import create_tables
@@ -109,12 +110,60 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"[STARTUP] Error creating tables: {e}", exc_info=True)
 
+    try:
+        from .core.branch_access import warm_branch_access
+        await warm_branch_access()
+    except Exception as e:
+        logger.warning(f"[STARTUP] Branch access index warm-up error (will load on first request): {e}")
+
+    try:
+        from .services.tenant_usage import start_tenant_usage_listener
+        await start_tenant_usage_listener()
+    except Exception as e:
+        logger.warning(f"[STARTUP] Tenant usage listener error (optional): {e}")
+
+    try:
+        from .llm import start_llm_provider_listener
+        await start_llm_provider_listener()
+    except Exception as e:
+        logger.warning(f"[STARTUP] LLM provider listener error (optional): {e}")
+
+    try:
+        from .services.menu_snapshot import start_menu_snapshot_listener
+        await start_menu_snapshot_listener()
+    except Exception as e:
+        logger.warning(f"[STARTUP] Menu snapshot listener error (optional): {e}")
+
+    try:
+        from .services.assistant_knowledge import start_assistant_knowledge_listener
+        await start_assistant_knowledge_listener()
+    except Exception as e:
+        logger.warning(f"[STARTUP] Assistant knowledge listener error (optional): {e}")
+
     try:
         await cache_service.connect()
         logger.info("[STARTUP] Redis cache initialized")
     except Exception as e:
         logger.warning(f"[STARTUP] Redis cache error (optional): {e}")
 
+    try:
+        from .websocket.manager import manager as ws_manager
+        await ws_manager.start_broker()
+    except Exception as e:
+        logger.warning(f"[STARTUP] WebSocket broker error (optional): {e}")
+
+    try:
+        from .services.audit import audit_writer
+        await audit_writer.start()
+    except Exception as e:
+        logger.error(f"[STARTUP] Audit writer error (logs will be written inline): {e}", exc_info=True)
+
+    try:
+        from .services.usage_metering import usage_meter
+        await usage_meter.start()
+    except Exception as e:
+        logger.error(f"[STARTUP] Usage meter error (usage will be written inline): {e}", exc_info=True)
+
     try:
         scheduler_service.start()
         logger.info("[STARTUP] Scheduler started")
@@ -126,6 +175,30 @@ async def lifespan(app: FastAPI):
     yield  # <- uygulama burada çalışır
 
     # --- SHUTDOWN ---
+    try:
+        # Kuyruktaki audit kayıtları DB bağlantısı kapanmadan yazılsın
+        from .services.audit import audit_writer
+        await audit_writer.stop()
+    except Exception as e:
+        logger.error(f"[SHUTDOWN] Audit writer drain error: {e}")
+    try:
+        # Bekleyen API kullanım sayaçları da aynı şekilde
+        from .services.usage_metering import usage_meter
+        await usage_meter.stop()
+    except Exception as e:
+        logger.error(f"[SHUTDOWN] Usage meter flush error: {e}")
+    try:
+        from .websocket.manager import manager as ws_manager
+        await ws_manager.stop_broker()
+        from .services.event_bus import event_bus
+        await event_bus.stop_listener()
+    except Exception:
+        pass
+    try:
+        from .llm import close_llm_clients
+        await close_llm_clients()
+    except Exception:
+        pass
     await db.disconnect()
     try:
         await cache_service.disconnect()
@@ -141,6 +214,8 @@ app = FastAPI(
     title=settings.APP_NAME,
     version=settings.VERSION,
     lifespan=lifespan,
+    # RLS tenant ayarı istek başına tek bağlantıda bir kez uygulanır (core/deps.request_db_scope)
+    dependencies=[Depends(request_db_scope)],
     docs_url="/docs" if settings.ENV != "prod" else None,
     redoc_url="/redoc" if settings.ENV != "prod" else None,
 )
@@ -174,6 +249,7 @@ app.add_middleware(
     allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
     allow_methods=settings.CORS_ALLOW_METHODS,
     allow_headers=settings.CORS_ALLOW_HEADERS,
+    expose_headers=["X-Mutfak-Cursor"],  # Mutfak ekranı replay cursor'ı (/mutfak/kuyruk)
 )
 
 # ---- SaaS Multi-Tenancy Middleware'leri ----
@@ -3,7 +3,6 @@
 Adisyon (Hesap) Yönetimi
 Her masa için bir adisyon (hesap) açılır, siparişler ve ödemeler adisyon'a bağlanır.
 """
-import json
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import Literal, Optional, List, Dict, Any, Mapping
@@ -11,6 +10,7 @@ from datetime import datetime
 
 from ..core.deps import get_current_user, get_sube_id, require_roles
 from ..db.database import db
+from ..services.order_lines import normalize_items
 
 router = APIRouter(prefix="/adisyon", tags=["Adisyon"])
 
@@ -70,19 +70,6 @@ async def _get_or_create_adisyon(masa: str, sube_id: int) -> int:
     return yeni["id"]
 
 
-def _decode_sepet(value):
-    if value is None:
-        return []
-    if isinstance(value, list):
-        return value
-    if isinstance(value, str):
-        try:
-            return json.loads(value)
-        except json.JSONDecodeError:
-            return []
-    return []
-
-
 def _to_float(val, default=0.0) -> float:
     try:
         if val is None or val == "":
@@ -92,70 +79,6 @@ def _to_float(val, default=0.0) -> float:
         return default
 
 
-def _normalize_items(value):
-    """
-    siparis.sepet alanını normalize ederek ürün listesine dönüştürür.
-    """
-    normalized = []
-    for item in _decode_sepet(value):
-        if not isinstance(item, dict):
-            continue
-
-        urun = str(item.get("urun") or item.get("ad") or "").strip()
-        if not urun:
-            continue
-
-        miktar = _to_float(
-            item.get("adet")
-            or item.get("miktar")
-            or item.get("quantity")
-            or item.get("qty"),
-            default=1.0,
-        )
-        if miktar <= 0:
-            miktar = 1.0
-
-        fiyat = _to_float(
-            item.get("fiyat")
-            or item.get("birim_fiyat")
-            or item.get("unit_price")
-            or item.get("price"),
-            default=0.0,
-        )
-
-        toplam = _to_float(
-            item.get("toplam")
-            or item.get("tutar")
-            or item.get("total"),
-            default=fiyat * miktar,
-        )
-
-        if fiyat == 0 and miktar:
-            fiyat = toplam / miktar if toplam else 0.0
-
-        normalized_item = {
-            "urun": urun,
-            "adet": miktar,
-            "miktar": miktar,
-            "fiyat": fiyat,
-            "toplam": toplam if toplam else fiyat * miktar,
-        }
-
-        if "varyasyon" in item:
-            normalized_item["varyasyon"] = item["varyasyon"]
-
-        note = item.get("notlar") or item.get("not") or item.get("note")
-        if note:
-            normalized_item["notlar"] = note
-
-        if "ikram" in item:
-            normalized_item["ikram"] = item["ikram"]
-
-        normalized.append(normalized_item)
-
-    return normalized
-
-
 def _build_adisyon_siparis_detay(rows) -> List[Dict[str, Any]]:
     """
     Sipariş satırlarını (adisyon_id -> siparisler) UI'nin beklediği formata dönüştür.
@@ -215,7 +138,7 @@ def _build_adisyon_siparis_detay(rows) -> List[Dict[str, Any]]:
             })
             continue
 
-        sepet_items = _normalize_items(row_dict.get("sepet"))
+        sepet_items = normalize_items(row_dict.get("sepet"))
 
         if sepet_items:
             for idx, item in enumerate(sepet_items, start=1):
@@ -265,7 +188,11 @@ def _build_adisyon_siparis_detay(rows) -> List[Dict[str, Any]]:
 
 async def _update_adisyon_totals(adisyon_id: int, sube_id: int) -> None:
     """
-    Adisyon toplamlarını güncelle (toplam_tutar, odeme_toplam, bakiye)
+    Adisyon toplamlarını kaynak tablolardan tam olarak yeniden hesapla
+    (toplam_tutar, odeme_toplam, bakiye, sipariş sayaçları).
+
+    Normal akışta toplamlar trigger'larla artımlı güncellenir; bu fonksiyon
+    mutabakat (drift düzeltme) ve fazla ödeme ayırma için kullanılır.
     """
     import logging
     
@@ -275,14 +202,16 @@ async def _update_adisyon_totals(adisyon_id: int, sube_id: int) -> None:
         SELECT
             COALESCE(SUM(CASE WHEN durum <> 'iptal' THEN tutar ELSE 0 END), 0) AS toplam,
             COUNT(CASE WHEN durum <> 'iptal' THEN 1 END) AS siparis_sayisi,
+            COUNT(CASE WHEN durum IN ('yeni', 'hazirlaniyor', 'hazir') THEN 1 END) AS aktif_siparis_sayisi,
             COALESCE(SUM(CASE WHEN durum IN ('yeni', 'hazirlaniyor', 'hazir') THEN tutar ELSE 0 END), 0) AS aktif_toplam
         FROM siparisler
-        WHERE adisyon_id = :aid AND sube_id = :sid
+        WHERE adisyon_id = :aid
         """,
-        {"aid": adisyon_id, "sid": sube_id},
+        {"aid": adisyon_id},
     )
     toplam_tutar = float(siparis_row["toplam"] or 0) if siparis_row else 0.0
     siparis_sayisi = int(siparis_row["siparis_sayisi"] or 0) if siparis_row else 0
+    aktif_siparis_sayisi = int(siparis_row["aktif_siparis_sayisi"] or 0) if siparis_row else 0
     aktif_toplam = float(siparis_row["aktif_toplam"] or 0) if siparis_row else 0.0
     
     # Önce adisyon açılış tarihini al
@@ -419,7 +348,7 @@ async def _update_adisyon_totals(adisyon_id: int, sube_id: int) -> None:
     aktif_bakiye = max(0.0, aktif_toplam - odeme_toplam)
     
     # Debug log
-    logging.info(
+    logging.debug(
         f"[ADISYON_UPDATE] Adisyon #{adisyon_id} (masa={masa}): "
         f"siparis_sayisi={siparis_sayisi}, toplam_tutar={toplam_tutar:.2f}, net_toplam={net_toplam:.2f}, "
         f"aktif_toplam={aktif_toplam:.2f}, odeme_sayisi={odeme_sayisi}, odeme_toplam={odeme_toplam:.2f}, "
@@ -433,7 +362,10 @@ async def _update_adisyon_totals(adisyon_id: int, sube_id: int) -> None:
         SET toplam_tutar = :toplam,
             odeme_toplam = :odeme,
             bakiye = :bakiye,
-            iskonto_tutari = :iskonto
+            iskonto_tutari = :iskonto,
+            siparis_sayisi = :siparis_sayisi,
+            aktif_siparis_sayisi = :aktif_siparis_sayisi,
+            aktif_toplam = :aktif_toplam
         WHERE id = :aid
         """,
         {
@@ -442,9 +374,186 @@ async def _update_adisyon_totals(adisyon_id: int, sube_id: int) -> None:
             "odeme": odeme_toplam,
             "bakiye": bakiye,
             "iskonto": iskonto_tutari,
+            "siparis_sayisi": siparis_sayisi,
+            "aktif_siparis_sayisi": aktif_siparis_sayisi,
+            "aktif_toplam": aktif_toplam,
         },
     )
 
+
+# Adisyon toplamları siparisler/odemeler trigger'ları ile artımlı (delta) güncellenir
+# (bkz. db/schema.py ADISYON_TOTALS_TRIGGER_STATEMENTS). Bu sorgu saklanan değerleri
+# _update_adisyon_totals ile aynı formülle yeniden hesaplanan değerlerle karşılaştırır
+# ve sapma (drift) olan açık adisyonları döndürür. :sid NULL ise tüm şubeler taranır.
+ADISYON_DRIFT_SQL = """
+WITH calc AS (
+    SELECT a.id,
+           a.sube_id,
+           a.masa,
+           COALESCE(a.toplam_tutar, 0) AS kayitli_toplam,
+           COALESCE(a.odeme_toplam, 0) AS kayitli_odeme,
+           COALESCE(a.siparis_sayisi, 0) AS kayitli_siparis_sayisi,
+           COALESCE(a.aktif_siparis_sayisi, 0) AS kayitli_aktif_sayisi,
+           COALESCE(a.aktif_toplam, 0) AS kayitli_aktif_toplam,
+           COALESCE(s.toplam, 0) AS toplam,
+           COALESCE(s.siparis_sayisi, 0) AS siparis_sayisi,
+           COALESCE(s.aktif_sayisi, 0) AS aktif_sayisi,
+           COALESCE(s.aktif_toplam, 0) AS aktif_toplam,
+           COALESCE(o.toplam, 0) AS odeme
+    FROM adisyons a
+    LEFT JOIN LATERAL (
+        SELECT SUM(tutar) FILTER (WHERE durum <> 'iptal') AS toplam,
+               COUNT(*) FILTER (WHERE durum <> 'iptal') AS siparis_sayisi,
+               COUNT(*) FILTER (WHERE durum IN ('yeni', 'hazirlaniyor', 'hazir')) AS aktif_sayisi,
+               SUM(tutar) FILTER (WHERE durum IN ('yeni', 'hazirlaniyor', 'hazir')) AS aktif_toplam
+        FROM siparisler
+        WHERE adisyon_id = a.id
+    ) s ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT SUM(tutar) AS toplam
+        FROM odemeler
+        WHERE adisyon_id = a.id
+          AND iptal = FALSE
+          AND (a.acilis_zamani IS NULL OR created_at >= a.acilis_zamani)
+    ) o ON TRUE
+    WHERE a.durum = 'acik'
+      AND (CAST(:sid AS BIGINT) IS NULL OR a.sube_id = CAST(:sid AS BIGINT))
+)
+SELECT *
+FROM calc
+WHERE kayitli_toplam <> toplam
+   OR kayitli_odeme <> odeme
+   OR kayitli_siparis_sayisi <> siparis_sayisi
+   OR kayitli_aktif_sayisi <> aktif_sayisi
+   OR kayitli_aktif_toplam <> aktif_toplam
+ORDER BY sube_id, id
+"""
+
+
+async def _reconcile_adisyon_totals(sube_id: Optional[int] = None, duzelt: bool = True) -> List[Dict[str, Any]]:
+    """
+    Açık adisyonların artımlı toplamlarını kaynak tablolarla karşılaştırır (mutabakat).
+    Sapma bulunan adisyonlar loglanır ve duzelt=True ise _update_adisyon_totals ile
+    tam yeniden hesaplanır (fazla ödeme ayırma kuralları dahil).
+
+    Args:
+        sube_id: Sadece bu şube (None ise tüm şubeler - scheduler)
+        duzelt: False ise sadece rapor üretir
+
+    Returns: sapma raporu (adisyon başına kayıtlı/hesaplanan değerler)
+    """
+    import logging
+
+    rows = await db.fetch_all(ADISYON_DRIFT_SQL, {"sid": sube_id})
+    rapor: List[Dict[str, Any]] = []
+    for r in rows:
+        kayit = {
+            "adisyon_id": r["id"],
+            "sube_id": r["sube_id"],
+            "masa": r["masa"],
+            "toplam_tutar": {"kayitli": float(r["kayitli_toplam"]), "hesaplanan": float(r["toplam"])},
+            "odeme_toplam": {"kayitli": float(r["kayitli_odeme"]), "hesaplanan": float(r["odeme"])},
+            "siparis_sayisi": {"kayitli": int(r["kayitli_siparis_sayisi"]), "hesaplanan": int(r["siparis_sayisi"])},
+            "aktif_siparis_sayisi": {"kayitli": int(r["kayitli_aktif_sayisi"]), "hesaplanan": int(r["aktif_sayisi"])},
+            "aktif_toplam": {"kayitli": float(r["kayitli_aktif_toplam"]), "hesaplanan": float(r["aktif_toplam"])},
+        }
+        rapor.append(kayit)
+        logging.warning(
+            f"[ADISYON_MUTABAKAT] Sapma: adisyon #{r['id']} (sube_id={r['sube_id']}, masa={r['masa']}) "
+            f"toplam {r['kayitli_toplam']}->{r['toplam']}, odeme {r['kayitli_odeme']}->{r['odeme']}, "
+            f"siparis_sayisi {r['kayitli_siparis_sayisi']}->{r['siparis_sayisi']}, "
+            f"aktif {r['kayitli_aktif_sayisi']}/{r['kayitli_aktif_toplam']}->{r['aktif_sayisi']}/{r['aktif_toplam']}"
+        )
+        if duzelt:
+            try:
+                await _update_adisyon_totals(int(r["id"]), int(r["sube_id"]))
+            except Exception as e:
+                logging.error(f"[ADISYON_MUTABAKAT] Adisyon #{r['id']} düzeltilemedi: {e}", exc_info=True)
+
+    if rapor:
+        logging.warning(
+            f"[ADISYON_MUTABAKAT] {len(rapor)} adisyonda sapma bulundu "
+            f"(sube_id={sube_id if sube_id is not None else 'tümü'}, duzeltildi={duzelt})"
+        )
+    return rapor
+
+
+async def _attach_orphan_siparisler(sube_id: Optional[int] = None) -> int:
+    """
+    adisyon_id'si olmayan aktif siparişleri (eski sistemden kalanlar veya adisyonsuz
+    insert yolları) masanın açık adisyonuna bağlar; açık adisyon yoksa oluşturur.
+    Set-based çalışır, masa sayısından bağımsız olarak sabit sayıda sorgu yapar.
+    ÖNEMLİ: Ödemelere dokunulmaz, eski ödemeler eski adisyonlarında kalır.
+
+    Args:
+        sube_id: Sadece bu şube için onar (None ise tüm şubeler - scheduler)
+
+    Returns: adisyona bağlanan sipariş sayısı
+    """
+    import logging
+
+    sube_filter = "AND sube_id = :sid" if sube_id is not None else ""
+    params: Dict[str, Any] = {"sid": sube_id} if sube_id is not None else {}
+
+    async with db.transaction():
+        created = await db.fetch_all(
+            f"""
+            WITH orphan AS (
+                SELECT DISTINCT sube_id, masa
+                FROM siparisler
+                WHERE durum IN ('yeni', 'hazirlaniyor', 'hazir')
+                  AND (adisyon_id IS NULL OR adisyon_id = 0)
+                  AND sube_id IS NOT NULL
+                  AND masa IS NOT NULL
+                  {sube_filter}
+            )
+            INSERT INTO adisyons (sube_id, masa, durum, acilis_zamani)
+            SELECT o.sube_id, o.masa, 'acik', NOW()
+            FROM orphan o
+            WHERE NOT EXISTS (
+                SELECT 1 FROM adisyons a
+                WHERE a.sube_id = o.sube_id AND a.masa = o.masa AND a.durum = 'acik'
+            )
+            RETURNING id, sube_id, masa
+            """,
+            params,
+        )
+        attached = await db.fetch_all(
+            f"""
+            WITH orphan AS (
+                SELECT DISTINCT sube_id, masa
+                FROM siparisler
+                WHERE durum IN ('yeni', 'hazirlaniyor', 'hazir')
+                  AND (adisyon_id IS NULL OR adisyon_id = 0)
+                  AND sube_id IS NOT NULL
+                  AND masa IS NOT NULL
+                  {sube_filter}
+            ), hedef AS (
+                SELECT DISTINCT ON (a.sube_id, a.masa) a.id, a.sube_id, a.masa
+                FROM adisyons a
+                JOIN orphan o ON o.sube_id = a.sube_id AND o.masa = a.masa
+                WHERE a.durum = 'acik'
+                ORDER BY a.sube_id, a.masa, a.acilis_zamani DESC
+            )
+            UPDATE siparisler s
+            SET adisyon_id = h.id
+            FROM hedef h
+            WHERE s.sube_id = h.sube_id
+              AND s.masa = h.masa
+              AND (s.adisyon_id IS NULL OR s.adisyon_id = 0)
+            RETURNING s.sube_id
+            """,
+            params,
+        )
+        # Adisyon toplamları siparisler trigger'ı ile (adisyon_id değişimi) güncellenir
+
+    if created or attached:
+        logging.info(
+            f"[ADISYON_ONARIM] {len(created)} adisyon oluşturuldu, {len(attached)} sipariş adisyona bağlandı "
+            f"(sube_id={sube_id if sube_id is not None else 'tümü'})"
+        )
+    return len(attached)
+
 # ------ Endpoint'ler ------
 @router.post("/olustur", response_model=AdisyonOut)
 async def adisyon_olustur(
@@ -483,15 +592,14 @@ async def acik_adisyons(
     sube_id: int = Depends(get_sube_id),
 ):
     """Adisyonları listele - durum filtresi ile açık/kapalı/tümü"""
-    import logging
-    
     if durum and durum in ['acik', 'kapali']:
         where_clause = "WHERE sube_id = :sid AND durum = :durum"
         params = {"sid": sube_id, "limit": limit, "durum": durum}
     else:
         where_clause = "WHERE sube_id = :sid"
         params = {"sid": sube_id, "limit": limit}
-    
+
+    # Toplamlar trigger'larla güncel tutulur; burada yeniden hesaplama yapılmaz
     rows = await db.fetch_all(
         f"""
         SELECT * FROM adisyons
@@ -501,35 +609,7 @@ async def acik_adisyons(
         """,
         params,
     )
-    
-    # Sadece açık adisyonların toplamlarını güncelle (kapalı adisyonlar değişmez)
-    for r in rows:
-        adisyon_id = r["id"]
-        try:
-            adisyon_durum = r["durum"] if "durum" in r else "acik"
-        except (KeyError, AttributeError):
-            adisyon_durum = "acik"
-        
-        # Sadece açık adisyonların toplamlarını güncelle
-        if adisyon_durum == "acik":
-            try:
-                await _update_adisyon_totals(adisyon_id, sube_id)
-            except Exception as e:
-                logging.warning(f"[ADISYON] Adisyon #{adisyon_id} toplamları güncellenirken hata: {e}", exc_info=True)
-    
-    # Güncellenmiş verileri tekrar çek (sadece açık adisyonlar güncellendi)
-    if durum == "acik" or not durum:
-        rows = await db.fetch_all(
-            f"""
-            SELECT * FROM adisyons
-            {where_clause}
-            ORDER BY acilis_zamani DESC
-            LIMIT :limit
-            """,
-            params,
-        )
-    # Kapalı adisyonlar için tekrar çekmeye gerek yok, değişmedi
-    
+
     return [
         AdisyonOut(
             id=r["id"],
@@ -583,6 +663,22 @@ async def masa_adisyon(
         created_at=row["created_at"].isoformat() if row["created_at"] else "",
     )
 
+@router.post(
+    "/mutabakat",
+    dependencies=[Depends(require_roles({"admin", "operator"}))]
+)
+async def adisyon_mutabakat(
+    duzelt: bool = Query(True, description="False ise sadece sapma raporu döner"),
+    _: Mapping[str, Any] = Depends(get_current_user),
+    sube_id: int = Depends(get_sube_id),
+):
+    """
+    Şubedeki açık adisyonların artımlı toplamlarını kaynak tablolarla karşılaştırır.
+    Normalde scheduler periyodik olarak çalıştırır; bu uç anında kontrol içindir.
+    """
+    rapor = await _reconcile_adisyon_totals(sube_id, duzelt=duzelt)
+    return {"sapma_sayisi": len(rapor), "duzeltildi": duzelt, "sapmalar": rapor}
+
 @router.get("/{adisyon_id}", response_model=AdisyonOut)
 async def adisyon_detay(
     adisyon_id: int,
@@ -627,6 +723,7 @@ async def adisyon_kapat(
     """
     import logging
     from ..routers.kasa import _finalize_hazir_siparisler
+    from ..services.kitchen_feed import kitchen_publish_after_commit
     
     # Adisyon kontrolü
     adisyon = await db.fetch_one(
@@ -642,7 +739,7 @@ async def adisyon_kapat(
     
     masa = adisyon["masa"]
     
-    async with db.transaction():
+    async with kitchen_publish_after_commit(), db.transaction():
         # Hazir siparişleri finalize et (odendi yap ve stoktan düş)
         finalized_ids = await _finalize_hazir_siparisler(masa, sube_id)
         logging.info(f"Adisyon #{adisyon_id} kapatılıyor: {len(finalized_ids)} sipariş finalize edildi")
@@ -668,8 +765,7 @@ async def adisyon_kapat(
         )
         logging.info(f"Masa '{masa}' durumu 'bos' olarak güncellendi (adisyon #{adisyon_id} kapatıldı)")
 
-        # Toplamları güncelle
-        await _update_adisyon_totals(adisyon_id, sube_id)
+        # Toplamlar siparisler trigger'ı ile (hazir -> odendi) zaten güncellendi
         
         # Cache invalidation: Analytics ve istatistiklerini temizle
         # Önemli: Adisyon kapatıldığında ciro değiştiği için cache'i temizlemeliyiz
@@ -747,9 +843,7 @@ async def adisyon_iskonto(
         },
     )
     
-    # Toplamları güncelle
-    await _update_adisyon_totals(adisyon_id, sube_id)
-
+    # Bakiye, adisyons BEFORE UPDATE trigger'ı ile iskonto sonrası yeniden türetilir
     return {"message": "İskonto oranı güncellendi", "iskonto_orani": iskonto_orani}
 
 @router.get("/{adisyon_id}/detayli", response_model=Dict[str, Any])
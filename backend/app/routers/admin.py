@@ -11,6 +11,8 @@ from ..core.deps import (
     require_roles,
     enforce_user_sube_access,  # şube yetki denetimi için kullanacağız
 )
+from ..core.auth_context import invalidate_auth_context
+from ..services.tenant_usage import record_user_usage
 from ..db.database import db
 
 
@@ -41,49 +43,44 @@ async def resolve_sube_id_or_none(
     sube_id = x_sube_id if x_sube_id is not None else sube_id_q
     
     effective_tenant_id = user.get("switched_tenant_id") or user.get("tenant_id")
+
+    # Aktif şubeler core/branch_access indeksinden çözülür
+    from ..core.branch_access import get_branch_index
+    try:
+        index = await get_branch_index(sube_id=sube_id, tenant_id=effective_tenant_id or None)
+    except Exception as e:
+        logging.error(f"Database error checking sube: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}"
+        )
     
     if effective_tenant_id:
-        if sube_id is not None:
-            check_tid = await db.fetch_val("SELECT id FROM subeler WHERE id = :sid AND isletme_id = :tid", {"sid": sube_id, "tid": effective_tenant_id})
-            if not check_tid:
-                logging.info(f"Sube {sube_id} does not belong to tenant {effective_tenant_id}, falling back to tenant default")
-                sube_id = None
+        if sube_id is not None and index.tenant_of(sube_id) != effective_tenant_id:
+            logging.info(f"Sube {sube_id} does not belong to tenant {effective_tenant_id} (or is not active), falling back to tenant default")
+            sube_id = None
         
         if sube_id is None:
-            first_sube = await db.fetch_val("SELECT id FROM subeler WHERE isletme_id = :tid AND aktif = TRUE ORDER BY id ASC LIMIT 1", {"tid": effective_tenant_id})
-            if first_sube:
-                sube_id = first_sube
+            sube_id = index.first_sube(effective_tenant_id)
 
     if sube_id is None:
         sube_id = 1  # DEMO varsayılanı
+        index = await get_branch_index(sube_id=sube_id)
 
     username = user.get("username", "unknown")
-    logging.info(f"resolve_sube_id_or_none: checking sube_id={sube_id} for username={username}")
+    logging.debug(f"resolve_sube_id_or_none: checking sube_id={sube_id} for username={username}")
     
     # Şube aktif mi?
-    try:
-        row = await db.fetch_one(
-            "SELECT id FROM subeler WHERE id = :id AND aktif = TRUE",
-            {"id": sube_id},
-        )
-        if not row:
-            logging.warning(f"Sube {sube_id} not found or not active")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Geçersiz veya pasif sube_id",
-            )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logging.error(f"Database error checking sube: {e}", exc_info=True)
+    if not index.is_active(sube_id):
+        logging.warning(f"Sube {sube_id} not found or not active")
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Database error: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Geçersiz veya pasif sube_id",
         )
 
     # Kullanıcının bu şubeye erişim izni var mı?
     try:
-        await enforce_user_sube_access(username, sube_id)
+        await enforce_user_sube_access(username, sube_id, role=user.get("role"))
     except HTTPException:
         raise
     except Exception as e:
@@ -270,7 +267,7 @@ async def admin_trend(
     return result
 
 
-# --- 3) Top Ürünler (sepet JSONB içinden) ---
+# --- 3) Top Ürünler (siparis_kalemleri) ---
 @router.get("/top-urunler")
 async def admin_top_urunler(
     gun_say: int = Query(30, ge=1, le=365),
@@ -285,7 +282,7 @@ async def admin_top_urunler(
 ):
     """
     Son N günde en çok satan/ciro yapan ürünler.
-    JSONB sepet -> ürün/adet/fiyat toplama.
+    siparis_kalemleri üzerinden ürün bazında adet/ciro toplama.
     """
     sube_id = await resolve_sube_id_or_none(
         tum_subeler=tum_subeler,
@@ -323,25 +320,17 @@ async def admin_top_urunler(
 
     flt = " AND ".join(flt_clauses) if flt_clauses else "TRUE"
 
-    # adet: SUM((item->>'adet')::numeric)
-    # ciro: SUM((item->>'adet')::numeric * (item->>'fiyat')::numeric)
     order_column = "adet" if metrik == "adet" else "ciro"
 
     q = f"""
-    WITH x AS (
-      SELECT 
-        unaccent(lower(item->>'urun')) AS ad_norm,
-        MAX(item->>'urun') AS urun,
-        SUM((item->>'adet')::numeric) AS adet,
-        SUM((item->>'adet')::numeric * (item->>'fiyat')::numeric) AS ciro
-      FROM siparisler s,
-           LATERAL jsonb_array_elements(s.sepet) AS item
-      WHERE {flt}
-        AND {date_filter}
-      GROUP BY unaccent(lower(item->>'urun'))
-    )
-    SELECT urun, adet, ciro
-    FROM x
+    SELECT
+      (array_agg(s.urun_adi ORDER BY s.created_at DESC))[1] AS urun,
+      SUM(s.adet) AS adet,
+      SUM(s.tutar) AS ciro
+    FROM siparis_kalemleri s
+    WHERE {flt}
+      AND {date_filter}
+    GROUP BY s.urun_key
     ORDER BY {order_column} DESC
     LIMIT :limit
     """
@@ -658,9 +647,15 @@ async def personeller_upsert(payload: UserUpsertIn, user: Dict[str, Any] = Depen
             detail="Super admin rolü atanamaz"
         )
     
+    # Abonelik kullanım sayaçları için kaydın önceki hali
+    onceki = await db.fetch_one(
+        "SELECT tenant_id, aktif FROM users WHERE username = :u",
+        {"u": payload.username},
+    )
+
     if payload.password:
         params["h"] = hash_password(payload.password)
-        await db.execute(
+        sonraki = await db.fetch_one(
             """
             INSERT INTO users (username, sifre_hash, role, aktif, tenant_id)
             VALUES (:u, :h, :r, :a, :tid)
@@ -669,11 +664,12 @@ async def personeller_upsert(payload: UserUpsertIn, user: Dict[str, Any] = Depen
                    aktif = EXCLUDED.aktif,
                    sifre_hash = EXCLUDED.sifre_hash,
                    tenant_id = COALESCE(EXCLUDED.tenant_id, users.tenant_id)
+            RETURNING tenant_id, aktif
             """,
             params,
         )
     else:
-        await db.execute(
+        sonraki = await db.fetch_one(
             """
             INSERT INTO users (username, role, aktif, tenant_id)
             VALUES (:u, :r, :a, :tid)
@@ -681,10 +677,13 @@ async def personeller_upsert(payload: UserUpsertIn, user: Dict[str, Any] = Depen
                SET role = EXCLUDED.role,
                    aktif = EXCLUDED.aktif,
                    tenant_id = COALESCE(EXCLUDED.tenant_id, users.tenant_id)
+            RETURNING tenant_id, aktif
             """,
             params,
         )
     
+    invalidate_auth_context(username=payload.username)
+    await record_user_usage(onceki, sonraki)
     return {"ok": True}
 
 
@@ -6,7 +6,6 @@ from datetime import datetime, timedelta
 from ..core.deps import get_current_user, get_sube_id, require_roles
 from ..core.cache import cache, cache_key
 from ..db.database import db
-import json
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
@@ -42,20 +41,6 @@ class AnalyticsSummary(BaseModel):
 
 
 # ------ Yardımcı Fonksiyonlar ------
-def parse_sepet(sepet_value) -> List[Dict[str, Any]]:
-    """Sepet JSONB'yi parse et"""
-    if sepet_value is None:
-        return []
-    if isinstance(sepet_value, list):
-        return sepet_value
-    if isinstance(sepet_value, str):
-        try:
-            return json.loads(sepet_value)
-        except:
-            return []
-    return []
-
-
 def _get_period_range(
     period: Literal["gunluk", "haftalik", "aylik"],
     reference: Optional[datetime] = None,
@@ -201,86 +186,20 @@ async def en_cok_tercih_edilen_urunler(
             start_date = None
             end_date = None
         
-        # Tüm ödenmiş siparişleri al
-        if start_date and end_date:
-            rows = await db.fetch_all(
-                """
-                SELECT sepet, tutar
-                FROM siparisler
-                WHERE sube_id = :sid
-                  AND durum = 'odendi'
-                  AND created_at >= :start_date
-                  AND created_at < :end_date
-                """,
-                {"sid": sube_id, "start_date": start_date, "end_date": end_date},
-            )
-        else:
-            rows = await db.fetch_all(
-                """
-                SELECT sepet, tutar
-                FROM siparisler
-                WHERE sube_id = :sid
-                  AND durum = 'odendi'
-                """,
-                {"sid": sube_id},
-            )
-        
-        # Ürün bazında toplama
-        product_stats: Dict[str, Dict[str, Any]] = {}
-        
-        for row in rows:
-            sepet = parse_sepet(row["sepet"])
-            siparis_tutar = float(row["tutar"] or 0)
-            
-            for item in sepet:
-                urun_adi = str(item.get("urun") or item.get("ad") or "").strip()
-                if not urun_adi:
-                    continue
-                
-                adet = int(item.get("adet") or 1)
-                # Ürün fiyatını hesapla (sepet içindeki fiyat varsa onu kullan, yoksa sipariş tutarını adetlere böl)
-                item_fiyat = float(item.get("fiyat") or 0)
-                if item_fiyat == 0 and len(sepet) > 0:
-                    # Sipariş tutarını adetlere böl
-                    toplam_adet = sum(int(i.get("adet") or 1) for i in sepet)
-                    if toplam_adet > 0:
-                        item_fiyat = siparis_tutar / toplam_adet
-                
-                if urun_adi not in product_stats:
-                    product_stats[urun_adi] = {
-                        "satis_adeti": 0,
-                        "toplam_tutar": 0.0,
-                        "kategori": None,
-                    }
-                
-                product_stats[urun_adi]["satis_adeti"] += adet
-                product_stats[urun_adi]["toplam_tutar"] += item_fiyat * adet
-        
-        # Kategorileri al
-        menu_rows = await db.fetch_all(
-            """
-            SELECT DISTINCT ad, kategori
-            FROM menu
-            WHERE sube_id = :sid AND aktif = TRUE
-            """,
-            {"sid": sube_id},
-        )
-        kategori_map = {r["ad"]: r["kategori"] for r in menu_rows}
-        
-        # Sonuçları hazırla ve sırala
-        result = []
-        for urun_adi, stats in product_stats.items():
-            result.append({
-                "urun_adi": urun_adi,
-                "satis_adeti": stats["satis_adeti"],
-                "toplam_tutar": round(stats["toplam_tutar"], 2),
-                "kategori": kategori_map.get(urun_adi),
-            })
-        
-        # Satış adedine göre sırala
-        result.sort(key=lambda x: x["satis_adeti"], reverse=True)
-        
-        return result[:limit]
+        # Ödenmiş siparişlerin ürün toplamları günlük özetten (daily_product_sales)
+        from ..services.product_sales_rollup import product_sales_summary
+
+        rows = await product_sales_summary(sube_id, start=start_date, end=end_date, limit=limit)
+        result = [
+            {
+                "urun_adi": r["urun_adi"],
+                "satis_adeti": r["adet"],
+                "toplam_tutar": round(r["ciro"], 2),
+                "kategori": r["kategori"],
+            }
+            for r in rows
+        ]
+        return result
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Hata: {str(e)}")
@@ -341,31 +260,21 @@ async def analytics_ozet(
         toplam_ciro = float(total_row["toplam_ciro"] or 0.0)
         ortalama_sepet = round(toplam_ciro / siparis_sayisi, 2) if siparis_sayisi else 0.0
 
-        popular_rows = await db.fetch_all(
+        populer_row = await db.fetch_one(
             """
-            SELECT sepet
-            FROM siparisler
-            WHERE sube_id = :sid 
+            SELECT (array_agg(urun_adi ORDER BY created_at DESC))[1] AS urun_adi
+            FROM siparis_kalemleri
+            WHERE sube_id = :sid
               AND durum = 'odendi'
               AND created_at >= :start_date
               AND created_at < :end_date
-            LIMIT 500
+            GROUP BY urun_key
+            ORDER BY SUM(adet) DESC, urun_key ASC
+            LIMIT 1
             """,
             common_params,
         )
-
-        product_counts: Dict[str, int] = {}
-        for row in popular_rows:
-            sepet = parse_sepet(row["sepet"])
-            for item in sepet:
-                urun_adi = str(item.get("urun") or item.get("ad") or "").strip()
-                if urun_adi:
-                    adet = int(item.get("adet") or 1)
-                    product_counts[urun_adi] = product_counts.get(urun_adi, 0) + adet
-
-        en_populer = None
-        if product_counts:
-            en_populer = max(product_counts.items(), key=lambda x: x[1])[0]
+        en_populer = populer_row["urun_adi"] if populer_row else None
 
         payment_rows = await db.fetch_all(
             """
@@ -399,47 +308,30 @@ async def analytics_ozet(
 
         ikram_rows = await db.fetch_all(
             """
-            SELECT sepet
-            FROM siparisler
+            SELECT
+                (array_agg(urun_adi ORDER BY created_at DESC))[1] AS urun_adi,
+                SUM(adet)::int AS adet,
+                SUM(CASE WHEN ikram_tutar > 0 THEN ikram_tutar ELSE adet * birim_fiyat END)::float AS tutar
+            FROM siparis_kalemleri
             WHERE sube_id = :sid
+              AND ikram
               AND durum = 'odendi'
               AND created_at >= :start_date
               AND created_at < :end_date
+            GROUP BY urun_key
+            ORDER BY tutar DESC, adet DESC
             """,
             common_params,
         )
-        toplam_ikram = 0.0
-        ikram_map: Dict[str, Dict[str, Any]] = {}
-        for row in ikram_rows:
-            sepet = parse_sepet(row["sepet"])
-            for item in sepet:
-                ikram_flag = item.get("ikram")
-                if not ikram_flag:
-                    continue
-                if isinstance(ikram_flag, str) and ikram_flag.strip().lower() in {"false", "0", "hayır", "hayir", "no"}:
-                    continue
-
-                urun_adi = str(item.get("urun") or item.get("ad") or "").strip() or "İkram"
-                adet = int(item.get("adet") or 1)
-                tutar = float(item.get("ikram_edilen_tutar") or 0)
-                if tutar == 0:
-                    fiyat = float(item.get("fiyat") or 0)
-                    tutar = fiyat * adet
-                toplam_ikram += tutar
-
-                stats = ikram_map.setdefault(urun_adi, {"adet": 0, "tutar": 0.0})
-                stats["adet"] += adet
-                stats["tutar"] += tutar
-
+        toplam_ikram = round(sum(float(r["tutar"] or 0) for r in ikram_rows), 2)
         en_cok_ikram = None
-        if ikram_map:
-            urun_adi, stats = max(ikram_map.items(), key=lambda x: (x[1]["tutar"], x[1]["adet"]))
+        if ikram_rows:
+            top = ikram_rows[0]
             en_cok_ikram = {
-                "urun_adi": urun_adi,
-                "adet": stats["adet"],
-                "tutar": round(stats["tutar"], 2),
+                "urun_adi": top["urun_adi"] or "İkram",
+                "adet": int(top["adet"] or 0),
+                "tutar": round(float(top["tutar"] or 0), 2),
             }
-        toplam_ikram = round(toplam_ikram, 2)
 
         masa_avg_row = await db.fetch_one(
             """
@@ -100,30 +100,32 @@ async def get_product_profitability(
 
     **Yetkiler:** super_admin, admin
     """
-    # Tarih aralığını belirle
+    # Tarih aralığını belirle (özet gün çözünürlüğünde; bitiş günü dahil)
     if start_date and end_date:
-        start_dt = datetime.fromisoformat(start_date)
-        end_dt = datetime.fromisoformat(end_date) + timedelta(days=1)  # End of day
+        start_day = datetime.fromisoformat(start_date).date()
+        end_day = datetime.fromisoformat(end_date).date() + timedelta(days=1)
     else:
-        start_dt = datetime.now() - timedelta(days=days)
-        end_dt = datetime.now()
+        start_day = (datetime.now() - timedelta(days=days)).date()
+        end_day = datetime.now().date() + timedelta(days=1)
 
     query = """
     WITH product_sales AS (
+        -- Ödenmiş sipariş kalemleri günlük özetten (daily_product_sales)
         SELECT
-            si->>'urun' AS urun_adi,
-            (si->>'adet')::int AS adet,
-            (si->>'fiyat')::numeric AS fiyat
-        FROM siparisler s
-        CROSS JOIN LATERAL jsonb_array_elements(s.sepet) AS si
-        WHERE s.sube_id = :sube_id
-          AND s.created_at >= :start_dt
-          AND s.created_at < :end_dt
-          AND s.durum = 'odendi'
+            d.urun_key,
+            (array_agg(d.urun_adi ORDER BY d.gun DESC))[1] AS urun_adi,
+            (array_agg(d.kategori ORDER BY d.gun DESC) FILTER (WHERE d.kategori IS NOT NULL))[1] AS kategori,
+            SUM(d.adet) AS adet,
+            SUM(d.ciro) AS ciro
+        FROM daily_product_sales d
+        WHERE d.sube_id = :sube_id
+          AND d.gun >= :start_day
+          AND d.gun < :end_day
+        GROUP BY d.urun_key
     ),
     product_costs AS (
         SELECT
-            r.urun,
+            neso_urun_key(r.urun) AS urun_key,
             SUM(
                 CASE 
                     WHEN (LOWER(TRIM(r.birim)) IN ('gr', 'gram') AND LOWER(TRIM(sk.birim)) IN ('kg', 'kilo', 'kilogram'))
@@ -133,25 +135,29 @@ async def get_product_profitability(
                 END
             ) AS maliyet_per_unit
         FROM receteler r
-        JOIN stok_kalemleri sk ON sk.ad = r.stok AND sk.sube_id = r.sube_id
+        JOIN stok_kalemleri sk ON sk.id = r.stok_id
         WHERE r.sube_id = :sube_id
-        GROUP BY r.urun
+        GROUP BY neso_urun_key(r.urun)
     ),
     aggregated AS (
         SELECT
             ps.urun_adi,
-            m.kategori,
-            SUM(ps.adet) AS toplam_satis_adedi,
-            SUM(ps.adet * ps.fiyat) AS toplam_ciro,
-            COALESCE(SUM(ps.adet * COALESCE(pc.maliyet_per_unit, direct_sk.alis_fiyat)), 0) AS maliyet_toplam,
-            AVG(ps.fiyat) AS ortalama_satis_fiyati,
-            COALESCE(AVG(COALESCE(pc.maliyet_per_unit, direct_sk.alis_fiyat)), 0) AS ortalama_maliyet
+            ps.kategori,
+            ps.adet AS toplam_satis_adedi,
+            ps.ciro AS toplam_ciro,
+            COALESCE(ps.adet * COALESCE(pc.maliyet_per_unit, direct_sk.alis_fiyat), 0) AS maliyet_toplam,
+            CASE WHEN ps.adet > 0 THEN ps.ciro / ps.adet ELSE 0 END AS ortalama_satis_fiyati,
+            COALESCE(pc.maliyet_per_unit, direct_sk.alis_fiyat, 0) AS ortalama_maliyet
         FROM product_sales ps
-        LEFT JOIN menu m ON LOWER(TRIM(m.ad)) = LOWER(TRIM(ps.urun_adi)) AND m.sube_id = :sube_id
-        LEFT JOIN product_costs pc ON LOWER(TRIM(pc.urun)) = LOWER(TRIM(ps.urun_adi))
-        LEFT JOIN stok_kalemleri direct_sk ON LOWER(TRIM(direct_sk.ad)) = LOWER(TRIM(ps.urun_adi)) AND direct_sk.sube_id = :sube_id
-        GROUP BY ps.urun_adi, m.kategori
-        HAVING SUM(ps.adet) >= :min_sales
+        LEFT JOIN product_costs pc ON pc.urun_key = ps.urun_key
+        LEFT JOIN LATERAL (
+            SELECT sk.alis_fiyat
+            FROM stok_kalemleri sk
+            WHERE sk.sube_id = :sube_id AND neso_urun_key(sk.ad) = ps.urun_key
+            ORDER BY sk.id DESC
+            LIMIT 1
+        ) direct_sk ON TRUE
+        WHERE ps.adet >= :min_sales
     )
     SELECT
         urun_adi,
@@ -172,8 +178,8 @@ async def get_product_profitability(
 
     rows = await db.fetch_all(query, {
         "sube_id": sube_id,
-        "start_dt": start_dt,
-        "end_dt": end_dt,
+        "start_day": start_day,
+        "end_day": end_day,
         "min_sales": min_sales,
     })
 
@@ -302,17 +308,17 @@ async def get_personnel_performance(
         GROUP BY 1,2,3
     ),
     top_products AS (
-        SELECT username,
-               si->>'urun' AS urun,
+        SELECT u.username AS username,
+               MAX(k.urun_adi) AS urun,
                COUNT(*) AS adet
         FROM siparisler s
         LEFT JOIN users u ON u.id = s.created_by_user_id
-        CROSS JOIN LATERAL jsonb_array_elements(s.sepet) AS si
+        JOIN siparis_kalemleri k ON k.siparis_id = s.id
         WHERE s.sube_id = :sube_id
           AND s.created_at >= :start_dt
           AND s.created_at < :end_dt
           AND s.durum = 'odendi'
-        GROUP BY username, si->>'urun'
+        GROUP BY u.username, k.urun_key
     ),
     top_products_ranked AS (
         SELECT DISTINCT ON (username)
@@ -467,13 +473,13 @@ async def get_customer_behavior(
     top_products_per_customer AS (
         SELECT DISTINCT ON (s.masa)
             s.masa,
-            si->>'urun' AS en_cok_siparis
+            MAX(k.urun_adi) AS en_cok_siparis
         FROM siparisler s
-        CROSS JOIN LATERAL jsonb_array_elements(s.sepet) AS si
+        JOIN siparis_kalemleri k ON k.siparis_id = s.id
         WHERE s.sube_id = :sube_id
           AND s.created_at >= :start_dt
           AND s.created_at < :end_dt
-        GROUP BY s.masa, si->>'urun'
+        GROUP BY s.masa, k.urun_key
         ORDER BY s.masa, COUNT(*) DESC
     )
     SELECT
@@ -512,15 +518,14 @@ async def get_customer_behavior(
     # Get popular items across all customers
     popular_items_query = """
     SELECT
-        si->>'urun' AS item_name,
-        SUM((si->>'adet')::int) AS order_count
-    FROM siparisler s
-    CROSS JOIN LATERAL jsonb_array_elements(s.sepet) AS si
-    WHERE s.sube_id = :sube_id
-      AND s.created_at >= :start_dt
-      AND s.created_at < :end_dt
-      AND s.durum = 'odendi'
-    GROUP BY item_name
+        MAX(k.urun_adi) AS item_name,
+        SUM(k.adet)::int AS order_count
+    FROM siparis_kalemleri k
+    WHERE k.sube_id = :sube_id
+      AND k.created_at >= :start_dt
+      AND k.created_at < :end_dt
+      AND k.durum = 'odendi'
+    GROUP BY k.urun_key
     ORDER BY order_count DESC
     LIMIT 10
     """
@@ -592,17 +597,15 @@ async def get_category_analysis(
         SELECT
             COALESCE(m.kategori, 'Diğer') AS kategori,
             COUNT(DISTINCT m.id) AS urun_sayisi,
-            SUM((si->>'adet')::int) AS toplam_satis,
-            SUM((si->>'adet')::int * (si->>'fiyat')::numeric) AS toplam_ciro,
-            AVG((si->>'fiyat')::numeric) AS ortalama_fiyat
-        FROM siparisler s
-        CROSS JOIN LATERAL jsonb_array_elements(s.sepet) AS si
-        LEFT JOIN menu m ON LOWER(TRIM(m.ad)) = LOWER(TRIM(si->>'urun'))
-            AND m.sube_id = s.sube_id
-        WHERE s.sube_id = :sube_id
-          AND s.created_at >= :start_dt
-          AND s.created_at < :end_dt
-          AND s.durum = 'odendi'
+            SUM(k.adet) AS toplam_satis,
+            SUM(k.tutar) AS toplam_ciro,
+            AVG(k.birim_fiyat) AS ortalama_fiyat
+        FROM siparis_kalemleri k
+        LEFT JOIN menu m ON m.id = k.menu_id
+        WHERE k.sube_id = :sube_id
+          AND k.created_at >= :start_dt
+          AND k.created_at < :end_dt
+          AND k.durum = 'odendi'
         GROUP BY kategori
     ),
     total_revenue AS (
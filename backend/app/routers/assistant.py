@@ -47,6 +47,11 @@ import re
 from ..services.data_access import resolve_data_query, DataQueryRequest
 from ..services.data_access.exceptions import DataAccessError
 from ..services.context_manager import context_manager
+from ..services.conversation_store import ConversationSession, conversation_store
+from ..services.menu_snapshot import get_menu_snapshot
+from ..services.assistant_knowledge import get_assistant_knowledge, invalidate_assistant_knowledge
+from ..services.response_cache import content_fingerprint, response_cache
+from ..services.chat_streaming import ChatStream, start_chat_turn
 from ..services.nlp.intents import intent_classifier, IntentResult
 from ..rules.engine import evaluate_rules
 from ..utils.text_matching import closest_match
@@ -315,16 +320,10 @@ async def parse_order(
     _: Dict[str, Any] = Depends(get_current_user),
     sube_id: int = Depends(get_sube_id),
 ):
-    rows = await db.fetch_all(
-        "SELECT ad, fiyat FROM menu WHERE aktif = TRUE AND sube_id = :sid;",
-        {"sid": sube_id},
-    )
-    price_map: Dict[str, float] = {}
-    name_map: Dict[str, str] = {}
-    for r in rows:
-        k = normalize_name(r["ad"])
-        price_map[k] = float(r["fiyat"]) if r["fiyat"] is not None else 0.0
-        name_map[k] = r["ad"]
+    # Fiyat ve ad haritaları şube menü snapshot'ından (salt-okunur)
+    menu_snapshot = await get_menu_snapshot(sube_id)
+    price_map: Dict[str, float] = menu_snapshot.price_map
+    name_map: Dict[str, str] = menu_snapshot.name_map
     pairs = _extract_candidates(payload.text)
 
     # eşleşme: normalize ederek menü anahtarlarına bak
@@ -378,16 +377,10 @@ async def create_order_from_text(
 ):
     try:
         # Parse order manually (aynı mantık ama bağımsız çalıştır)
-        rows = await db.fetch_all(
-            "SELECT ad, fiyat FROM menu WHERE aktif = TRUE AND sube_id = :sid;",
-            {"sid": sube_id},
-        )
-        price_map: Dict[str, float] = {}
-        name_map: Dict[str, str] = {}
-        for r in rows:
-            k = normalize_name(r["ad"])
-            price_map[k] = float(r["fiyat"]) if r["fiyat"] is not None else 0.0
-            name_map[k] = r["ad"]
+        # Fiyat ve ad haritaları şube menü snapshot'ından (salt-okunur)
+        menu_snapshot = await get_menu_snapshot(sube_id)
+        price_map: Dict[str, float] = menu_snapshot.price_map
+        name_map: Dict[str, str] = menu_snapshot.name_map
         
         pairs = _extract_candidates(payload.text)
         aggregated: Dict[str, int] = {}
@@ -421,29 +414,34 @@ async def create_order_from_text(
         tutar = sum(i["adet"] * i["fiyat"] for i in sepet)
 
         # Adisyon sistemi: Masada açık adisyon varsa al, yoksa oluştur
-        from ..routers.adisyon import _get_or_create_adisyon, _update_adisyon_totals
+        from ..routers.adisyon import _get_or_create_adisyon
         adisyon_id = await _get_or_create_adisyon(payload.masa, sube_id)
 
         row = await db.fetch_one(
             """
             INSERT INTO siparisler (sube_id, masa, adisyon_id, sepet, durum, tutar)
             VALUES (:sid, :masa, :adisyon_id, CAST(:sepet AS JSONB), 'yeni', :tutar)
-            RETURNING id, masa, durum, tutar, created_at
+            RETURNING id, masa, durum, tutar, created_at, mutfak_seq
             """,
             {"sid": sube_id, "masa": payload.masa, "adisyon_id": adisyon_id, "sepet": json.dumps(sepet, ensure_ascii=False), "tutar": tutar},
         )
+        # Mutfak ekranları: kompakt delta + replay cursor
+        from ..services.kitchen_feed import publish_kitchen_orders
+        await publish_kitchen_orders(sube_id, [row], event_type="new_order", sepet=sepet)
         try:
             from ..websocket.manager import manager
             import asyncio
             asyncio.create_task(manager.broadcast({
                 "type": "new_order",
                 "message": f"Yeni sipariş",
-                "masa": payload.masa
+                "masa": payload.masa,
+                "sube_id": sube_id
             }, topic="orders"))
             asyncio.create_task(manager.broadcast({
                 "type": "masa_status_change",
                 "masa_adi": payload.masa,
-                "durum": "dolu"
+                "durum": "dolu",
+                "sube_id": sube_id
             }, topic="orders"))
             # Update table to full if it's currently empty or reserved
             await db.execute(
@@ -455,11 +453,7 @@ async def create_order_from_text(
             logging.error(f"WebSocket event error: {e}")
 
         
-        # Adisyon toplamlarını güncelle
-        try:
-            await _update_adisyon_totals(adisyon_id, sube_id)
-        except Exception as e:
-            logging.warning(f"Adisyon toplamları güncellenirken hata: {e}", exc_info=True)
+        # Adisyon toplamları siparisler trigger'ı ile artımlı güncellenir
         
         if not row:
             raise HTTPException(status_code=500, detail="Sipariş kaydedilemedi")
@@ -495,21 +489,14 @@ async def recommend(
     sube_id: int = Depends(get_sube_id),
 ):
     q = """
-    WITH z AS (
-      SELECT lower(unaccent(trim(si->>'urun'))) AS urun_norm,
-             (si->>'adet')::int AS adet,
-             (si->>'fiyat')::numeric AS fiyat
-      FROM siparisler s
-      CROSS JOIN LATERAL jsonb_array_elements(s.sepet) AS si
-      WHERE s.sube_id = :sid
-        AND s.created_at >= (NOW() - make_interval(days => :gun))
-        AND s.durum <> 'iptal'
-    )
-    SELECT urun_norm AS urun,
+    SELECT urun_key AS urun,
            SUM(adet)::int AS adet,
-           SUM(adet * fiyat)::float AS ciro
-    FROM z
-    GROUP BY urun_norm
+           SUM(tutar)::float AS ciro
+    FROM siparis_kalemleri
+    WHERE sube_id = :sid
+      AND created_at >= (NOW() - make_interval(days => :gun))
+      AND durum <> 'iptal'
+    GROUP BY urun_key
     ORDER BY adet DESC, ciro DESC
     LIMIT :limit
     """
@@ -532,17 +519,10 @@ class PublicCreateIn(BaseModel):
 @router.post("/public/siparis")
 async def public_create_order(payload: PublicCreateIn):
     sube_id = int(payload.sube_id or 1)
-    # Build price and name maps
-    rows = await db.fetch_all(
-        "SELECT ad, fiyat FROM menu WHERE aktif = TRUE AND sube_id = :sid;",
-        {"sid": sube_id},
-    )
-    price_map: Dict[str, float] = {}
-    name_map: Dict[str, str] = {}
-    for r in rows:
-        k = normalize_name(r["ad"])  # normalize key
-        price_map[k] = float(r["fiyat"]) if r["fiyat"] is not None else 0.0
-        name_map[k] = r["ad"]
+    # Fiyat ve ad haritaları şube menü snapshot'ından (salt-okunur)
+    menu_snapshot = await get_menu_snapshot(sube_id)
+    price_map: Dict[str, float] = menu_snapshot.price_map
+    name_map: Dict[str, str] = menu_snapshot.name_map
 
     pairs = _extract_candidates(payload.text)
     aggregated: Dict[str, int] = {}
@@ -568,22 +548,27 @@ async def public_create_order(payload: PublicCreateIn):
         """
         INSERT INTO siparisler (sube_id, masa, sepet, durum, tutar)
         VALUES (:sid, :masa, CAST(:sepet AS JSONB), 'yeni', :tutar)
-        RETURNING id, masa, durum, tutar, created_at
+        RETURNING id, masa, durum, tutar, created_at, mutfak_seq
         """,
         {"sid": sube_id, "masa": payload.masa, "sepet": json_dumps(sepet), "tutar": tutar},
     )
+    # Mutfak ekranları: kompakt delta + replay cursor
+    from ..services.kitchen_feed import publish_kitchen_orders
+    await publish_kitchen_orders(sube_id, [row], event_type="new_order", sepet=sepet)
     try:
         from ..websocket.manager import manager
         import asyncio
         asyncio.create_task(manager.broadcast({
             "type": "new_order",
             "message": f"Yeni sipariş",
-            "masa": payload.masa
+            "masa": payload.masa,
+            "sube_id": sube_id
         }, topic="orders"))
         asyncio.create_task(manager.broadcast({
             "type": "masa_status_change",
             "masa_adi": payload.masa,
-            "durum": "dolu"
+            "durum": "dolu",
+            "sube_id": sube_id
         }, topic="orders"))
         await db.execute(
             "UPDATE masalar SET durum = 'dolu' WHERE masa_adi = :masa AND sube_id = :sid AND durum IN ('bos', 'rezerve')",
@@ -649,9 +634,10 @@ async def _build_chat_response(
     conversation_id: Optional[str] = None,
     detected_language: Optional[str] = None,
     tenant_id: Optional[int] = None,
+    synthesize: bool = True,
 ) -> ChatResponse:
     audio_base64: Optional[str] = None
-    if settings.ASSISTANT_ENABLE_TTS and reply:
+    if settings.ASSISTANT_ENABLE_TTS and synthesize and reply:
         try:
             logging.info(f"[TTS_REQUEST] Generating audio for reply (length: {len(reply)})")
             audio_bytes = await synthesize_speech(
@@ -681,11 +667,6 @@ async def _build_chat_response(
 
 
 _fallback_stock: Dict[Tuple[int, str], float] = {}
-_chat_sessions: Dict[str, List[Dict[str, str]]] = {}
-_session_languages: Dict[str, str] = {}  # conversation_id -> language code
-_pending_aggregated: Dict[str, Dict[str, int]] = {}  # conversation_id -> aggregated items waiting for variation
-_pending_variations: Dict[str, List[Dict[str, Any]]] = {}  # conversation_id -> varyasyon bekleyen ürünler listesi
-SESSION_MAX_MESSAGES = 20
 
 
 HUNGER_HINTS = {
@@ -1267,78 +1248,29 @@ def _normalize_stock_key(name: str) -> str:
 
 
 async def _load_menu_details(sube_id: int) -> List[Dict[str, Any]]:
-    # N+1 query düzeltmesi: Tek JOIN sorgusu ile tüm varyasyonları getir
-    rows = await db.fetch_all(
-        """
-        SELECT
-            m.id,
-            m.ad,
-            m.fiyat,
-            m.kategori,
-            m.aciklama,
-            NULL::numeric as stok_miktari,
-            NULL::numeric as stok_min,
-            NULL::numeric as stok_kritik,
-            NULL::text as stok_birim,
-            mv.id as var_id, mv.ad as var_ad, mv.ek_fiyat as var_ek_fiyat, mv.sira as var_sira
-        FROM menu m
-        LEFT JOIN menu_varyasyonlar mv ON m.id = mv.menu_id AND mv.aktif = TRUE
-        WHERE m.aktif = TRUE AND m.sube_id = :sid
-        ORDER BY m.kategori NULLS LAST, m.ad ASC, mv.sira ASC, mv.ad ASC
-        """,
-        {"sid": sube_id},
-    )
-    
-    # Grupla: menu_id -> variations list
-    items_dict: Dict[int, Dict[str, Any]] = {}
-    for r in rows:
-        menu_id = r["id"]
-        if menu_id not in items_dict:
-            key = normalize_name(r["ad"])
-            raw_stock_value = r["stok_miktari"]
-            stock_birim = (r["stok_birim"] or "").strip()
-            raw_stock_min = r["stok_min"]
-            stock_kritik = r["stok_kritik"]
-            stock_value: Optional[float]
-            try:
-                stock_value = float(raw_stock_value) if raw_stock_value is not None else None
-            except (TypeError, ValueError):
-                stock_value = None
-            # View stok bilgisi yoksa 0 döndürüyor; gerçek stok bilinmiyorsa None bırak
-            if (
-                stock_value == 0
-                and not stock_birim
-                and (raw_stock_min is None or raw_stock_min == 0)
-                and (stock_kritik is None or stock_kritik == 0)
-            ):
-                stock_value = None
-            try:
-                stock_min_value = float(raw_stock_min) if raw_stock_min is not None else None
-            except (TypeError, ValueError):
-                stock_min_value = None
-            items_dict[menu_id] = {
-                "id": menu_id,
-                "ad": r["ad"],
-                "fiyat": float(r["fiyat"] or 0),
-                "kategori": r["kategori"] or "",
-                "key": key,
-                "aciklama": (r["aciklama"] or "").strip(),
-                "stok_miktari": stock_value,
-                "stok_min": stock_min_value,
-                "stok_kritik": stock_kritik,
-                "stok_birim": stock_birim,
-                "varyasyonlar": []
-            }
-        
-        # Varyasyon varsa ekle
-        if r["var_id"]:
-            items_dict[menu_id]["varyasyonlar"].append({
-                "id": r["var_id"],
-                "ad": r["var_ad"],
-                "ek_fiyat": float(r["var_ek_fiyat"] or 0)
-            })
-    
-    items_list = list(items_dict.values())
+    # Menü + varyasyonlar şube snapshot'ından; çağıranlar item'ları zenginleştirdiği
+    # için (ingredients, stock_status_text) snapshot'ın kopyası döndürülür
+    snapshot = await get_menu_snapshot(sube_id)
+    items_list: List[Dict[str, Any]] = []
+    for snap_item in snapshot.items:
+        items_list.append({
+            "id": snap_item["id"],
+            "ad": snap_item["ad"],
+            "fiyat": snap_item["fiyat"],
+            "kategori": snap_item["kategori"],
+            "key": snap_item["key"],
+            "aciklama": snap_item["aciklama"],
+            # Menü tablosunda stok bilgisi yok; gerçek stok bilinmiyorsa None (fallback aşağıda)
+            "stok_miktari": None,
+            "stok_min": None,
+            "stok_kritik": None,
+            "stok_birim": "",
+            "varyasyonlar": [
+                {"id": v["id"], "ad": v["ad"], "ek_fiyat": v["ek_fiyat"]}
+                for v in snap_item["varyasyonlar"]
+            ],
+        })
+
     fallback_stock = _ensure_fallback_stock(sube_id, [item["key"] for item in items_list])
     for item in items_list:
         if item.get("stok_miktari") is None:
@@ -1349,16 +1281,17 @@ async def _load_menu_details(sube_id: int) -> List[Dict[str, Any]]:
 async def _load_stock_map(sube_id: int) -> Tuple[Dict[str, float], Dict[str, bool]]:
     try:
         rows = await db.fetch_all(
-            "SELECT kod, miktar FROM stok_kalemleri WHERE sube_id = :sid;",
+            "SELECT ad, mevcut FROM stok_kalemleri WHERE sube_id = :sid;",
             {"sid": sube_id},
         )
-    except Exception:
+    except Exception as e:
+        logging.warning(f"[STOCK] Stok haritası okunamadı (sube_id={sube_id}): {e}")
         return {}, {}
     stock_map: Dict[str, float] = {}
     has_db_key: Dict[str, bool] = {}
     for r in rows:
-        key = _normalize_stock_key(r["kod"])
-        stock_map[key] = float(r["miktar"] or 0)
+        key = _normalize_stock_key(r["ad"])
+        stock_map[key] = float(r["mevcut"] or 0)
         has_db_key[key] = True
     return stock_map, has_db_key
 
@@ -1609,19 +1542,6 @@ def _build_menu_knowledge(items: List[Dict[str, Any]], attr_map: Dict[str, Dict[
     return "\n".join(lines)
 
 
-def _session_messages(conversation_id: str) -> List[Dict[str, str]]:
-    if conversation_id not in _chat_sessions:
-        _chat_sessions[conversation_id] = []
-    return _chat_sessions[conversation_id]
-
-
-def _append_session(conversation_id: str, role: str, content: str) -> None:
-    session = _session_messages(conversation_id)
-    session.append({"role": role, "content": content})
-    if len(session) > SESSION_MAX_MESSAGES:
-        del session[: len(session) - SESSION_MAX_MESSAGES]
-
-
 def _format_menu_summary(items: List[Dict[str, Any]]) -> str:
     if not items:
         return "Su an menude aktif urun bulunmuyor."
@@ -1756,7 +1676,8 @@ async def handle_voice_command(
         # Dil algılama: Önce conversation'dan önceki dili al, yoksa varsayılan tr kullan
         stt_language = "tr-TR"  # Default
         if conversation_id:
-            previous_lang = _session_languages.get(conversation_id)
+            known_session = await conversation_store.load(conversation_id, create=False)
+            previous_lang = known_session.language if known_session else None
             if previous_lang:
                 stt_language = _STT_LANG_MAP.get(previous_lang, "tr-TR")
         
@@ -1792,27 +1713,55 @@ async def handle_voice_command(
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_smart(payload: ChatRequest):
+    return await chat_smart_turn(payload)
+
+
+@router.post("/chat/stream")
+async def chat_smart_stream(payload: ChatRequest):
+    """
+    /chat'in akışlı (SSE) sürümü: LLM token'ları geldikçe iletilir, cümle bazlı TTS
+    yanıt akarken başlar (olaylar için bkz. services/chat_streaming).
+    """
+    stream = ChatStream(assistant_type="customer")
+
+    async def turn() -> Tuple[str, Dict[str, Any]]:
+        response = await chat_smart_turn(payload, stream=stream)
+        return response.reply, response.dict(exclude={"audio_base64"})
+
+    start_chat_turn(stream, turn())
+    return StreamingResponse(stream.events(), media_type="text/event-stream")
+
+
+async def chat_smart_turn(payload: ChatRequest, stream: Optional[ChatStream] = None) -> ChatResponse:
+    """
+    Akıllı sohbetin bir turu (/chat, /chat/stream ve customer-assistant ortak).
+    stream verilirse LLM yanıtı provider.chat_stream ile token token stream'e akar ve
+    yanıttaki tüm-metin TTS'i atlanır (sesi stream cümle cümle üretir).
+    """
     logging.info("[CHAT] Version 2.1 - Smart Intelligence Active")
+    # Konuşma kaydı (geçmiş, dil, bekleyen varyasyonlar); tur sonunda finally'de yazılır
+    session: Optional[ConversationSession] = None
     try:
         text = (payload.text or "").strip()
         if not text:
             raise HTTPException(status_code=400, detail="Bos metin")
 
         conversation_id = payload.conversation_id or uuid4().hex
-        history_snapshot = list(_session_messages(conversation_id))
+        session = await conversation_store.load(conversation_id)
+        history_snapshot = session.history()
 
         # Dil algılama - müşterinin diline göre cevap ver
         detected_lang = _detect_language(text)
     
         # Konuşma geçmişinde dil varsa kontrol et
-        previous_lang = _session_languages.get(conversation_id, None)
+        previous_lang = session.language
         if previous_lang and detected_lang != previous_lang:
             # Müşteri farklı bir dilde yazmaya başladı, dili değiştir
             logging.info(f"[LANGUAGE] Language changed from {previous_lang} to {detected_lang} for conversation {conversation_id}")
-            _session_languages[conversation_id] = detected_lang
+            session.language = detected_lang
         elif not previous_lang:
             # İlk mesaj veya dil belirlenmemiş, algılanan dili kullan
-            _session_languages[conversation_id] = detected_lang
+            session.language = detected_lang
         else:
             # Aynı dil, önceki dili kullan
             detected_lang = previous_lang
@@ -1831,6 +1780,8 @@ async def chat_smart(payload: ChatRequest):
                 sube_dict = dict(sube_row) if hasattr(sube_row, 'keys') else sube_row
                 tenant_id = sube_dict.get("isletme_id")
                 logging.info(f"[CHAT] sube_id={sube_id}, tenant_id={tenant_id}")
+            if stream is not None:
+                stream.configure(language=detected_lang, tenant_id=tenant_id)
         except Exception as e:
             logging.warning(f"[CHAT] Failed to get tenant_id from sube_id={sube_id}: {e}")
 
@@ -1878,9 +1829,12 @@ async def chat_smart(payload: ChatRequest):
                 context_lines.append(f"STRUCTURED INTENT DATA: {reply_override}")
             if suggestions_override:
                 suggestions = suggestions_override
+        # Menü, reçete, stok, özellik haritası ve prompt şube snapshot'ından (paylaşımlı, salt-okunur)
+        knowledge = await get_assistant_knowledge(sube_id)
+        business_profile = knowledge.business_profile
+        menu_items = knowledge.items
+
         if text_clean_pure in simple_greetings_exact and not hunger_signal:
-            business_profile = await _load_business_profile(sube_id)
-            menu_items = await _load_menu_details(sube_id)
             if menu_items:
                 sample = _pick_menu_samples(menu_items, 4)
                 isletme_ad = business_profile.get("isletme_ad") if business_profile else None
@@ -1889,52 +1843,28 @@ async def chat_smart(payload: ChatRequest):
                 context_lines.append(greeting_context)
                 suggestions = sample
 
-        business_profile = await _load_business_profile(sube_id)
-        menu_items = await _load_menu_details(sube_id)
         if not menu_items:
             reply = "Şu an menümüzde ürün bulunamadı. Lütfen daha sonra tekrar deneyin."
-            _append_session(conversation_id, "user", text)
-            _append_session(conversation_id, "assistant", reply)
+            session.append("user", text)
+            session.append("assistant", reply)
             return await _build_chat_response(
                 reply=reply,
                 conversation_id=conversation_id,
                 detected_language=detected_lang,
+                synthesize=stream is None,
             )
 
-        recipe_map_norm, recipe_detail_map = await _load_recipe_map(sube_id)
+        attr_map = knowledge.attr_map
+        dairy_free_items = knowledge.dairy_free_items
+        caffeine_free_items = knowledge.caffeine_free_items
+        gluten_free_items = knowledge.gluten_free_items
+        milky_coffee_items = knowledge.milky_coffee_items
 
-        attr_map, dairy_free_items, caffeine_free_items, gluten_free_items = _analyze_menu_attributes(menu_items, recipe_map_norm)
-        for item in menu_items:
-            key = item.get("key")
-            if key and key in recipe_detail_map:
-                item["ingredients"] = recipe_detail_map[key]
-            stock_sentence = _format_stock_status(item)
-            if stock_sentence:
-                item["stock_status_text"] = stock_sentence
-            description = (item.get("aciklama") or "").strip()
-            if description:
-                item["aciklama"] = description
-
-        milky_coffee_items = _filter_milky_coffee_items(menu_items, attr_map)
-        menu_knowledge = _build_menu_knowledge(menu_items, attr_map)
-
-        price_map: Dict[str, float] = {}
-        name_map: Dict[str, str] = {}
-        category_map: Dict[str, str] = {}
-        menu_token_keywords: Set[str] = set()
-        menu_full_names: Set[str] = set()
-        full_name_map: Dict[str, Dict[str, Any]] = {}
-        for item in menu_items:
-            price_map[item["key"]] = item["fiyat"]
-            name_map[item["key"]] = item["ad"]
-            category_map[item["key"]] = item["kategori"]
-            normalized_name = normalize_name(item["ad"])
-            if normalized_name:
-                menu_full_names.add(normalized_name)
-                full_name_map.setdefault(normalized_name, item)
-                for token in normalized_name.split():
-                    if len(token) > 2:
-                        menu_token_keywords.add(token)
+        price_map = knowledge.price_map
+        name_map = knowledge.name_map
+        category_map = knowledge.category_map
+        menu_token_keywords = knowledge.menu_token_keywords
+        full_name_map = knowledge.full_name_map
 
         # İkinci greeting kontrolü burada gerekmiyor - zaten en başta yapıldı
     
@@ -2049,15 +1979,14 @@ async def chat_smart(payload: ChatRequest):
         
         logging.info(f"[ORDER_CHECK] Final is_likely_order={is_likely_order}")
     
-        stock_map_db, has_db_key = await _load_stock_map(sube_id)
-        fallback = _ensure_fallback_stock(sube_id, [it["key"] for it in menu_items])
-        stock_map = _merge_stock(stock_map_db, fallback)
+        stock_map = knowledge.stock_map
+        has_db_key = knowledge.has_db_key
 
         aggregated: Dict[str, int] = {}
         not_matched: List[str] = []
         not_matched_with_count: List[Tuple[str, int]] = []
         auto_selected_variations = []  # type: List[Tuple[str, str]]
-        pending_variation_options = _pending_variations.get(conversation_id)
+        pending_variation_options = session.pending_variations
         allowed_variation_keys: Set[str] = set()
         if pending_variation_options:
             for option in pending_variation_options:
@@ -2145,7 +2074,7 @@ async def chat_smart(payload: ChatRequest):
             confirmation_text = re.sub(r"[^a-zçğıöşü0-9\s]", " ", text_clean)
             confirmation_text = re.sub(r"\s+", " ", confirmation_text).strip()
             if any(keyword in confirmation_text for keyword in confirmation_keywords):
-                base_pending = _pending_aggregated.get(conversation_id, {}) or {}
+                base_pending = session.pending_aggregated or {}
                 aggregated = dict(base_pending)
                 for pending_item in pending_variation_options:
                     product_key = pending_item.get("key")
@@ -2160,7 +2089,7 @@ async def chat_smart(payload: ChatRequest):
                         auto_selected_variations.append((pending_item.get("urun", product_key), selected_variation))
                     else:
                         aggregated[product_key] = aggregated.get(product_key, 0) + adet
-                _pending_variations.pop(conversation_id, None)
+                session.pending_variations = None
 
         # Varyasyonları ürünlerle eşleştir (örn: "2 türk kahvesi 1 sade 1 orta" -> 2 farklı ürün)
         # Ayrıca "1 sade 1 şekerli" gibi durumlarda conversation history'den ürün adını bul
@@ -2192,8 +2121,8 @@ async def chat_smart(payload: ChatRequest):
             # Eğer aggregated boşsa, önce session'dan pending ürünleri kontrol et
             pending_was_loaded = False
             if not aggregated:
-                if conversation_id in _pending_aggregated:
-                    pending = _pending_aggregated[conversation_id]
+                if session.pending_aggregated:
+                    pending = session.pending_aggregated
                     aggregated = dict(pending)
                     pending_was_loaded = True
                     logging.info(f"[VARIATION_PARSE] Loaded pending aggregated from session: {aggregated}")
@@ -2512,14 +2441,14 @@ async def chat_smart(payload: ChatRequest):
                     tutar = sum(item["adet"] * item["fiyat"] for item in sepet)
                     
                     # Adisyon sistemi: Masada açık adisyon varsa al, yoksa oluştur
-                    from ..routers.adisyon import _get_or_create_adisyon, _update_adisyon_totals
+                    from ..routers.adisyon import _get_or_create_adisyon
                     adisyon_id = await _get_or_create_adisyon(masa, sube_id)
                     
                     row = await db.fetch_one(
                         """
                         INSERT INTO siparisler (sube_id, masa, adisyon_id, sepet, durum, tutar)
                         VALUES (:sid, :masa, :adisyon_id, CAST(:sepet AS JSONB), 'yeni', :tutar)
-                        RETURNING id, masa, durum, tutar, created_at
+                        RETURNING id, masa, durum, tutar, created_at, mutfak_seq
                         """,
                         {"sid": sube_id, "masa": masa, "adisyon_id": adisyon_id, "sepet": json_dumps(sepet), "tutar": tutar},
                     )
@@ -2542,36 +2471,23 @@ async def chat_smart(payload: ChatRequest):
 
                     logging.info(f"[ORDER] Created partial order #{row['id']} with items without variation: {json_dumps(sepet)}")
                     
-                    # Adisyon toplamlarını güncelle
-                    try:
-                        await _update_adisyon_totals(adisyon_id, sube_id)
-                    except Exception as e:
-                        logging.warning(f"Adisyon toplamları güncellenirken hata: {e}", exc_info=True)
+                    # Adisyon toplamları siparisler trigger'ı ile artımlı güncellenir
                     
                     # Stok güncelle
                     for product_key, adet in items_without_variation.items():
                         stok_key = product_key
-                        new_value = stock_map.get(stok_key, 0) - adet
-                        _fallback_stock[(sube_id, stok_key)] = max(0.0, new_value)
-                        if stok_key in has_db_key:
-                            await db.execute(
-                                """
-                                UPDATE stok_kalemleri
-                                SET miktar = GREATEST(0, miktar - :adet)
-                                WHERE sube_id = :sid AND LOWER(kod) = LOWER(:kod)
-                                """,
-                                {"adet": adet, "sid": sube_id, "kod": name_map.get(stok_key, stok_key)},
-                            )
+                        # DB'deki stok ödeme anında kasa tarafından (reçete indeksi) düşülür;
+                        # burada sadece stok kalemi olmayan ürünlerin tahmini stoku güncellenir
+                        if stok_key not in has_db_key:
+                            new_value = stock_map.get(stok_key, 0) - adet
+                            _fallback_stock[(sube_id, stok_key)] = max(0.0, new_value)
+                    # Tahmini stok değişti (process içi): sadece bu worker'ın snapshot'ı eskidi
+                    await invalidate_assistant_knowledge(sube_id, broadcast=False)
                     
-                    # WebSocket broadcast
+                    # WebSocket broadcast (mutfak: kompakt delta + replay cursor)
                     from ..websocket.manager import manager, Topics
-                    await manager.broadcast({
-                        "type": "new_order",
-                        "order_id": row["id"],
-                        "masa": row["masa"],
-                        "durum": row["durum"],
-                        "sube_id": sube_id
-                    }, topic=Topics.KITCHEN)
+                    from ..services.kitchen_feed import publish_kitchen_orders
+                    await publish_kitchen_orders(sube_id, [row], event_type="new_order", sepet=sepet)
                     
                     await manager.broadcast({
                         "type": "order_added",
@@ -2589,9 +2505,9 @@ async def chat_smart(payload: ChatRequest):
 
                 # Varyasyonlu ürünleri pending'e kaydet
                 if pending_items:
-                    _pending_aggregated[conversation_id] = pending_items
+                    session.pending_aggregated = pending_items
                     logging.info(f"[SESSION] Saved pending aggregated items (products with missing variations): {pending_items}")
-                _pending_variations[conversation_id] = [dict(item) for item in missing_variations_in_cart]
+                session.pending_variations = [dict(item) for item in missing_variations_in_cart]
              
                 context_lines.append("KULLANICI SİPARİŞ VERDİ ANCAK BAZI ÜRÜNLER İÇİN SEÇENEK BELİRTİLMEDİ. MÜŞTERİYE KISA VE NET BİR ŞEKİLDE SEÇENEKLERİ SOR. PASİF OLMA, DİREKT SEÇENEKLERİ SUN.")
             
@@ -2674,14 +2590,14 @@ async def chat_smart(payload: ChatRequest):
                 tutar = sum(item["adet"] * item["fiyat"] for item in sepet)
 
                 # Adisyon sistemi: Masada açık adisyon varsa al, yoksa oluştur
-                from ..routers.adisyon import _get_or_create_adisyon, _update_adisyon_totals
+                from ..routers.adisyon import _get_or_create_adisyon
                 adisyon_id = await _get_or_create_adisyon(masa, sube_id)
 
                 row = await db.fetch_one(
                     """
                     INSERT INTO siparisler (sube_id, masa, adisyon_id, sepet, durum, tutar)
                     VALUES (:sid, :masa, :adisyon_id, CAST(:sepet AS JSONB), 'yeni', :tutar)
-                    RETURNING id, masa, durum, tutar, created_at
+                    RETURNING id, masa, durum, tutar, created_at, mutfak_seq
                     """,
                     {"sid": sube_id, "masa": masa, "adisyon_id": adisyon_id, "sepet": json_dumps(sepet), "tutar": tutar},
                 )
@@ -2705,11 +2621,7 @@ async def chat_smart(payload: ChatRequest):
                 logging.info(f"[ORDER] Created order #{row['id']} with sepet: {json_dumps(sepet)}")
 
             
-                # Adisyon toplamlarını güncelle
-                try:
-                    await _update_adisyon_totals(adisyon_id, sube_id)
-                except Exception as e:
-                    logging.warning(f"Adisyon toplamları güncellenirken hata: {e}", exc_info=True)
+                # Adisyon toplamları siparisler trigger'ı ile artımlı güncellenir
 
                 for key, adet in aggregated.items():
                     # Key formatı "product_key|variation_name" olabilir
@@ -2717,30 +2629,20 @@ async def chat_smart(payload: ChatRequest):
                         stok_key = key.split("|", 1)[0]
                     else:
                         stok_key = key
-                    new_value = stock_map.get(stok_key, 0) - adet
-                    _fallback_stock[(sube_id, stok_key)] = max(0.0, new_value)
-                    if stok_key in has_db_key:
-                        await db.execute(
-                            """
-                            UPDATE stok_kalemleri
-                            SET miktar = GREATEST(0, miktar - :adet)
-                            WHERE sube_id = :sid AND LOWER(kod) = LOWER(:kod)
-                            """,
-                            {"adet": adet, "sid": sube_id, "kod": name_map.get(stok_key, stok_key)},
-                        )
+                    # DB'deki stok ödeme anında kasa tarafından (reçete indeksi) düşülür
+                    if stok_key not in has_db_key:
+                        new_value = stock_map.get(stok_key, 0) - adet
+                        _fallback_stock[(sube_id, stok_key)] = max(0.0, new_value)
+                # Tahmini stok değişti (process içi): sadece bu worker'ın snapshot'ı eskidi
+                await invalidate_assistant_knowledge(sube_id, broadcast=False)
 
                 order_summary = {"id": row["id"], "masa": row["masa"], "durum": row["durum"], "tutar": float(row["tutar"]), "created_at": row["created_at"], "sepet": sepet}
                 sepet_desc = ", ".join(f"{item['urun']} x{item['adet']}" for item in sepet)
             
-                # WebSocket broadcast for new order
+                # WebSocket broadcast for new order (mutfak: kompakt delta + replay cursor)
                 from ..websocket.manager import manager, Topics
-                await manager.broadcast({
-                    "type": "new_order",
-                    "order_id": row["id"],
-                    "masa": row["masa"],
-                    "durum": row["durum"],
-                    "sube_id": sube_id
-                }, topic=Topics.KITCHEN)
+                from ..services.kitchen_feed import publish_kitchen_orders
+                await publish_kitchen_orders(sube_id, [row], event_type="new_order", sepet=sepet)
             
                 await manager.broadcast({
                     "type": "order_added",
@@ -2751,11 +2653,11 @@ async def chat_smart(payload: ChatRequest):
                 }, topic=Topics.ORDERS)
             
                 # Clear pending aggregated items from session
-                if conversation_id in _pending_aggregated:
-                    del _pending_aggregated[conversation_id]
+                if session.pending_aggregated is not None:
+                    session.pending_aggregated = None
                     logging.info(f"[SESSION] Cleared pending aggregated for conversation {conversation_id}")
-                if conversation_id in _pending_variations:
-                    del _pending_variations[conversation_id]
+                if session.pending_variations is not None:
+                    session.pending_variations = None
                     logging.info(f"[SESSION] Cleared pending variations for conversation {conversation_id}")
             
                 # ÖNEMLİ: Parse işlemi başarılı oldu, LLM'e parse edilen ürünlerin menüde olduğunu açıkça belirt
@@ -3078,7 +2980,7 @@ async def chat_smart(payload: ChatRequest):
                     force_default_reply = True
 
         # Build Neso System Prompt
-        menu_prompt_data = _build_neso_menu_prompt(menu_items, attr_map)
+        menu_prompt_data = knowledge.menu_prompt
         business_name = business_profile.get('isletme_ad') or 'Fıstık Kafe' if business_profile else 'Fıstık Kafe'
 
         system_prompt = f"""Sen {business_name} için **Neso** adında, son derece zeki, neşeli ve proaktif bir yapay zeka sipariş asistanısın.
@@ -3155,46 +3057,85 @@ Cevap vermeden önce içinden şu adımları izle:
             for line in context_lines:
                 system_parts.append(f"- {line}")
 
-        try:
-            logging.info(f"[LLM] Calling LLM provider for text: '{text[:50]}...'")
+        # Yanıt önbelleği: sadece konuşmanın ilk turundaki, sipariş/sepet/hesap içermeyen bilgi
+        # soruları (menü, öneri, içerik) önbelleğe girer; geçmişe dayanan takip soruları ("evet",
+        # "onun fiyatı ne?") başka bir masanın yanıtını almasın. Versiyon bilgi snapshot'ının
+        # parmak izi (menü/stok/reçete) + bu tura özel ek talimatların özetidir.
+        cacheable = (
+            not history_snapshot
+            and not is_likely_order
+            and not aggregated
+            and not order_summary
+            and not pending_variation_options
+            and not structured_data
+            and not asks_math
+            and not shortages
+        )
+        cached = None
+        cache_version = content_fingerprint([knowledge.fingerprint, system_parts[1:]])
+        if cacheable:
+            cached = await response_cache.lookup(
+                "customer", tenant_id, sube_id, text, cache_version,
+                language=detected_lang, endpoint="/assistant/chat",
+            )
+        if cached is not None:
+            reply_text = cached["reply"]
+        else:
+            try:
+                logging.info(f"[LLM] Calling LLM provider for text: '{text[:50]}...'")
             
-            # OpenAIProvider tuple döndürür (text, usage_info), diğerleri string
-            messages_for_llm = [{"role": "system", "content": "\n\n".join(system_parts)}]
-            messages_for_llm.extend(history_snapshot)
-            messages_for_llm.append({"role": "user", "content": text})
+                # OpenAIProvider tuple döndürür (text, usage_info), diğerleri string
+                messages_for_llm = [{"role": "system", "content": "\n\n".join(system_parts)}]
+                messages_for_llm.extend(history_snapshot)
+                messages_for_llm.append({"role": "user", "content": text})
             
-            result = await provider.chat(messages_for_llm)
-            if isinstance(result, tuple):
-                reply_text, usage_info = result
-            else:
-                reply_text, usage_info = result, None
+                if stream is not None:
+                    # Akış modu: parçalar geldikçe istemciye (ve cümle bazlı TTS'e) iletilir
+                    usage_info = {}
+                    parts: List[str] = []
+                    async for delta in provider.chat_stream(messages_for_llm, usage=usage_info):
+                        parts.append(delta)
+                        await stream.token(delta)
+                    reply_text = "".join(parts)
+                    usage_info = usage_info or None
+                else:
+                    result = await provider.chat(messages_for_llm)
+                    if isinstance(result, tuple):
+                        reply_text, usage_info = result
+                    else:
+                        reply_text, usage_info = result, None
             
-            # API kullanımını logla (tenant_id varsa)
-            if usage_info and tenant_id:
-                from ..services.api_usage_tracker import log_api_usage
-                # Model bilgisini provider'dan al (get_llm_provider zaten doğru modeli seçti)
-                actual_model = getattr(provider, 'model', 'gpt-4o-mini')
+                # API kullanımını logla (tenant_id varsa)
+                if usage_info and tenant_id:
+                    from ..services.api_usage_tracker import log_api_usage
+                    # Model bilgisini provider'dan al (get_llm_provider zaten doğru modeli seçti)
+                    actual_model = getattr(provider, 'model', 'gpt-4o-mini')
             
-                await log_api_usage(
-                    isletme_id=tenant_id,
-                    api_type="openai",
-                    model=actual_model,
-                    endpoint="/v1/chat/completions",
-                    prompt_tokens=usage_info.get("prompt_tokens", 0),
-                    completion_tokens=usage_info.get("completion_tokens", 0),
-                    total_tokens=usage_info.get("total_tokens", 0),
-                    cost_usd=usage_info.get("cost_usd", 0.0),
-                    response_time_ms=usage_info.get("response_time_ms"),
-                    status="success",
-                )
+                    await log_api_usage(
+                        isletme_id=tenant_id,
+                        api_type="openai",
+                        model=actual_model,
+                        endpoint="/v1/chat/completions",
+                        prompt_tokens=usage_info.get("prompt_tokens", 0),
+                        completion_tokens=usage_info.get("completion_tokens", 0),
+                        total_tokens=usage_info.get("total_tokens", 0),
+                        cost_usd=usage_info.get("cost_usd", 0.0),
+                        response_time_ms=usage_info.get("response_time_ms"),
+                        status="success",
+                    )
         
-            logging.info(f"[LLM] Received reply (length: {len(reply_text) if reply_text else 0})")
+                logging.info(f"[LLM] Received reply (length: {len(reply_text) if reply_text else 0})")
         
-            if not reply_text or len(reply_text.strip()) == 0:
-                logging.warning("[LLM] Empty reply from LLM, using default")
-        except Exception as e:
-            logging.error(f"[LLM] Error calling LLM provider: {e}", exc_info=True)
-            reply_text = ""
+                if not reply_text or len(reply_text.strip()) == 0:
+                    logging.warning("[LLM] Empty reply from LLM, using default")
+                elif cacheable:
+                    await response_cache.store(
+                        "customer", tenant_id, sube_id, text, cache_version, reply_text,
+                        usage=usage_info, model=getattr(provider, 'model', None), language=detected_lang,
+                    )
+            except Exception as e:
+                logging.error(f"[LLM] Error calling LLM provider: {e}", exc_info=True)
+                reply_text = ""
 
         if not reply_text or len(reply_text.strip()) == 0:
             reply_text = default_reply or "Ben Neso Asistan (v2.2)! Yapay zeka servisime şu an ulaşamıyorum, ancak menümüzden sipariş almak için buradayım. Ne istersiniz?"
@@ -3210,8 +3151,8 @@ Cevap vermeden önce içinden şu adımları izle:
                 if len(not_matched) == 0:
                     not_matched = None
 
-        _append_session(conversation_id, "user", text)
-        _append_session(conversation_id, "assistant", reply_text)
+        session.append("user", text)
+        session.append("assistant", reply_text)
 
         # Parse başarısız olduğunda (aggregated yok) not_matched uyarısını gösterme
         # Kullanıcı deneyimi için sadece LLM'in cevabını göster, teknik detayları gösterme
@@ -3253,6 +3194,7 @@ Cevap vermeden önce içinden şu adımları izle:
             conversation_id=conversation_id,
             detected_language=detected_lang,
             tenant_id=tenant_id,
+            synthesize=stream is None,
         )
     except HTTPException:
         raise
@@ -3268,11 +3210,15 @@ Cevap vermeden önce içinden şu adımları izle:
                 conversation_id=conversation_id_for_error,
                 detected_language="tr",
                 tenant_id=None,
+                synthesize=stream is None,
             )
         except Exception as inner_e:
             logging.error(f"[CHAT] Error building error response: {inner_e}", exc_info=True)
             # Son çare: basit bir response döndür
             raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        if session is not None:
+            await conversation_store.save(session)
 
 
 # ---- Asistan Ayarları ----
@@ -3561,7 +3507,7 @@ async def _handle_structured_intent(
 
     try:
         if intent == "stok_durumu":
-            menu_items = await _load_menu_details(sube_id)
+            menu_items = (await get_assistant_knowledge(sube_id)).items
             menu_names = [item["ad"] for item in menu_items]
             product_name: Optional[str] = None
             for kw in keyword_list:
@@ -3730,9 +3676,11 @@ async def _handle_structured_intent(
 async def _load_recipe_map(sube_id: int) -> Tuple[Dict[str, List[str]], Dict[str, List[Dict[str, Any]]]]:
     rows = await db.fetch_all(
         """
-        SELECT urun, stok, miktar, birim
-        FROM receteler
-        WHERE sube_id = :sid
+        SELECT COALESCE(m.ad, r.urun) AS urun, COALESCE(sk.ad, r.stok) AS stok, r.miktar, r.birim
+        FROM receteler r
+        LEFT JOIN menu m ON m.id = r.menu_id
+        LEFT JOIN stok_kalemleri sk ON sk.id = r.stok_id
+        WHERE r.sube_id = :sid
         """,
         {"sid": sube_id},
     )
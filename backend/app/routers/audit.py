@@ -9,7 +9,7 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 
 from ..core.deps import get_current_user, require_roles, get_sube_id
-from ..services.audit import audit_service
+from ..services.audit import audit_service, audit_writer
 
 router = APIRouter(prefix="/audit", tags=["Audit Log"])
 
@@ -124,3 +124,19 @@ async def get_audit_statistics(
         end_date=end_date,
     )
     return stats
+
+
+@router.get(
+    "/writer",
+    dependencies=[Depends(require_roles({"super_admin"}))],
+)
+async def get_audit_writer_stats(_: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Arka plan audit yazıcısının durumu
+
+    **Yetkiler:** super_admin
+
+    Kuyruk derinliği, yazılan/düşürülen kayıt sayıları, backpressure beklemeleri
+    ve son batch süresi.
+    """
+    return audit_writer.stats()
@@ -12,9 +12,11 @@ from ..core.security import (
     decode_token,
     verify_token_type,
 )
+from ..core.auth_context import invalidate_auth_context
 from ..core.deps import get_current_user, get_current_user_and_role, oauth2_scheme
 from ..db.database import db
 from ..services.cache import cache_service
+from ..services.tenant_usage import record_usage_change
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -311,6 +313,7 @@ async def register(
         """,
         {"u": request.username, "h": hashed, "r": request.role, "tid": tenant_id}
     )
+    await record_usage_change(tenant_id, "kullanicilar", 1)
 
     return UserResponse(**user)
 
@@ -411,6 +414,7 @@ async def logout(token: str = Depends(oauth2_scheme)):
                     await cache_service.set(f"denylist:{token}", "1", ttl)
         except Exception:
             pass # Token invalid or already expired
+    invalidate_auth_context(token=token)
             
     return {"message": "Successfully logged out"}
 
@@ -5,15 +5,16 @@ from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
 from datetime import datetime, timedelta
 from collections import defaultdict
 import ast
-import json
 import logging
 import operator
 import re
 
+from ..core.config import settings
 from ..core.deps import get_current_user, get_sube_id, require_roles
 from ..db.database import db
 from ..llm import get_llm_provider
 from ..llm.bi_intelligence import generate_smart_response, QueryIntent
+from ..services.response_cache import content_fingerprint, response_cache
 
 router = APIRouter(prefix="/bi-assistant", tags=["BI Assistant"])
 
@@ -28,20 +29,6 @@ class BIQueryResponse(BaseModel):
 
 
 # ------ Yardımcı Fonksiyonlar ------
-def parse_sepet(sepet_value) -> List[Dict[str, Any]]:
-    """Sepet JSONB'yi parse et"""
-    if sepet_value is None:
-        return []
-    if isinstance(sepet_value, list):
-        return sepet_value
-    if isinstance(sepet_value, str):
-        try:
-            return json.loads(sepet_value)
-        except:
-            return []
-    return []
-
-
 async def get_revenue_data(sube_id: int, days: int = 30) -> Dict[str, Any]:
     end_date = datetime.now()
     if days == 1:
@@ -146,38 +133,22 @@ async def get_inventory_status(sube_id: int) -> List[Dict[str, Any]]:
             {"sid": sube_id}
         )
         
-        # Son 30 günlük satış verilerinden tüketim hesapla
-        sales_rows = await db.fetch_all(
+        # Son 30 günlük satışlardan reçete bazlı malzeme tüketimi (tek sorgu)
+        consumption_rows = await db.fetch_all(
             """
-            SELECT sepet, created_at
-            FROM siparisler
-            WHERE sube_id = :sid AND durum = 'odendi' 
-            AND created_at >= NOW() - INTERVAL '30 days';
+            SELECT sk.ad AS stok, SUM(r.miktar * k.adet)::float AS tuketim
+            FROM siparis_kalemleri k
+            JOIN receteler r ON r.menu_id = k.menu_id
+            JOIN stok_kalemleri sk ON sk.id = r.stok_id
+            WHERE k.sube_id = :sid AND k.durum = 'odendi'
+              AND k.created_at >= NOW() - INTERVAL '30 days'
+            GROUP BY sk.ad;
             """,
             {"sid": sube_id}
         )
-        
-        # Reçetelerden malzeme tüketimini hesapla
-        daily_consumption: Dict[str, float] = defaultdict(float)
-        for row in sales_rows:
-            sepet = parse_sepet(row["sepet"])
-            for item in sepet:
-                urun_adi = str(item.get("urun") or item.get("ad") or "").strip()
-                if urun_adi:
-                    # Bu ürünün reçetesini getir
-                    recete_rows = await db.fetch_all(
-                        """
-                        SELECT stok, miktar
-                        FROM receteler
-                        WHERE urun = :urun;
-                        """,
-                        {"urun": urun_adi}
-                    )
-                    adet = float(item.get("adet") or 1)
-                    for rec in recete_rows:
-                        stok_adi = str(rec["stok"]).strip()
-                        miktar = float(rec["miktar"] or 0)
-                        daily_consumption[stok_adi] += miktar * adet
+        daily_consumption: Dict[str, float] = {
+            r["stok"]: float(r["tuketim"] or 0) for r in consumption_rows
+        }
         
         # 30 güne böl
         avg_daily = {k: v / 30.0 for k, v in daily_consumption.items()}
@@ -249,25 +220,10 @@ async def get_top_products(sube_id: int, days: int = 30) -> List[Dict[str, Any]]
         start_date = end_date - timedelta(days=days)
     
     try:
-        popular_rows = await db.fetch_all(
-            """
-            SELECT sepet
-            FROM siparisler
-            WHERE sube_id = :sid AND durum = 'odendi' AND created_at BETWEEN :start AND :end;
-            """,
-            {"sid": sube_id, "start": start_date, "end": end_date}
-        )
-        
-        product_counts: Dict[str, float] = defaultdict(float)
-        for row in popular_rows:
-            sepet = parse_sepet(row["sepet"])
-            for item in sepet:
-                urun_adi = str(item.get("urun") or item.get("ad") or "").strip()
-                if urun_adi:
-                    product_counts[urun_adi] += float(item.get("adet") or 1) * float(item.get("fiyat") or 0)
-        
-        sorted_products = sorted(product_counts.items(), key=lambda x: x[1], reverse=True)
-        return [{"urun_adi": k, "toplam_tutar": v} for k, v in sorted_products[:10]]
+        from ..services.product_sales_rollup import product_sales_summary
+
+        rows = await product_sales_summary(sube_id, start=start_date, order_by="ciro", limit=10)
+        return [{"urun_adi": r["urun_adi"], "toplam_tutar": r["ciro"]} for r in rows]
     except Exception as e:
         logging.warning(f"Top products query error: {e}")
         return []
@@ -284,44 +240,24 @@ async def get_category_sales(sube_id: int, days: int = 30) -> List[Dict[str, Any
         start_date = end_date - timedelta(days=days)
 
     try:
-        menu_rows = await db.fetch_all(
-            """
-            SELECT ad, kategori
-            FROM menu
-            WHERE sube_id = :sid
-            """,
-            {"sid": sube_id}
-        )
-        name_to_category: Dict[str, str] = {}
-        for row in menu_rows:
-            name = str(row["ad"] or "").strip().lower()
-            if name:
-                name_to_category[name] = row.get("kategori") or "Kategori Belirtilmemiş"
-
         sales_rows = await db.fetch_all(
             """
-            SELECT sepet
-            FROM siparisler
-            WHERE sube_id = :sid
-              AND durum = 'odendi'
-              AND created_at BETWEEN :start AND :end;
+            SELECT COALESCE(m.kategori, 'Kategori Belirtilmemiş') AS kategori,
+                   SUM(k.tutar)::float AS ciro,
+                   SUM(k.adet)::float AS adet
+            FROM siparis_kalemleri k
+            LEFT JOIN menu m ON m.id = k.menu_id
+            WHERE k.sube_id = :sid
+              AND k.durum = 'odendi'
+              AND k.created_at BETWEEN :start AND :end
+            GROUP BY 1;
             """,
             {"sid": sube_id, "start": start_date, "end": end_date}
         )
-
-        category_totals: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"ciro": 0.0, "adet": 0})
-        for row in sales_rows:
-            sepet = parse_sepet(row["sepet"])
-            for item in sepet:
-                urun_adi = str(item.get("urun") or item.get("ad") or "").strip()
-                if not urun_adi:
-                    continue
-                kategorize_name = urun_adi.lower()
-                category = name_to_category.get(kategorize_name, "Kategori Belirtilmemiş")
-                adet = float(item.get("adet") or 1)
-                fiyat = float(item.get("fiyat") or 0)
-                category_totals[category]["ciro"] += fiyat * adet
-                category_totals[category]["adet"] += adet
+        category_totals: Dict[str, Dict[str, Any]] = {
+            r["kategori"]: {"ciro": float(r["ciro"] or 0), "adet": float(r["adet"] or 0)}
+            for r in sales_rows
+        }
 
         # Toplam ciro
         total_revenue = sum(info["ciro"] for info in category_totals.values())
@@ -356,39 +292,22 @@ async def get_shopping_suggestions(sube_id: int) -> Dict[str, Any]:
             {"sid": sube_id}
         )
         
-        # Son 30 günlük satış verilerinden tüketim hesapla
-        sales_rows = await db.fetch_all(
+        # Son 30 günlük satışlardan reçete bazlı malzeme tüketimi (tek sorgu)
+        consumption_rows = await db.fetch_all(
             """
-            SELECT sepet, DATE(created_at) as tarih
-            FROM siparisler
-            WHERE sube_id = :sid AND durum = 'odendi' 
-            AND created_at >= NOW() - INTERVAL '30 days'
-            ORDER BY tarih DESC;
+            SELECT sk.ad AS stok, SUM(r.miktar * k.adet)::float AS tuketim
+            FROM siparis_kalemleri k
+            JOIN receteler r ON r.menu_id = k.menu_id
+            JOIN stok_kalemleri sk ON sk.id = r.stok_id
+            WHERE k.sube_id = :sid AND k.durum = 'odendi'
+              AND k.created_at >= NOW() - INTERVAL '30 days'
+            GROUP BY sk.ad;
             """,
             {"sid": sube_id}
         )
-        
-        # Reçetelerden malzeme tüketimini hesapla
-        daily_consumption: Dict[str, float] = defaultdict(float)
-        for row in sales_rows:
-            sepet = parse_sepet(row["sepet"])
-            for item in sepet:
-                urun_adi = str(item.get("urun") or item.get("ad") or "").strip()
-                if urun_adi:
-                    # Bu ürünün reçetesini getir
-                    recete_rows = await db.fetch_all(
-                        """
-                        SELECT stok, miktar, birim
-                        FROM receteler
-                        WHERE urun = :urun;
-                        """,
-                        {"urun": urun_adi}
-                    )
-                    adet = float(item.get("adet") or 1)
-                    for rec in recete_rows:
-                        stok_adi = str(rec["stok"]).strip()
-                        miktar = float(rec["miktar"] or 0)
-                        daily_consumption[stok_adi] += miktar * adet
+        daily_consumption: Dict[str, float] = {
+            r["stok"]: float(r["tuketim"] or 0) for r in consumption_rows
+        }
         
         # 30 güne böl
         avg_daily = {k: v / 30.0 for k, v in daily_consumption.items()}
@@ -425,68 +344,49 @@ async def get_profit_margin_analysis(sube_id: int) -> Dict[str, Any]:
         # Menü ürünleri ve fiyatları
         menu_items = await db.fetch_all(
             """
-            SELECT ad, fiyat, kategori
+            SELECT id, ad, fiyat, kategori
             FROM menu
             WHERE sube_id = :sid AND aktif = TRUE;
             """,
             {"sid": sube_id}
         )
         
-        # Son 30 günlük satışlar
+        # Son 30 günlük satış adetleri (menü ürünü bazında)
         sales_rows = await db.fetch_all(
             """
-            SELECT sepet, tutar
-            FROM siparisler
-            WHERE sube_id = :sid AND durum = 'odendi' 
-            AND created_at >= NOW() - INTERVAL '30 days';
+            SELECT menu_id, SUM(adet)::int AS adet
+            FROM siparis_kalemleri
+            WHERE sube_id = :sid AND durum = 'odendi' AND menu_id IS NOT NULL
+            AND created_at >= NOW() - INTERVAL '30 days'
+            GROUP BY menu_id;
             """,
             {"sid": sube_id}
         )
+        sales_by_menu: Dict[int, int] = {r["menu_id"]: int(r["adet"] or 0) for r in sales_rows}
+        
+        # Reçete maliyetleri (menü ürünü bazında, tek sorgu)
+        cost_rows = await db.fetch_all(
+            """
+            SELECT r.menu_id, SUM(r.miktar * COALESCE(sk.alis_fiyat, 0))::float AS maliyet
+            FROM receteler r
+            JOIN stok_kalemleri sk ON sk.id = r.stok_id
+            WHERE r.sube_id = :sid AND r.menu_id IS NOT NULL
+            GROUP BY r.menu_id;
+            """,
+            {"sid": sube_id}
+        )
+        recipe_costs: Dict[int, float] = {r["menu_id"]: float(r["maliyet"] or 0) for r in cost_rows}
         
         product_analysis = []
         for menu_item in menu_items:
             urun_adi = str(menu_item["ad"])
             satis_fiyati = float(menu_item["fiyat"])
             
-            # Bu ürünün reçetesini getir
-            recete_rows = await db.fetch_all(
-                """
-                SELECT stok, miktar, birim
-                FROM receteler
-                WHERE urun = :urun;
-                """,
-                {"urun": urun_adi}
-            )
-            
-            # Reçete toplam maliyeti hesapla
-            toplam_maliyet = 0.0
-            for rec in recete_rows:
-                stok_adi = str(rec["stok"])
-                miktar = float(rec["miktar"] or 0)
-                
-                # Stok kaleminden alış fiyatını al
-                stok_row = await db.fetch_one(
-                    """
-                    SELECT alis_fiyat, birim
-                    FROM stok_kalemleri
-                    WHERE sube_id = :sid AND ad = :ad
-                    LIMIT 1;
-                    """,
-                    {"sid": sube_id, "ad": stok_adi}
-                )
-                
-                if stok_row:
-                    stok_data = dict(stok_row)
-                    alis_fiyat = float(stok_data.get("alis_fiyat") or 0)
-                    toplam_maliyet += miktar * alis_fiyat
+            # Reçete toplam maliyeti (menu_id → reçete → stok kalemi)
+            toplam_maliyet = recipe_costs.get(menu_item["id"], 0.0)
             
             # Satış sayısı
-            satis_sayisi = 0
-            for row in sales_rows:
-                sepet = parse_sepet(row["sepet"])
-                for item in sepet:
-                    if str(item.get("urun") or item.get("ad") or "").strip() == urun_adi:
-                        satis_sayisi += int(item.get("adet") or 1)
+            satis_sayisi = sales_by_menu.get(menu_item["id"], 0)
             
             # Kar marjı hesapla
             kar = satis_fiyati - toplam_maliyet
@@ -1423,8 +1323,16 @@ async def bi_query(
 
                 logging.info(f"[BI_ASSISTANT] Intent: {detected_intent}, Data sources: {len(relevant_data)}")
 
+                # Yanıt önbelleği: anahtar analizde kullanılan verinin parmak izine bağlı;
+                # yeni satış / gider / stok hareketi gelince eski yanıt eşleşmez
+                data_version = content_fingerprint([requested_period, all_business_data])
+                cached = await response_cache.lookup(
+                    "bi", tenant_id, target_sube_id, text, data_version, endpoint="/bi-assistant/query",
+                )
+                if cached is not None:
+                    llm_reply = cached["reply"]
                 # LLM'e gönder (BI analizi için optimize edilmiş parametrelerle)
-                if hasattr(provider, 'chat'):
+                elif hasattr(provider, 'chat'):
                     # OpenAI provider için task_type parametresi
                     import inspect
                     sig = inspect.signature(provider.chat)
@@ -1456,6 +1364,13 @@ async def bi_query(
                             response_time_ms=usage_info.get("response_time_ms"),
                             status="success",
                         )
+
+                    if llm_reply and llm_reply.strip():
+                        await response_cache.store(
+                            "bi", tenant_id, target_sube_id, text, data_version, llm_reply.strip(),
+                            usage=usage_info, model=getattr(provider, 'model', None),
+                            ttl=settings.RESPONSE_CACHE_BI_TTL_SECONDS,
+                        )
                 else:
                     llm_reply = ""
 
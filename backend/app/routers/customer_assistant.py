@@ -9,18 +9,22 @@ This router handles:
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 
 from ..core.deps import get_current_user, get_sube_id
 from ..db.database import db
 from ..services.context_manager import context_manager
+from ..services.chat_streaming import ChatStream, start_chat_turn
 import json
 
 from .assistant import (
     ChatRequest,
+    ChatResponse,
     chat_smart as assistant_chat_smart,
+    chat_smart_turn as assistant_chat_smart_turn,
 )
 
 logger = logging.getLogger(__name__)
@@ -75,6 +79,51 @@ class CustomerChatResponse(BaseModel):
 
 # ==================== MAIN ENDPOINTS ====================
 
+async def _assistant_request(payload: CustomerChatRequest, request: Request) -> ChatRequest:
+    """Müşteri mesajını şube / masa bağlamıyla asistan isteğine çevirir."""
+    # sube_id önceliği: payload > X-Sube-Id header > 1 (varsayılan)
+    sube_id = payload.sube_id
+    if not sube_id:
+        header_sube = request.headers.get("X-Sube-Id")
+        if header_sube and header_sube.isdigit():
+            sube_id = int(header_sube)
+    if not sube_id:
+        sube_id = 1
+
+    conversation_id = payload.conversation_id or f"conv_customer_{sube_id}"
+    ctx = await context_manager.get(conversation_id)
+
+    masa_value = payload.masa or ctx.masa
+    if payload.masa and payload.masa != ctx.masa:
+        await context_manager.update(conversation_id, masa=payload.masa)
+
+    return ChatRequest(
+        text=payload.text,
+        masa=masa_value,
+        sube_id=sube_id,
+        conversation_id=conversation_id,
+    )
+
+
+async def _customer_response(assistant_request: ChatRequest, assistant_response: ChatResponse) -> CustomerChatResponse:
+    conversation_id = assistant_request.conversation_id
+    await context_manager.set_last_intent(conversation_id, "assistant")
+
+    return CustomerChatResponse(
+        type="success",
+        message=assistant_response.reply,
+        matched_products=None,
+        options=None,
+        recommendations=None,
+        suggestions=assistant_response.suggestions,
+        intent="assistant",
+        sentiment={"mood": "neutral", "confidence": 1.0},
+        audio_base64=assistant_response.audio_base64,
+        conversation_id=assistant_response.conversation_id or conversation_id,
+        detected_language=assistant_response.detected_language,
+    )
+
+
 @router.post("/chat", response_model=CustomerChatResponse)
 async def customer_chat(
     payload: CustomerChatRequest,
@@ -82,46 +131,9 @@ async def customer_chat(
 ):
     """Thin wrapper that delegates to the intelligent assistant pipeline."""
     try:
-        # sube_id önceliği: payload > X-Sube-Id header > 1 (varsayılan)
-        sube_id = payload.sube_id
-        if not sube_id:
-            header_sube = request.headers.get("X-Sube-Id")
-            if header_sube and header_sube.isdigit():
-                sube_id = int(header_sube)
-        if not sube_id:
-            sube_id = 1
-
-        conversation_id = payload.conversation_id or f"conv_customer_{sube_id}"
-        ctx = await context_manager.get(conversation_id)
-
-        masa_value = payload.masa or ctx.masa
-        if payload.masa and payload.masa != ctx.masa:
-            await context_manager.update(conversation_id, masa=payload.masa)
-
-        assistant_request = ChatRequest(
-            text=payload.text,
-            masa=masa_value,
-            sube_id=sube_id,
-            conversation_id=conversation_id,
-        )
-
+        assistant_request = await _assistant_request(payload, request)
         assistant_response = await assistant_chat_smart(assistant_request)
-
-        await context_manager.set_last_intent(conversation_id, "assistant")
-
-        return CustomerChatResponse(
-            type="success",
-            message=assistant_response.reply,
-            matched_products=None,
-            options=None,
-            recommendations=None,
-            suggestions=assistant_response.suggestions,
-            intent="assistant",
-            sentiment={"mood": "neutral", "confidence": 1.0},
-            audio_base64=assistant_response.audio_base64,
-            conversation_id=assistant_response.conversation_id or conversation_id,
-            detected_language=assistant_response.detected_language,
-        )
+        return await _customer_response(assistant_request, assistant_response)
 
     except HTTPException:
         raise
@@ -133,6 +145,24 @@ async def customer_chat(
         )
 
 
+@router.post("/chat/stream")
+async def customer_chat_stream(
+    payload: CustomerChatRequest,
+    request: Request,
+):
+    """Streaming (SSE) variant of /chat: token, audio (per sentence), done, error events."""
+    assistant_request = await _assistant_request(payload, request)
+    stream = ChatStream(assistant_type="customer")
+
+    async def turn() -> Tuple[str, Dict[str, Any]]:
+        assistant_response = await assistant_chat_smart_turn(assistant_request, stream=stream)
+        response = await _customer_response(assistant_request, assistant_response)
+        return response.message, response.dict(exclude={"audio_base64"})
+
+    start_chat_turn(stream, turn())
+    return StreamingResponse(stream.events(), media_type="text/event-stream")
+
+
 @router.post("/confirm-order")
 async def confirm_order(
     menu_id: int,
@@ -145,11 +175,11 @@ async def confirm_order(
     This is called after user confirms a product match.
     """
     try:
-        # Get product details
-        product = await db.fetch_one(
-            "SELECT ad, fiyat FROM menu WHERE id = :id AND sube_id = :sube_id",
-            {"id": menu_id, "sube_id": sube_id}
-        )
+        # Get product details (active menu snapshot of the branch)
+        from ..services.menu_snapshot import get_menu_snapshot
+
+        menu_snapshot = await get_menu_snapshot(sube_id)
+        product = menu_snapshot.by_id.get(menu_id)
 
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
@@ -158,10 +188,10 @@ async def confirm_order(
         sepet = [{
             "urun": product["ad"],
             "adet": quantity,
-            "fiyat": float(product["fiyat"]) if product["fiyat"] else 0.0
+            "fiyat": product["fiyat"]
         }]
 
-        tutar = quantity * (float(product["fiyat"]) if product["fiyat"] else 0.0)
+        tutar = quantity * product["fiyat"]
 
         # Get or create adisyon
         from ..routers.adisyon import _get_or_create_adisyon
@@ -172,10 +202,11 @@ async def confirm_order(
         adisyon_id = await _get_or_create_adisyon(masa, sube_id)
 
         # Create order
-        await db.execute(
+        row = await db.fetch_one(
             """
             INSERT INTO siparisler (sube_id, masa, adisyon_id, sepet, durum, tutar, created_by_username)
             VALUES (:sube_id, :masa, :adisyon_id, :sepet, 'yeni', :tutar, 'AI')
+            RETURNING id, masa, durum, tutar, created_at, mutfak_seq
             """,
             {
                 "sube_id": sube_id,
@@ -185,6 +216,9 @@ async def confirm_order(
                 "tutar": tutar
             }
         )
+        # Mutfak ekranları: kompakt delta + replay cursor
+        from ..services.kitchen_feed import publish_kitchen_orders
+        await publish_kitchen_orders(sube_id, [row], event_type="new_order", sepet=sepet)
 
         return {
             "status": "success",
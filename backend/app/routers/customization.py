@@ -6,9 +6,11 @@ from pathlib import Path
 import secrets
 from PIL import Image
 import io
+from ..core.auth_context import invalidate_auth_context
 from ..core.deps import require_roles, get_current_user
 from ..core.config import settings
 from ..db.database import db
+from ..llm import invalidate_llm_providers
 from .customization_helper import check_assistant_columns, get_select_fields, add_default_assistant_fields
 from ..core.logging_config import get_logger
 
@@ -264,6 +266,11 @@ async def upsert_customization(
             {k: v for k, v in data.items() if k in base_cols},
         )
     
+    # Domain eşlemesi değişmiş olabilir: yerel auth bağlamlarını düşür
+    invalidate_auth_context()
+    # Asistan API key/model değişmiş olabilir: çözümlenmiş LLM provider'larını düşür
+    await invalidate_llm_providers(target_id)
+
     # Eksik kolonları varsayılanlarla doldur (model response_model için)
     row_dict = dict(row)
     if "openai_api_key" not in row_dict: row_dict["openai_api_key"] = None
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from typing import Optional, List
+from ..core.auth_context import invalidate_auth_context
+from ..core.branch_access import invalidate_branch_access
 from ..core.deps import get_current_user
 from ..db.database import db
 
@@ -68,9 +70,12 @@ async def guncelle(id: int, payload: IsletmeIn, user=Depends(get_current_user)):
         """,
         {**payload.model_dump(), "id": id}
     )
+    invalidate_auth_context(tenant_id=id)
     return row
 
 @router.delete("/{id}")
 async def sil(id: int, user=Depends(get_current_user)):
     await db.execute("DELETE FROM isletmeler WHERE id=:id", {"id": id})
+    invalidate_auth_context(tenant_id=id)
+    await invalidate_branch_access("isletme_sil")
     return {"ok": True}
@@ -1,11 +1,13 @@
 # backend/app/routers/kasa.py
-import json
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import Literal, Optional, List, Dict, Any, Mapping
 
 from ..core.deps import get_current_user, get_sube_id, require_roles
 from ..db.database import db
+from ..services.kitchen_feed import kitchen_publish_after_commit
+from ..services.order_lines import decode_sepet, normalize_items
+from ..services.table_balance import fetch_table_balance
 
 router = APIRouter(prefix="/kasa", tags=["Kasa"])
 
@@ -48,181 +50,8 @@ class HesapOzetOut(BaseModel):
 
 # ------  yardmc ------
 async def _hesap_ozet_core(masa: str, sube_id: int) -> Dict[str, Any]:
-    params_base = {"sid": sube_id, "masa": masa}
-
-    adisyon_row = await db.fetch_one(
-        """
-        SELECT id, acilis_zamani
-        FROM adisyons
-        WHERE sube_id = :sid
-          AND masa = :masa
-          AND durum = 'acik'
-        ORDER BY acilis_zamani DESC
-        LIMIT 1
-        """,
-        params_base,
-    )
-
-    adisyon_id = adisyon_row["id"] if adisyon_row else None
-    session_start_dt = adisyon_row["acilis_zamani"] if adisyon_row else None
-
-    orders_condition = ""
-    orders_params: Dict[str, Any] = {"sid": sube_id}
-
-    if adisyon_id is not None:
-        orders_condition = "adisyon_id = :aid"
-        orders_params["aid"] = adisyon_id
-    else:
-        orders_condition = "masa = :masa"
-        orders_params["masa"] = masa
-        if session_start_dt is None:
-            start_row = await db.fetch_one(
-                """
-                SELECT MIN(created_at) AS first_created
-                FROM siparisler
-                WHERE masa = :masa AND sube_id = :sid AND durum IN ('yeni', 'hazirlaniyor', 'hazir')
-                """,
-                params_base,
-            )
-            session_start_dt = start_row["first_created"] if start_row else None
-
-    time_filter_clause = ""
-    if session_start_dt is not None and adisyon_id is None:
-        orders_params["start_time"] = session_start_dt
-        time_filter_clause = " AND created_at >= :start_time"
-
-    row1 = await db.fetch_one(
-        f"""
-        SELECT COALESCE(SUM(tutar),0) AS toplam
-        FROM siparisler
-        WHERE {orders_condition}
-          AND durum IN ('yeni', 'hazirlaniyor', 'hazir')
-          AND sube_id = :sid
-        """,
-        orders_params,
-    )
-    sip_toplam = float(row1["toplam"] or 0)
-
-    row_hazir = await db.fetch_one(
-        f"""
-        SELECT COALESCE(SUM(tutar),0) AS toplam
-        FROM siparisler
-        WHERE {orders_condition}
-          AND durum = 'hazir'
-          AND sube_id = :sid
-        """,
-        orders_params,
-    )
-    hazir_toplam = float(row_hazir["toplam"] or 0)
-
-    row_odendi = await db.fetch_one(
-        f"""
-        SELECT COALESCE(SUM(tutar),0) AS toplam
-        FROM siparisler
-        WHERE {orders_condition}
-          AND durum = 'odendi'
-          AND sube_id = :sid
-          {time_filter_clause}
-        """,
-        orders_params,
-    )
-    odendi_toplam = float(row_odendi["toplam"] or 0)
-
-    row_all = await db.fetch_one(
-        f"""
-        SELECT COALESCE(SUM(tutar),0) AS toplam
-        FROM siparisler
-        WHERE {orders_condition}
-          AND durum <> 'iptal'
-          AND sube_id = :sid
-          {time_filter_clause}
-        """,
-        orders_params,
-    )
-    sip_all_toplam = float(row_all["toplam"] or 0)
-
-    if adisyon_id is not None:
-        payment_params: Dict[str, Any] = {"sid": sube_id, "aid": adisyon_id}
-        if session_start_dt is not None:
-            payment_params["start_time"] = session_start_dt
-            payments_sql = """
-                SELECT COALESCE(SUM(tutar),0) AS toplam
-                FROM odemeler
-                WHERE sube_id = :sid
-                  AND adisyon_id = :aid
-                  AND iptal = FALSE
-                  AND created_at >= :start_time
-            """
-        else:
-            payments_sql = """
-                SELECT COALESCE(SUM(tutar),0) AS toplam
-                FROM odemeler
-                WHERE sube_id = :sid
-                  AND adisyon_id = :aid
-                  AND iptal = FALSE
-            """
-        row2 = await db.fetch_one(payments_sql, payment_params)
-    else:
-        if session_start_dt is not None:
-            payment_params = {
-                "sid": sube_id,
-                "masa": masa,
-                "start_time": session_start_dt,
-            }
-            payments_sql = """
-                SELECT COALESCE(SUM(tutar),0) AS toplam
-                FROM odemeler
-                WHERE sube_id = :sid
-                  AND masa = :masa
-                  AND iptal = FALSE
-                  AND adisyon_id IS NULL
-                  AND created_at >= :start_time
-            """
-            row2 = await db.fetch_one(payments_sql, payment_params)
-        else:
-            # Hiç aktif sipariş yoksa mevcut seansı yok say
-            row2 = {"toplam": 0}
-
-    od_toplam = float(row2["toplam"] or 0)
-
-    # Bakiye hesaplama mantığı:
-    # "hazir" durumundaki siparişler henüz ödenmemiş kabul edilir
-    # Ödemeler önce "odendi" durumundaki siparişlere uygulanır, sonra "hazir" siparişlere
-    # Bakiye = hazir_toplam - max(0, ödemeler - odendi_toplam)
-    # Eğer ödemeler >= (odendi_toplam + hazir_toplam) ise: bakiye = 0
-    # Aksi halde: bakiye = hazir_toplam - max(0, ödemeler - odendi_toplam)
-    if hazir_toplam > 0:
-        # "hazir" durumundaki siparişler var
-        # Ödemeler önce "odendi" siparişlere uygulanır, sonra "hazir" siparişlere
-        odendi_icin_odeme = min(od_toplam, odendi_toplam)
-        hazir_icin_odeme = max(0.0, od_toplam - odendi_icin_odeme)
-        
-        if hazir_icin_odeme >= hazir_toplam:
-            # Tüm "hazir" siparişler ödenmiş, bakiye 0
-            bakiye = 0.0
-        else:
-            # "hazir" siparişlerin bir kısmı ödenmemiş
-            bakiye = hazir_toplam - hazir_icin_odeme
-    elif sip_toplam > 0:
-        # Aktif siparişler var ama "hazir" yok, normal hesaplama
-        bakiye = max(0.0, sip_toplam - od_toplam)
-    else:
-        # Aktif sipariş yok
-        if od_toplam >= sip_all_toplam and sip_all_toplam > 0:
-            # Tüm siparişler öденmiş, bakiye 0
-            bakiye = 0.0
-        else:
-            # Aktif sipariş yok ve finalize edilmiş, bakiye 0
-            bakiye = 0.0
-
-    return {
-        "masa": masa,
-        "siparis_toplam": sip_toplam,
-        "odeme_toplam": od_toplam,
-        "bakiye": round(max(0.0, bakiye), 2),
-        "adisyon_id": adisyon_id,
-        "session_start": session_start_dt.isoformat() if session_start_dt else None,
-    }
+    # Tüm toplamlar (aktif/hazir/odendi/tümü, ödemeler, seans başlangıcı) tek sorguda
+    return await fetch_table_balance(masa, sube_id)
 
 
 async def _finalize_hazir_siparisler(masa: str, sube_id: int) -> List[int]:
@@ -282,16 +111,21 @@ async def _finalize_hazir_siparisler(masa: str, sube_id: int) -> List[int]:
         return []
 
     # Sipariş durumlarını güncelle
-    result = await db.execute(
+    closed_rows = await db.fetch_all(
         """
         UPDATE siparisler
            SET durum = 'odendi'
          WHERE sube_id = :sid
            AND id = ANY(:ids)
+     RETURNING id, masa, durum, mutfak_seq
         """,
         {"sid": sube_id, "ids": ids},
     )
     logging.info(f"Masa {masa} icin {len(ids)} siparis 'odendi' durumuna gecirildi")
+
+    # Mutfak ekranlarından düşen siparişler için tek kompakt delta
+    from ..services.kitchen_feed import publish_kitchen_orders
+    await publish_kitchen_orders(sube_id, closed_rows)
     
     # Cache invalidation: Analytics ve admin istatistiklerini temizle
     # Önemli: Ödeme sonrası ciro değiştiği için cache'i temizlemeliyiz
@@ -345,15 +179,8 @@ async def odeme_ekle(
     adisyon_id = None
     if adisyon_row:
         adisyon_id = adisyon_row["id"]
-        # Adisyon varsa, toplamları güncelle ve bakiyeyi al
-        from ..routers.adisyon import _update_adisyon_totals
-        await _update_adisyon_totals(adisyon_id, sube_id)
-        # Güncellenmiş bakiyeyi tekrar al
-        adisyon_row_updated = await db.fetch_one(
-            "SELECT bakiye FROM adisyons WHERE id = :aid",
-            {"aid": adisyon_id},
-        )
-        bakiye = float(adisyon_row_updated["bakiye"] or 0) if adisyon_row_updated else 0.0
+        # Adisyon bakiyesi trigger'larla güncel tutulur, doğrudan kullanılır
+        bakiye = float(adisyon_row["bakiye"] or 0)
     else:
         # Adisyon yoksa eski sistemi kullan
         ozet = await _hesap_ozet_core(payload.masa, sube_id)
@@ -406,12 +233,11 @@ async def odeme_ekle(
         from ..routers.adisyon import _get_or_create_adisyon
         adisyon_id = await _get_or_create_adisyon(payload.masa, sube_id)
     
-    from ..routers.adisyon import _update_adisyon_totals
-    
     finalized_ids: List[int] = []
     auto_closed = False
     remaining_balance = bakiye
-    async with db.transaction():
+    # Mutfak delta yayınları commit sonrasına ertelenir (cursor henüz görünmeyen satırı atlamasın)
+    async with kitchen_publish_after_commit(), db.transaction():
         row = await db.fetch_one(
             """
             INSERT INTO odemeler (sube_id, masa, adisyon_id, tutar, yontem)
@@ -460,11 +286,7 @@ async def odeme_ekle(
                 },
             )
         
-        # Adisyon toplamlarını güncelle
-        try:
-            await _update_adisyon_totals(adisyon_id, sube_id)
-        except Exception as e:
-            logging.warning(f"Adisyon toplamları güncellenirken hata: {e}", exc_info=True)
+        # Adisyon toplamları odemeler trigger'ı ile güncellendi
         # Bakiye sıfırlandıysa hazir siparisleri kapat ve stoktan dus
         # Transaction içinde yapılmalı ki atomik olsun
         finalized_ids = []
@@ -502,7 +324,6 @@ async def odeme_ekle(
                         {"aid": adisyon_id},
                     )
                     logging.info(f"Adisyon #{adisyon_id} kapatıldı (masa={payload.masa})")
-                    await _update_adisyon_totals(adisyon_id, sube_id)
                 else:
                     # Adisyon yoksa, eğer adisyon oluşturulmamışsa oluştur ve kapat
                     from ..routers.adisyon import _get_or_create_adisyon
@@ -609,7 +430,7 @@ async def ozet_gunluk(
         """
         SELECT COALESCE(SUM(tutar),0) AS ciro
         FROM siparisler
-        WHERE created_at::date = CURRENT_DATE AND durum = 'odendi' AND sube_id = :sid
+        WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1 AND durum = 'odendi' AND sube_id = :sid
         """,
         {"sid": sube_id},
     )
@@ -618,7 +439,7 @@ async def ozet_gunluk(
         """
         SELECT yontem, COALESCE(SUM(tutar),0) AS toplam
         FROM odemeler
-        WHERE created_at::date = CURRENT_DATE AND iptal = FALSE AND sube_id = :sid
+        WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1 AND iptal = FALSE AND sube_id = :sid
         GROUP BY yontem
         ORDER BY toplam DESC
         """,
@@ -628,36 +449,22 @@ async def ozet_gunluk(
         """
         SELECT COALESCE(SUM(tutar),0) AS toplam
         FROM iskonto_kayitlari
-        WHERE created_at::date = CURRENT_DATE AND sube_id = :sid
+        WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1 AND sube_id = :sid
         """,
         {"sid": sube_id},
     )
-    ikram_rows = await db.fetch_all(
+    ikram_row = await db.fetch_one(
         """
-        SELECT sepet
-        FROM siparisler
-        WHERE created_at::date = CURRENT_DATE
+        SELECT COALESCE(SUM(CASE WHEN ikram_tutar > 0 THEN ikram_tutar ELSE adet * birim_fiyat END), 0) AS toplam
+        FROM siparis_kalemleri
+        WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1
+          AND ikram
           AND durum = 'odendi'
           AND sube_id = :sid
         """,
         {"sid": sube_id},
     )
-    gunluk_ikram = 0.0
-    for row in ikram_rows:
-        try:
-            sepet = json.loads(row["sepet"]) if isinstance(row["sepet"], str) else row["sepet"]
-        except Exception:
-            sepet = []
-        if not sepet:
-            continue
-        for item in sepet:
-            if isinstance(item, dict) and item.get("ikram"):
-                if "ikram_edilen_tutar" in item:
-                    gunluk_ikram += float(item.get("ikram_edilen_tutar") or 0)
-                else:
-                    adet = float(item.get("adet") or 1)
-                    fiyat = float(item.get("fiyat") or 0)
-                    gunluk_ikram += adet * fiyat
+    gunluk_ikram = float(ikram_row["toplam"] or 0) if ikram_row else 0.0
 
     gunluk_iskonto = float(iskonto_row["toplam"] or 0) if iskonto_row else 0.0
 
@@ -682,160 +489,47 @@ async def acik_masalar(
 ):
     """
     Adisyon sistemine göre açık masaları listele.
-    Adisyon tablosundan açık adisyonları çeker ve bakiye bilgilerini döndürür.
-    Eğer adisyon yoksa ama aktif siparişler varsa, adisyon oluşturur.
+    Adisyon toplamları ve aktif sipariş sayaçları trigger'larla artımlı tutulduğu için
+    liste doğrudan adisyons satırlarından okunur (tumu=True ise kayıtlı masalar için +1 sorgu).
+    Adisyonsuz eski siparişlerin onarımı okuma yolunda değil, scheduler ve
+    POST /kasa/masalar/onar ile yapılır.
     """
     import logging
-    
-    # Önce adisyon tablosundan açık adisyonları çek
+
     sql = """
-    SELECT 
-      a.masa,
-      a.toplam_tutar AS siparis_toplam,
-      a.odeme_toplam,
-      a.bakiye,
-      a.id AS adisyon_id,
-      -- Hazır sipariş sayısını da ekle (tüm aktif siparişler)
-      COALESCE((
-        SELECT COUNT(*)
-        FROM siparisler
-        WHERE adisyon_id = a.id AND durum IN ('yeni', 'hazirlaniyor', 'hazir')
-      ), 0) AS hazir_count
-    FROM adisyons a
-    WHERE a.sube_id = :sid AND a.durum = 'acik'
+    SELECT
+      masa,
+      toplam_tutar AS siparis_toplam,
+      odeme_toplam,
+      bakiye,
+      id AS adisyon_id,
+      aktif_siparis_sayisi AS hazir_count
+    FROM adisyons
+    WHERE sube_id = :sid AND durum = 'acik'
     """
-    
     if not tumu:
         # Sadece bakiye > 0 veya aktif siparişi olanları göster
-        # ÖNEMLİ: Bakiye = 0 ise ve aktif sipariş yoksa masayı gösterme
         sql += """
-      AND (a.bakiye > 0.01 OR EXISTS (
-        SELECT 1 FROM siparisler
-        WHERE adisyon_id = a.id AND durum IN ('yeni', 'hazirlaniyor', 'hazir')
-      ))
+      AND (bakiye > 0.01 OR aktif_siparis_sayisi > 0)
         """
-    
     sql += """
-    ORDER BY a.bakiye DESC, a.masa ASC
+    ORDER BY bakiye DESC, masa ASC
     LIMIT :limit
     """
     rows = await db.fetch_all(sql, {"sid": sube_id, "limit": limit})
-    
-    # Tüm açık adisyonların toplamlarını güncelle (sipariş durumu değişmiş olabilir)
-    if rows:
-        from ..routers.adisyon import _update_adisyon_totals
-        for r in rows:
-            try:
-                adisyon_id = r["adisyon_id"] if r["adisyon_id"] is not None else None
-                if adisyon_id:
-                    await _update_adisyon_totals(adisyon_id, sube_id)
-            except (KeyError, AttributeError) as e:
-                logging.warning(f"[KASA] Adisyon ID alınamadı: {e}", exc_info=True)
-            except Exception as e:
-                logging.warning(f"[KASA] Adisyon toplamları güncellenirken hata: {e}", exc_info=True)
-        # Güncellenmiş verileri tekrar çek
-        rows = await db.fetch_all(sql, {"sid": sube_id, "limit": limit})
-    
-    # Eğer adisyon olmayan ama aktif siparişi olan masalar varsa, onlar için adisyon oluştur
-    # Bu durum eski sistemden kalan siparişler için gerekli
-    # ÖNEMLİ: Eski ödemelerin adisyon_id'sini güncelleme - sadece siparişleri yeni adisyona bağla
-    aktif_siparis_masalar = await db.fetch_all(
-        """
-        SELECT DISTINCT masa
-        FROM siparisler
-        WHERE sube_id = :sid 
-          AND durum IN ('yeni', 'hazirlaniyor', 'hazir')
-          AND (adisyon_id IS NULL OR adisyon_id = 0)
-        """,
-        {"sid": sube_id},
-    )
-    
-    if aktif_siparis_masalar:
-        from ..routers.adisyon import _get_or_create_adisyon, _update_adisyon_totals
-        for masa_row in aktif_siparis_masalar:
-            masa = masa_row["masa"]
-            try:
-                # Adisyon oluştur veya mevcut adisyonu al
-                adisyon_id = await _get_or_create_adisyon(masa, sube_id)
-                
-                # SADECE siparişlerin adisyon_id'sini güncelle - ÖDEMELERİ GÜNCELLEME!
-                # Eski ödemeler eski adisyonlarına bağlı kalmalı veya NULL olmalı
-                await db.execute(
-                    """
-                    UPDATE siparisler
-                    SET adisyon_id = :aid
-                    WHERE sube_id = :sid AND masa = :masa AND (adisyon_id IS NULL OR adisyon_id = 0)
-                    """,
-                    {"aid": adisyon_id, "sid": sube_id, "masa": masa},
-                )
-                
-                # Adisyon toplamlarını güncelle
-                await _update_adisyon_totals(adisyon_id, sube_id)
-                logging.info(f"[KASA] Eksik adisyon oluşturuldu/güncellendi: masa={masa}, adisyon_id={adisyon_id}")
-            except Exception as e:
-                logging.warning(f"[KASA] Eksik adisyon oluşturulurken hata (masa={masa}): {e}", exc_info=True)
-        
-        # Adisyonları tekrar çek
-        rows = await db.fetch_all(sql, {"sid": sube_id, "limit": limit})
-    
-    logging.info(f"[KASA] acik_masalar çağrıldı: sube_id={sube_id}, tumu={tumu}, limit={limit}, dönen masa sayısı={len(rows)}")
-    if rows:
-        # Debug: Her masa için detaylı bilgi logla
-        for r in rows[:10]:
-            try:
-                hazir_count = r['hazir_count'] if r['hazir_count'] is not None else 0
-            except (KeyError, AttributeError):
-                hazir_count = 0
-            try:
-                siparis_toplam = r['siparis_toplam'] if 'siparis_toplam' in r else 0
-                odeme_toplam = r['odeme_toplam'] if 'odeme_toplam' in r else 0
-                bakiye = r['bakiye'] if 'bakiye' in r else 0
-            except (KeyError, AttributeError):
-                siparis_toplam = 0
-                odeme_toplam = 0
-                bakiye = 0
-            logging.info(f"[KASA] Masa: {r['masa']}, bakiye: {bakiye}, siparis_toplam: {siparis_toplam}, odeme_toplam: {odeme_toplam}, hazir_count: {hazir_count}")
-    else:
-        # Debug için: hazir durumundaki masaları kontrol et
-        debug_rows = await db.fetch_all(
-            "SELECT masa, COUNT(*) as cnt FROM siparisler WHERE sube_id = :sid AND durum = 'hazir' GROUP BY masa",
-            {"sid": sube_id}
-        )
-        if debug_rows:
-            logging.warning(f"[KASA] DEBUG: Hazir durumunda {len(debug_rows)} masa var ama acik_masalar'da gözükmüyor: {[r['masa'] for r in debug_rows]}")
+
     result = []
     mevcut_masalar = set()
     for r in rows:
-        try:
-            # SQL'den gelen kolon adlarını kullan: siparis_toplam, odeme_toplam, bakiye
-            # Record objesi için try-except kullanıyoruz
-            try:
-                siparis_toplam = r["siparis_toplam"]
-            except (KeyError, AttributeError):
-                siparis_toplam = 0
-                
-            try:
-                odeme_toplam = r["odeme_toplam"]
-            except (KeyError, AttributeError):
-                odeme_toplam = 0
-                
-            try:
-                bakiye = r["bakiye"]
-            except (KeyError, AttributeError):
-                bakiye = 0
-            
-            result.append({
-                "masa": r["masa"],
-                "siparis_toplam": float(siparis_toplam or 0),
-                "odeme_toplam": float(odeme_toplam or 0),
-                "bakiye": float(bakiye or 0),
-                "adisyon_id": r["adisyon_id"] if "adisyon_id" in r else None,
-                "hazir_count": r["hazir_count"] if "hazir_count" in r else 0,
-            })
-            mevcut_masalar.add(r["masa"])
-        except Exception as e:
-            logging.warning(f"[KASA] Masa verisi işlenirken hata: {e}", exc_info=True)
-            continue
+        result.append({
+            "masa": r["masa"],
+            "siparis_toplam": float(r["siparis_toplam"] or 0),
+            "odeme_toplam": float(r["odeme_toplam"] or 0),
+            "bakiye": float(r["bakiye"] or 0),
+            "adisyon_id": r["adisyon_id"],
+            "hazir_count": int(r["hazir_count"] or 0),
+        })
+        mevcut_masalar.add(r["masa"])
 
     if tumu:
         try:
@@ -862,80 +556,29 @@ async def acik_masalar(
         except Exception as e:
             logging.warning(f"[KASA] Kayıtlı masalar alınırken hata: {e}", exc_info=True)
 
+    logging.debug(f"[KASA] acik_masalar: sube_id={sube_id}, tumu={tumu}, limit={limit}, dönen masa sayısı={len(rows)}")
     return result
 
 
-# ------ Siparis + masa detayi ------
-def _decode_sepet(value):
-    if value is None:
-        return []
-    if isinstance(value, list):
-        return value
-    if isinstance(value, str):
-        try:
-            return json.loads(value)
-        except json.JSONDecodeError:
-            return []
-    return []
-
+@router.post(
+    "/masalar/onar",
+    dependencies=[Depends(require_roles({"admin", "operator"}))]
+)
+async def acik_masalar_onar(
+    _: Mapping[str, Any] = Depends(get_current_user),
+    sube_id: int = Depends(get_sube_id),
+):
+    """
+    Adisyonu olmayan aktif siparişleri masanın açık adisyonuna bağlar (yoksa oluşturur).
+    Normalde scheduler periyodik olarak çalıştırır; bu uç anında onarım içindir.
+    """
+    from ..routers.adisyon import _attach_orphan_siparisler
 
-def _normalize_items(value):
-    def _num(val, default=0.0):
-        try:
-            if val is None or val == "":
-                return default
-            return float(val)
-        except (TypeError, ValueError):
-            return default
-
-    items = []
-    for item in _decode_sepet(value):
-        if isinstance(item, dict):
-            urun = str(item.get("urun") or item.get("ad") or "").strip()
-            adet = _num(
-                item.get("adet")
-                or item.get("miktar")
-                or item.get("quantity")
-                or item.get("qty"),
-                default=1.0,
-            )
-            if adet <= 0:
-                adet = 1.0
-            fiyat = _num(
-                item.get("fiyat")
-                or item.get("birim_fiyat")
-                or item.get("unit_price")
-                or item.get("price"),
-                default=0.0,
-            )
-            toplam = _num(
-                item.get("toplam")
-                or item.get("tutar")
-                or item.get("total"),
-                default=fiyat * adet,
-            )
-            if fiyat == 0 and adet:
-                fiyat = toplam / adet if toplam else 0.0
-            item_dict = {
-                "urun": urun,
-                "adet": adet,
-                "miktar": adet,
-                "fiyat": fiyat,
-                "toplam": fiyat * adet if fiyat else toplam,
-            }
-            
-            # Include variation if present
-            if "varyasyon" in item:
-                item_dict["varyasyon"] = item["varyasyon"]
-            
-            # Include ikram flag if present
-            if "ikram" in item:
-                item_dict["ikram"] = item["ikram"]
-            
-            items.append(item_dict)
-    return items
+    baglanan = await _attach_orphan_siparisler(sube_id)
+    return {"message": "Adisyon onarımı tamamlandı", "baglanan_siparis": baglanan}
 
 
+# ------ Siparis + masa detayi ------
 @router.get("/hesap/detay")
 async def hesap_detay(
     masa: str = Query(..., min_length=1),
@@ -978,7 +621,7 @@ async def hesap_detay(
     last_personel_role: Optional[str] = None
 
     for row in siparis_rows:
-        items = _normalize_items(row["sepet"])
+        items = normalize_items(row["sepet"])
         created_by_user_id = row["created_by_user_id"] if "created_by_user_id" in row else None
         created_by_username = row["created_by_username"] if "created_by_username" in row else None
         personel_username = row["personel_username"] if "personel_username" in row else None
@@ -1078,7 +721,7 @@ async def kasa_siparisler(
     rows = await db.fetch_all(base_sql, {"sid": sube_id, "limit": limit})
     result = []
     for row in rows:
-        items = _normalize_items(row["sepet"])
+        items = normalize_items(row["sepet"])
         result.append({
             "id": row["id"],
             "masa": row["masa"],
@@ -1203,6 +846,33 @@ def _convert_unit_to_base(amount: float, unit: str) -> float:
     return amount
 
 
+def _recete_miktari_stok_birimine(toplam_dusulecek: float, recete_birim: str, stok_birim: str) -> float:
+    """
+    Reçete birimindeki miktarı stok kaleminin birimine çevir.
+    Reçete birimi ile stok birimi aynıysa veya bilinmiyorsa miktar olduğu gibi kullanılır.
+    """
+    if recete_birim and stok_birim:
+        # Her iki birimi de temel birime çevir
+        recete_base = _convert_unit_to_base(toplam_dusulecek, recete_birim)
+        stok_birim_lower = stok_birim.lower()
+        # Stok birimine göre tekrar çevir
+        if stok_birim_lower in ["litre", "l", "lt", "liter"]:
+            return recete_base / 1000  # ml -> litre
+        if stok_birim_lower in ["kg", "kilogram", "kilo"]:
+            return recete_base / 1000  # gr -> kg
+        if stok_birim_lower in ["ml", "mililitre", "milliliter"]:
+            return recete_base  # zaten ml
+        if stok_birim_lower in ["gr", "gram", "g"]:
+            return recete_base  # zaten gr
+        # Aynı birim veya bilinmeyen -> reçete miktarını olduğu gibi kullan
+        return toplam_dusulecek
+    if recete_birim:
+        # Sadece reçete birimi var, temel birime çevir
+        return _convert_unit_to_base(toplam_dusulecek, recete_birim)
+    # Birim bilgisi yok, olduğu gibi kullan
+    return toplam_dusulecek
+
+
 async def _dus_stok_recepte(
     masa: str,
     sube_id: int,
@@ -1213,7 +883,12 @@ async def _dus_stok_recepte(
     - Siparişteki her ürün için reçete kontrolü yapılır
     - Reçete miktarı × sipariş adedi = düşülecek miktar
     - Birim dönüşümü yapılır (ml/litre, gr/kg)
+
+    Reçeteler şube bazlı cache'lenmiş indeksten okunur (services/recipe_index);
+    tüm malzemeler stok adına göre birleştirilip tek bulk UPDATE ile düşülür.
     """
+    import logging
+
     try:
         # Masadaki aktif siparislerin sepetlerini topla
         # ÖNEMLİ: Artık sadece 'hazir' değil, tüm aktif siparişler ('yeni', 'hazirlaniyor', 'hazir') işleniyor
@@ -1228,22 +903,16 @@ async def _dus_stok_recepte(
                 {"sid": sube_id, "masa": masa},
             )
         
-        import json
         from ..routers.siparis import normalize_name
+        from ..services.recipe_index import bulk_decrement_stock, get_recipe_index
         
         # Ürün bazında toplam adet hesapla
         # {urun_normalized: toplam_adet}
         toplam: Dict[str, int] = {}
         for r in rows:
-            val = r["sepet"]
-            if isinstance(val, list):
-                arr = val
-            elif isinstance(val, str):
-                arr = json.loads(val)
-            else:
-                arr = []
-            
-            for it in arr:
+            for it in decode_sepet(r["sepet"]):
+                if not isinstance(it, dict):
+                    continue
                 urun_adi = str(it.get("urun", "")).strip()
                 if not urun_adi:
                     continue
@@ -1255,174 +924,54 @@ async def _dus_stok_recepte(
         if not toplam:
             return
 
-        # Her ürün için reçete kontrolü ve stoktan düşme
+        index = await get_recipe_index(sube_id)
+        receteler = index["receteler"]
+
+        # {stok_id: toplam_dusulecek} - aynı malzeme birden fazla üründe geçebilir
+        dusulecekler: Dict[int, float] = {}
         for urun_key, siparis_adet in toplam.items():
-            # Reçeteyi bul: Tüm reçeteleri çekip normalize ederek karşılaştır
-            # (Çünkü reçete tablosunda normalize edilmemiş ürün adı kaydedilmiş olabilir)
-            all_recs = await db.fetch_all(
-                """
-                SELECT stok, miktar, birim, urun
-                FROM receteler 
-                WHERE sube_id = :sid
-                """,
-                {"sid": sube_id},
-            )
-            # Normalize edilmiş ürün adı ile eşleşen reçeteleri bul
-            recs = [
-                rec for rec in all_recs 
-                if normalize_name(str(rec["urun"]).strip()) == urun_key
-            ]
-            
-            # Debug log - reçete bulunamazsa uyar
-            if not recs:
-                import logging
-                mevcut_receteler_str = ", ".join([normalize_name(str(r['urun']).strip()) for r in all_recs[:10]])
-                logging.warning(
-                    f"[STOK_DUSME] Recete bulunamadi: urun_key='{urun_key}', siparis_adet={siparis_adet}, "
-                    f"masa='{masa}', sube_id={sube_id}. "
-                    f"Mevcut receteler (ilk 10): {mevcut_receteler_str}. "
-                    f"Fallback mekanizmasi deneniyor..."
-                )
-            else:
-                import logging
-                logging.info(
-                    f"[STOK_DUSME] Recete bulundu: urun_key='{urun_key}', siparis_adet={siparis_adet}, "
-                    f"recete_sayisi={len(recs)}, masa='{masa}', sube_id={sube_id}"
-                )
-            
+            recs = receteler.get(urun_key)
             if recs:
                 # Reçete tanımlı: Reçete miktarı × Sipariş adedi
-                for rec in recs:
-                    try:
-                        stok_adi = str(rec["stok"]).strip()
-                        recete_miktar = float(rec["miktar"] or 0)
-                        # Database record'da .get() yok, direkt erişim
-                        recete_birim = str(rec["birim"] if rec["birim"] else "").strip()
-                    except (KeyError, AttributeError) as e:
-                        import logging
-                        logging.warning(f"Recete record'unda eksik alan: {e}")
+                for stok_id, stok_adi, recete_miktar, recete_birim, stok_birim in recs:
+                    if stok_id is None:
+                        # Reçetedeki stok kalemi tanımlı değil, düşülecek bir şey yok
+                        logging.warning(
+                            f"[STOK_DUSME] Recete stok kalemi bulunamadi: stok_adi='{stok_adi}', "
+                            f"urun='{urun_key}', masa='{masa}', sube_id={sube_id}"
+                        )
                         continue
-                    
-                    # Toplam düşülecek miktar = reçete_miktar × siparis_adet
                     # Örn: 100 ml × 2 latte = 200 ml
-                    toplam_dusulecek = recete_miktar * siparis_adet
-                    
-                    # Stok kaleminin birimini al
-                    stok_row = await db.fetch_one(
-                        """
-                        SELECT ad, birim FROM stok_kalemleri 
-                        WHERE sube_id = :sid AND ad = :stok_adi
-                        LIMIT 1
-                        """,
-                        {"sid": sube_id, "stok_adi": stok_adi},
-                    )
-                    
-                    if stok_row:
-                        # Database record'da .get() yok, direkt erişim
-                        try:
-                            stok_birim = str(stok_row["birim"] if stok_row["birim"] else "").strip()
-                        except (KeyError, AttributeError):
-                            stok_birim = ""
-                        
-                        # Birim dönüşümü: Reçete birimi ile stok birimi aynıysa direkt kullan
-                        # Farklıysa temel birime çevir ve stok birimine dönüştür
-                        if recete_birim and stok_birim:
-                            # Her iki birimi de temel birime çevir
-                            recete_base = _convert_unit_to_base(toplam_dusulecek, recete_birim)
-                            
-                            # Stok birimine göre tekrar çevir
-                            if stok_birim.lower() in ["litre", "l", "lt", "liter"]:
-                                dusulecek_miktar = recete_base / 1000  # ml -> litre
-                            elif stok_birim.lower() in ["kg", "kilogram", "kilo"]:
-                                dusulecek_miktar = recete_base / 1000  # gr -> kg
-                            elif stok_birim.lower() in ["ml", "mililitre", "milliliter"]:
-                                dusulecek_miktar = recete_base  # zaten ml
-                            elif stok_birim.lower() in ["gr", "gram", "g"]:
-                                dusulecek_miktar = recete_base  # zaten gr
-                            else:
-                                # Aynı birim veya bilinmeyen -> reçete miktarını olduğu gibi kullan
-                                dusulecek_miktar = toplam_dusulecek
-                        elif recete_birim:
-                            # Sadece reçete birimi var, temel birime çevir
-                            dusulecek_miktar = _convert_unit_to_base(toplam_dusulecek, recete_birim)
-                        else:
-                            # Birim bilgisi yok, olduğu gibi kullan
-                            dusulecek_miktar = toplam_dusulecek
-                        
-                        # Stoktan düş
-                        result = await db.execute(
-                    """
-                    UPDATE stok_kalemleri
-                       SET mevcut = GREATEST(0, (mevcut - :m))
-                     WHERE sube_id = :sid AND ad = :stok_adi
-                    """,
-                            {"sid": sube_id, "stok_adi": stok_adi, "m": dusulecek_miktar},
-                        )
-                        import logging
-                        logging.info(
-                            f"[STOK_DUSME] Stok dusuldu (recete ile): stok_adi='{stok_adi}', "
-                            f"dusulecek={dusulecek_miktar} {stok_birim or recete_birim or 'birim'}, "
-                            f"recete_miktar={recete_miktar} {recete_birim or 'birim'}, "
-                            f"siparis_adet={siparis_adet}, urun='{urun_key}', masa='{masa}', sube_id={sube_id}, "
-                            f"UPDATE result={result}"
-                        )
+                    miktar = _recete_miktari_stok_birimine(recete_miktar * siparis_adet, recete_birim, stok_birim)
+                    dusulecekler[stok_id] = dusulecekler.get(stok_id, 0.0) + miktar
+                continue
+
+            # Reçete tanımlı değil: Ürün adı = Stok adı ise direkt düş (basit fallback)
+            # Önce küçük harf eşleşmesi, sonra normalize edilmiş isim
+            stok_id = index["stok_lower"].get(urun_key.lower()) or index["stok_norm"].get(urun_key)
+            if stok_id:
+                dusulecekler[stok_id] = dusulecekler.get(stok_id, 0.0) + siparis_adet
+                logging.debug(
+                    f"[STOK_DUSME] Fallback (recete yok): stok_id={stok_id}, "
+                    f"dusulecek_adet={siparis_adet}, urun='{urun_key}', masa='{masa}', sube_id={sube_id}"
+                )
             else:
-                # Reçete tanımlı değil: Ürün adı = Stok adı ise direkt düş (basit fallback)
-                import logging
-                
-                # Önce normalize edilmiş isimle kontrol et
-                stok_row = await db.fetch_one(
-                    """
-                    SELECT ad FROM stok_kalemleri 
-                    WHERE sube_id = :sid AND LOWER(ad) = LOWER(:urun)
-                    LIMIT 1
-                    """,
-                    {"sid": sube_id, "urun": urun_key},
+                logging.warning(
+                    f"[STOK_DUSME] Stok kalemi bulunamadi: urun_key='{urun_key}', siparis_adet={siparis_adet}, "
+                    f"masa='{masa}', sube_id={sube_id}. "
+                    f"Stok dusurme yapilamadi - recete tanimli degil ve stok kalemi bulunamadi."
                 )
-                
-                # Bulunamazsa, normalize edilmiş isimle kontrol et
-                if not stok_row:
-                    # Tüm stok kalemlerini çek ve normalize ederek karşılaştır
-                    all_stok = await db.fetch_all(
-                        """
-                        SELECT ad FROM stok_kalemleri 
-                        WHERE sube_id = :sid
-                        """,
-                        {"sid": sube_id},
-                    )
-                    for stok_item in all_stok:
-                        stok_normalized = normalize_name(str(stok_item["ad"]).strip())
-                        if stok_normalized == urun_key:
-                            stok_row = stok_item
-                            break
-                
-                if stok_row:
-                    stok_adi = stok_row["ad"]
-                    result = await db.execute(
-                        """
-                        UPDATE stok_kalemleri
-                           SET mevcut = GREATEST(0, (mevcut - :adet))
-                         WHERE sube_id = :sid AND ad = :stok_adi
-                        """,
-                        {"sid": sube_id, "stok_adi": stok_adi, "adet": siparis_adet},
-                    )
-                    logging.info(
-                        f"[STOK_DUSME] Fallback: Stok dusuldu (recete yok): stok_adi='{stok_adi}', "
-                        f"dusulecek_adet={siparis_adet}, urun='{urun_key}', masa='{masa}', sube_id={sube_id}"
-                    )
-                else:
-                    # Stok kalemi de bulunamadı
-                    logging.warning(
-                        f"[STOK_DUSME] Stok kalemi bulunamadi: urun_key='{urun_key}', siparis_adet={siparis_adet}, "
-                        f"masa='{masa}', sube_id={sube_id}. "
-                        f"Stok dusurme yapilamadi - recete tanimli degil ve stok kalemi bulunamadi."
-                    )
+
+        guncellenen = await bulk_decrement_stock(sube_id, dusulecekler)
+        logging.info(
+            f"[STOK_DUSME] masa='{masa}', sube_id={sube_id}: {len(toplam)} urun, "
+            f"{len(dusulecekler)} stok kalemi dusuldu (guncellenen satir={guncellenen})"
+        )
                     
     except Exception as e:
         # Stok/recete tablolar yoksa veya hata oluşursa detaylı log
         # ÖNEMLİ: Exception'ı fırlatmıyoruz çünkü ödeme zaten alınmış olabilir
         # Ancak hatayı ERROR seviyesinde loglayalım ki görünsün
-        import logging
         logging.error(
             f"[STOK_DUSME_HATASI] masa='{masa}', sube_id={sube_id}, "
             f"hata_tipi={type(e).__name__}, hata_mesaji={str(e)}", 
@@ -1456,7 +1005,7 @@ async def siparis_item_masa_degistir(
     if not siparis:
         raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
     
-    sepet = _decode_sepet(siparis["sepet"])
+    sepet = decode_sepet(siparis["sepet"])
     if payload.item_index < 0 or payload.item_index >= len(sepet):
         raise HTTPException(status_code=400, detail="Geçersiz item index")
     
@@ -1467,10 +1016,9 @@ async def siparis_item_masa_degistir(
     # Eski siparişin tutarını güncelle
     yeni_tutar = sum(i.get("fiyat", 0) * i.get("adet", 1) for i in yeni_sepet)
     
-    from ..routers.adisyon import _get_or_create_adisyon, _update_adisyon_totals
+    from ..routers.adisyon import _get_or_create_adisyon
 
     hedef_masa = payload.yeni_masa.strip()
-    eski_adisyon_id = siparis.get("adisyon_id")
     
     async with db.transaction():
         # Eski siparişi güncelle (item çıkarıldı)
@@ -1511,7 +1059,7 @@ async def siparis_item_masa_degistir(
         
         if hedef_siparis:
             # Mevcut siparişe ekle
-            hedef_sepet = _decode_sepet(hedef_siparis["sepet"])
+            hedef_sepet = decode_sepet(hedef_siparis["sepet"])
             hedef_sepet.append(item)
             hedef_tutar = sum(i.get("fiyat", 0) * i.get("adet", 1) for i in hedef_sepet)
             
@@ -1548,16 +1096,7 @@ async def siparis_item_masa_degistir(
             )
             logging.info(f"Item {payload.item_index} from siparis {payload.siparis_id} moved to new siparis {yeni_siparis_id['id']} at masa {payload.yeni_masa} (durum: hazir)")
 
-        # Adisyon toplamlarını güncelle
-        if eski_adisyon_id:
-            try:
-                await _update_adisyon_totals(int(eski_adisyon_id), sube_id)
-            except Exception as e:
-                logging.warning(f"Eski adisyon toplamı güncellenemedi (adisyon_id={eski_adisyon_id}): {e}", exc_info=True)
-        try:
-            await _update_adisyon_totals(hedef_adisyon_id, sube_id)
-        except Exception as e:
-            logging.warning(f"Hedef adisyon toplamı güncellenemedi (adisyon_id={hedef_adisyon_id}): {e}", exc_info=True)
+        # Eski ve hedef adisyon toplamları siparisler trigger'ı ile güncellendi
 
     # WebSocket broadcast - notify cashier and orders topics about table transfer
     from ..websocket.manager import manager, Topics
@@ -1609,7 +1148,7 @@ async def siparis_item_ikram(
     if not siparis:
         raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
     
-    sepet = _decode_sepet(siparis["sepet"])
+    sepet = decode_sepet(siparis["sepet"])
     if payload.item_index < 0 or payload.item_index >= len(sepet):
         raise HTTPException(status_code=400, detail="Geçersiz item index")
     
@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 from . import kasa as _kasa
 from ..core.deps import get_current_user, get_sube_id, require_roles
 from ..db.database import db
+from ..services.kitchen_feed import kitchen_publish_after_commit
 
 
 ALLOWED_YONTEM = {"nakit", "kart", "havale", "iyzico", "papara", "diger"}
@@ -72,7 +73,7 @@ async def odeme_ekle(
             detail=f"Fazla odeme: bakiye {ozet['bakiye']} TL, tutar {payload.tutar} TL",
         )
 
-    async with db.transaction():
+    async with kitchen_publish_after_commit(), db.transaction():
         row = await db.fetch_one(
             """
             INSERT INTO odemeler (sube_id, masa, tutar, yontem)
@@ -141,7 +142,7 @@ async def odeme_kapat(
     if bakiye <= 0:
         raise HTTPException(status_code=400, detail="Kapatacak bakiye yok")
 
-    async with db.transaction():
+    async with kitchen_publish_after_commit(), db.transaction():
         row = await db.fetch_one(
             """
             INSERT INTO odemeler (sube_id, masa, tutar, yontem)
@@ -10,6 +10,15 @@ from ..core.config import settings
 from ..core.deps import get_current_user, get_sube_id, require_roles
 from ..core.cache import cache, cache_key
 from ..db.database import db
+from ..services.menu_snapshot import invalidate_menu_snapshot
+from ..services.recipe_index import invalidate_recipe_index
+from ..services.tenant_usage import (
+    forget_tenant_usage,
+    get_tenant_usage,
+    record_membership_change,
+    record_usage_change,
+    tenant_of_sube,
+)
 
 router = APIRouter(prefix="/menu", tags=["Menu"])
 
@@ -110,7 +119,8 @@ async def menu_ekle(
     import logging
     logging.info(f"[MENU_EKLE] sube_id={sube_id}, effective_tenant_id={effective_tenant_id}, item={item.model_dump()}")
     
-    # UNIQUE (sube_id, unaccent(lower(ad))) nedeniyle kopya yazımlar hata verebilir -> INSERT dene, patlarsa UPDATE
+    # UNIQUE (sube_id, unaccent(lower(ad))) ve (sube_id, neso_urun_key(ad)) nedeniyle kopya yazımlar
+    # hata verebilir -> INSERT dene, patlarsa çakışan satırı aynı anahtarlarla bulup UPDATE
     params = {**item.model_dump(), "sid": sube_id}
     try:
         row = await db.fetch_one(
@@ -122,6 +132,8 @@ async def menu_ekle(
             params,
         )
         logging.info(f"[MENU_EKLE] Menü eklendi: id={row['id']}, ad={row['ad']}, sube_id={sube_id}")
+        if row["aktif"]:
+            await record_usage_change(await tenant_of_sube(sube_id), "menu_items", 1)
     except Exception as e:
         # Aynı ürün farklı yazımla varsa (aynı şubede) UPDATE'e düş
         logging.warning(f"[MENU_EKLE] INSERT başarısız, UPDATE deneniyor: {e}")
@@ -133,7 +145,14 @@ async def menu_ekle(
                    aktif = :aktif,
                    aciklama = COALESCE(:aciklama, aciklama)
              WHERE sube_id = :sid
-               AND unaccent(lower(ad)) = unaccent(lower(:ad))
+               AND id = (
+                   SELECT m.id FROM menu m
+                    WHERE m.sube_id = :sid
+                      AND (neso_urun_key(m.ad) = neso_urun_key(:ad)
+                           OR unaccent(lower(m.ad)) = unaccent(lower(:ad)))
+                    ORDER BY (neso_urun_key(m.ad) = neso_urun_key(:ad)) DESC, m.id DESC
+                    LIMIT 1
+               )
          RETURNING id, ad, fiyat, kategori, aktif, aciklama, gorsel_url
             """,
             params,
@@ -142,9 +161,13 @@ async def menu_ekle(
             logging.error(f"[MENU_EKLE] UPDATE başarısız: sube_id={sube_id}, ad={params.get('ad')}")
             raise HTTPException(status_code=400, detail="Menü ekleme/güncelleme başarısız")
         logging.info(f"[MENU_EKLE] Menü güncellendi: id={row['id']}, ad={row['ad']}, sube_id={sube_id}")
+        # Önceki aktiflik bilinmiyor: sayaç yeniden sayılsın
+        await forget_tenant_usage(await tenant_of_sube(sube_id))
     
     # Cache'i temizle (menu listesi değişti) - TÜM tenant'lar ve sube'ler için
     await cache.delete_pattern("menu:liste:*")
+    await invalidate_menu_snapshot(sube_id)
+    await invalidate_recipe_index(sube_id)
     logging.info(f"[MENU_EKLE] Cache temizlendi: pattern=menu:liste:*")
     
     return row_to_menu_out(row)
@@ -322,7 +345,7 @@ async def menu_guncelle(
         # id ile bul
         mevcut = await db.fetch_one(
             """
-            SELECT id, ad FROM menu
+            SELECT id, ad, aktif FROM menu
              WHERE id = :id AND sube_id = :sid
              LIMIT 1
             """,
@@ -346,7 +369,7 @@ async def menu_guncelle(
         # ad ile bul
         mevcut = await db.fetch_one(
             """
-            SELECT id, ad FROM menu
+            SELECT id, ad, aktif FROM menu
              WHERE sube_id = :sid
                AND unaccent(lower(ad)) = unaccent(lower(:ad))
              LIMIT 1
@@ -400,9 +423,14 @@ async def menu_guncelle(
          WHERE {where_clause}
     """
     await db.execute(sql, values)
+    if payload.aktif is not None:
+        tenant_id = await tenant_of_sube(sube_id)
+        await record_membership_change("menu_items", tenant_id, mevcut["aktif"], tenant_id, payload.aktif)
     
     # Cache'i temizle (menu listesi değişti)
     await cache.delete_pattern("menu:liste:*")
+    await invalidate_menu_snapshot(sube_id)
+    await invalidate_recipe_index(sube_id)
 
     # Güncellenmiş kaydı getir
     if payload.id:
@@ -597,7 +625,7 @@ async def menu_sil(
         # id ile bul ve sil
         row = await db.fetch_one(
             """
-            SELECT id, ad FROM menu
+            SELECT id, ad, aktif FROM menu
              WHERE id = :id AND sube_id = :sid
              LIMIT 1
             """,
@@ -613,14 +641,18 @@ async def menu_sil(
             """,
             {"id": id, "sid": sube_id},
         )
+        if row["aktif"]:
+            await record_usage_change(await tenant_of_sube(sube_id), "menu_items", -1)
         # Cache'i temizle (menu listesi değişti)
         await cache.delete_pattern("menu:liste:*")
+        await invalidate_menu_snapshot(sube_id)
+        await invalidate_recipe_index(sube_id)
         return {"message": f"Silindi: {urun_ad} (ID: {id})"}
     else:
         # ad ile bul ve sil
         row = await db.fetch_one(
             """
-            SELECT id, ad FROM menu
+            SELECT id, ad, aktif FROM menu
              WHERE sube_id = :sid
                AND unaccent(lower(ad)) = unaccent(lower(:ad))
              LIMIT 1
@@ -637,8 +669,12 @@ async def menu_sil(
             """,
             {"sid": sube_id, "ad": ad},
         )
+        if row["aktif"]:
+            await record_usage_change(await tenant_of_sube(sube_id), "menu_items", -1)
         # Cache'i temizle (menu listesi değişti)
         await cache.delete_pattern("menu:liste:*")
+        await invalidate_menu_snapshot(sube_id)
+        await invalidate_recipe_index(sube_id)
         return {"message": f"Silindi: {ad}"}
 
 @router.post(
@@ -694,11 +730,7 @@ async def menu_yukle_csv(
         )
         if sub:
             max_limit = sub["max_menu_items"]
-            current_count_row = await db.fetch_one(
-                "SELECT COUNT(*) as count FROM menu m JOIN subeler s ON m.sube_id = s.id WHERE s.isletme_id = :id AND m.aktif = TRUE", 
-                {"id": isletme_id}
-            )
-            count_val = current_count_row["count"] if current_count_row else 0
+            count_val = (await get_tenant_usage(isletme_id))["menu_items"]
             
             # Yeni eklenecek benzersiz ürünleri hesapla
             new_additions = [it for it in items if normalize_name(it["ad"]) not in mevcut_map]
@@ -754,12 +786,21 @@ async def menu_yukle_csv(
                            kategori = :kategori,
                            aktif = :aktif
                      WHERE sube_id = :sid
-                       AND unaccent(lower(ad)) = unaccent(lower(:ad))
+                       AND (neso_urun_key(ad) = neso_urun_key(:ad)
+                            OR unaccent(lower(ad)) = unaccent(lower(:ad)))
                     """,
                     it_sube,
                 )
                 update_count += 1
 
+    # Toplu ekleme/aktiflik değişimi: sayaç yeniden sayılsın
+    await forget_tenant_usage(tenant_info["isletme_id"] if tenant_info else None)
+
+    # Cache'i temizle (menu listesi değişti)
+    await cache.delete_pattern("menu:liste:*")
+    await invalidate_menu_snapshot(sube_id)
+    await invalidate_recipe_index(sube_id)
+
     return {
         "ok": True,
         "toplam_kayit": len(items),
@@ -5,6 +5,7 @@ from typing import List, Optional, Dict, Any
 
 from ..core.deps import get_current_user, get_sube_id, require_roles
 from ..db.database import db
+from ..services.menu_snapshot import invalidate_menu_snapshot
 
 router = APIRouter(prefix="/menu-varyasyonlar", tags=["Menu Varyasyonlar"])
 
@@ -45,7 +46,7 @@ async def varyasyon_ekle(
     """Yeni menü varyasyonu ekle"""
     # Menu ID'nin geçerli olduğunu kontrol et
     menu = await db.fetch_one(
-        "SELECT id FROM menu WHERE id = :mid",
+        "SELECT id, sube_id FROM menu WHERE id = :mid",
         {"mid": item.menu_id}
     )
     if not menu:
@@ -65,6 +66,8 @@ async def varyasyon_ekle(
     if not row:
         raise HTTPException(status_code=500, detail="Varyasyon eklenemedi")
     
+    await invalidate_menu_snapshot(menu["sube_id"])
+
     return {
         "id": row["id"],
         "menu_id": row["menu_id"],
@@ -122,7 +125,12 @@ async def varyasyon_guncelle(
 ):
     """Varyasyon bilgilerini güncelle"""
     existing = await db.fetch_one(
-        "SELECT id FROM menu_varyasyonlar WHERE id = :id",
+        """
+        SELECT mv.id, m.sube_id
+        FROM menu_varyasyonlar mv
+        LEFT JOIN menu m ON m.id = mv.menu_id
+        WHERE mv.id = :id
+        """,
         {"id": payload.id}
     )
     if not existing:
@@ -158,6 +166,9 @@ async def varyasyon_guncelle(
     if not row:
         raise HTTPException(status_code=400, detail="Güncelleme başarısız")
     
+    if updates:
+        await invalidate_menu_snapshot(existing["sube_id"])
+
     return {
         "id": row["id"],
         "menu_id": row["menu_id"],
@@ -176,7 +187,12 @@ async def varyasyon_sil(
 ):
     """Varyasyon sil"""
     existing = await db.fetch_one(
-        "SELECT id FROM menu_varyasyonlar WHERE id = :id",
+        """
+        SELECT mv.id, m.sube_id
+        FROM menu_varyasyonlar mv
+        LEFT JOIN menu m ON m.id = mv.menu_id
+        WHERE mv.id = :id
+        """,
         {"id": varyasyon_id}
     )
     if not existing:
@@ -186,6 +202,7 @@ async def varyasyon_sil(
         "DELETE FROM menu_varyasyonlar WHERE id = :id",
         {"id": varyasyon_id}
     )
+    await invalidate_menu_snapshot(existing["sube_id"])
     
     return {"success": True, "message": "Varyasyon silindi"}
 
@@ -1,11 +1,17 @@
 # backend/app/routers/mutfak.py
-import json
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Literal, Dict, Any, Mapping, Optional
 from pydantic import BaseModel, Field
 
 from ..core.deps import get_current_user, get_sube_id, require_roles
 from ..db.database import db
+from ..services.order_lines import normalize_items
+from ..services.kitchen_feed import (
+    KITCHEN_ROW_COLUMNS,
+    current_kitchen_cursor,
+    kitchen_changes_since,
+    publish_kitchen_orders,
+)
 
 router = APIRouter(prefix="/mutfak", tags=["Mutfak"])
 
@@ -29,72 +35,10 @@ class SiparisRow(BaseModel):
     sepet: List[SepetItem] = Field(default_factory=list)
 
 
-def _decode_sepet(value: Any) -> List[Dict[str, Any]]:
-    if value is None:
-        return []
-    if isinstance(value, list):
-        return value
-    if isinstance(value, str):
-        try:
-            return json.loads(value)
-        except json.JSONDecodeError:
-            return []
-    return []
-
-
-def _normalize_sepet(value: Any) -> List[Dict[str, Any]]:
-    def _num(val: Any, default: float = 0.0) -> float:
-        try:
-            if val is None or val == "":
-                return default
-            return float(val)
-        except (TypeError, ValueError):
-            return default
-
-    normalized: List[Dict[str, Any]] = []
-    for item in _decode_sepet(value):
-        if isinstance(item, dict):
-            urun = str(item.get("urun") or item.get("ad") or "").strip()
-            adet = _num(
-                item.get("adet")
-                or item.get("miktar")
-                or item.get("quantity")
-                or item.get("qty"),
-                default=1.0,
-            )
-            if adet <= 0:
-                adet = 1.0
-            fiyat = _num(
-                item.get("fiyat")
-                or item.get("birim_fiyat")
-                or item.get("unit_price")
-                or item.get("price"),
-                default=0.0,
-            )
-            toplam = _num(
-                item.get("toplam")
-                or item.get("tutar")
-                or item.get("total"),
-                default=fiyat * adet,
-            )
-            if fiyat == 0 and adet:
-                fiyat = toplam / adet if toplam else 0.0
-            
-            # Create normalized item
-            normalized_item = {
-                "urun": urun,
-                "adet": adet,
-                "miktar": adet,
-                "fiyat": fiyat,
-                "toplam": fiyat * adet if fiyat else toplam,
-            }
-            
-            # Include variation if present
-            if "varyasyon" in item:
-                normalized_item["varyasyon"] = item["varyasyon"]
-            
-            normalized.append(normalized_item)
-    return normalized
+class MutfakDegisiklikOut(BaseModel):
+    cursor: int
+    resync: bool = False
+    orders: List[Dict[str, Any]] = Field(default_factory=list)
 
 
 def _row_map(r: Mapping[str, Any]) -> Dict[str, Any]:
@@ -107,12 +51,13 @@ def _row_map(r: Mapping[str, Any]) -> Dict[str, Any]:
         "created_at": r_dict["created_at"].isoformat() if r_dict.get("created_at") else "",
         "started_at": r_dict["started_at"].isoformat() if r_dict.get("started_at") else None,
         "hazir_at": r_dict["hazir_at"].isoformat() if r_dict.get("hazir_at") else None,
-        "sepet": _normalize_sepet(r_dict.get("sepet", [])),
+        "sepet": normalize_items(r_dict.get("sepet", [])),
     }
 
 # ---- Uçlar ----
 @router.get("/kuyruk", response_model=List[SiparisRow])
 async def kuyruk(
+    response: Response,
     _: Mapping[str, Any] = Depends(get_current_user),
     sube_id: int = Depends(get_sube_id),
     durum: Optional[Literal["yeni", "hazirlaniyor", "hazir", "iptal", "aktif", "tumu"]] = Query(
@@ -124,7 +69,10 @@ async def kuyruk(
     Mutfak kuyruğu: varsayılan sadece 'yeni'.
     durum=aktif → ['yeni','hazirlaniyor'] birlikte döner.
     durum=tumu → tüm durumlar (odendi ve iptal hariç).
+    X-Mutfak-Cursor header'ı: WS delta'ları / replay için başlangıç cursor'ı.
     """
+    # Cursor kuyruktan önce okunur; arada gelen değişiklikler replay'de tekrar gelir (idempotent)
+    response.headers["X-Mutfak-Cursor"] = str(await current_kitchen_cursor(sube_id))
     params = {"sid": sube_id, "limit": limit}
     base = """
         SELECT id, masa, durum, tutar, sepet, created_at, started_at, hazir_at
@@ -144,7 +92,20 @@ async def kuyruk(
     rows = await db.fetch_all(base, params)
     return [_row_map(r) for r in rows]
 
-@router.get("/poll", response_model=List[SiparisRow])
+@router.get("/degisiklikler", response_model=MutfakDegisiklikOut)
+async def degisiklikler(
+    _: Mapping[str, Any] = Depends(get_current_user),
+    sube_id: int = Depends(get_sube_id),
+    cursor: int = Query(0, ge=0, description="Son görülen mutfak cursor'ı (X-Mutfak-Cursor / WS mesajı)"),
+):
+    """
+    Cursor'dan sonra değişen siparişler (WS kullanılamayan ekranlar ve WS replay için).
+    resync=true ise kuyruk /mutfak/kuyruk ile baştan yüklenmelidir.
+    Canlı güncellemeler için /ws/connect/auth?topics=kitchen + {"type": "resume"} tercih edilmeli.
+    """
+    return await kitchen_changes_since(sube_id, cursor)
+
+@router.get("/poll", response_model=List[SiparisRow], deprecated=True)
 async def poll(
     _: Mapping[str, Any] = Depends(get_current_user),
     sube_id: int = Depends(get_sube_id),
@@ -153,8 +114,8 @@ async def poll(
     limit: int = Query(100, ge=1, le=500),
 ):
     """
-    Basit polling: son görülen id'yi tut ve periyodik çağır.
-    Frontend 3-10 sn arası aralıkla çağırabilir.
+    Eski polling ucu (geriye dönük uyumluluk için korunuyor).
+    Yerine Topics.KITCHEN WS delta'ları + cursor replay (/mutfak/degisiklikler) kullanılmalı.
     """
     params = {"sid": sube_id, "since": since_id, "limit": limit}
     base = """
@@ -198,44 +159,24 @@ async def durum_guncelle(
     # Stok sadece kasa'dan ödeme alınınca düşer (ödeme işlemi sırasında)
     # Bu sayede henüz ödenmemiş siparişler için stok rezerve edilmez
 
-    # Zaman damgalarını güncelle
+    # Zaman damgalarını güncelle (tek UPDATE ... RETURNING, ayrı SELECT yok)
     if yeni_durum == "hazirlaniyor":
-        await db.execute(
-            "UPDATE siparisler SET durum = :d, started_at = NOW() WHERE id = :id",
-            {"d": yeni_durum, "id": id},
-        )
+        set_clause = "durum = :d, started_at = NOW()"
     elif yeni_durum == "hazir":
-        await db.execute(
-            "UPDATE siparisler SET durum = :d, hazir_at = NOW() WHERE id = :id",
-            {"d": yeni_durum, "id": id},
-        )
+        set_clause = "durum = :d, hazir_at = NOW()"
     else:
-        await db.execute(
-            "UPDATE siparisler SET durum = :d WHERE id = :id",
-            {"d": yeni_durum, "id": id},
-        )
-
+        set_clause = "durum = :d"
     row = await db.fetch_one(
-        "SELECT id, masa, durum, tutar, sepet, created_at, started_at, hazir_at, adisyon_id FROM siparisler WHERE id = :id",
-        {"id": id},
+        f"UPDATE siparisler SET {set_clause} WHERE id = :id RETURNING {KITCHEN_ROW_COLUMNS}",
+        {"d": yeni_durum, "id": id},
     )
     
-    # Adisyon toplamlarını güncelle (özellikle 'hazir' durumuna geçtiğinde)
-    if row:
-        try:
-            # Record objesi için güvenli erişim - direkt key ile erişim
-            adisyon_id = row["adisyon_id"]
-            if adisyon_id:
-                from ..routers.adisyon import _update_adisyon_totals
-                await _update_adisyon_totals(adisyon_id, sube_id)
-                logging.info(f"Mutfak: Adisyon #{adisyon_id} toplamları güncellendi (sipariş #{id} durum={yeni_durum})")
-        except (KeyError, AttributeError):
-            # adisyon_id kolonu yoksa veya None ise, sessizce devam et
-            pass
-        except Exception as e:
-            logging.warning(f"Mutfak: Adisyon toplamları güncellenirken hata: {e}", exc_info=True)
+    # Adisyon toplamları/aktif sayaçları siparisler trigger'ı ile durum değişiminde güncellenir
     
-    # WebSocket broadcast - kitchen, orders, and cashier topics
+    # Mutfak ekranları: kompakt delta + replay cursor
+    await publish_kitchen_orders(sube_id, [row])
+
+    # WebSocket broadcast - orders and cashier topics
     from ..websocket.manager import manager, Topics
     broadcast_message = {
         "type": "status_change",
@@ -246,11 +187,6 @@ async def durum_guncelle(
         "sube_id": sube_id
     }
     
-    logging.info(f"Mutfak: Broadcasting status change for order #{id} (masa={owner['masa']}, status={yeni_durum}) to topics: kitchen, orders, cashier")
-    
-    # Broadcast to kitchen topic (for mutfak page)
-    await manager.broadcast(broadcast_message, topic=Topics.KITCHEN)
-    
     # Broadcast to orders topic (for general order updates)
     await manager.broadcast(broadcast_message, topic=Topics.ORDERS)
     
@@ -261,8 +197,6 @@ async def durum_guncelle(
     if yeni_durum == "hazir":
         logging.info(f"Mutfak: Sipariş #{id} hazır durumuna geçti, kasa sayfasına bildirim gönderildi (masa={owner['masa']})")
     
-    logging.info(f"Mutfak: Broadcast completed for order #{id}")
-    
     return _row_map(row)
     
 @router.get("/stats", dependencies=[Depends(require_roles({"admin", "super_admin", "mutfak"}))])
@@ -117,17 +117,11 @@ async def public_create_order(
             else:
                 logging.warning(f"[PUBLIC_API] Sube {payload.sube_id} işletme {isletme_id}'ye ait değil veya pasif, varsayılan şube kullanılıyor")
         
-        # Build maps from menu
-        rows = await db.fetch_all(
-            "SELECT ad, fiyat FROM menu WHERE aktif = TRUE AND sube_id = :sid;",
-            {"sid": sube_id},
-        )
-        price_map: Dict[str, float] = {}
-        name_map: Dict[str, str] = {}
-        for r in rows:
-            k = normalize_name(r["ad"])  # normalize key
-            price_map[k] = float(r["fiyat"]) if r["fiyat"] is not None else 0.0
-            name_map[k] = r["ad"]
+        # Build maps from menu (şube menü snapshot'ı)
+        from ..services.menu_snapshot import get_menu_snapshot
+        menu_snapshot = await get_menu_snapshot(sube_id)
+        price_map: Dict[str, float] = menu_snapshot.price_map
+        name_map: Dict[str, str] = menu_snapshot.name_map
 
         pairs = _extract_candidates(payload.text)
         aggregated: Dict[str, int] = {}
@@ -159,29 +153,34 @@ async def public_create_order(
         tutar = sum(i["adet"] * i["fiyat"] for i in sepet)
 
         # Adisyon sistemi: Masada açık adisyon varsa al, yoksa oluştur
-        from ..routers.adisyon import _get_or_create_adisyon, _update_adisyon_totals
+        from ..routers.adisyon import _get_or_create_adisyon
         adisyon_id = await _get_or_create_adisyon(payload.masa, sube_id)
 
         row = await db.fetch_one(
             """
             INSERT INTO siparisler (sube_id, masa, adisyon_id, sepet, durum, tutar)
             VALUES (:sid, :masa, :adisyon_id, CAST(:sepet AS JSONB), 'yeni', :tutar)
-            RETURNING id, masa, durum, tutar, created_at
+            RETURNING id, masa, durum, tutar, created_at, mutfak_seq
             """,
             {"sid": sube_id, "masa": payload.masa, "adisyon_id": adisyon_id, "sepet": json.dumps(sepet, ensure_ascii=False), "tutar": tutar},
         )
+        # Mutfak ekranları: kompakt delta + replay cursor
+        from ..services.kitchen_feed import publish_kitchen_orders
+        await publish_kitchen_orders(sube_id, [row], event_type="new_order", sepet=sepet)
         try:
             from ..websocket.manager import manager
             import asyncio
             asyncio.create_task(manager.broadcast({
                 "type": "new_order",
                 "message": f"Yeni sipariş",
-                "masa": payload.masa
+                "masa": payload.masa,
+                "sube_id": sube_id
             }, topic="orders"))
             asyncio.create_task(manager.broadcast({
                 "type": "masa_status_change",
                 "masa_adi": payload.masa,
-                "durum": "dolu"
+                "durum": "dolu",
+                "sube_id": sube_id
             }, topic="orders"))
             # Update table to full if it's currently empty or reserved
             await db.execute(
@@ -195,11 +194,7 @@ async def public_create_order(
         
         siparis_id = row["id"]
         
-        # Adisyon toplamlarını güncelle
-        try:
-            await _update_adisyon_totals(adisyon_id, sube_id)
-        except Exception as e:
-            logging.warning(f"Adisyon toplamları güncellenirken hata: {e}", exc_info=True)
+        # Adisyon toplamları siparisler trigger'ı ile artımlı güncellenir
         
         response_time_ms = int((time.time() - start_time) * 1000)
         
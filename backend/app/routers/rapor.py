@@ -82,25 +82,17 @@ async def top_urunler(
 ):
     """
     Son N gün içinde adet ve ciroya göre en çok satan ürünler.
-    Sepet JSONB: [{urun, adet, fiyat}] üstünden hesaplanır.
+    siparis_kalemleri (sepet satırları) üstünden hesaplanır.
     """
     rows = await db.fetch_all(
         """
-        WITH z AS (
-          SELECT
-            lower(unaccent(trim(si->>'urun'))) AS urun_norm,
-            (si->>'adet')::int AS adet,
-            (si->>'fiyat')::numeric AS fiyat
-          FROM siparisler s
-          CROSS JOIN LATERAL jsonb_array_elements(s.sepet) AS si
-          WHERE s.created_at >= (NOW() - make_interval(days => :gun))
-        )
         SELECT
-          urun_norm AS urun,
+          urun_key AS urun,
           SUM(adet)::int AS adet,
-          SUM(adet * fiyat)::float AS ciro
-        FROM z
-        GROUP BY urun_norm
+          SUM(tutar)::float AS ciro
+        FROM siparis_kalemleri
+        WHERE created_at >= (NOW() - make_interval(days => :gun))
+        GROUP BY urun_key
         ORDER BY ciro DESC, adet DESC
         LIMIT :limit;
         """,
@@ -5,6 +5,8 @@ from typing import List, Optional, Dict, Any
 
 from ..core.deps import get_current_user, get_sube_id, require_roles
 from ..db.database import db
+from ..services.assistant_knowledge import invalidate_assistant_knowledge
+from ..services.recipe_index import invalidate_recipe_index
 
 router = APIRouter(prefix="/recete", tags=["Recete"])
 
@@ -21,6 +23,8 @@ class ReceteItemOut(BaseModel):
     stok: str
     miktar: float
     birim: str
+    menu_id: Optional[int] = None  # yazma anında çözülen menü ürünü (eşleşmediyse None)
+    stok_id: Optional[int] = None  # yazma anında çözülen stok kalemi (eşleşmediyse None)
 
 # ---------- Uçlar ----------
 @router.post(
@@ -39,7 +43,7 @@ async def recete_ekle(
             """
             INSERT INTO receteler (sube_id, urun, stok, miktar, birim)
             VALUES (:sid, :urun, :stok, :miktar, :birim)
-            RETURNING id, urun, stok, miktar, birim
+            RETURNING id, urun, stok, miktar, birim, menu_id, stok_id
             """,
             params,
         )
@@ -53,18 +57,22 @@ async def recete_ekle(
              WHERE sube_id = :sid
                AND urun = :urun
                AND stok = :stok
-         RETURNING id, urun, stok, miktar, birim
+         RETURNING id, urun, stok, miktar, birim, menu_id, stok_id
             """,
             params,
         )
         if not row:
             raise HTTPException(status_code=400, detail="Reçete ekleme/güncelleme başarısız")
+    await invalidate_recipe_index(sube_id)
+    await invalidate_assistant_knowledge(sube_id)
     return {
         "id": row["id"],
         "urun": row["urun"],
         "stok": row["stok"],
         "miktar": float(row["miktar"]),
         "birim": row["birim"],
+        "menu_id": row["menu_id"],
+        "stok_id": row["stok_id"],
     }
 
 @router.get("/liste", response_model=List[ReceteItemOut])
@@ -77,7 +85,7 @@ async def recete_liste(
     if urun:
         rows = await db.fetch_all(
             """
-            SELECT id, urun, stok, miktar, birim
+            SELECT id, urun, stok, miktar, birim, menu_id, stok_id
             FROM receteler
             WHERE sube_id = :sid AND urun = :urun
             ORDER BY urun, stok
@@ -88,7 +96,7 @@ async def recete_liste(
     else:
         rows = await db.fetch_all(
             """
-            SELECT id, urun, stok, miktar, birim
+            SELECT id, urun, stok, miktar, birim, menu_id, stok_id
             FROM receteler
             WHERE sube_id = :sid
             ORDER BY urun, stok
@@ -103,6 +111,8 @@ async def recete_liste(
             "stok": r["stok"],
             "miktar": float(r["miktar"]),
             "birim": r["birim"] or "",
+            "menu_id": r["menu_id"],
+            "stok_id": r["stok_id"],
         }
         for r in rows
     ]
@@ -123,6 +133,8 @@ async def recete_sil_by_id(
         """,
         {"sid": sube_id, "id": recete_id},
     )
+    await invalidate_recipe_index(sube_id)
+    await invalidate_assistant_knowledge(sube_id)
     return {"message": "Reçete silindi", "id": recete_id}
 
 @router.delete(
@@ -142,4 +154,6 @@ async def recete_sil(
         """,
         {"sid": sube_id, "urun": urun, "stok": stok},
     )
+    await invalidate_recipe_index(sube_id)
+    await invalidate_assistant_knowledge(sube_id)
     return {"message": "Reçete silindi", "urun": urun, "stok": stok}
@@ -50,14 +50,13 @@ def normalize_name(s: str) -> str:
 
 async def load_menu_map(sube_id: int) -> Dict[str, float]:
     """
-    Aktif menü ürünlerini çeker ve normalize edilmiş ada göre fiyat haritası döner.
-    Şube bazlıdır.
+    Aktif menü ürünlerinin normalize edilmiş ada göre fiyat haritasını döner.
+    Şube bazlıdır; şube menü snapshot'ından okunur (salt-okunur, değiştirmeyin).
     """
-    rows = await db.fetch_all(
-        "SELECT ad, fiyat FROM menu WHERE aktif = TRUE AND sube_id = :sid;",
-        {"sid": sube_id},
-    )
-    return {normalize_name(r["ad"]): float(r["fiyat"]) for r in rows}
+    from ..services.menu_snapshot import get_menu_snapshot
+
+    snapshot = await get_menu_snapshot(sube_id)
+    return snapshot.price_map
 
 def row_to_out(row: Mapping[str, Any]) -> Dict[str, Any]:
     return {
@@ -171,7 +170,7 @@ async def siparis_ekle(
             """
             INSERT INTO siparisler (sube_id, masa, adisyon_id, sepet, durum, tutar, created_by_user_id, created_by_username)
             VALUES (:sid, :masa, :adisyon_id, :sepet::jsonb, :durum, :tutar, :user_id, :username)
-            RETURNING id, masa, durum, tutar, created_at;
+            RETURNING id, masa, durum, tutar, created_at, mutfak_seq;
             """,
             params,
         )
@@ -183,7 +182,7 @@ async def siparis_ekle(
                 """
                 INSERT INTO siparisler (sube_id, masa, adisyon_id, sepet, durum, tutar, created_by_user_id)
                 VALUES (:sid, :masa, :adisyon_id, :sepet::jsonb, :durum, :tutar, :user_id)
-                RETURNING id, masa, durum, tutar, created_at;
+                RETURNING id, masa, durum, tutar, created_at, mutfak_seq;
                 """,
                 params_with_user_id,
             )
@@ -219,12 +218,7 @@ async def siparis_ekle(
         except Exception as e:
             logging.warning(f"created_by_username update skipped (order_id={row['id']}): {e}")
     
-    # Adisyon toplamlarını güncelle
-    try:
-        from ..routers.adisyon import _update_adisyon_totals
-        await _update_adisyon_totals(adisyon_id, sube_id)
-    except Exception as e:
-        logging.warning(f"Adisyon toplamları güncellenirken hata: {e}", exc_info=True)
+    # Adisyon toplamları siparisler trigger'ı ile artımlı güncellenir
     # Masa durumunu 'dolu' olarak güncelle (eğer boş veya rezerve ise)
     try:
         await db.execute(
@@ -249,15 +243,10 @@ async def siparis_ekle(
     except Exception as e:
         logging.warning(f"Masa durumu güncellenirken hata: {e}", exc_info=True)
     
-    # WebSocket broadcast for new order
+    # WebSocket broadcast for new order (mutfak: kompakt delta + replay cursor)
     from ..websocket.manager import manager, Topics
-    await manager.broadcast({
-        "type": "new_order",
-        "order_id": row["id"],
-        "masa": row["masa"],
-        "durum": row["durum"],
-        "sube_id": sube_id
-    }, topic=Topics.KITCHEN)
+    from ..services.kitchen_feed import publish_kitchen_orders
+    await publish_kitchen_orders(sube_id, [row], event_type="new_order", sepet=sepet_kayit)
     
     await manager.broadcast({
         "type": "order_added",
@@ -339,12 +328,10 @@ async def siparis_durum_guncelle(
             success=True
         )
 
-    await db.execute(
-        "UPDATE siparisler SET durum = :durum WHERE id = :id",
-        {"durum": yeni_durum, "id": id},
-    )
+    from ..services.kitchen_feed import KITCHEN_ROW_COLUMNS, publish_kitchen_orders
     row = await db.fetch_one(
-        "SELECT id, masa, durum, tutar, created_at FROM siparisler WHERE id = :id",
-        {"id": id},
+        f"UPDATE siparisler SET durum = :durum WHERE id = :id RETURNING {KITCHEN_ROW_COLUMNS}",
+        {"durum": yeni_durum, "id": id},
     )
+    await publish_kitchen_orders(sube_id, [row])
     return row_to_out(row)
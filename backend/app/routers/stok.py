@@ -9,6 +9,8 @@ from ..db.database import db
 from ..websocket.manager import manager, Topics
 from ..services.notification import notification_service
 from ..services.audit import audit_service
+from ..services.assistant_knowledge import invalidate_assistant_knowledge
+from ..services.recipe_index import invalidate_recipe_index
 
 logger = logging.getLogger(__name__)
 
@@ -74,11 +76,14 @@ async def stok_ekle(
     except Exception:
         # Aynı stok varsa - OTOMATİK MALİYET HESAPLAMA YAP
         # Mevcut stok ve fiyatı al
+        # Çakışma uq_stok_kalemleri_sube_ad_key'den de gelebilir ("Sut" / "Süt"): aynı anahtarla bul
         existing = await db.fetch_one(
             """
-            SELECT mevcut, alis_fiyat
+            SELECT id, mevcut, alis_fiyat
             FROM stok_kalemleri
-            WHERE sube_id = :sid AND ad = :ad
+            WHERE sube_id = :sid AND (ad = :ad OR neso_urun_key(ad) = neso_urun_key(:ad))
+            ORDER BY (ad = :ad) DESC, id DESC
+            LIMIT 1
             """,
             {"sid": sube_id, "ad": item.ad},
         )
@@ -99,7 +104,15 @@ async def stok_ekle(
                 ortalama_fiyat = yeni_fiyat
             
             # Güncelle (miktar artışı + ortalama fiyat)
-            params_with_avg = {**params, "alis_fiyat": ortalama_fiyat, "mevcut": eski_miktar + yeni_miktar}
+            params_with_avg = {
+                "sid": sube_id,
+                "id": existing["id"],
+                "kategori": item.kategori,
+                "birim": item.birim,
+                "min": item.min,
+                "alis_fiyat": ortalama_fiyat,
+                "mevcut": eski_miktar + yeni_miktar,
+            }
             row = await db.fetch_one(
                 """
                 UPDATE stok_kalemleri
@@ -109,7 +122,7 @@ async def stok_ekle(
                        min = :min,
                        alis_fiyat = :alis_fiyat
                  WHERE sube_id = :sid
-                   AND ad = :ad
+                   AND id = :id
              RETURNING id, ad, kategori, birim, mevcut, min, alis_fiyat
                 """,
                 params_with_avg,
@@ -120,6 +133,10 @@ async def stok_ekle(
         if not row:
             raise HTTPException(status_code=400, detail="Stok ekleme/güncelleme başarısız")
     
+    # Yeni stok kalemi reçetesiz ürün eşleşmesini veya reçete stok birimini değiştirebilir
+    await invalidate_recipe_index(sube_id)
+    await invalidate_assistant_knowledge(sube_id)
+
     new_item = {
         "id": row["id"],
         "ad": row["ad"],
@@ -252,6 +269,12 @@ async def stok_guncelle(
     if not row:
         raise HTTPException(status_code=400, detail="Güncelleme başarısız")
 
+    # Ad veya birim değiştiyse reçete indeksi (stok eşleşmesi / birim dönüşümü) eskidi
+    if "ad" in updates or "birim" in updates:
+        await invalidate_recipe_index(sube_id)
+    # Miktar değişikliği dahil: asistanın stok haritası eskidi
+    await invalidate_assistant_knowledge(sube_id)
+
     updated_item = {
         "id": row["id"],
         "ad": row["ad"],
@@ -464,4 +487,6 @@ async def stok_sil(
         """,
         {"sid": sube_id, "ad": ad},
     )
+    await invalidate_recipe_index(sube_id)
+    await invalidate_assistant_knowledge(sube_id)
     return {"message": "Stok silindi", "ad": ad}
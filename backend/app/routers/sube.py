@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from ..core.deps import get_current_user
+from ..core.branch_access import invalidate_branch_access
+from ..services.tenant_usage import forget_tenant_usage, record_usage_change
 from ..db.database import db
 
 router = APIRouter(prefix="/sube", tags=["Sube"])
@@ -30,11 +32,14 @@ async def sube_ekle(data: SubeIn, current_user: str = Depends(get_current_user))
     q = """INSERT INTO subeler (isletme_id, ad, adres, telefon)
            VALUES (:isletme_id, :ad, :adres, :telefon)
            RETURNING id, isletme_id, ad, adres, telefon"""
-    return await db.fetch_one(q, data.model_dump())
+    row = await db.fetch_one(q, data.model_dump())
+    await invalidate_branch_access("sube_ekle")
+    await record_usage_change(row["isletme_id"], "subeler", 1)
+    return row
 
 @router.patch("/{id}", response_model=SubeOut)
 async def sube_guncelle(id: int, data: SubeIn, current_user: str = Depends(get_current_user)):
-    exists = await db.fetch_one("SELECT id FROM subeler WHERE id=:id", {"id": id})
+    exists = await db.fetch_one("SELECT id, isletme_id FROM subeler WHERE id=:id", {"id": id})
     if not exists:
         raise HTTPException(404, "Şube bulunamadı")
     q = """UPDATE subeler
@@ -42,9 +47,19 @@ async def sube_guncelle(id: int, data: SubeIn, current_user: str = Depends(get_c
            WHERE id=:id
            RETURNING id, isletme_id, ad, adres, telefon"""
     vals = {**data.model_dump(), "id": id}
-    return await db.fetch_one(q, vals)
+    row = await db.fetch_one(q, vals)
+    await invalidate_branch_access("sube_guncelle")
+    if exists["isletme_id"] != data.isletme_id:
+        # Şube (ve menüsü) başka işletmeye taşındı
+        await forget_tenant_usage(exists["isletme_id"])
+        await forget_tenant_usage(data.isletme_id)
+    return row
 
 @router.delete("/{id}")
 async def sube_sil(id: int, current_user: str = Depends(get_current_user)):
-    await db.execute("DELETE FROM subeler WHERE id=:id", {"id": id})
+    row = await db.fetch_one("DELETE FROM subeler WHERE id=:id RETURNING isletme_id", {"id": id})
+    await invalidate_branch_access("sube_sil")
+    if row:
+        # Menü ürünleri de cascade silindi: sayaçlar yeniden sayılsın
+        await forget_tenant_usage(row["isletme_id"])
     return {"ok": True}
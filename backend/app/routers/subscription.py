@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
+from ..core.auth_context import invalidate_auth_context
 from ..core.deps import require_roles, get_current_user
 from ..db.database import db
 
@@ -136,6 +137,7 @@ async def create_subscription(
         """,
         data,
     )
+    invalidate_auth_context(tenant_id=payload.isletme_id)
     return dict(row)
 
 
@@ -173,6 +175,7 @@ async def update_subscription(
         """,
         data,
     )
+    invalidate_auth_context(tenant_id=isletme_id)
     return dict(row)
 
 
@@ -208,6 +211,7 @@ async def update_subscription_status(
         """,
         data,
     )
+    invalidate_auth_context(tenant_id=isletme_id)
     return dict(row)
 
 
@@ -2,8 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 
+from ..core.auth_context import invalidate_auth_context
+from ..core.branch_access import invalidate_branch_access
+from ..services.tenant_usage import forget_tenant_usage, record_user_usage
 from ..core.deps import require_roles, get_current_user
 from ..db.database import db
+from ..llm import invalidate_llm_providers
 
 
 router = APIRouter(
@@ -330,6 +334,7 @@ async def tenant_update(id: int, payload: TenantIn, _: Dict[str, Any] = Depends(
         """,
         {**payload.model_dump(), "id": id},
     )
+    invalidate_auth_context(tenant_id=id)
     return row
 
 
@@ -361,6 +366,9 @@ async def tenant_delete(id: int, _: Dict[str, Any] = Depends(get_current_user)):
     # users tablosunda tenant_id NULL olur (ON DELETE SET NULL)
     
     await db.execute("DELETE FROM isletmeler WHERE id = :id", {"id": id})
+    invalidate_auth_context(tenant_id=id)
+    await invalidate_branch_access("tenant_delete")
+    await forget_tenant_usage(id)
     
     logging.info(f"[TENANT_DELETE] İşletme ve ilişkili veriler silindi: id={id}")
     return {"ok": True, "message": f"İşletme '{isletme_ad}' ve tüm ilişkili veriler silindi"}
@@ -402,6 +410,12 @@ async def users_upsert(
     switched_tenant_id = current_user.get("switched_tenant_id")
     tenant_id = switched_tenant_id  # Super admin tenant switching yapıyorsa tenant_id set et
     
+    # Abonelik kullanım sayaçları için kaydın önceki hali
+    onceki = await db.fetch_one(
+        "SELECT tenant_id, aktif FROM users WHERE username = :u",
+        {"u": payload.username},
+    )
+
     # Şifre hash sütunu varsa kullan, yoksa geç
     params = {
         "u": payload.username,
@@ -413,7 +427,7 @@ async def users_upsert(
     if payload.password:
         try:
             params["h"] = hash_password(payload.password)
-            await db.execute(
+            sonraki = await db.fetch_one(
                 """
                 INSERT INTO users (username, sifre_hash, role, aktif, tenant_id)
                 VALUES (:u, :h, :r, :a, :tid)
@@ -422,9 +436,12 @@ async def users_upsert(
                        aktif = EXCLUDED.aktif,
                        sifre_hash = EXCLUDED.sifre_hash,
                        tenant_id = EXCLUDED.tenant_id
+                RETURNING tenant_id, aktif
                 """,
                 params,
             )
+            invalidate_auth_context(username=payload.username)
+            await record_user_usage(onceki, sonraki)
             return {"ok": True}
         except Exception as e:
             # Şema sifre_hash içermiyorsa ikinci deneme
@@ -432,7 +449,7 @@ async def users_upsert(
             logging.warning(f"[USER_UPSERT] Error with password hash: {e}")
             pass
 
-    await db.execute(
+    sonraki = await db.fetch_one(
         """
         INSERT INTO users (username, role, aktif, tenant_id)
         VALUES (:u, :r, :a, :tid)
@@ -440,12 +457,16 @@ async def users_upsert(
            SET role = EXCLUDED.role,
                aktif = EXCLUDED.aktif,
                tenant_id = EXCLUDED.tenant_id
+        RETURNING tenant_id, aktif
         """,
         params,
     )
+    invalidate_auth_context(username=payload.username)
+    await record_user_usage(onceki, sonraki)
     return {"ok": True}
 
 
+
 class UserSubeIzinIn(BaseModel):
     username: str
     sube_ids: List[int] = Field(default_factory=list)
@@ -464,6 +485,7 @@ async def set_user_sube_permissions(payload: UserSubeIzinIn, _: Dict[str, Any] =
                 )
             except Exception:
                 pass
+    await invalidate_branch_access("user_sube_izin")
     return {"ok": True, "username": payload.username, "sube_ids": payload.sube_ids}
 
 
@@ -505,6 +527,8 @@ async def app_settings_put(payload: SettingsUpsertIn, _: Dict[str, Any] = Depend
                     """,
                     {"k": k, "v": json_dumps(v)},
                 )
+    # app_settings LLM anahtarı için son yedek kaynaktır
+    await invalidate_llm_providers()
     return {"ok": True}
 
 
@@ -756,7 +780,10 @@ async def get_api_usage_stats(
     api_type: Optional[str] = Query(None, description="API türü (örn: 'openai')"),
     _: Dict[str, Any] = Depends(get_current_user),
 ):
-    """API kullanım istatistiklerini getir (tüm işletmeler veya tek işletme)"""
+    """
+    API kullanım istatistiklerini getir (tüm işletmeler veya tek işletme).
+    Toplamlar api_usage_minutely özetinden, son hatalar ham api_usage_logs'tan okunur.
+    """
     from datetime import timedelta
     start_date = datetime.now() - timedelta(days=days)
     params: Dict[str, Any] = {"start_date": start_date}
@@ -771,22 +798,25 @@ async def get_api_usage_stats(
         type_filter = " AND a.api_type = :api_type"
         params["api_type"] = api_type
 
+    # Ortalama yanıt süresi: özet satırlarındaki toplam / ölçüm sayısı
+    avg_rt = "COALESCE(CAST(SUM(a.response_time_ms_sum) AS FLOAT) / NULLIF(SUM(a.response_time_count), 0), 0)"
+
     # 1) Genel özet istatistikler
     summary_row = await db.fetch_one(
         f"""
         SELECT
-            COUNT(*)                            AS total_rows,
+            COALESCE(SUM(a.call_count), 0)      AS total_rows,
             COALESCE(SUM(a.request_count), 0)   AS total_requests,
             COALESCE(SUM(a.total_tokens), 0)    AS total_tokens,
             COALESCE(SUM(a.prompt_tokens), 0)   AS total_prompt_tokens,
             COALESCE(SUM(a.completion_tokens), 0) AS total_completion_tokens,
             COALESCE(SUM(a.cost_usd), 0)        AS total_cost_usd,
             COALESCE(SUM(a.cost_tl), 0)         AS total_cost_tl,
-            COALESCE(AVG(a.response_time_ms), 0) AS avg_response_time_ms,
-            COUNT(*) FILTER (WHERE a.status = 'success') AS success_count,
-            COUNT(*) FILTER (WHERE a.status = 'error')   AS error_count
-        FROM api_usage_logs a
-        WHERE a.created_at >= :start_date {tenant_filter} {type_filter}
+            {avg_rt}                            AS avg_response_time_ms,
+            COALESCE(SUM(a.success_count), 0)   AS success_count,
+            COALESCE(SUM(a.error_count), 0)     AS error_count
+        FROM api_usage_minutely a
+        WHERE a.bucket >= :start_date {tenant_filter} {type_filter}
         """,
         params,
     )
@@ -798,19 +828,19 @@ async def get_api_usage_stats(
             a.isletme_id,
             i.ad                                AS isletme_ad,
             a.api_type,
-            a.model,
+            NULLIF(a.model, '')                 AS model,
             SUM(a.request_count)                AS total_requests,
             SUM(a.total_tokens)                 AS total_tokens,
             SUM(a.prompt_tokens)                AS total_prompt_tokens,
             SUM(a.completion_tokens)            AS total_completion_tokens,
             SUM(a.cost_usd)                     AS total_cost_usd,
             SUM(a.cost_tl)                      AS total_cost_tl,
-            AVG(a.response_time_ms)             AS avg_response_time_ms,
-            COUNT(*) FILTER (WHERE a.status='success') AS success_count,
-            COUNT(*) FILTER (WHERE a.status='error')   AS error_count
-        FROM api_usage_logs a
+            {avg_rt}                            AS avg_response_time_ms,
+            SUM(a.success_count)                AS success_count,
+            SUM(a.error_count)                  AS error_count
+        FROM api_usage_minutely a
         LEFT JOIN isletmeler i ON i.id = a.isletme_id
-        WHERE a.created_at >= :start_date {tenant_filter} {type_filter}
+        WHERE a.bucket >= :start_date {tenant_filter} {type_filter}
         GROUP BY a.isletme_id, i.ad, a.api_type, a.model
         ORDER BY total_cost_usd DESC
         """,
@@ -821,14 +851,14 @@ async def get_api_usage_stats(
     daily_rows = await db.fetch_all(
         f"""
         SELECT
-            DATE(a.created_at)                AS date,
+            DATE(a.bucket)                    AS date,
             COALESCE(SUM(a.request_count), 0) AS total_requests,
             COALESCE(SUM(a.total_tokens), 0)  AS total_tokens,
             COALESCE(SUM(a.cost_usd), 0)      AS total_cost_usd,
             COALESCE(SUM(a.cost_tl), 0)       AS total_cost_tl
-        FROM api_usage_logs a
-        WHERE a.created_at >= :start_date {tenant_filter} {type_filter}
-        GROUP BY DATE(a.created_at)
+        FROM api_usage_minutely a
+        WHERE a.bucket >= :start_date {tenant_filter} {type_filter}
+        GROUP BY DATE(a.bucket)
         ORDER BY date DESC
         LIMIT 90
         """,
@@ -841,13 +871,13 @@ async def get_api_usage_stats(
         SELECT
             a.endpoint,
             a.method,
-            COUNT(*)                            AS row_count,
+            COALESCE(SUM(a.call_count), 0)      AS row_count,
             COALESCE(SUM(a.request_count), 0)   AS total_requests,
             COALESCE(SUM(a.cost_tl), 0)         AS total_cost_tl,
             COALESCE(SUM(a.cost_usd), 0)        AS total_cost_usd,
-            COALESCE(AVG(a.response_time_ms), 0) AS avg_response_time_ms
-        FROM api_usage_logs a
-        WHERE a.created_at >= :start_date {tenant_filter} {type_filter}
+            {avg_rt}                            AS avg_response_time_ms
+        FROM api_usage_minutely a
+        WHERE a.bucket >= :start_date {tenant_filter} {type_filter}
         GROUP BY a.endpoint, a.method
         ORDER BY total_requests DESC
         LIMIT 20
@@ -855,7 +885,7 @@ async def get_api_usage_stats(
         params,
     )
 
-    # 5) Son hatalar
+    # 5) Son hatalar (hatalar her zaman ham satır olarak da yazılır; bkz. API_USAGE_RAW_LOG_ERRORS)
     error_rows = await db.fetch_all(
         f"""
         SELECT
@@ -942,6 +972,38 @@ async def get_api_usage_stats(
     }
 
 
+@router.get("/api-usage/meter")
+async def get_api_usage_meter_stats(_: Dict[str, Any] = Depends(get_current_user)):
+    """Kullanım ölçüm tamponunun durumu (bekleyen özet/ham satırlar, yazılan/düşürülen kayıtlar)"""
+    from ..services.usage_metering import usage_meter
+
+    return usage_meter.stats()
+
+
+@router.get("/assistant/sessions")
+async def get_assistant_session_stats(_: Dict[str, Any] = Depends(get_current_user)):
+    """Asistan konuşma deposunun durumu (canlı konuşma, yaklaşık bellek, atılan/süresi dolan kayıtlar)"""
+    from ..services.conversation_store import conversation_store
+
+    return conversation_store.stats()
+
+
+@router.get("/assistant/response-cache")
+async def get_response_cache_stats(_: Dict[str, Any] = Depends(get_current_user)):
+    """Asistan yanıt önbelleği (bu worker): hit / yakın kopya / miss ve tasarruf edilen token"""
+    from ..services.response_cache import response_cache
+
+    return response_cache.stats()
+
+
+@router.get("/llm/providers")
+async def get_llm_provider_stats(_: Dict[str, Any] = Depends(get_current_user)):
+    """Çözümlenmiş LLM provider cache'i ve HTTP client havuzunun durumu"""
+    from ..llm.providers import llm_provider_stats
+
+    return llm_provider_stats()
+
+
 # ---- Hızlı İşletme Kurulumu ----
 class QuickSetupIn(BaseModel):
     isletme_ad: str = Field(min_length=1)
@@ -1740,7 +1802,9 @@ async def upsert_platform_setting(
                 "updated_by": username,
             }
         )
-        
+        # LLM anahtar/model ayarı olabilir: tüm tenant'ların çözümlenmiş provider'ları düşer
+        await invalidate_llm_providers()
+
         return {"message": f"Platform ayarı kaydedildi: {payload.key}", "key": payload.key}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Platform ayarı kaydedilemedi: {str(e)}")
@@ -1757,6 +1821,7 @@ async def delete_platform_setting(
             "DELETE FROM platform_settings WHERE key = :key",
             {"key": key}
         )
+        await invalidate_llm_providers()
         return {"message": f"Platform ayarı silindi: {key}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Platform ayarı silinemedi: {str(e)}")
@@ -5,13 +5,49 @@ import uuid
 import logging
 
 from ..websocket.manager import manager, Topics
-from ..core.deps import get_current_user
+from ..core.deps import get_current_user, require_roles
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ws", tags=["WebSocket"])
 
 
+async def _kitchen_replay(user: Dict[str, Any], msg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Yeniden bağlanan mutfak ekranı için {"type": "resume", "sube_id": S, "cursor": N}
+    mesajının cevabı: cursor'dan sonra kaçırılan sipariş delta'ları (veya resync).
+    """
+    from fastapi import HTTPException
+    from ..core.deps import enforce_user_sube_access
+    from ..db.database import db
+    from ..services.kitchen_feed import kitchen_changes_since
+
+    try:
+        sube_id = int(msg.get("sube_id"))
+        cursor = int(msg.get("cursor") or 0)
+    except (TypeError, ValueError):
+        return {"type": "error", "message": "Invalid resume request"}
+
+    try:
+        if (user.get("role") or "").lower() != "super_admin":
+            sube = await db.fetch_one(
+                "SELECT id FROM subeler WHERE id = :sid AND isletme_id = :tid",
+                {"sid": sube_id, "tid": user.get("tenant_id")},
+            )
+            if not sube:
+                return {"type": "error", "message": "Sube access denied"}
+            await enforce_user_sube_access(user["username"], sube_id, role=user.get("role"))
+        changes = await kitchen_changes_since(sube_id, cursor)
+    except HTTPException:
+        return {"type": "error", "message": "Sube access denied"}
+    except Exception as e:
+        logger.error(f"[KITCHEN_FEED] Replay hatası (sube_id={sube_id}, cursor={cursor}): {e}")
+        # İstemci kuyruğu baştan yüklesin
+        return {"type": "kitchen_replay", "sube_id": sube_id, "cursor": cursor, "orders": [], "resync": True}
+
+    return {"type": "kitchen_replay", "sube_id": sube_id, **changes}
+
+
 @router.websocket("/connect")
 async def websocket_endpoint(
     websocket: WebSocket,
@@ -20,11 +56,12 @@ async def websocket_endpoint(
     """
     WebSocket connection endpoint.
     Topics: kitchen,cashier,tables,orders,admin,waiter
+    Kimliksizdir: tenant'ı belli yayınları (sipariş içerikleri dahil) almaz; bunlar için /connect/auth.
     """
     connection_id = str(uuid.uuid4())
     
     try:
-        await manager.connect(websocket, connection_id)
+        await manager.connect(websocket, connection_id, anonymous=True)
         
         # Subscribe to requested topics
         if topics:
@@ -41,9 +78,9 @@ async def websocket_endpoint(
                 
                 # Handle simple ping/pong
                 if data == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    await manager.send_personal_message({"type": "pong"}, connection_id)
                 else:
-                    logger.info(f"Received message from {connection_id}: {data}")
+                    logger.debug(f"Received message from {connection_id}: {data}")
                     
             except WebSocketDisconnect:
                 break
@@ -66,6 +103,8 @@ async def websocket_endpoint_auth(
     """
     Authenticated WebSocket connection endpoint.
     Requires JWT token for access.
+    Mutfak ekranları yeniden bağlanınca {"type": "resume", "sube_id": S, "cursor": N}
+    gönderir ve "kitchen_replay" cevabıyla sadece kaçırdıkları delta'ları alır.
     """
     connection_id = str(uuid.uuid4())
     
@@ -106,7 +145,8 @@ async def websocket_endpoint_auth(
             await websocket.close()
             return
         
-        await manager.connect(websocket, connection_id)
+        # Abonelikler kullanıcının tenant isim alanına bağlanır (super admin: tenant'sız, tüm yayınlar)
+        await manager.connect(websocket, connection_id, tenant_id=user.get("tenant_id"))
         
         # Subscribe to requested topics
         if topics:
@@ -115,11 +155,11 @@ async def websocket_endpoint_auth(
                 manager.subscribe(connection_id, topic)
         
         # Send connection confirmation
-        await websocket.send_json({
+        await manager.send_personal_message({
             "type": "connected",
             "user": user["username"],
             "topics": topic_list if topics else []
-        })
+        }, connection_id)
         
         # Keep connection alive
         while True:
@@ -127,9 +167,9 @@ async def websocket_endpoint_auth(
                 data = await websocket.receive_text()
                 
                 if data == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    await manager.send_personal_message({"type": "pong"}, connection_id)
                 else:
-                    logger.info(f"Received message from {connection_id}: {data}")
+                    logger.debug(f"Received message from {connection_id}: {data}")
                     # Try to parse JSON message (subscribe/unsubscribe)
                     try:
                         import json
@@ -143,6 +183,9 @@ async def websocket_endpoint_auth(
                             # Unsubscribe from topics
                             for topic in msg["topics"]:
                                 manager.unsubscribe(connection_id, topic)
+                        elif msg.get("type") == "resume":
+                            # Mutfak ekranı: son görülen cursor'dan sonrasını replay et
+                            await manager.send_personal_message(await _kitchen_replay(user, msg), connection_id)
                     except (json.JSONDecodeError, KeyError):
                         # Not a JSON message or doesn't have expected structure, ignore
                         pass
@@ -160,6 +203,12 @@ async def websocket_endpoint_auth(
         manager.disconnect(connection_id)
 
 
+@router.get("/stats", dependencies=[Depends(require_roles({"admin", "super_admin"}))])
+async def websocket_stats():
+    """Bu worker'ın WS metrikleri: bağlantılar, kuyruk derinliği, düşürülen mesaj/istemciler"""
+    return manager.get_stats()
+
+
 # Broadcast endpoints for internal use
 @router.post("/broadcast/{topic}")
 async def broadcast_to_topic(topic: str, message: dict):
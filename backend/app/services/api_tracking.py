@@ -29,48 +29,30 @@ async def log_api_usage(
     total_tokens: int = 0,
 ) -> None:
     """
-    API kullanımını loglar.
+    API kullanımını ölçüme ekler (dakikalık özet + örneklenmiş ham satır,
+    bkz. services/usage_metering).
     """
-    try:
-        await db.execute(
-            """
-            INSERT INTO api_usage_logs (
-                isletme_id, api_key_id, api_type, endpoint, method,
-                status, status_code, response_time_ms, error_message,
-                metadata, cost_tl, cost_usd,
-                model, prompt_tokens, completion_tokens, total_tokens,
-                request_count, created_at
-            )
-            VALUES (
-                :isletme_id, :api_key_id, :api_type, :endpoint, :method,
-                :status, :status_code, :response_time_ms, :error_message,
-                CAST(:metadata AS JSONB), :cost_tl, :cost_usd,
-                :model, :prompt_tokens, :completion_tokens, :total_tokens,
-                1, NOW()
-            )
-            """,
-            {
-                "isletme_id": isletme_id,
-                "api_key_id": api_key_id,
-                "api_type": api_type,
-                "endpoint": endpoint,
-                "method": method,
-                "status": status,
-                "status_code": status_code,
-                "response_time_ms": response_time_ms,
-                "error_message": error_message,
-                "metadata": str(metadata) if metadata else "{}",
-                "cost_tl": cost_tl,
-                "cost_usd": cost_usd,
-                "model": model,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": total_tokens,
-            },
-        )
-    except Exception as e:
-        logging.error(f"[API_TRACKING] Error logging API usage: {e}", exc_info=True)
-        # Hata olsa bile devam et (logging hatası API çağrısını engellememeli)
+    from .usage_metering import record_api_usage
+
+    # Ölçüm hatası API çağrısını engellemez (record_api_usage hataları yutar)
+    await record_api_usage(
+        isletme_id,
+        api_type,
+        endpoint,
+        api_key_id=api_key_id,
+        method=method,
+        status=status,
+        status_code=status_code,
+        response_time_ms=response_time_ms,
+        error_message=error_message,
+        metadata=metadata,
+        cost_tl=cost_tl,
+        cost_usd=cost_usd,
+        model=model,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=total_tokens,
+    )
 
 
 async def get_api_usage_summary(
@@ -79,28 +61,28 @@ async def get_api_usage_summary(
     end_date: Optional[datetime] = None,
 ) -> Dict[str, Any]:
     """
-    İşletme için API kullanım özeti döner.
+    İşletme için API kullanım özeti döner (api_usage_minutely özetinden).
     """
     try:
         params: Dict[str, Any] = {"isletme_id": isletme_id}
         date_filter = ""
         
         if start_date and end_date:
-            date_filter = "AND created_at BETWEEN :start_date AND :end_date"
+            date_filter = "AND bucket BETWEEN :start_date AND :end_date"
             params["start_date"] = start_date
             params["end_date"] = end_date
         elif start_date:
-            date_filter = "AND created_at >= :start_date"
+            date_filter = "AND bucket >= :start_date"
             params["start_date"] = start_date
         elif end_date:
-            date_filter = "AND created_at <= :end_date"
+            date_filter = "AND bucket <= :end_date"
             params["end_date"] = end_date
         
         # Toplam request sayısı
         total_requests = await db.fetch_one(
             f"""
-            SELECT COUNT(*) as total, SUM(request_count) as total_count
-            FROM api_usage_logs
+            SELECT COALESCE(SUM(call_count), 0) as total, SUM(request_count) as total_count
+            FROM api_usage_minutely
             WHERE isletme_id = :isletme_id {date_filter}
             """,
             params,
@@ -112,7 +94,7 @@ async def get_api_usage_summary(
             SELECT 
                 COALESCE(SUM(cost_tl), 0) as total_cost_tl,
                 COALESCE(SUM(cost_usd), 0) as total_cost_usd
-            FROM api_usage_logs
+            FROM api_usage_minutely
             WHERE isletme_id = :isletme_id {date_filter}
             """,
             params,
@@ -124,11 +106,11 @@ async def get_api_usage_summary(
             SELECT 
                 endpoint,
                 method,
-                COUNT(*) as request_count,
+                SUM(call_count) as request_count,
                 SUM(request_count) as total_requests,
                 COALESCE(SUM(cost_tl), 0) as total_cost_tl,
-                AVG(response_time_ms) as avg_response_time_ms
-            FROM api_usage_logs
+                CAST(SUM(response_time_ms_sum) AS FLOAT) / NULLIF(SUM(response_time_count), 0) as avg_response_time_ms
+            FROM api_usage_minutely
             WHERE isletme_id = :isletme_id {date_filter}
             GROUP BY endpoint, method
             ORDER BY total_requests DESC
@@ -140,13 +122,13 @@ async def get_api_usage_summary(
         daily_usage = await db.fetch_all(
             f"""
             SELECT 
-                DATE(created_at) as date,
-                COUNT(*) as request_count,
+                DATE(bucket) as date,
+                SUM(call_count) as request_count,
                 SUM(request_count) as total_requests,
                 COALESCE(SUM(cost_tl), 0) as total_cost_tl
-            FROM api_usage_logs
+            FROM api_usage_minutely
             WHERE isletme_id = :isletme_id {date_filter}
-            GROUP BY DATE(created_at)
+            GROUP BY DATE(bucket)
             ORDER BY date DESC
             LIMIT 30
             """,
@@ -21,40 +21,25 @@ async def log_api_usage(
     error_message: Optional[str] = None,
     metadata: Optional[Dict[str, Any]] = None,
 ):
-    """API kullanımını logla"""
-    try:
-        import json
-        await db.execute(
-            """
-            INSERT INTO api_usage_logs (
-                isletme_id, api_type, model, endpoint,
-                prompt_tokens, completion_tokens, total_tokens, cost_usd,
-                request_count, response_time_ms, status, error_message, metadata
-            )
-            VALUES (
-                :isletme_id, :api_type, :model, :endpoint,
-                :prompt_tokens, :completion_tokens, :total_tokens, :cost_usd,
-                :request_count, :response_time_ms, :status, :error_message, CAST(:metadata AS JSONB)
-            )
-            """,
-            {
-                "isletme_id": isletme_id,
-                "api_type": api_type,
-                "model": model,
-                "endpoint": endpoint or "/v1/chat/completions",
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": total_tokens,
-                "cost_usd": cost_usd,
-                "request_count": request_count,
-                "response_time_ms": response_time_ms,
-                "status": status,
-                "error_message": error_message,
-                "metadata": json.dumps(metadata or {}),
-            },
-        )
-    except Exception as e:
-        logging.error(f"Failed to log API usage: {e}", exc_info=True)
+    """API kullanımını ölçüme ekler (bkz. services/usage_metering)"""
+    from .usage_metering import record_api_usage
+
+    await record_api_usage(
+        isletme_id,
+        api_type,
+        endpoint or "/v1/chat/completions",
+        model=model,
+        method="POST",
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=total_tokens,
+        cost_usd=cost_usd,
+        request_count=request_count,
+        response_time_ms=response_time_ms,
+        status=status,
+        error_message=error_message,
+        metadata=metadata,
+    )
 
 
 async def get_api_usage_stats(
@@ -71,17 +56,17 @@ async def get_api_usage_stats(
             SELECT 
                 isletme_id,
                 api_type,
-                model,
+                NULLIF(model, '') as model,
                 SUM(prompt_tokens) as total_prompt_tokens,
                 SUM(completion_tokens) as total_completion_tokens,
                 SUM(total_tokens) as total_tokens,
                 SUM(cost_usd) as total_cost_usd,
                 SUM(request_count) as total_requests,
-                AVG(response_time_ms) as avg_response_time_ms,
-                COUNT(*) FILTER (WHERE status = 'success') as success_count,
-                COUNT(*) FILTER (WHERE status = 'error') as error_count
-            FROM api_usage_logs
-            WHERE created_at >= :start_date
+                CAST(SUM(response_time_ms_sum) AS FLOAT) / NULLIF(SUM(response_time_count), 0) as avg_response_time_ms,
+                SUM(success_count) as success_count,
+                SUM(error_count) as error_count
+            FROM api_usage_minutely
+            WHERE bucket >= :start_date
         """
         params = {"start_date": start_date}
         
@@ -94,7 +79,7 @@ async def get_api_usage_stats(
             params["api_type"] = api_type
         
         query += """
-            GROUP BY isletme_id, api_type, model
+            GROUP BY isletme_id, api_type, NULLIF(model, '')
             ORDER BY total_cost_usd DESC
         """
         
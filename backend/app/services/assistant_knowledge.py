@@ -0,0 +1,260 @@
+# backend/app/services/assistant_knowledge.py
+"""
+Asistan Bilgi Snapshot'ı
+/assistant/chat'in her mesajda yeniden kurduğu şube bilgisini (işletme profili,
+varyasyonlu menü, reçete haritası, stok haritası, süt/kafein/glüten/kuruyemiş
+özellik haritası ve hazır menü prompt metni) şube bazında versiyonlu,
+in-process bir snapshot olarak tutar.
+
+Snapshot menü snapshot'ının versiyonuna bağlıdır (menü / varyasyon yazımları onu
+zaten her worker'da geçersiz kılar); reçete ve stok yazımları invalidate_assistant_knowledge
+ile ayrıca geçersiz kılar; invalidation pg_notify ile diğer worker'lara da
+yayılır (her worker kendi snapshot'ını tutar). ASSISTANT_KNOWLEDGE_TTL_SECONDS
+dış yazımlar ve kaçan bildirimler için güvenlik sınırıdır. Sohbet turları
+snapshot'ı O(1) okur. fingerprint; menü prompt'u, işletme profili ve stok
+kalemlerinin var/yok durumunun içerik özetidir. Versiyon sayaçları process içi
+olduğundan worker'lar arası paylaşılan anahtarlarda (yanıt önbelleği) o kullanılır.
+
+Snapshot içindeki dict/list'ler paylaşımlıdır; çağıranlar değiştirmemelidir.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from ..core.config import settings
+from .menu_snapshot import get_menu_version
+from .response_cache import content_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class AssistantKnowledge:
+    """Bir şube için asistanın ihtiyaç duyduğu salt-okunur bilgi"""
+
+    __slots__ = (
+        "sube_id",
+        "version",
+        "menu_version",
+        "built_at",
+        "business_profile",
+        "items",
+        "recipe_norm_map",
+        "recipe_detail_map",
+        "stock_map",
+        "has_db_key",
+        "attr_map",
+        "dairy_free_items",
+        "caffeine_free_items",
+        "gluten_free_items",
+        "milky_coffee_items",
+        "menu_prompt",
+        "price_map",
+        "name_map",
+        "category_map",
+        "menu_token_keywords",
+        "full_name_map",
+        "fingerprint",
+    )
+
+    def __init__(self, sube_id: int, version: int, menu_version: int):
+        self.sube_id = sube_id
+        self.version = version
+        self.menu_version = menu_version
+        self.built_at = time.monotonic()
+        self.business_profile: Dict[str, Any] = {}
+        self.items: List[Dict[str, Any]] = []
+        self.recipe_norm_map: Dict[str, List[str]] = {}
+        self.recipe_detail_map: Dict[str, List[Dict[str, Any]]] = {}
+        self.stock_map: Dict[str, float] = {}
+        self.has_db_key: Dict[str, bool] = {}
+        self.attr_map: Dict[str, Dict[str, Any]] = {}
+        self.dairy_free_items: List[Dict[str, Any]] = []
+        self.caffeine_free_items: List[Dict[str, Any]] = []
+        self.gluten_free_items: List[Dict[str, Any]] = []
+        self.milky_coffee_items: List[Dict[str, Any]] = []
+        self.menu_prompt = ""
+        self.price_map: Dict[str, float] = {}
+        self.name_map: Dict[str, str] = {}
+        self.category_map: Dict[str, str] = {}
+        self.menu_token_keywords: Set[str] = set()
+        self.full_name_map: Dict[str, Dict[str, Any]] = {}
+        # İçerik parmak izi: worker'lar arası aynı bilgi için aynı değer (yanıt önbelleği anahtarı)
+        self.fingerprint = ""
+
+    def is_fresh(self, version: int, menu_version: int) -> bool:
+        return (
+            self.version == version
+            and self.menu_version == menu_version
+            and time.monotonic() - self.built_at < settings.ASSISTANT_KNOWLEDGE_TTL_SECONDS
+        )
+
+
+ASSISTANT_KNOWLEDGE_CHANNEL = "neso_assistant_knowledge"
+
+_snapshots: Dict[int, AssistantKnowledge] = {}
+_versions: Dict[int, int] = {}
+_locks: Dict[int, asyncio.Lock] = {}
+# Kendi yayınladığımız bildirimleri tekrar uygulamamak için worker kimliği
+_ORIGIN = uuid.uuid4().hex
+_listening = False
+
+
+def get_knowledge_version(sube_id: int) -> int:
+    """Şubenin güncel bilgi versiyonu (her reçete/stok invalidation'ında artar)"""
+    return _versions.get(sube_id, 0)
+
+
+async def _build_knowledge(sube_id: int, version: int, menu_version: int) -> AssistantKnowledge:
+    from ..routers.assistant import (
+        _analyze_menu_attributes,
+        _build_neso_menu_prompt,
+        _ensure_fallback_stock,
+        _filter_milky_coffee_items,
+        _format_stock_status,
+        _load_business_profile,
+        _load_menu_details,
+        _load_recipe_map,
+        _load_stock_map,
+        _merge_stock,
+    )
+    from ..routers.siparis import normalize_name
+
+    knowledge = AssistantKnowledge(sube_id, version, menu_version)
+    knowledge.business_profile = await _load_business_profile(sube_id)
+    items = await _load_menu_details(sube_id)
+    knowledge.items = items
+    if not items:
+        knowledge.fingerprint = content_fingerprint([knowledge.business_profile])
+        return knowledge
+
+    recipe_norm_map, recipe_detail_map = await _load_recipe_map(sube_id)
+    knowledge.recipe_norm_map = recipe_norm_map
+    knowledge.recipe_detail_map = recipe_detail_map
+
+    attr_map, dairy_free, caffeine_free, gluten_free = _analyze_menu_attributes(items, recipe_norm_map)
+    for item in items:
+        key = item.get("key")
+        if key and key in recipe_detail_map:
+            item["ingredients"] = recipe_detail_map[key]
+        stock_sentence = _format_stock_status(item)
+        if stock_sentence:
+            item["stock_status_text"] = stock_sentence
+
+    stock_map_db, has_db_key = await _load_stock_map(sube_id)
+    fallback = _ensure_fallback_stock(sube_id, [it["key"] for it in items])
+    knowledge.stock_map = _merge_stock(stock_map_db, fallback)
+    knowledge.has_db_key = has_db_key
+
+    knowledge.attr_map = attr_map
+    knowledge.dairy_free_items = dairy_free
+    knowledge.caffeine_free_items = caffeine_free
+    knowledge.gluten_free_items = gluten_free
+    knowledge.milky_coffee_items = _filter_milky_coffee_items(items, attr_map)
+    knowledge.menu_prompt = _build_neso_menu_prompt(items, attr_map)
+
+    for item in items:
+        key = item["key"]
+        knowledge.price_map[key] = item["fiyat"]
+        knowledge.name_map[key] = item["ad"]
+        knowledge.category_map[key] = item["kategori"]
+        normalized_name = normalize_name(item["ad"])
+        if normalized_name:
+            knowledge.full_name_map.setdefault(normalized_name, item)
+            for token in normalized_name.split():
+                if len(token) > 2:
+                    knowledge.menu_token_keywords.add(token)
+    # Stok: ham miktar değil sadece DB stok kalemlerinin var/yok durumu (her satış anahtarı
+    # değiştirmesin; worker'a özel tahmini stok da anahtara girmesin)
+    stock_flags = {key: knowledge.stock_map.get(key, 0) > 0 for key in has_db_key}
+    knowledge.fingerprint = content_fingerprint(
+        [knowledge.business_profile, knowledge.menu_prompt, stock_flags]
+    )
+    return knowledge
+
+
+async def get_assistant_knowledge(sube_id: int) -> AssistantKnowledge:
+    """
+    Şubenin asistan bilgi snapshot'ını döndürür; yoksa, süresi dolduysa, menü
+    değiştiyse veya invalidate edildiyse yeniden oluşturur (eşzamanlı istekler
+    tek build'i bekler).
+    """
+    version = get_knowledge_version(sube_id)
+    menu_version = get_menu_version(sube_id)
+    snap = _snapshots.get(sube_id)
+    if snap is not None and snap.is_fresh(version, menu_version):
+        return snap
+
+    lock = _locks.setdefault(sube_id, asyncio.Lock())
+    async with lock:
+        version = get_knowledge_version(sube_id)
+        menu_version = get_menu_version(sube_id)
+        snap = _snapshots.get(sube_id)
+        if snap is not None and snap.is_fresh(version, menu_version):
+            return snap
+        snap = await _build_knowledge(sube_id, version, menu_version)
+        # Build sırasında invalidation geldiyse bu snapshot'ı saklama
+        if get_knowledge_version(sube_id) == version and get_menu_version(sube_id) == menu_version:
+            _snapshots[sube_id] = snap
+        logger.debug(
+            f"[ASSISTANT_KNOWLEDGE] Oluşturuldu: sube_id={sube_id}, v={version}, "
+            f"menu_v={menu_version}, urun={len(snap.items)}"
+        )
+        return snap
+
+
+def _drop_knowledge(sube_id: Optional[int]) -> None:
+    targets = list(_snapshots.keys() | _versions.keys()) if sube_id is None else [sube_id]
+    for sid in targets:
+        _versions[sid] = _versions.get(sid, 0) + 1
+        _snapshots.pop(sid, None)
+
+
+async def _on_knowledge_event(channel: str, payload: Dict[str, Any]) -> None:
+    if payload.get("origin") == _ORIGIN:
+        return
+    sube_id = payload.get("sube_id")
+    _drop_knowledge(int(sube_id) if sube_id is not None else None)
+
+
+async def invalidate_assistant_knowledge(sube_id: Optional[int] = None, broadcast: bool = True) -> None:
+    """
+    Reçete veya stok yazımından sonra snapshot'ı geçersiz kıl ve diğer worker'lara
+    pg_notify ile bildir. Transaction içinden çağrılırsa bildirim commit'te gönderilir.
+    Menü yazımları menü versiyonu üzerinden yansır (menu_snapshot invalidation'ı da
+    worker'lar arası yayılır).
+
+    Args:
+        sube_id: Sadece bu şube (None ise tüm şubeler)
+        broadcast: False ise sadece bu worker (ör. process içi tahmini stok değişti)
+    """
+    _drop_knowledge(sube_id)
+    if not broadcast:
+        return
+    from ..db.database import db
+
+    try:
+        await db.execute(
+            "SELECT pg_notify(:channel, :payload)",
+            {
+                "channel": ASSISTANT_KNOWLEDGE_CHANNEL,
+                "payload": json.dumps({"sube_id": sube_id, "origin": _ORIGIN}),
+            },
+        )
+    except Exception as e:
+        # Diğer worker'lar TTL sonunda güncellenir
+        logger.warning(f"[ASSISTANT_KNOWLEDGE] Invalidation bildirimi gönderilemedi: {e}")
+
+
+async def start_assistant_knowledge_listener() -> None:
+    """Startup: diğer worker'ların bilgi snapshot invalidation bildirimlerine abone olur."""
+    global _listening
+    if _listening:
+        return
+    from .event_bus import event_bus
+
+    await event_bus.register(ASSISTANT_KNOWLEDGE_CHANNEL, _on_knowledge_event)
+    await event_bus.start_listener()
+    _listening = True
@@ -2,16 +2,184 @@
 """
 Audit Log Servisi
 Kritik işlemlerin loglanması ve görüntülenmesi
+
+log_action kayıtları istek yolunda yazmaz: AuditLogWriter'ın sınırlı kuyruğuna
+ekler, arka plan worker'ı bunları AUDIT_BATCH_SIZE kayıtta veya
+AUDIT_FLUSH_INTERVAL_MS'te bir tek çok satırlı INSERT ile yazar. Kuyruk doluysa
+AUDIT_ENQUEUE_TIMEOUT_MS kadar beklenir (backpressure), sonra kayıt düşürülür ve
+sayılır. Shutdown'da kuyruk boşaltılır. Worker çalışmıyorsa (script, test)
+kayıt eskisi gibi doğrudan yazılır.
 """
 from typing import Dict, Any, Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
+import asyncio
 import json
 import logging
+import time
+from functools import lru_cache
 
+from ..core.config import settings
 from ..db.database import db
 
 logger = logging.getLogger(__name__)
 
+_AUDIT_COLUMNS = (
+    "action", "user_id", "username", "sube_id",
+    "entity_type", "entity_id", "old_values", "new_values",
+    "ip_address", "user_agent", "success", "error_message", "created_at",
+)
+
+
+@lru_cache(maxsize=64)
+def _insert_sql(row_count: int) -> str:
+    """row_count satırlık INSERT (parametreler :kolon_i)"""
+    rows = ",\n".join(
+        "(" + ", ".join(f":{col}_{i}" for col in _AUDIT_COLUMNS) + ")"
+        for i in range(row_count)
+    )
+    return f"INSERT INTO audit_logs ({', '.join(_AUDIT_COLUMNS)}) VALUES\n{rows}"
+
+
+class AuditLogWriter:
+    """audit_logs için sınırlı kuyruk + toplu yazan arka plan worker'ı"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = False
+        self._queue = asyncio.Queue(maxsize=max(1, settings.AUDIT_QUEUE_MAX_SIZE))
+        self._task = asyncio.create_task(self._run(), name="audit-log-writer")
+        logger.info(
+            f"[AUDIT] Writer başladı: batch={settings.AUDIT_BATCH_SIZE}, "
+            f"flush={settings.AUDIT_FLUSH_INTERVAL_MS}ms, kuyruk={settings.AUDIT_QUEUE_MAX_SIZE}"
+        )
+
+    async def stop(self) -> None:
+        """Yeni kayıt almayı bırakır, kuyruktakileri yazar ve worker'ı kapatır."""
+        if self._task is None:
+            return
+        self._stopping = True
+        try:
+            if not self._task.done():
+                await asyncio.wait_for(self._queue.put(None), timeout=10)
+            await asyncio.wait_for(self._task, timeout=10)
+        except asyncio.TimeoutError:
+            logger.error(f"[AUDIT] Writer zamanında kapanmadı; kuyrukta {self._queue.qsize()} kayıt kaldı")
+            self._task.cancel()
+        self._task = None
+        logger.info(f"[AUDIT] Writer durdu: {self.stats()}")
+
+    async def enqueue(self, record: Dict[str, Any]) -> bool:
+        """Kaydı kuyruğa ekler; kuyruk dolu kalırsa düşürür (False)."""
+        queue = self._queue
+        try:
+            queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.backpressure_waits += 1
+            try:
+                await asyncio.wait_for(queue.put(record), timeout=settings.AUDIT_ENQUEUE_TIMEOUT_MS / 1000)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    logger.error(f"[AUDIT] Kuyruk dolu, kayıt düşürüldü (toplam {self.dropped}): {record['action']}")
+                return False
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, queue.qsize())
+        return True
+
+    async def _run(self) -> None:
+        queue = self._queue
+        interval = settings.AUDIT_FLUSH_INTERVAL_MS / 1000
+        batch_size = max(1, settings.AUDIT_BATCH_SIZE)
+        done = False
+        while not done:
+            batch: List[Dict[str, Any]] = []
+            item = await queue.get()
+            if item is None:
+                done = True
+            else:
+                batch.append(item)
+                deadline = time.monotonic() + interval
+                # Batch dolana ya da süre bitene kadar topla
+                while len(batch) < batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is None:
+                        done = True
+                        break
+                    batch.append(item)
+            if done:
+                # Shutdown: kalan her şeyi al
+                while not queue.empty():
+                    item = queue.get_nowait()
+                    if item is not None:
+                        batch.append(item)
+            for i in range(0, len(batch), batch_size):
+                await self._flush(batch[i:i + batch_size])
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        start = time.perf_counter()
+        params: Dict[str, Any] = {}
+        for i, record in enumerate(batch):
+            for col in _AUDIT_COLUMNS:
+                params[f"{col}_{i}"] = record[col]
+        try:
+            await db.execute(_insert_sql(len(batch)), params)
+            self.written += len(batch)
+        except Exception as e:
+            # Sorunlu kaydı ayıklamak için tek tek dene
+            logger.error(f"[AUDIT] Toplu yazım başarısız ({len(batch)} kayıt), tek tek deneniyor: {e}")
+            for record in batch:
+                try:
+                    await db.execute(_insert_sql(1), {f"{col}_0": record[col] for col in _AUDIT_COLUMNS})
+                    self.written += 1
+                except Exception as row_error:
+                    self.failed += 1
+                    logger.error(f"[AUDIT] Kayıt yazılamadı: {record['action']}: {row_error}")
+        self.batches += 1
+        self.last_flush_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "backpressure_waits": self.backpressure_waits,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+audit_writer = AuditLogWriter()
+
 
 class AuditService:
     """Audit log işlemlerini yöneten servis"""
@@ -32,7 +200,7 @@ class AuditService:
         error_message: Optional[str] = None,
     ) -> int:
         """
-        Bir işlemi audit log'a kaydet
+        Bir işlemi audit log'a kaydet (kayıt arka planda toplu yazılır)
 
         Args:
             action: İşlem türü (örn: "menu.create", "siparis.update", "odeme.delete")
@@ -49,45 +217,35 @@ class AuditService:
             error_message: Hata mesajı (varsa)
 
         Returns:
-            Oluşturulan audit log ID
+            0 → kuyruğa alındı, -1 → yazılamadı/düşürüldü,
+            writer çalışmıyorsa doğrudan yazılan kaydın ID'si
         """
         try:
-            # JSON serialize (None değerleri temizle)
-            old_json = json.dumps(old_values) if old_values else None
-            new_json = json.dumps(new_values) if new_values else None
-
-            query = """
-                INSERT INTO audit_logs (
-                    action, user_id, username, sube_id,
-                    entity_type, entity_id, old_values, new_values,
-                    ip_address, user_agent, success, error_message
-                )
-                VALUES (
-                    :action, :user_id, :username, :sube_id,
-                    :entity_type, :entity_id, :old_values, :new_values,
-                    :ip_address, :user_agent, :success, :error_message
-                )
-                RETURNING id
-            """
+            record = {
+                "action": action,
+                "user_id": user_id,
+                "username": username,
+                "sube_id": sube_id,
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                # JSON serialize (None değerleri temizle)
+                "old_values": json.dumps(old_values, default=str) if old_values else None,
+                "new_values": json.dumps(new_values, default=str) if new_values else None,
+                "ip_address": ip_address,
+                "user_agent": user_agent,
+                "success": success,
+                "error_message": error_message,
+                # Zaman damgası yazım anına değil işlem anına ait olsun
+                "created_at": datetime.now(timezone.utc),
+            }
+
+            if audit_writer.running:
+                return 0 if await audit_writer.enqueue(record) else -1
 
             row = await db.fetch_one(
-                query,
-                {
-                    "action": action,
-                    "user_id": user_id,
-                    "username": username,
-                    "sube_id": sube_id,
-                    "entity_type": entity_type,
-                    "entity_id": entity_id,
-                    "old_values": old_json,
-                    "new_values": new_json,
-                    "ip_address": ip_address,
-                    "user_agent": user_agent,
-                    "success": success,
-                    "error_message": error_message,
-                },
+                _insert_sql(1) + " RETURNING id",
+                {f"{col}_0": record[col] for col in _AUDIT_COLUMNS},
             )
-
             log_id = row["id"]
             logger.info(f"Audit log created: {action} by {username} (ID: {log_id})")
             return log_id
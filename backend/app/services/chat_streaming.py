@@ -0,0 +1,186 @@
+# backend/app/services/chat_streaming.py
+"""
+Akışlı Sohbet (SSE)
+/assistant/chat/stream ve /customer-assistant/chat/stream için olay hattı.
+
+Sohbet turu normal /chat ile aynı kodda (chat_smart_turn) çalışır; LLM çağrısı
+provider.chat_stream ile yapılır ve her parça "token" olayı olarak hemen
+istemciye iletilir. Parçalar cümle sınırlarında bölünür; tamamlanan her cümle
+için synthesize_speech yanıtın geri kalanı akarken başlatılır ve ses "audio"
+olayı olarak (seq sırasıyla) gönderilir. Böylece ilk ses, tüm yanıtın
+tamamlanmasını beklemeden çalmaya başlar.
+
+Olaylar:
+    token  {"text"}                          LLM parçası
+    audio  {"seq", "text", "audio_base64"}   cümle sesi (ASSISTANT_ENABLE_TTS açıksa)
+    done   {... yanıt alanları}              nihai yanıt; "reply"/"message" geçerli metindir
+    error  {"detail"}
+
+LLM'e gidilmeyen turlarda (selamlama, önbellek hit'i, hata sonrası varsayılan
+yanıt) token olayı gelmez; yanıtın akmamış kısmı done'dan önce seslendirilir.
+İstemci bağlantıyı koparsa tur yine tamamlanır (sipariş yarıda kalmaz), yalnızca
+yeni ses sentezi başlatılmaz.
+"""
+import asyncio
+import base64
+import json
+import logging
+import re
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from .tts import synthesize_speech
+
+logger = logging.getLogger(__name__)
+
+# Cümle sonu: . ! ? … (ardından kapanış tırnağı/parantez) + boşluk, veya satır sonu.
+# Boşluk şartı "12.50" gibi ondalıkları bölmez.
+_BOUNDARY = re.compile(r"[.!?…]+[\"'”’)\]]*\s+|\n+")
+
+# Arka planda çalışan turlar (referans tutulmazsa task GC ile kaybolabilir)
+_running: Set[asyncio.Task] = set()
+
+
+class SentenceSplitter:
+    """Akan metni cümle sınırlarında böler; min_chars'tan kısa cümleler sonrakiyle birleştirilir."""
+
+    def __init__(self, min_chars: Optional[int] = None):
+        self.min_chars = settings.ASSISTANT_STREAM_MIN_SENTENCE_CHARS if min_chars is None else min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Parçayı ekler, tamamlanan cümleleri döndürür."""
+        self._buffer += text
+        sentences: List[str] = []
+        start = 0
+        for match in _BOUNDARY.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Kalan (sınırı gelmemiş) metni döndürür."""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return rest or None
+
+
+class ChatStream:
+    """Tek bir akışlı sohbet turu: olay kuyruğu + cümle bazlı erken TTS"""
+
+    def __init__(self, assistant_type: str = "customer"):
+        self.assistant_type = assistant_type
+        self.language: Optional[str] = None
+        self.tenant_id: Optional[int] = None
+        self.closed = False
+        self._queue: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = asyncio.Queue()
+        self._splitter = SentenceSplitter()
+        self._streamed: List[str] = []
+        self._tts = settings.ASSISTANT_ENABLE_TTS
+        self._tts_slots = asyncio.Semaphore(max(1, settings.ASSISTANT_STREAM_TTS_CONCURRENCY))
+        self._last_audio: Optional[asyncio.Task] = None
+        self._audio_seq = 0
+
+    def configure(self, *, language: Optional[str] = None, tenant_id: Optional[int] = None) -> None:
+        """TTS için dil / işletme bilgisini günceller (tur içinde belli oldukça)."""
+        if language:
+            self.language = language
+        if tenant_id:
+            self.tenant_id = tenant_id
+
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        self._queue.put_nowait((event, data))
+
+    async def token(self, text: str) -> None:
+        """LLM parçasını iletir; tamamlanan cümlelerin sentezini başlatır."""
+        if not text:
+            return
+        self._streamed.append(text)
+        self._emit("token", {"text": text})
+        for sentence in self._splitter.feed(text):
+            self._speak(sentence)
+
+    def _speak(self, sentence: str) -> None:
+        if not self._tts or self.closed:
+            return
+        seq = self._audio_seq
+        self._audio_seq += 1
+        self._last_audio = asyncio.create_task(self._synthesize(seq, sentence, self._last_audio))
+
+    async def _synthesize(self, seq: int, sentence: str, previous: Optional[asyncio.Task]) -> None:
+        audio = b""
+        try:
+            async with self._tts_slots:
+                audio = await synthesize_speech(
+                    sentence,
+                    language=self.language,
+                    tenant_id=self.tenant_id,
+                    assistant_type=self.assistant_type,
+                )
+        except Exception as e:
+            logger.warning(f"[CHAT_STREAM] TTS hatası (#{seq}): {e}")
+        # Sentezler paralel, yayın cümle sırasıyla: önceki cümlenin sesi gönderilmeden bu gönderilmez
+        if previous is not None:
+            await asyncio.wait([previous])
+        if audio:
+            self._emit("audio", {
+                "seq": seq,
+                "text": sentence,
+                "audio_base64": base64.b64encode(audio).decode("ascii"),
+            })
+
+    async def finish(self, reply: str, data: Dict[str, Any]) -> None:
+        """Tur bitti: akmayan kalan metni seslendirir, sesleri bekler ve done olayını gönderir."""
+        streamed = "".join(self._streamed)
+        if reply.startswith(streamed):
+            for sentence in self._splitter.feed(reply[len(streamed):]):
+                self._speak(sentence)
+            rest = self._splitter.flush()
+            if rest:
+                self._speak(rest)
+        # Aksi halde yanıt akıştan sonra değişti (ör. LLM yarıda hata verdi → varsayılan yanıt);
+        # geçerli metin done olayındadır
+        if self._last_audio is not None:
+            await asyncio.wait([self._last_audio])
+        self._emit("done", data)
+        self._queue.put_nowait(None)
+
+    def fail(self, detail: str) -> None:
+        self._emit("error", {"detail": detail})
+        self._queue.put_nowait(None)
+
+    async def events(self) -> AsyncIterator[str]:
+        """Olayları SSE satırları olarak verir (StreamingResponse gövdesi)."""
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is None:
+                    break
+                event, data = item
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+        finally:
+            self.closed = True
+
+
+def start_chat_turn(stream: ChatStream, turn: Awaitable[Tuple[str, Dict[str, Any]]]) -> asyncio.Task:
+    """
+    Sohbet turunu arka planda çalıştırır; tur (reply, done verisi) döndürünce finish,
+    hata verirse fail çağrılır. İstemci bağlantısından bağımsızdır.
+    """
+    async def _run() -> None:
+        try:
+            reply, data = await turn
+        except Exception as e:
+            logger.error(f"[CHAT_STREAM] Tur hatası: {e}", exc_info=True)
+            stream.fail(str(getattr(e, "detail", "") or "Bir hata oluştu"))
+            return
+        await stream.finish(reply or "", data)
+
+    task = asyncio.create_task(_run())
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return task
@@ -0,0 +1,232 @@
+# backend/app/services/conversation_store.py
+"""
+Konuşma Deposu
+Asistan konuşmalarının tek deposu: mesaj geçmişi, algılanan dil, masa/şube/niyet
+bağlamı (context_manager) ve varyasyon bekleyen sepet aynı kayıtta tutulur.
+
+Eskiden bunlar assistant.py'deki modül seviyesi dict'lerde ve ContextManager'da
+ayrı ayrı tutuluyor, yeni her conversation_id ile büyüyüp hiç atılmıyordu
+(public QR ucunda sınırsız bellek). Kayıtlar process içi LRU'da tutulur:
+CONVERSATION_TTL_SECONDS boyunca dokunulmayan konuşma düşer, en fazla
+CONVERSATION_STORE_MAX_SESSIONS konuşma ve yaklaşık CONVERSATION_STORE_MAX_BYTES
+bellek kullanılır; sınır aşılınca en uzun süredir kullanılmayan konuşma atılır.
+
+Redis aktifse (CONVERSATION_STORE_BACKEND=auto/redis) her kayıt ayrıca Redis'e
+yazılır ve load sırasında başka bir worker'ın yazdığı daha yeni kopya alınır;
+böylece aynı konuşmanın turları farklı worker'lara düşebilir.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+from ..core.lru import LRUCache
+from .cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+SESSION_MAX_MESSAGES = 20
+
+_KEY_PREFIX = "conversation"
+# Her bu kadar kayıtta bir, okunmadan süresi dolan konuşmalar da temizlenir
+_PURGE_EVERY = 256
+# Kayıt başına sabit yük (slot'lar, dict/list başlıkları) için yaklaşık bayt
+_SESSION_OVERHEAD = 512
+_MESSAGE_OVERHEAD = 96
+
+
+class ChatMessage:
+    """Konuşmadaki tek mesaj"""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+class ConversationSession:
+    """Bir konuşmanın durumu (geçmiş + dil + masa/şube bağlamı + bekleyen varyasyonlar)"""
+
+    __slots__ = (
+        "conversation_id",
+        "messages",
+        "language",
+        "sube_id",
+        "masa",
+        "last_intent",
+        "extra",
+        "pending_aggregated",
+        "pending_variations",
+        "last_updated",
+        "rev",
+    )
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.messages: List[ChatMessage] = []
+        self.language: Optional[str] = None
+        self.sube_id: Optional[int] = None
+        self.masa: Optional[str] = None
+        self.last_intent: Optional[str] = None
+        self.extra: Dict[str, Any] = {}
+        self.pending_aggregated: Optional[Dict[str, int]] = None
+        self.pending_variations: Optional[List[Dict[str, Any]]] = None
+        self.last_updated = datetime.utcnow()
+        self.rev = 0
+
+    def touch(self) -> None:
+        self.last_updated = datetime.utcnow()
+
+    def history(self) -> List[Dict[str, str]]:
+        return [m.to_dict() for m in self.messages]
+
+    def append(self, role: str, content: str) -> None:
+        self.messages.append(ChatMessage(role, content))
+        if len(self.messages) > SESSION_MAX_MESSAGES:
+            del self.messages[: len(self.messages) - SESSION_MAX_MESSAGES]
+
+    def approx_size(self) -> int:
+        size = _SESSION_OVERHEAD + len(self.conversation_id)
+        for m in self.messages:
+            size += _MESSAGE_OVERHEAD + len(m.content)
+        if self.pending_aggregated:
+            size += _MESSAGE_OVERHEAD * len(self.pending_aggregated)
+        if self.pending_variations:
+            size += _SESSION_OVERHEAD * len(self.pending_variations)
+        if self.extra:
+            size += _MESSAGE_OVERHEAD * len(self.extra)
+        return size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "messages": [[m.role, m.content] for m in self.messages],
+            "language": self.language,
+            "sube_id": self.sube_id,
+            "masa": self.masa,
+            "last_intent": self.last_intent,
+            "extra": self.extra,
+            "pending_aggregated": self.pending_aggregated,
+            "pending_variations": self.pending_variations,
+            "rev": self.rev,
+        }
+
+    def apply(self, data: Dict[str, Any]) -> None:
+        """Redis'ten gelen (daha yeni) kopyayı bu kayda yerinde uygular."""
+        self.messages = [ChatMessage(role, content) for role, content in data.get("messages") or []]
+        self.language = data.get("language")
+        self.sube_id = data.get("sube_id")
+        self.masa = data.get("masa")
+        self.last_intent = data.get("last_intent")
+        self.extra = data.get("extra") or {}
+        self.pending_aggregated = data.get("pending_aggregated")
+        self.pending_variations = data.get("pending_variations")
+        self.rev = int(data.get("rev") or 0)
+
+
+def _weigh(session: ConversationSession) -> int:
+    return session.approx_size()
+
+
+def _redis_key(conversation_id: str) -> str:
+    return f"{_KEY_PREFIX}:{conversation_id}"
+
+
+class ConversationStore:
+    """LRU + TTL + bayt sınırlı konuşma deposu (isteğe bağlı Redis yedekli)"""
+
+    def __init__(self) -> None:
+        self._sessions = LRUCache(
+            maxsize=settings.CONVERSATION_STORE_MAX_SESSIONS,
+            ttl=settings.CONVERSATION_TTL_SECONDS,
+            maxweight=settings.CONVERSATION_STORE_MAX_BYTES,
+            weigher=_weigh,
+        )
+        self._saves = 0
+        self.redis_errors = 0
+
+    def _redis(self):
+        if settings.CONVERSATION_STORE_BACKEND == "memory":
+            return None
+        return cache_service.get_redis_client()
+
+    async def load(self, conversation_id: str, create: bool = True) -> Optional[ConversationSession]:
+        """
+        Konuşmayı döndürür (yoksa create=True ise boş kayıt açar). Aynı worker'da aynı
+        konuşma için hep aynı nesne döner; Redis'te daha yeni kopya varsa yerinde güncellenir.
+        """
+        session = self._sessions.get(conversation_id)
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                raw = await redis_client.get(_redis_key(conversation_id))
+                if raw:
+                    data = json.loads(raw)
+                    if session is None:
+                        session = ConversationSession(conversation_id)
+                    if int(data.get("rev") or 0) > session.rev:
+                        session.apply(data)
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"[CONVERSATION] Redis okuma hatası ({conversation_id}): {e}")
+        if session is None:
+            if not create:
+                return None
+            session = ConversationSession(conversation_id)
+        session.touch()
+        self._sessions.set(conversation_id, session)
+        return session
+
+    async def save(self, session: ConversationSession) -> None:
+        """Kaydı yazar: LRU'da TTL'i ve ağırlığı yeniler, Redis aktifse oraya da yazar."""
+        session.rev += 1
+        session.touch()
+        self._sessions.set(session.conversation_id, session)
+        self._saves += 1
+        if self._saves % _PURGE_EVERY == 0:
+            self._sessions.purge_expired()
+
+        redis_client = self._redis()
+        if redis_client is None:
+            return
+        try:
+            await redis_client.set(
+                _redis_key(session.conversation_id),
+                json.dumps(session.to_dict(), ensure_ascii=False, default=str),
+                ex=settings.CONVERSATION_TTL_SECONDS,
+            )
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"[CONVERSATION] Redis yazma hatası ({session.conversation_id}): {e}")
+
+    async def delete(self, conversation_id: str) -> None:
+        self._sessions.pop(conversation_id)
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                await redis_client.delete(_redis_key(conversation_id))
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"[CONVERSATION] Redis silme hatası ({conversation_id}): {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lru = self._sessions.stats()
+        return {
+            "backend": "redis" if self._redis() is not None else "memory",
+            "live_sessions": lru["size"],
+            "max_sessions": lru["maxsize"],
+            "approx_bytes": lru["weight"],
+            "max_bytes": lru["maxweight"],
+            "evictions": lru["evictions"],
+            "expirations": lru["expirations"],
+            "hits": lru["hits"],
+            "misses": lru["misses"],
+            "redis_errors": self.redis_errors,
+        }
+
+
+conversation_store = ConversationStore()
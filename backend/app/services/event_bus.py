@@ -16,11 +16,17 @@ logger = logging.getLogger(__name__)
 EventHandler = Callable[[str, Dict[str, object]], Awaitable[None]]
 
 
+def _asyncpg_dsn(url: str) -> str:
+    """SQLAlchemy/databases URL'sini (postgresql+asyncpg://) asyncpg'nin kabul ettiği forma çevirir."""
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
 class EventBus:
     def __init__(self) -> None:
         self._handlers: Dict[str, List[EventHandler]] = {}
         self._lock = asyncio.Lock()
         self._listener_task: asyncio.Task | None = None
+        self._conn: asyncpg.Connection | None = None
         self._handler = invalidate_ai_cache_sync
 
     async def start_listener(self) -> None:
@@ -28,17 +34,39 @@ class EventBus:
             return
         self._listener_task = asyncio.create_task(self._listen_loop())
 
+    async def stop_listener(self) -> None:
+        if self._listener_task:
+            self._listener_task.cancel()
+            self._listener_task = None
+
+    def _channels(self) -> List[str]:
+        return sorted({"ai_cache", *self._handlers.keys()})
+
     async def _listen_loop(self) -> None:
-        try:
-            conn = await asyncpg.connect(settings.DATABASE_URL)
-            await conn.add_listener("ai_cache", self._notify_cb)
-            logger.info("Event bus LISTEN başladı: ai_cache")
-            while True:
-                await asyncio.sleep(3600)
-        except Exception:
-            logger.exception("Event bus listener hata verdi; 10sn sonra yeniden denenecek")
-            await asyncio.sleep(10)
-            await self._listen_loop()
+        # Bağlantı koparsa kanallara yeniden abone olarak devam eder
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(_asyncpg_dsn(settings.DATABASE_URL))
+                for channel in self._channels():
+                    await conn.add_listener(channel, self._notify_cb)
+                self._conn = conn
+                logger.info("Event bus LISTEN başladı: %s", ", ".join(self._channels()))
+                while not conn.is_closed():
+                    await asyncio.sleep(5)
+                logger.warning("Event bus LISTEN bağlantısı kapandı; yeniden bağlanılıyor")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event bus listener hata verdi; 10sn sonra yeniden denenecek")
+                await asyncio.sleep(10)
+            finally:
+                self._conn = None
+                if conn is not None and not conn.is_closed():
+                    try:
+                        await conn.close()
+                    except Exception:
+                        pass
 
     async def _notify_cb(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
         try:
@@ -50,9 +78,21 @@ class EventBus:
 
     async def register(self, channel: str, handler: EventHandler) -> None:
         async with self._lock:
+            is_new_channel = channel not in self._handlers
             self._handlers.setdefault(channel, []).append(handler)
+            # Listener zaten çalışıyorsa yeni kanalı canlı bağlantıya ekle
+            if is_new_channel and self._conn is not None and not self._conn.is_closed():
+                await self._conn.add_listener(channel, self._notify_cb)
             logger.info("Event handler kaydedildi: channel=%s handler=%s", channel, handler)
 
+    async def unregister(self, channel: str, handler: EventHandler) -> None:
+        async with self._lock:
+            handlers = self._handlers.get(channel, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers:
+                self._handlers.pop(channel, None)
+
     async def emit(self, channel: str, payload: Dict[str, object]) -> None:
         handlers = list(self._handlers.get(channel, []))
         if not handlers:
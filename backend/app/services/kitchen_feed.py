@@ -0,0 +1,190 @@
+# backend/app/services/kitchen_feed.py
+"""
+Mutfak Akışı (push + replay)
+Sipariş oluşturma ve durum değişikliği yolları, mutfak ekranlarının ihtiyaç
+duyduğu kompakt sipariş delta'larını Topics.KITCHEN'e yayınlar. Ekranlar artık
+her olayda (veya birkaç saniyede bir /mutfak/poll ile) kuyruğu yeniden sorgulamaz;
+delta'yı yerel listeye uygular.
+
+Cursor, siparisler.mutfak_seq kolonudur: trigger her oluşturma ve durum/masa/
+sepet/tutar değişiminde global bir sequence'tan değer atar. Yeniden bağlanan
+ekran son gördüğü cursor ile sadece kaçırdığı siparişleri (son halleriyle) alır;
+çok gerideyse resync ile kuyruğu tek sefer yeniden yükler.
+
+mutfak_seq satır yazılırken (nextval) alınır, commit anında değil: üst üste binen
+iki transaction ters sırada commit edilebilir. Bu yüzden replay cursor'dan
+KITCHEN_REPLAY_OVERLAP kadar geriden başlar; istemci zaten gördüğü (id, mutfak_seq)
+çiftlerini atar (delta siparişin son hali olduğundan tekrar uygulamak da zararsızdır).
+Transaction içinden yapılan yayınlar kitchen_publish_after_commit ile commit
+sonrasına ertelenir; ekran henüz görünmeyen satırın cursor'ını almaz.
+"""
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from ..core.config import settings
+from ..db.database import db
+
+logger = logging.getLogger(__name__)
+
+# Mutfak ekranında görünen durumlar; diğerleri için sadece kaldırma delta'sı gönderilir
+KITCHEN_VISIBLE_STATES = ("yeni", "hazirlaniyor", "hazir")
+
+KITCHEN_ROW_COLUMNS = "id, masa, durum, tutar, sepet, created_at, started_at, hazir_at, mutfak_seq"
+
+# kitchen_publish_after_commit bloğu içindeyken yayınlar burada bekler
+_deferred: ContextVar[Optional[List[Tuple[Any, ...]]]] = ContextVar("kitchen_deferred", default=None)
+
+
+@asynccontextmanager
+async def kitchen_publish_after_commit():
+    """
+    Blok içindeki publish_kitchen_orders çağrılarını blok başarıyla bitince gönderir.
+    Transaction ile aynı async with'te transaction'dan önce yazılır, böylece yayın
+    commit'ten sonra yapılır; transaction geri alınırsa hiç yapılmaz:
+
+        async with kitchen_publish_after_commit(), db.transaction():
+            ...
+    """
+    pending: List[Tuple[Any, ...]] = []
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    for args in pending:
+        await publish_kitchen_orders(*args)
+
+
+def kitchen_order_delta(row: Mapping[str, Any], sepet: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Siparişin mutfak ekranı için kompakt görünümü.
+    Ekrandan düşen (odendi/iptal) siparişler için sadece id/masa/durum döner.
+
+    Args:
+        row: siparisler satırı (en az id, masa, durum)
+        sepet: row'da sepet yoksa (INSERT ... RETURNING) Python tarafındaki sepet
+    """
+    from ..routers.mutfak import _row_map
+
+    data = dict(row)
+    durum = data.get("durum") or "yeni"
+    if durum not in KITCHEN_VISIBLE_STATES:
+        return {"id": data.get("id"), "masa": data.get("masa", ""), "durum": durum}
+    if sepet is not None:
+        data["sepet"] = sepet
+    return _row_map(data)
+
+
+async def publish_kitchen_orders(
+    sube_id: int,
+    rows: Iterable[Mapping[str, Any]],
+    event_type: str = "status_change",
+    sepet: Optional[List[Dict[str, Any]]] = None,
+) -> None:
+    """
+    Sipariş delta'larını Topics.KITCHEN'e yayınlar.
+
+    Mesaj eski istemcilerle uyumlu alanları (type, order_id, masa, durum/status)
+    korur; yeni alanlar: "cursor" (en büyük mutfak_seq) ve "orders" (kompakt delta listesi).
+
+    Args:
+        sube_id: Şube ID
+        rows: siparisler satırları (mutfak_seq varsa cursor olarak kullanılır)
+        event_type: "new_order" | "status_change"
+        sepet: Tek siparişlik INSERT yollarında satırda olmayan sepet
+    """
+    from ..websocket.manager import manager, Topics
+
+    rows = list(rows)
+    if not rows:
+        return
+    pending = _deferred.get()
+    if pending is not None:
+        pending.append((sube_id, [dict(r) for r in rows], event_type, sepet))
+        return
+    orders = [kitchen_order_delta(r, sepet=sepet) for r in rows]
+    seqs = [s for s in (dict(r).get("mutfak_seq") for r in rows) if s is not None]
+
+    message: Dict[str, Any] = {
+        "type": event_type,
+        "sube_id": sube_id,
+        "cursor": max(seqs) if seqs else None,
+        "orders": orders,
+    }
+    if len(orders) == 1:
+        first = orders[0]
+        message.update({
+            "order_id": first["id"],
+            "masa": first["masa"],
+            "durum": first["durum"],
+            "new_status": first["durum"],
+            "status": first["durum"],
+        })
+
+    try:
+        await manager.broadcast(message, topic=Topics.KITCHEN)
+    except Exception as e:
+        logger.warning(f"[KITCHEN_FEED] Yayın hatası (sube_id={sube_id}): {e}")
+
+
+async def current_kitchen_cursor(sube_id: int) -> int:
+    """Şubenin güncel mutfak cursor'ı (idx_siparisler_sube_mutfak_seq üzerinden)."""
+    row = await db.fetch_one(
+        "SELECT COALESCE(MAX(mutfak_seq), 0) AS cursor FROM siparisler WHERE sube_id = :sid",
+        {"sid": sube_id},
+    )
+    return int(row["cursor"] or 0) if row else 0
+
+
+async def kitchen_changes_since(sube_id: int, cursor: int, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Cursor'dan sonra değişen siparişleri (son halleriyle) döndürür. Geç commit edilen
+    değişiklikler kaçmasın diye KITCHEN_REPLAY_OVERLAP kadar geriden başlanır;
+    dönen listede istemcinin zaten gördüğü siparişler de olabilir (limite sayılmazlar;
+    pencere mutfak_seq birimindedir, satır sayısı en fazla o kadardır).
+
+    Returns:
+        {"cursor": int, "orders": [...], "resync": bool}
+        resync=True ise istemci kuyruğu /mutfak/kuyruk ile baştan yüklemeli
+        (cursor yok/0 veya kaçırılan değişiklik sayısı limiti aşıyor).
+    """
+    limit = limit or settings.KITCHEN_REPLAY_LIMIT
+    if cursor <= 0:
+        return {"cursor": await current_kitchen_cursor(sube_id), "orders": [], "resync": True}
+
+    # Cursor'dan sonrakiler limite sayılır; güvenlik penceresindeki (istemcinin büyük ihtimalle
+    # gördüğü) satırlar sayılmaz, yoksa yoğun şubede her yeniden bağlanma resync olurdu
+    rows = await db.fetch_all(
+        f"""
+        SELECT {KITCHEN_ROW_COLUMNS}
+        FROM siparisler
+        WHERE sube_id = :sid AND mutfak_seq > :cursor
+        ORDER BY mutfak_seq ASC
+        LIMIT :limit
+        """,
+        {"sid": sube_id, "cursor": cursor, "limit": limit + 1},
+    )
+    if len(rows) > limit:
+        logger.info(f"[KITCHEN_FEED] Replay limiti aşıldı, resync (sube_id={sube_id}, cursor={cursor})")
+        return {"cursor": await current_kitchen_cursor(sube_id), "orders": [], "resync": True}
+
+    overlap = settings.KITCHEN_REPLAY_OVERLAP
+    if overlap > 0:
+        late_rows = await db.fetch_all(
+            f"""
+            SELECT {KITCHEN_ROW_COLUMNS}
+            FROM siparisler
+            WHERE sube_id = :sid AND mutfak_seq > :since AND mutfak_seq <= :cursor
+            ORDER BY mutfak_seq ASC
+            """,
+            {"sid": sube_id, "since": max(0, cursor - overlap), "cursor": cursor},
+        )
+        rows = list(late_rows) + list(rows)
+
+    return {
+        "cursor": max(cursor, rows[-1]["mutfak_seq"]) if rows else cursor,
+        "orders": [kitchen_order_delta(r) for r in rows],
+        "resync": False,
+    }
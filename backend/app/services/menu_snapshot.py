@@ -0,0 +1,197 @@
+# backend/app/services/menu_snapshot.py
+"""
+Menü Snapshot Servisi
+Şube bazında aktif menünün (normalize anahtarlar, fiyatlar, kategoriler,
+varyasyonlar) versiyonlu, in-process bir kopyasını tutar.
+
+Sipariş alma yolları (siparis, public QR, assistant, customer_assistant) her
+istekte menüyü DB'den okuyup normalize etmek yerine buradan okur. Snapshot
+MENU_SNAPSHOT_TTL_SECONDS sonunda yenilenir; menu / menu_varyasyonlar yazım
+uçları invalidate_menu_snapshot ile anında geçersiz kılar (versiyon artar).
+Invalidation pg_notify ile diğer worker'lara da yayılır; fiyatlama snapshot'tan
+yapıldığından diğer worker eski fiyatla / pasif ürünle sipariş almaz. TTL yalnızca
+kaçan bildirimler için güvenlik sınırıdır.
+
+Snapshot içindeki dict/list'ler paylaşımlıdır; çağıranlar değiştirmemelidir.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+from ..db.database import db
+
+logger = logging.getLogger(__name__)
+
+
+class MenuSnapshot:
+    """Bir şubenin aktif menüsünün salt-okunur görüntüsü"""
+
+    __slots__ = (
+        "sube_id",
+        "version",
+        "built_at",
+        "items",
+        "by_key",
+        "by_id",
+        "price_map",
+        "name_map",
+        "kategoriler",
+    )
+
+    def __init__(self, sube_id: int, version: int, items: List[Dict[str, Any]]):
+        self.sube_id = sube_id
+        self.version = version
+        self.built_at = time.monotonic()
+        self.items = items
+        self.by_key: Dict[str, Dict[str, Any]] = {}
+        self.by_id: Dict[int, Dict[str, Any]] = {}
+        self.price_map: Dict[str, float] = {}
+        self.name_map: Dict[str, str] = {}
+        kategoriler: List[str] = []
+        for item in items:
+            key = item["key"]
+            self.by_key[key] = item
+            self.by_id[item["id"]] = item
+            self.price_map[key] = item["fiyat"]
+            self.name_map[key] = item["ad"]
+            if item["kategori"] and item["kategori"] not in kategoriler:
+                kategoriler.append(item["kategori"])
+        self.kategoriler = kategoriler
+
+    def is_fresh(self, version: int) -> bool:
+        return (
+            self.version == version
+            and time.monotonic() - self.built_at < settings.MENU_SNAPSHOT_TTL_SECONDS
+        )
+
+
+MENU_SNAPSHOT_CHANNEL = "neso_menu_snapshot"
+
+_snapshots: Dict[int, MenuSnapshot] = {}
+_versions: Dict[int, int] = {}
+_locks: Dict[int, asyncio.Lock] = {}
+# Kendi yayınladığımız bildirimleri tekrar uygulamamak için worker kimliği
+_ORIGIN = uuid.uuid4().hex
+_listening = False
+
+
+def get_menu_version(sube_id: int) -> int:
+    """Şubenin güncel menü versiyonu (her invalidation'da artar)"""
+    return _versions.get(sube_id, 0)
+
+
+async def _build_snapshot(sube_id: int, version: int) -> MenuSnapshot:
+    from ..routers.siparis import normalize_name
+
+    rows = await db.fetch_all(
+        """
+        SELECT
+            m.id, m.ad, m.fiyat, m.kategori, m.aciklama,
+            mv.id AS var_id, mv.ad AS var_ad, mv.ek_fiyat AS var_ek_fiyat, mv.sira AS var_sira
+        FROM menu m
+        LEFT JOIN menu_varyasyonlar mv ON m.id = mv.menu_id AND mv.aktif = TRUE
+        WHERE m.aktif = TRUE AND m.sube_id = :sid
+        ORDER BY m.kategori NULLS LAST, m.ad ASC, mv.sira ASC, mv.ad ASC
+        """,
+        {"sid": sube_id},
+    )
+    items_dict: Dict[int, Dict[str, Any]] = {}
+    for r in rows:
+        menu_id = r["id"]
+        item = items_dict.get(menu_id)
+        if item is None:
+            item = {
+                "id": menu_id,
+                "ad": r["ad"],
+                "key": normalize_name(r["ad"]),
+                "fiyat": float(r["fiyat"]) if r["fiyat"] is not None else 0.0,
+                "kategori": r["kategori"] or "",
+                "aciklama": (r["aciklama"] or "").strip(),
+                "varyasyonlar": [],
+            }
+            items_dict[menu_id] = item
+        if r["var_id"]:
+            item["varyasyonlar"].append({
+                "id": r["var_id"],
+                "ad": r["var_ad"],
+                "ek_fiyat": float(r["var_ek_fiyat"] or 0),
+                "sira": r["var_sira"],
+            })
+    return MenuSnapshot(sube_id, version, list(items_dict.values()))
+
+
+async def get_menu_snapshot(sube_id: int) -> MenuSnapshot:
+    """
+    Şubenin menü snapshot'ını döndürür; yoksa, süresi dolduysa veya invalidate
+    edildiyse tek sorgu ile yeniden oluşturur (eşzamanlı istekler tek build'i bekler).
+    """
+    version = get_menu_version(sube_id)
+    snap = _snapshots.get(sube_id)
+    if snap is not None and snap.is_fresh(version):
+        return snap
+
+    lock = _locks.setdefault(sube_id, asyncio.Lock())
+    async with lock:
+        version = get_menu_version(sube_id)
+        snap = _snapshots.get(sube_id)
+        if snap is not None and snap.is_fresh(version):
+            return snap
+        snap = await _build_snapshot(sube_id, version)
+        # Build sırasında invalidation geldiyse bu snapshot'ı saklama
+        if get_menu_version(sube_id) == version:
+            _snapshots[sube_id] = snap
+        logger.debug(f"[MENU_SNAPSHOT] Oluşturuldu: sube_id={sube_id}, v={version}, urun={len(snap.items)}")
+        return snap
+
+
+def _drop_snapshot(sube_id: Optional[int]) -> None:
+    targets = list(_snapshots.keys() | _versions.keys()) if sube_id is None else [sube_id]
+    for sid in targets:
+        _versions[sid] = _versions.get(sid, 0) + 1
+        _snapshots.pop(sid, None)
+
+
+async def _on_menu_event(channel: str, payload: Dict[str, Any]) -> None:
+    if payload.get("origin") == _ORIGIN:
+        return
+    sube_id = payload.get("sube_id")
+    _drop_snapshot(int(sube_id) if sube_id is not None else None)
+
+
+async def invalidate_menu_snapshot(sube_id: Optional[int] = None) -> None:
+    """
+    Menü veya varyasyon yazımından sonra snapshot'ı geçersiz kıl ve diğer
+    worker'lara pg_notify ile bildir (menü versiyonuna bağlı asistan bilgi
+    snapshot'ı da böylece her worker'da eskir).
+
+    Args:
+        sube_id: Sadece bu şube (None ise tüm şubeler)
+    """
+    _drop_snapshot(sube_id)
+    try:
+        await db.execute(
+            "SELECT pg_notify(:channel, :payload)",
+            {
+                "channel": MENU_SNAPSHOT_CHANNEL,
+                "payload": json.dumps({"sube_id": sube_id, "origin": _ORIGIN}),
+            },
+        )
+    except Exception as e:
+        # Diğer worker'lar TTL sonunda güncellenir
+        logger.warning(f"[MENU_SNAPSHOT] Invalidation bildirimi gönderilemedi: {e}")
+
+
+async def start_menu_snapshot_listener() -> None:
+    """Startup: diğer worker'ların menü invalidation bildirimlerine abone olur."""
+    global _listening
+    if _listening:
+        return
+    from .event_bus import event_bus
+
+    await event_bus.register(MENU_SNAPSHOT_CHANNEL, _on_menu_event)
+    await event_bus.start_listener()
+    _listening = True
@@ -0,0 +1,161 @@
+# backend/app/services/order_lines.py
+"""
+Sipariş Kalemleri (siparis_kalemleri)
+siparisler.sepet JSONB'sinin tipli satır karşılığı: sipariş başına her sepet
+kalemi için (siparis_id, sira, menu_id, urun_key, adet, birim_fiyat, tutar,
+varyasyon, ikram). Analitik / stok / öneri sorguları JSON açmak yerine bu tabloda
+tamsayı anahtarlar ve index'ler üzerinden gruplar ve menu'ye menu_id ile bağlanır.
+
+Satırlar siparisler üzerindeki trigger ile yazılır (bkz. schema.ORDER_LINE_STATEMENTS):
+INSERT'te eklenir, sepet/tutar değişince yeniden yazılır, durum değişince
+güncellenir, sipariş silinince silinir. Geçmiş siparişler için backfill burada.
+
+Uygulama tarafında sepet okuyan uçlar (kasa, adisyon, mutfak, analitik) aynı
+normalizasyonu decode_sepet / normalize_items üzerinden kullanır.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from ..db.database import db
+
+logger = logging.getLogger(__name__)
+
+
+def decode_sepet(value: Any) -> List[Dict[str, Any]]:
+    """Sepet değerini (JSONB list veya JSON string) listeye çevirir; bozuksa boş liste."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+        except json.JSONDecodeError:
+            return []
+        return parsed if isinstance(parsed, list) else []
+    return []
+
+
+def _num(val: Any, default: float = 0.0) -> float:
+    try:
+        if val is None or val == "":
+            return default
+        return float(val)
+    except (TypeError, ValueError):
+        return default
+
+
+def normalize_items(value: Any) -> List[Dict[str, Any]]:
+    """
+    siparis.sepet alanını ürün listesine normalize eder.
+
+    Alan adları eski kayıtlarla uyumlu okunur (adet/miktar/quantity/qty,
+    fiyat/birim_fiyat/unit_price/price, toplam/tutar/total). SQL karşılığı:
+    siparis_sepet_satirlari().
+
+    Returns:
+        [{"urun", "adet", "miktar", "fiyat", "toplam", ["varyasyon", "notlar", "ikram"]}, ...]
+    """
+    items: List[Dict[str, Any]] = []
+    for item in decode_sepet(value):
+        if not isinstance(item, dict):
+            continue
+        urun = str(item.get("urun") or item.get("ad") or "").strip()
+        if not urun:
+            continue
+
+        adet = _num(
+            item.get("adet")
+            or item.get("miktar")
+            or item.get("quantity")
+            or item.get("qty"),
+            default=1.0,
+        )
+        if adet <= 0:
+            adet = 1.0
+        fiyat = _num(
+            item.get("fiyat")
+            or item.get("birim_fiyat")
+            or item.get("unit_price")
+            or item.get("price"),
+            default=0.0,
+        )
+        toplam = _num(
+            item.get("toplam")
+            or item.get("tutar")
+            or item.get("total"),
+            default=fiyat * adet,
+        )
+        if fiyat == 0 and adet:
+            fiyat = toplam / adet if toplam else 0.0
+
+        normalized = {
+            "urun": urun,
+            "adet": adet,
+            "miktar": adet,
+            "fiyat": fiyat,
+            "toplam": fiyat * adet if fiyat else toplam,
+        }
+        if "varyasyon" in item:
+            normalized["varyasyon"] = item["varyasyon"]
+        note = item.get("notlar") or item.get("not") or item.get("note")
+        if note:
+            normalized["notlar"] = note
+        if "ikram" in item:
+            normalized["ikram"] = item["ikram"]
+        items.append(normalized)
+    return items
+
+
+async def backfill_order_lines(
+    sube_id: Optional[int] = None,
+    batch_size: int = 5000,
+    after_id: int = 0,
+) -> int:
+    """
+    Kalemi olmayan siparişler için siparis_kalemleri satırlarını yazar (backfill).
+
+    Siparişler id sırasıyla batch_size'lık parçalar halinde işlenir; her parça ayrı
+    statement'tır (uzun kilit/transaction yok). Kalemi zaten olan siparişler atlanır,
+    bu yüzden yarıda kesilen çalışma tekrar başlatılabilir (idempotent).
+
+    Args:
+        sube_id: Sadece bu şube (None = tümü)
+        batch_size: Parça başına sipariş sayısı
+        after_id: Bu id'den sonraki siparişlerden başla (devam ettirme için)
+
+    Returns:
+        Kalemleri yazılan sipariş sayısı
+    """
+    sube_filter = "AND s.sube_id = :sid" if sube_id is not None else ""
+    toplam = 0
+    last_id = after_id
+    while True:
+        params: Dict[str, Any] = {"after": last_id, "limit": batch_size}
+        if sube_id is not None:
+            params["sid"] = sube_id
+        row = await db.fetch_one(
+            f"""
+            WITH parca AS (
+                SELECT s.id, s.sube_id, s.created_at, s.durum, s.sepet, s.tutar
+                FROM siparisler s
+                WHERE s.id > :after {sube_filter}
+                ORDER BY s.id
+                LIMIT :limit
+            ),
+            yazilan AS (
+                SELECT siparis_kalemleri_yaz(p.id, p.sube_id, p.created_at, p.durum, p.sepet, p.tutar)
+                FROM parca p
+                WHERE NOT EXISTS (SELECT 1 FROM siparis_kalemleri k WHERE k.siparis_id = p.id)
+            )
+            SELECT (SELECT MAX(id) FROM parca) AS last_id, (SELECT COUNT(*) FROM yazilan)::int AS n
+            """,
+            params,
+        )
+        if not row or row["last_id"] is None:
+            break
+        last_id = int(row["last_id"])
+        toplam += int(row["n"] or 0)
+    logger.info(f"[ORDER_LINES] Backfill tamamlandı: sube_id={sube_id}, siparis={toplam}, son_id={last_id}")
+    return toplam
@@ -0,0 +1,432 @@
+# backend/app/services/partitioning.py
+"""
+Büyük zaman serisi tablolarının aylık range partitioning'i (created_at üzerinden).
+
+Tablolar varsayılan olarak düz heap tablodur; geçiş opt-in'dir ve bakım
+penceresinde scripts/partition_tables.py ile yapılır (convert_to_partitioned):
+
+1. Tablo ACCESS EXCLUSIVE kilitlenir, <tablo>_legacy adına taşınır
+   (index'leri de _legacy son ekiyle yeniden adlandırılır).
+2. Aynı kolonlarla PARTITION BY RANGE (created_at) ebeveyn tablo açılır;
+   PRIMARY KEY (id, created_at) olur (bölümleme anahtarı PK'da olmalı),
+   id sequence'ı yeni tabloya bağlanır, FK'lar kopyalanır.
+3. En eski satırın ayından PARTITION_PREMAKE_MONTHS sonrasına kadar aylık
+   bölümler + aralık dışı satırlar için <tablo>_default açılır, veri kopyalanır.
+4. Eski tablonun index'leri ve trigger'ları yeni tabloya kurulur (trigger'lar
+   kopyadan sonra; adisyon/satış özeti delta'ları iki kez uygulanmasın).
+   RLS (ENABLE/FORCE ROW LEVEL SECURITY) ve tüm politikalar aynı komut, rol ve
+   ifadelerle yeniden oluşturulur; eşitlik doğrulanmazsa geçiş geri alınır.
+
+Bölüm adları <tablo>_pYYYYMM'dir; ay sınırları işletme saat diliminde
+(schema.DAILY_PRODUCT_SALES_TIMEZONE) alınır. maintain_partitions zamanlayıcıdan
+çalışır: ileri ayların bölümlerini açar, PARTITION_RETENTION_MONTHS'u dolan
+bölümleri ayırıp arşiv şemasına taşır (veya siler). Yalnızca id ile yapılan
+erişimler (WHERE id = ...) tüm bölümlerin PK index'ine bakar; created_at aralığı
+veren sorgular sadece ilgili bölümleri tarar.
+"""
+import logging
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..db.schema import DAILY_PRODUCT_SALES_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("siparisler", "odemeler", "audit_logs", "api_usage_logs")
+PARTITION_TIMEZONE = DAILY_PRODUCT_SALES_TIMEZONE
+
+# Aynı anda birden fazla worker'ın DDL çalıştırmaması için (pg_try_advisory_xact_lock)
+_MAINTENANCE_LOCK_KEY = 0x6E65736F_70617274  # "nesopart"
+
+
+def _oid_sql(param: str) -> str:
+    """Geçerli şemadaki :param adlı ilişkinin oid'i (yoksa NULL)"""
+    return (
+        "(SELECT c.oid FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        f"WHERE n.nspname = current_schema() AND c.relname = :{param})"
+    )
+
+
+async def _relation_exists(name: str) -> bool:
+    from ..db.database import db
+
+    row = await db.fetch_one(f"SELECT {_oid_sql('name')} AS oid", {"name": name})
+    return bool(row and row["oid"])
+
+
+def _check_table(table: str) -> str:
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"Bölümlenebilir tablo değil: {table}")
+    return table
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def _bound(month: date) -> str:
+    # Sınır literal'i: işletme saat dilimindeki ay başı (DDL'de bind parametresi kullanılamaz)
+    return f"'{month.isoformat()} 00:00:00 {PARTITION_TIMEZONE}'"
+
+
+def _parse_partition_month(table: str, name: str) -> Optional[date]:
+    match = re.fullmatch(rf"{re.escape(table)}_p(\d{{4}})(\d{{2}})", name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def _local_date(value: Optional[datetime] = None) -> date:
+    """Verilen anın (None ise şimdinin) işletme saat dilimindeki günü"""
+    from zoneinfo import ZoneInfo
+
+    tz = ZoneInfo(PARTITION_TIMEZONE)
+    return (value.astimezone(tz) if value is not None else datetime.now(tz)).date()
+
+
+def _today() -> date:
+    return _local_date()
+
+
+def current_month() -> date:
+    """İşletme saat dilimine göre içinde bulunulan ayın ilk günü"""
+    return month_start(_today())
+
+
+async def is_partitioned(table: str) -> bool:
+    from ..db.database import db
+
+    row = await db.fetch_one(
+        f"SELECT c.relkind FROM pg_class c WHERE c.oid = {_oid_sql('table')}",
+        {"table": _check_table(table)},
+    )
+    return bool(row) and row["relkind"] == "p"
+
+
+async def list_partitions(table: str) -> List[Dict[str, Any]]:
+    """Tablonun bölümleri: ad, sınır ifadesi, tahmini satır sayısı"""
+    from ..db.database import db
+
+    rows = await db.fetch_all(
+        f"""
+        SELECT c.relname AS name,
+               pg_get_expr(c.relpartbound, c.oid) AS bound,
+               CAST(c.reltuples AS BIGINT) AS approx_rows
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = {_oid_sql('table')}
+        ORDER BY c.relname
+        """,
+        {"table": _check_table(table)},
+    )
+    return [dict(r) for r in rows]
+
+
+async def _create_month_partition(table: str, month: date) -> bool:
+    """Ay bölümü yoksa açar; açıldıysa True."""
+    from ..db.database import db
+
+    name = partition_name(table, month)
+    if await _relation_exists(name):
+        return False
+    await db.execute(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ({_bound(month)}) TO ({_bound(add_months(month, 1))})"
+    )
+    return True
+
+
+async def ensure_future_partitions(table: str, months_ahead: Optional[int] = None) -> List[str]:
+    """Şimdiki ay ve sonraki months_ahead ayın bölümlerini açar; açılanların adlarını döner."""
+    months_ahead = settings.PARTITION_PREMAKE_MONTHS if months_ahead is None else months_ahead
+    current = current_month()
+    created = []
+    for offset in range(0, max(0, months_ahead) + 1):
+        month = add_months(current, offset)
+        if await _create_month_partition(table, month):
+            created.append(partition_name(table, month))
+    return created
+
+
+async def archive_old_partitions(table: str, retention_months: int) -> List[str]:
+    """
+    Saklama süresi dolan ay bölümlerini ayırır (PARTITION_ARCHIVE_MODE'a göre
+    arşiv şemasına taşır veya siler). Şimdiki ay + önceki retention_months ay tutulur.
+    """
+    from ..db.database import db
+
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(current_month(), -retention_months)
+    mode = settings.PARTITION_ARCHIVE_MODE
+    schema = settings.PARTITION_ARCHIVE_SCHEMA
+    if mode not in ("detach", "drop"):
+        raise ValueError(f"Geçersiz PARTITION_ARCHIVE_MODE: {mode}")
+    if mode == "detach" and not re.fullmatch(r"[a-z_][a-z0-9_]*", schema):
+        raise ValueError(f"Geçersiz PARTITION_ARCHIVE_SCHEMA: {schema}")
+
+    archived = []
+    for part in await list_partitions(table):
+        month = _parse_partition_month(table, part["name"])
+        if month is None or add_months(month, 1) > cutoff:
+            continue
+        name = part["name"]
+        await db.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        if mode == "drop":
+            await db.execute(f"DROP TABLE {name}")
+        else:
+            await db.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+            await db.execute(f"ALTER TABLE {name} SET SCHEMA {schema}")
+        archived.append(name)
+    return archived
+
+
+async def maintain_partitions() -> Dict[str, Dict[str, Any]]:
+    """
+    Zamanlanmış bakım: bölümlenmiş her tablo için ileri bölümleri açar ve
+    saklama süresi dolanları arşivler. Aynı anda tek worker çalışır.
+
+    Returns:
+        {tablo: {"created": [...], "archived": [...], "default_rows": n}} (sadece bölümlenmiş tablolar)
+    """
+    from ..db.database import db
+
+    report: Dict[str, Dict[str, Any]] = {}
+    async with db.transaction():
+        locked = await db.fetch_one(
+            "SELECT pg_try_advisory_xact_lock(:key) AS ok", {"key": _MAINTENANCE_LOCK_KEY}
+        )
+        if not locked or not locked["ok"]:
+            logger.info("[PARTITION] Bakım başka bir worker'da sürüyor, atlandı")
+            return report
+        for table in PARTITIONED_TABLES:
+            if not await is_partitioned(table):
+                continue
+            created = await ensure_future_partitions(table)
+            archived = await archive_old_partitions(
+                table, int(settings.PARTITION_RETENTION_MONTHS.get(table, 0))
+            )
+            default_rows = await _default_partition_rows(table)
+            report[table] = {"created": created, "archived": archived, "default_rows": default_rows}
+            if default_rows:
+                # Default bölümde satır varsa o aralığa yeni bölüm açılamaz
+                logger.warning(
+                    f"[PARTITION] {table}_default bölümünde {default_rows} satır var; "
+                    f"aralık dışı created_at değerlerini kontrol edin"
+                )
+    for table, item in report.items():
+        if item["created"] or item["archived"]:
+            logger.info(f"[PARTITION] {table}: açılan={item['created']}, arşivlenen={item['archived']}")
+    return report
+
+
+async def _default_partition_rows(table: str) -> int:
+    from ..db.database import db
+
+    name = f"{table}_default"
+    if not await _relation_exists(name):
+        return 0
+    row = await db.fetch_one(f"SELECT COUNT(*) AS n FROM (SELECT 1 FROM {name} LIMIT 10000) d")
+    return int(row["n"]) if row else 0
+
+
+async def _legacy_definitions(table: str) -> Tuple[List[str], List[str], List[Tuple[str, str]]]:
+    """Eski tablonun (PK hariç) index, trigger ve FK tanımları"""
+    from ..db.database import db
+
+    index_rows = await db.fetch_all(
+        f"""
+        SELECT ic.relname AS name, pg_get_indexdef(ic.oid) AS def, x.indisunique AS is_unique
+        FROM pg_index x JOIN pg_class ic ON ic.oid = x.indexrelid
+        WHERE x.indrelid = {_oid_sql('table')} AND NOT x.indisprimary
+        """,
+        {"table": table},
+    )
+    indexes = []
+    for r in index_rows:
+        if r["is_unique"]:
+            # Bölümlenmiş tabloda unique index bölümleme anahtarını içermek zorunda
+            logger.warning(f"[PARTITION] {table}: unique index {r['name']} taşınmadı: {r['def']}")
+            continue
+        indexes.append(r["def"])
+
+    trigger_rows = await db.fetch_all(
+        "SELECT pg_get_triggerdef(t.oid) AS def FROM pg_trigger t "
+        f"WHERE t.tgrelid = {_oid_sql('table')} AND NOT t.tgisinternal",
+        {"table": table},
+    )
+    fk_rows = await db.fetch_all(
+        "SELECT conname, pg_get_constraintdef(oid) AS def FROM pg_constraint "
+        f"WHERE conrelid = {_oid_sql('table')} AND contype = 'f'",
+        {"table": table},
+    )
+    return indexes, [r["def"] for r in trigger_rows], [(r["conname"], r["def"]) for r in fk_rows]
+
+
+_POLICY_COMMANDS = {"r": "SELECT", "a": "INSERT", "w": "UPDATE", "d": "DELETE", "*": "ALL"}
+
+
+async def _rls_definitions(table: str) -> Tuple[Dict[str, bool], List[Dict[str, Any]]]:
+    """Tablonun RLS bayrakları (relrowsecurity / relforcerowsecurity) ve politikaları"""
+    from ..db.database import db
+
+    flags = await db.fetch_one(
+        "SELECT c.relrowsecurity AS enabled, c.relforcerowsecurity AS forced "
+        f"FROM pg_class c WHERE c.oid = {_oid_sql('table')}",
+        {"table": table},
+    )
+    policy_rows = await db.fetch_all(
+        f"""
+        SELECT p.polname AS name,
+               CAST(p.polcmd AS TEXT) AS cmd,
+               p.polpermissive AS permissive,
+               pg_get_expr(p.polqual, p.polrelid) AS qual,
+               pg_get_expr(p.polwithcheck, p.polrelid) AS with_check,
+               COALESCE((
+                   SELECT string_agg(
+                       CASE WHEN r.oid = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(r.oid)) END,
+                       ', ' ORDER BY r.oid
+                   )
+                   FROM unnest(p.polroles) AS r(oid)
+               ), 'PUBLIC') AS roles
+        FROM pg_policy p
+        WHERE p.polrelid = {_oid_sql('table')}
+        ORDER BY p.polname
+        """,
+        {"table": table},
+    )
+    return (
+        {"enabled": bool(flags and flags["enabled"]), "forced": bool(flags and flags["forced"])},
+        [dict(r) for r in policy_rows],
+    )
+
+
+def _policy_sql(table: str, policy: Dict[str, Any]) -> str:
+    sql = (
+        f'CREATE POLICY "{policy["name"]}" ON {table} '
+        f'AS {"PERMISSIVE" if policy["permissive"] else "RESTRICTIVE"} '
+        f'FOR {_POLICY_COMMANDS[policy["cmd"]]} TO {policy["roles"]}'
+    )
+    if policy["qual"] is not None:
+        sql += f" USING ({policy['qual']})"
+    if policy["with_check"] is not None:
+        sql += f" WITH CHECK ({policy['with_check']})"
+    return sql
+
+
+async def convert_to_partitioned(table: str, drop_legacy: bool = False) -> Dict[str, Any]:
+    """
+    Düz tabloyu aylık bölümlenmiş tabloya çevirir (tek transaction; yazımlar
+    süre boyunca bekler). Eski veri <tablo>_legacy'de kalır (drop_legacy=False).
+    """
+    from ..db.database import db
+
+    _check_table(table)
+    legacy = f"{table}_legacy"
+    async with db.transaction():
+        await db.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        if await is_partitioned(table):
+            return {"table": table, "status": "already_partitioned"}
+        if await _relation_exists(legacy):
+            raise RuntimeError(f"{legacy} zaten var; önceki geçişi temizleyin")
+
+        indexes, triggers, fks = await _legacy_definitions(table)
+        # RLS (ör. siparisler/odemeler tenant izolasyonu) LIKE ile kopyalanmaz; ayrıca kurulur
+        rls_flags, policies = await _rls_definitions(table)
+        span = await db.fetch_one(f"SELECT MIN(created_at) AS lo, COUNT(*) AS n FROM {table}")
+        columns = [
+            r["column_name"]
+            for r in await db.fetch_all(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = :table ORDER BY ordinal_position",
+                {"table": table},
+            )
+        ]
+
+        await db.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        for r in await db.fetch_all(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :t",
+            {"t": legacy},
+        ):
+            await db.execute(f'ALTER INDEX "{r["indexname"]}" RENAME TO "{r["indexname"][:55]}_legacy"')
+
+        await db.execute(
+            f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+            f"INCLUDING STORAGE INCLUDING COMMENTS) PARTITION BY RANGE (created_at)"
+        )
+        await db.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)")
+        seq = await db.fetch_one("SELECT pg_get_serial_sequence(:t, 'id') AS seq", {"t": legacy})
+        if seq and seq["seq"]:
+            await db.execute(f"ALTER SEQUENCE {seq['seq']} OWNED BY {table}.id")
+        for conname, definition in fks:
+            await db.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{conname}" {definition}')
+
+        first = month_start(_local_date(span["lo"])) if span and span["lo"] else current_month()
+        last = add_months(current_month(), max(0, settings.PARTITION_PREMAKE_MONTHS))
+        month = first
+        while month <= last:
+            await _create_month_partition(table, month)
+            month = add_months(month, 1)
+        await db.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+        # created_at NULL olan eski satırlar PK'ya giremez; kopyalanırken NOW() verilir
+        select_cols = ", ".join(
+            "COALESCE(created_at, NOW())" if c == "created_at" else f'"{c}"' for c in columns
+        )
+        col_list = ", ".join(f'"{c}"' for c in columns)
+        # FORCE RLS açıksa sahip de politikalara tabi olur; kopya süresince kapatılır
+        if rls_flags["forced"]:
+            await db.execute(f"ALTER TABLE {legacy} NO FORCE ROW LEVEL SECURITY")
+        await db.execute(f"INSERT INTO {table} ({col_list}) SELECT {select_cols} FROM {legacy}")
+        copied = await db.fetch_one(f"SELECT COUNT(*) AS n FROM {table}")
+        if rls_flags["forced"]:
+            await db.execute(f"ALTER TABLE {legacy} FORCE ROW LEVEL SECURITY")
+        if int(copied["n"]) != int(span["n"]):
+            raise RuntimeError(f"{table}: kopyalanan {copied['n']} satır, kaynak {span['n']} satır")
+
+        # RLS bayrakları ve politikalar (kopyadan sonra; FORCE kopyayı filtrelemesin)
+        for policy in policies:
+            await db.execute(_policy_sql(table, policy))
+        if rls_flags["enabled"]:
+            await db.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY")
+        if rls_flags["forced"]:
+            await db.execute(f"ALTER TABLE {table} FORCE ROW LEVEL SECURITY")
+        new_flags, new_policies = await _rls_definitions(table)
+        if new_flags != rls_flags or new_policies != policies:
+            raise RuntimeError(
+                f"{table}: RLS politikaları taşınamadı (kaynak {len(policies)} politika {rls_flags}, "
+                f"yeni {len(new_policies)} politika {new_flags})"
+            )
+
+        # Index'ler ebeveynde açılınca tüm bölümlere uygulanır; tanımlar eski adlarla gelir
+        for definition in indexes:
+            await db.execute(definition)
+        for definition in triggers:
+            await db.execute(
+                re.sub(rf" ON (\S+\.)?{re.escape(table)} ", f" ON {table} ", definition, count=1)
+            )
+        if drop_legacy:
+            await db.execute(f"DROP TABLE {legacy}")
+
+    logger.info(f"[PARTITION] {table} bölümlendi: {span['n']} satır, ilk ay {first}, legacy silindi={drop_legacy}")
+    return {
+        "table": table,
+        "status": "converted",
+        "rows": int(span["n"]),
+        "first_month": first.isoformat(),
+        "indexes": len(indexes),
+        "triggers": len(triggers),
+        "policies": len(policies),
+        "legacy_dropped": drop_legacy,
+    }
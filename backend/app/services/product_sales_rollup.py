@@ -0,0 +1,150 @@
+# backend/app/services/product_sales_rollup.py
+"""
+Günlük Ürün Satış Özeti (daily_product_sales)
+Analitik uçları (en çok tercih edilenler, BI top ürünler, öneri motoru, ürün
+karlılığı) ödenmiş siparişlerin sepet JSONB'sini satır satır açmak yerine bu
+özetten okur: (sube_id, gun, urun_key) başına adet, ciro ve kalem sayısı.
+
+Özet, siparisler üzerindeki trigger ile artımlı tutulur (bkz. schema.
+DAILY_PRODUCT_SALES_STATEMENTS); burada okuma yardımcıları ve geçmiş veri için
+yeniden oluşturma (backfill) bulunur. Çözünürlük gündür: tarih aralıkları gün
+sınırına yuvarlanır.
+"""
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Union
+
+from ..db.database import db
+
+logger = logging.getLogger(__name__)
+
+DayLike = Union[date, datetime, None]
+
+
+def _to_day(value: DayLike) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _day_filters(gun_expr: str, start: DayLike, end: DayLike, params: Dict[str, Any]) -> List[str]:
+    """[start, end) gün aralığı için WHERE parçaları; parametreleri params'a ekler."""
+    filters: List[str] = []
+    start_day, end_day = _to_day(start), _to_day(end)
+    if start_day is not None:
+        filters.append(f"{gun_expr} >= :start_day")
+        params["start_day"] = start_day
+    if end_day is not None:
+        filters.append(f"{gun_expr} < :end_day")
+        params["end_day"] = end_day
+    return filters
+
+
+async def product_sales_summary(
+    sube_id: int,
+    start: DayLike = None,
+    end: DayLike = None,
+    order_by: str = "adet",
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Ürün bazında satış toplamları.
+
+    Args:
+        sube_id: Şube ID
+        start: Başlangıç günü (dahil, None = tüm geçmiş)
+        end: Bitiş günü (hariç, None = bugün dahil)
+        order_by: "adet" | "ciro"
+        limit: En fazla ürün sayısı
+
+    Returns:
+        [{"urun_key", "urun_adi", "kategori", "adet", "ciro", "kalem_sayisi"}, ...]
+    """
+    order_col = "ciro" if order_by == "ciro" else "adet"
+    params: Dict[str, Any] = {"sid": sube_id}
+    filters = ["sube_id = :sid"] + _day_filters("gun", start, end, params)
+    limit_sql = ""
+    if limit:
+        limit_sql = "LIMIT :limit"
+        params["limit"] = limit
+
+    rows = await db.fetch_all(
+        f"""
+        SELECT
+            urun_key,
+            (array_agg(urun_adi ORDER BY gun DESC))[1] AS urun_adi,
+            (array_agg(kategori ORDER BY gun DESC) FILTER (WHERE kategori IS NOT NULL))[1] AS kategori,
+            SUM(adet)::int AS adet,
+            SUM(ciro)::float AS ciro,
+            SUM(kalem_sayisi)::int AS kalem_sayisi
+        FROM daily_product_sales
+        WHERE {" AND ".join(filters)}
+        GROUP BY urun_key
+        HAVING SUM(kalem_sayisi) > 0
+        ORDER BY {order_col} DESC, urun_key ASC
+        {limit_sql}
+        """,
+        params,
+    )
+    return [dict(r) for r in rows]
+
+
+async def rebuild_daily_product_sales(
+    sube_id: int,
+    start: DayLike = None,
+    end: DayLike = None,
+) -> int:
+    """
+    Bir şubenin özetini siparisler tablosundan yeniden oluşturur (backfill / onarım).
+
+    Aralıktaki özet satırları silinip ödenmiş siparişlerden tek sorguda yeniden
+    yazılır. İşlem boyunca tablo SHARE ROW EXCLUSIVE kilitlenir: eşzamanlı ödeme
+    trigger'ları yeniden oluşturma bitene kadar bekler, böylece hiçbir sipariş iki
+    kez sayılmaz veya atlanmaz.
+
+    Returns:
+        Yazılan özet satırı sayısı
+    """
+    from ..db.schema import DAILY_PRODUCT_SALES_TIMEZONE
+
+    gun_expr = f"(s.created_at AT TIME ZONE '{DAILY_PRODUCT_SALES_TIMEZONE}')::date"
+    params: Dict[str, Any] = {"sid": sube_id}
+    where_rollup = " AND ".join(["sube_id = :sid"] + _day_filters("gun", start, end, params))
+    where_orders = " AND ".join(["s.sube_id = :sid"] + _day_filters(gun_expr, start, end, {}))
+
+    async with db.transaction():
+        await db.execute("LOCK TABLE daily_product_sales IN SHARE ROW EXCLUSIVE MODE")
+        await db.execute(f"DELETE FROM daily_product_sales WHERE {where_rollup}", params)
+        row = await db.fetch_one(
+            f"""
+            WITH yazilan AS (
+                INSERT INTO daily_product_sales
+                    (sube_id, gun, urun_key, urun_adi, kategori, adet, ciro, kalem_sayisi, updated_at)
+                SELECT
+                    s.sube_id,
+                    {gun_expr} AS gun,
+                    k.urun_key,
+                    (array_agg(k.urun_adi ORDER BY s.created_at DESC))[1],
+                    (SELECT m.kategori FROM menu m
+                      WHERE m.sube_id = s.sube_id AND neso_urun_key(m.ad) = k.urun_key
+                      ORDER BY m.aktif DESC, m.id DESC LIMIT 1),
+                    SUM(k.adet),
+                    SUM(k.ciro),
+                    COUNT(*),
+                    NOW()
+                FROM siparisler s
+                CROSS JOIN LATERAL siparis_sepet_kalemleri(s.sepet, s.tutar) k
+                WHERE {where_orders}
+                  AND s.durum = 'odendi'
+                GROUP BY s.sube_id, {gun_expr}, k.urun_key
+                RETURNING 1
+            )
+            SELECT COUNT(*)::int AS n FROM yazilan
+            """,
+            params,
+        )
+    written = int(row["n"] or 0) if row else 0
+    logger.info(f"[PRODUCT_SALES] Özet yeniden oluşturuldu: sube_id={sube_id}, satir={written}")
+    return written
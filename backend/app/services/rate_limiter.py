@@ -1,14 +1,25 @@
 # backend/app/services/rate_limiter.py
 """
-API Key Rate Limiting Service
-Redis veya in-memory fallback ile rate limiting
+Rate Limiting Service
+GCRA (Generic Cell Rate Algorithm) ile O(1) durumlu rate limiting.
+
+Her anahtar için tek bir değer tutulur: TAT (theoretical arrival time). Limit
+"period_seconds içinde limit istek" olarak verilir; burst kadar istek art arda
+geçebilir, sonrası period/limit aralığıyla açılır (token bucket ile eşdeğer).
+
+- Redis aktifse durum Redis'te tutulur (tek Lua script, worker'lar arası ortak;
+  saat olarak Redis TIME kullanılır)
+- Redis yoksa/hata verirse process içi, boyutu sınırlı LRU'ya düşer
+  (RATE_LIMIT_MEMORY_MAX_KEYS; en uzun süredir görülmeyen anahtar atılır)
 """
+import math
 import time
 import logging
 from dataclasses import dataclass
-from typing import Dict, Optional
-from collections import defaultdict, deque
+from typing import Any, Dict, Optional
 
+from ..core.config import settings
+from ..core.lru import LRUCache
 from .cache import cache_service
 
 logger = logging.getLogger(__name__)
@@ -16,138 +27,144 @@ logger = logging.getLogger(__name__)
 
 @dataclass
 class RateLimitResult:
-    """Rate limit kontrolÃ¼nÃ¼n detaylÄ± sonucunu temsil eder."""
+    """Rate limit kontrolünün detaylı sonucunu temsil eder."""
 
     allowed: bool
     remaining: int
     retry_after: Optional[int] = None
     reset_after: Optional[int] = None
+    limit: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """
+    Bir limit kuralı: period_seconds içinde en fazla limit istek.
+    burst verilmezse limit kadar istek art arda geçebilir.
+    """
+
+    name: str
+    limit: int
+    period_seconds: float = 60.0
+    burst: Optional[int] = None
+
+    @property
+    def emission_interval(self) -> float:
+        return self.period_seconds / self.limit
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self.burst if self.burst is not None else self.limit)
+
+
+# KEYS[1] = durum anahtarı, ARGV[1] = emission interval (sn), ARGV[2] = burst
+# Dönüş: {izin (0/1), izin için kalan/bekleme süresi (sn), tam dolmaya kalan süre (sn)}
+# Lua number'ları tamsayıya kırpılacağı için süreler string döner.
+_GCRA_LUA = """
+local key = KEYS[1]
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', key) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - burst * interval
+if now < allow_at then
+  return {0, tostring(allow_at - now), tostring(tat - now)}
+end
+redis.call('SET', key, tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, tostring(now - allow_at), tostring(new_tat - now)}
+"""
+
+
+def _gcra(tat: Optional[float], now: float, interval: float, burst: int):
+    """In-memory GCRA adımı (Lua script ile aynı hesap). Dönüş: (izin, süre, reset, yeni_tat)"""
+    tat = now if tat is None or tat < now else tat
+    new_tat = tat + interval
+    allow_at = new_tat - burst * interval
+    if now < allow_at:
+        return False, allow_at - now, tat - now, None
+    return True, now - allow_at, new_tat - now, new_tat
 
 
 class RateLimiter:
-    """API Key bazlÄ± rate limiting servisi."""
+    """Policy bazlı (IP, tenant, API key, route) rate limiting servisi."""
 
     def __init__(self):
-        # In-memory fallback (Redis yoksa)
-        self._in_memory_hits: Dict[int, deque] = defaultdict(deque)
-        self._window_seconds = 60
-
-    async def check_rate_limit(
-        self,
-        api_key_id: int,
-        rate_limit_per_minute: int,
-    ) -> RateLimitResult:
+        # In-memory fallback (Redis yoksa): anahtar → TAT, boyutu sınırlı
+        self._memory = LRUCache(maxsize=settings.RATE_LIMIT_MEMORY_MAX_KEYS)
+        self._script = None
+        self._script_client = None
+
+    def _redis_script(self, redis_client):
+        # register_script EVALSHA kullanır, script cache'te yoksa EVAL'e düşer
+        if self._script is None or self._script_client is not redis_client:
+            self._script = redis_client.register_script(_GCRA_LUA)
+            self._script_client = redis_client
+        return self._script
+
+    async def hit(self, policy: RateLimitPolicy, identity: Any) -> RateLimitResult:
         """
-        Rate limit kontrolÃ¼ yapar ve kalan hak / reset bilgilerini dÃ¶ner.
+        identity (IP, tenant id, API key id...) için policy'den bir istek hakkı tüketir.
         """
-        if rate_limit_per_minute <= 0:
-            # Rate limit devre dÄ±ÅŸÄ±
-            return RateLimitResult(True, remaining=rate_limit_per_minute)
+        if policy.limit <= 0:
+            # Rate limit devre dışı
+            return RateLimitResult(True, remaining=policy.limit)
 
-        now = time.time()
-        cache_key = f"rate_limit:api_key:{api_key_id}"
+        key = f"rate_limit:{policy.name}:{identity}"
 
-        # Redis kullanÄ±labilirse Redis ile yap
-        if cache_service.is_enabled():
+        # Redis kullanılabilirse Redis ile yap
+        redis_client = cache_service.get_redis_client()
+        if redis_client is not None:
             try:
-                return await self._check_redis_rate_limit(
-                    cache_key,
-                    rate_limit_per_minute,
-                    now,
+                allowed, wait, reset = await self._redis_script(redis_client)(
+                    keys=[key],
+                    args=[repr(policy.emission_interval), policy.capacity],
                 )
+                return self._result(policy, bool(int(allowed)), float(wait), float(reset))
             except Exception as e:
                 logger.warning("Redis rate limit check failed: %s, falling back to in-memory", e)
 
         # In-memory fallback
-        return self._check_in_memory_rate_limit(
-            api_key_id,
-            rate_limit_per_minute,
-            now,
+        now = time.monotonic()
+        allowed, wait, reset, new_tat = _gcra(
+            self._memory.get(key), now, policy.emission_interval, policy.capacity
         )
+        if allowed:
+            self._memory.set(key, new_tat, ttl=reset)
+        return self._result(policy, allowed, wait, reset)
+
+    def _result(self, policy: RateLimitPolicy, allowed: bool, wait: float, reset: float) -> RateLimitResult:
+        reset_after = max(1, math.ceil(reset))
+        if not allowed:
+            retry_after = max(1, math.ceil(wait))
+            return RateLimitResult(
+                False, remaining=0, retry_after=retry_after, reset_after=reset_after, limit=policy.limit
+            )
+        remaining = min(policy.capacity - 1, int(wait / policy.emission_interval))
+        return RateLimitResult(True, remaining=max(remaining, 0), reset_after=reset_after, limit=policy.limit)
 
-    async def _check_redis_rate_limit(
-        self,
-        cache_key: str,
-        rate_limit_per_minute: int,
-        now: float,
-    ) -> RateLimitResult:
-        """Redis ile rate limit kontrolÃ¼ (sliding window)."""
-        try:
-            redis_client = cache_service.get_redis_client()
-
-            if not redis_client:
-                raise RuntimeError("Redis client not available")
-
-            # Sliding window: son 60 saniyedeki istekleri say
-            window_start = now - self._window_seconds
-
-            # Eski kayÄ±tlarÄ± temizle
-            await redis_client.zremrangebyscore(cache_key, 0, window_start)
-
-            # Mevcut istek sayÄ±sÄ±
-            current_count = await redis_client.zcard(cache_key)
-
-            if current_count >= rate_limit_per_minute:
-                # Rate limit aÅŸÄ±ldÄ±
-                oldest = await redis_client.zrange(cache_key, 0, 0, withscores=True)
-                oldest_timestamp = oldest[0][1] if oldest else None
-                retry_after = self._seconds_until_reset(now, oldest_timestamp)
-                return RateLimitResult(False, remaining=0, retry_after=retry_after, reset_after=retry_after)
-
-            # Yeni isteÄŸi ekle
-            await redis_client.zadd(cache_key, {str(now): now})
-            # TTL ayarla (window_seconds + 10 saniye buffer)
-            await redis_client.expire(cache_key, self._window_seconds + 10)
-
-            remaining = max(rate_limit_per_minute - (current_count + 1), 0)
-            oldest = await redis_client.zrange(cache_key, 0, 0, withscores=True)
-            oldest_timestamp = oldest[0][1] if oldest else None
-            reset_after = self._seconds_until_reset(now, oldest_timestamp)
-
-            return RateLimitResult(True, remaining=remaining, reset_after=reset_after)
-
-        except Exception as e:
-            logger.error("Redis rate limit error: %s", e, exc_info=True)
-            # Redis hatasÄ± durumunda in-memory'ye fallback yap
-            raise
-
-    def _check_in_memory_rate_limit(
+    async def check_rate_limit(
         self,
         api_key_id: int,
         rate_limit_per_minute: int,
-        now: float,
     ) -> RateLimitResult:
-        """In-memory rate limit kontrolÃ¼ (fallback)."""
-        q = self._in_memory_hits[api_key_id]
-
-        # Pencere dÄ±ÅŸÄ±ndakileri temizle
-        window_start = now - self._window_seconds
-        while q and q[0] < window_start:
-            q.popleft()
-
-        # Rate limit kontrolÃ¼
-        if len(q) >= rate_limit_per_minute:
-            oldest_timestamp = q[0] if q else None
-            retry_after = self._seconds_until_reset(now, oldest_timestamp)
-            return RateLimitResult(False, remaining=0, retry_after=retry_after, reset_after=retry_after)
-
-        # Yeni isteÄŸi ekle
-        q.append(now)
-        remaining = max(rate_limit_per_minute - len(q), 0)
-        reset_after = self._seconds_until_reset(now, q[0] if q else None)
-
-        return RateLimitResult(True, remaining=remaining, reset_after=reset_after)
+        """
+        API key bazlı rate limit kontrolü yapar ve kalan hak / reset bilgilerini döner.
+        """
+        policy = RateLimitPolicy("api_key", int(rate_limit_per_minute or 0))
+        return await self.hit(policy, api_key_id)
 
     def clear_in_memory_cache(self):
-        """In-memory cache'i temizle (test iÃ§in)."""
-        self._in_memory_hits.clear()
-
-    def _seconds_until_reset(self, now: float, oldest_timestamp: Optional[float]) -> int:
-        """Rate limit penceresinin tekrar aÃ§Ä±lmasÄ±na kaÃ§ saniye kaldÄ±ÄŸÄ±nÄ± hesapla."""
-        if oldest_timestamp is None:
-            return self._window_seconds
-        remaining = int((oldest_timestamp + self._window_seconds) - now)
-        return max(1, remaining)
+        """In-memory cache'i temizle (test için)."""
+        self._memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if cache_service.is_enabled() else "memory",
+            "memory": self._memory.stats(),
+        }
 
 
 # Global rate limiter instance
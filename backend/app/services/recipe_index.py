@@ -0,0 +1,150 @@
+# backend/app/services/recipe_index.py
+"""
+Reçete İndeksi
+Şube bazında normalize edilmiş ürün adı -> reçete satırları (stok, miktar, birim,
+stok birimi) haritasını ve reçetesiz ürünler için stok adı eşleme tablolarını tutar.
+
+Eskiden kasa stok düşürme akışı sepetteki her ürün için şubenin tüm reçetelerini
+yeniden çekip Python'da normalize ediyor, her malzeme için ayrı SELECT + UPDATE
+yapıyordu. İndeks cache'te (Redis varsa paylaşımlı, yoksa in-memory) tutulur ve
+reçete/stok kalemi yazımlarında invalidate_recipe_index ile geçersiz kılınır.
+Stok kalemleri id ile tutulur ve düşülür; ad yalnızca loglar içindir.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from ..core.cache import cache
+from ..core.config import settings
+from ..db.database import db
+from .assistant_knowledge import invalidate_assistant_knowledge
+
+logger = logging.getLogger(__name__)
+
+# Girdi biçimi değişince önek de değişir (eski cache kayıtları okunmasın)
+_KEY_PREFIX = "recete_index:v2"
+
+
+def _cache_key(sube_id: int) -> str:
+    return f"{_KEY_PREFIX}:{sube_id}"
+
+
+async def build_recipe_index(sube_id: int) -> Dict[str, Any]:
+    """
+    Şubenin reçete indeksini DB'den oluşturur (2 sorgu).
+
+    Reçeteler menü ürününe/stok kalemine menu_id/stok_id ile bağlıdır; ürün veya stok
+    yeniden adlandırılsa da güncel adlar kullanılır (bağlanmamış satırda reçetedeki ad).
+
+    Returns:
+        {
+            "receteler": {urun_key: [[stok_id, stok, miktar, recete_birim, stok_birim], ...]},
+            "stok_lower": {ad.lower(): stok_id},
+            "stok_norm": {normalize_name(ad): stok_id},
+        }
+        stok_id ve stok_birim, stok kalemi yoksa None'dır (bu satırlar stoktan düşülmez).
+    """
+    from ..routers.siparis import normalize_name
+
+    recete_rows = await db.fetch_all(
+        """
+        SELECT COALESCE(m.ad, r.urun) AS urun, COALESCE(sk.ad, r.stok) AS stok, r.miktar, r.birim,
+               sk.id AS stok_id, sk.birim AS stok_birim
+        FROM receteler r
+        LEFT JOIN menu m ON m.id = r.menu_id
+        LEFT JOIN stok_kalemleri sk ON sk.id = r.stok_id
+        WHERE r.sube_id = :sid
+        ORDER BY r.id
+        """,
+        {"sid": sube_id},
+    )
+    stok_rows = await db.fetch_all(
+        "SELECT id, ad FROM stok_kalemleri WHERE sube_id = :sid ORDER BY id",
+        {"sid": sube_id},
+    )
+
+    receteler: Dict[str, List[List[Any]]] = {}
+    for r in recete_rows:
+        urun_key = normalize_name(str(r["urun"]).strip())
+        if not urun_key:
+            continue
+        stok_birim: Optional[str] = None
+        if r["stok_id"] is not None:
+            stok_birim = str(r["stok_birim"] or "").strip()
+        receteler.setdefault(urun_key, []).append([
+            r["stok_id"],
+            str(r["stok"]).strip(),
+            float(r["miktar"] or 0),
+            str(r["birim"] or "").strip(),
+            stok_birim,
+        ])
+
+    stok_lower: Dict[str, int] = {}
+    stok_norm: Dict[str, int] = {}
+    for s in stok_rows:
+        ad = s["ad"]
+        if not ad:
+            continue
+        stok_lower.setdefault(str(ad).lower(), s["id"])
+        stok_norm.setdefault(normalize_name(str(ad).strip()), s["id"])
+
+    return {"receteler": receteler, "stok_lower": stok_lower, "stok_norm": stok_norm}
+
+
+async def get_recipe_index(sube_id: int) -> Dict[str, Any]:
+    """Şubenin reçete indeksini cache'ten döndürür, yoksa oluşturup cache'ler."""
+    key = _cache_key(sube_id)
+    index = await cache.get(key)
+    if index is not None:
+        return index
+    index = await build_recipe_index(sube_id)
+    await cache.set(key, index, ttl=settings.CACHE_TTL_LONG)
+    logger.debug(
+        f"[RECETE_INDEX] Oluşturuldu: sube_id={sube_id}, urun={len(index['receteler'])}, "
+        f"stok={len(index['stok_norm'])}"
+    )
+    return index
+
+
+async def invalidate_recipe_index(sube_id: int) -> None:
+    """Reçete veya stok kalemi değiştiğinde şubenin indeksini geçersiz kıl."""
+    try:
+        await cache.delete(_cache_key(sube_id))
+    except Exception as e:
+        logger.warning(f"[RECETE_INDEX] Invalidation hatası (sube_id={sube_id}): {e}")
+
+
+async def bulk_decrement_stock(sube_id: int, miktarlar: Dict[int, float]) -> int:
+    """
+    Stok kalemlerini tek UPDATE ... FROM (VALUES ...) ile düşer (mevcut 0'ın altına inmez).
+    Asistan bilgi snapshot'ı sadece stok var/yok durumunu kullanır; yalnızca bu düşümle
+    tükenen kalem varsa invalidate edilir (her ödemede tüm worker'lar yeniden kurmasın).
+
+    Args:
+        sube_id: Şube ID
+        miktarlar: {stok_id: dusulecek_miktar} (aynı stok için toplamlar önceden birleştirilmiş olmalı)
+
+    Returns: güncellenen stok kalemi sayısı
+    """
+    if not miktarlar:
+        return 0
+
+    params: Dict[str, Any] = {"sid": sube_id}
+    values_sql: List[str] = []
+    for i, (stok_id, miktar) in enumerate(miktarlar.items()):
+        params[f"id{i}"] = stok_id
+        params[f"m{i}"] = miktar
+        values_sql.append(f"(CAST(:id{i} AS BIGINT), CAST(:m{i} AS NUMERIC))")
+
+    rows = await db.fetch_all(
+        f"""
+        UPDATE stok_kalemleri s
+           SET mevcut = GREATEST(0, s.mevcut - v.m)
+          FROM (VALUES {", ".join(values_sql)}) AS v(stok_id, m), stok_kalemleri eski
+         WHERE s.id = v.stok_id AND s.sube_id = :sid AND eski.id = s.id
+     RETURNING s.id, (eski.mevcut > 0 AND s.mevcut <= 0) AS tukendi
+        """,
+        params,
+    )
+    if any(r["tukendi"] for r in rows):
+        await invalidate_assistant_knowledge(sube_id)
+    return len(rows)
@@ -63,7 +63,7 @@ class RecommendationEngine:
             category_filter = ""
             params: Dict[str, Any] = {
                 "sube_id": sube_id,
-                "start_date": datetime.now() - timedelta(days=days),
+                "start_date": (datetime.now() - timedelta(days=days)).date(),
                 "limit": limit
             }
 
@@ -71,30 +71,34 @@ class RecommendationEngine:
                 category_filter = "AND m.kategori = ANY(:categories)"
                 params["categories"] = categories
 
+            # Ödenmiş sipariş kalemleri günlük özetten (daily_product_sales); menüye
+            # normalize ürün adı ile eşlenir (idx_menu_sube_urun_key)
             query = f"""
                 WITH sales_data AS (
                     SELECT
-                        jsonb_array_elements(s.sepet::jsonb) AS item
-                    FROM siparisler s
-                    WHERE s.sube_id = :sube_id
-                      AND s.durum = 'odendi'
-                      AND s.created_at >= :start_date
+                        d.urun_key,
+                        SUM(d.kalem_sayisi) AS sales_count,
+                        SUM(d.adet) AS total_quantity,
+                        SUM(d.ciro) AS total_revenue
+                    FROM daily_product_sales d
+                    WHERE d.sube_id = :sube_id
+                      AND d.gun >= :start_date
+                    GROUP BY d.urun_key
+                    HAVING SUM(d.kalem_sayisi) > 0
                 )
                 SELECT
                     m.id AS menu_id,
                     m.ad AS product_name,
                     m.kategori AS category,
                     m.fiyat AS price,
-                    COUNT(*) AS sales_count,
-                    SUM((sd.item->>'adet')::float) AS total_quantity,
-                    SUM((sd.item->>'adet')::float * (sd.item->>'fiyat')::float) AS total_revenue
+                    sd.sales_count,
+                    sd.total_quantity,
+                    sd.total_revenue
                 FROM sales_data sd
-                JOIN menu m ON m.ad = (sd.item->>'urun')
-                WHERE m.sube_id = :sube_id
-                  AND m.aktif = TRUE
+                JOIN menu m ON m.sube_id = :sube_id AND neso_urun_key(m.ad) = sd.urun_key
+                WHERE m.aktif = TRUE
                   {category_filter}
-                GROUP BY m.id, m.ad, m.kategori, m.fiyat
-                ORDER BY sales_count DESC, total_revenue DESC
+                ORDER BY sd.sales_count DESC, sd.total_revenue DESC
                 LIMIT :limit
             """
 
@@ -0,0 +1,216 @@
+# backend/app/services/response_cache.py
+"""
+Asistan Yanıt Önbelleği
+Müşteri (/assistant/chat, /customer-assistant/chat) ve BI (/bi-assistant/query)
+asistanlarında tekrar eden sorular ("menüde neler var", "bugünkü ciro") için
+LLM yanıtını saklar; aynı soru tekrar geldiğinde LLM'e gidilmez.
+
+Anahtar: (kapsam, tenant, şube, normalize soru, bilgi versiyonu, dil). Bilgi
+versiyonu çağıranın verdiği içerik parmak izidir (müşteri: asistan bilgi
+snapshot'ının parmak izi, BI: analizde kullanılan işletme verisinin parmak izi);
+menü / stok / reçete / satış değişince parmak izi değişir ve eski yanıtlar bir
+daha eşleşmez, TTL sonunda düşer. Kayıtlar paylaşımlı cache'te (Redis varsa
+Redis, yoksa in-memory) tutulur, böylece worker'lar aynı yanıtları kullanır.
+
+Birebir eşleşme yoksa ve RESPONSE_CACHE_NEAR_DUPLICATE açıksa, aynı versiyondaki
+son soruların listesi intent_detector benzerlik skorlarıyla (fuzzy + trigram)
+taranır; iki eşik de geçilirse ve sorulardaki sayılar aynıysa yakın kopya kabul
+edilir.
+
+Her arama api_usage_tracker üzerinden api_type="response_cache" satırı olarak
+ölçülür: model "hit" / "near_hit" / "miss". Hit satırlarının token alanları,
+LLM'e gidilmediği için tasarruf edilen token'lardır (cost_usd her zaman 0;
+tasarruf edilen maliyet metadata'dadır).
+"""
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from ..core.cache import cache
+from ..core.config import settings
+from .intent_detector import detect_intent, normalize
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "resp_cache"
+_DIGITS = re.compile(r"\d+")
+
+
+def content_fingerprint(value: Any) -> str:
+    """Verinin kısa içerik parmak izi (JSON, anahtarlar sıralı)"""
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _question_hash(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def _scope_key(scope: str, tenant_id: Optional[int], sube_id: Optional[int], version: str, language: str) -> str:
+    return f"{_KEY_PREFIX}:{scope}:{tenant_id or 0}:{sube_id or 0}:{version}:{language or 'tr'}"
+
+
+def _similar(question: str, candidate: str) -> bool:
+    """intent_detector skorlarıyla yakın kopya kontrolü"""
+    if _DIGITS.findall(question) != _DIGITS.findall(candidate):
+        return False
+    result = detect_intent(question, triggers={candidate: [candidate]})
+    scores = result.get("method_scores") or {}
+    return (
+        scores.get("fuzzy", 0.0) >= settings.RESPONSE_CACHE_FUZZY_THRESHOLD
+        and scores.get("phonetic", 0.0) >= settings.RESPONSE_CACHE_PHONETIC_THRESHOLD
+    )
+
+
+class ResponseCache:
+    """Versiyonlu LLM yanıt önbelleği (paylaşımlı cache üzerinde)"""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.saved_tokens = 0
+        self.saved_cost_usd = 0.0
+
+    async def lookup(
+        self,
+        scope: str,
+        tenant_id: Optional[int],
+        sube_id: Optional[int],
+        question: str,
+        version: str,
+        language: str = "tr",
+        endpoint: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Sorunun önbellekteki yanıtını döndürür ({"reply", "usage", "model"}), yoksa None.
+        Sonuç (hit / near_hit / miss) tenant_id varsa kullanım ölçümüne yazılır.
+        """
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        normalized = normalize(question)
+        if not normalized:
+            return None
+
+        base = _scope_key(scope, tenant_id, sube_id, version, language)
+        kind = "hit"
+        entry = await cache.get(f"{base}:{_question_hash(normalized)}")
+        if entry is None and settings.RESPONSE_CACHE_NEAR_DUPLICATE:
+            recent: List[str] = await cache.get(f"{base}:index") or []
+            for candidate in recent:
+                if candidate != normalized and _similar(normalized, candidate):
+                    entry = await cache.get(f"{base}:{_question_hash(candidate)}")
+                    if entry is not None:
+                        kind = "near_hit"
+                        break
+
+        usage: Dict[str, Any] = (entry or {}).get("usage") or {}
+        if entry is None:
+            self.misses += 1
+            kind = "miss"
+        else:
+            if kind == "hit":
+                self.hits += 1
+            else:
+                self.near_hits += 1
+            self.saved_tokens += int(usage.get("total_tokens") or 0)
+            self.saved_cost_usd += float(usage.get("cost_usd") or 0.0)
+            logger.debug(f"[RESPONSE_CACHE] {kind}: scope={scope}, sube_id={sube_id}, q='{normalized[:40]}'")
+
+        if tenant_id:
+            await self._record(tenant_id, kind, endpoint or f"/{scope}", usage, entry)
+        return entry
+
+    async def store(
+        self,
+        scope: str,
+        tenant_id: Optional[int],
+        sube_id: Optional[int],
+        question: str,
+        version: str,
+        reply: str,
+        usage: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+        language: str = "tr",
+        ttl: Optional[int] = None,
+    ) -> None:
+        """LLM yanıtını saklar ve soruyu yakın kopya listesine ekler."""
+        if not settings.RESPONSE_CACHE_ENABLED or not reply or not reply.strip():
+            return
+        normalized = normalize(question)
+        if not normalized:
+            return
+
+        ttl = ttl or settings.RESPONSE_CACHE_TTL_SECONDS
+        base = _scope_key(scope, tenant_id, sube_id, version, language)
+        usage = usage or {}
+        entry = {
+            "reply": reply,
+            "model": model,
+            "usage": {
+                "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+                "completion_tokens": int(usage.get("completion_tokens") or 0),
+                "total_tokens": int(usage.get("total_tokens") or 0),
+                "cost_usd": float(usage.get("cost_usd") or 0.0),
+            },
+        }
+        try:
+            await cache.set(f"{base}:{_question_hash(normalized)}", entry, ttl=ttl)
+            if settings.RESPONSE_CACHE_NEAR_DUPLICATE:
+                recent: List[str] = await cache.get(f"{base}:index") or []
+                if normalized not in recent:
+                    recent.insert(0, normalized)
+                    del recent[settings.RESPONSE_CACHE_INDEX_SIZE:]
+                    await cache.set(f"{base}:index", recent, ttl=ttl)
+            self.stores += 1
+        except Exception as e:
+            logger.warning(f"[RESPONSE_CACHE] Yazma hatası ({scope}, sube_id={sube_id}): {e}")
+
+    async def _record(
+        self,
+        tenant_id: int,
+        kind: str,
+        endpoint: str,
+        usage: Dict[str, Any],
+        entry: Optional[Dict[str, Any]],
+    ) -> None:
+        from .api_usage_tracker import log_api_usage
+
+        try:
+            await log_api_usage(
+                isletme_id=tenant_id,
+                api_type="response_cache",
+                model=kind,
+                endpoint=endpoint,
+                prompt_tokens=int(usage.get("prompt_tokens") or 0),
+                completion_tokens=int(usage.get("completion_tokens") or 0),
+                total_tokens=int(usage.get("total_tokens") or 0),
+                cost_usd=0.0,
+                status="success",
+                metadata={
+                    "saved_cost_usd": float(usage.get("cost_usd") or 0.0),
+                    "source_model": (entry or {}).get("model"),
+                } if entry else None,
+            )
+        except Exception as e:
+            logger.warning(f"[RESPONSE_CACHE] Ölçüm yazılamadı: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "enabled": settings.RESPONSE_CACHE_ENABLED,
+            "backend": "redis" if cache.use_redis else "memory",
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "saved_tokens": self.saved_tokens,
+            "saved_cost_usd": round(self.saved_cost_usd, 6),
+        }
+
+
+response_cache = ResponseCache()
@@ -4,8 +4,11 @@ Zamanlayıcı Servisi
 APScheduler ile otomatik görevler (backup, cleanup, vb.)
 """
 import logging
+from datetime import datetime
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
 from ..core.config import settings
 from .backup import backup_service
@@ -26,26 +29,77 @@ class SchedulerService:
             logger.warning("Scheduler already started")
             return
 
-        if not settings.BACKUP_ENABLED:
-            logger.info("Backup scheduling disabled in settings")
-            return
+        if settings.ORPHAN_REPAIR_INTERVAL_MINUTES > 0:
+            self.scheduler.add_job(
+                self._orphan_repair,
+                IntervalTrigger(minutes=settings.ORPHAN_REPAIR_INTERVAL_MINUTES),
+                id="orphan_siparis_repair",
+                name="Adisyonsuz Sipariş Onarımı",
+                replace_existing=True,
+            )
+            logger.info(
+                f"Scheduled orphan order repair: every {settings.ORPHAN_REPAIR_INTERVAL_MINUTES} min"
+            )
 
-        # Otomatik yedekleme görevini ekle
-        try:
-            # Cron formatı: "minute hour day month day_of_week"
-            # Varsayılan: "0 2 * * *" = Her gün saat 02:00
+        if settings.ADISYON_RECONCILE_INTERVAL_MINUTES > 0:
+            # İlk çalıştırma hemen: yeni eklenen sayaç kolonlarını da doldurur
             self.scheduler.add_job(
-                self._auto_backup,
-                CronTrigger.from_crontab(settings.BACKUP_SCHEDULE_CRON),
-                id="auto_backup",
-                name="Otomatik Veritabanı Yedekleme",
+                self._adisyon_reconcile,
+                IntervalTrigger(minutes=settings.ADISYON_RECONCILE_INTERVAL_MINUTES),
+                id="adisyon_totals_reconcile",
+                name="Adisyon Toplam Mutabakatı",
+                next_run_time=datetime.now(),
                 replace_existing=True,
             )
             logger.info(
-                f"Scheduled auto backup: {settings.BACKUP_SCHEDULE_CRON}"
+                f"Scheduled adisyon totals reconciliation: every {settings.ADISYON_RECONCILE_INTERVAL_MINUTES} min"
+            )
+
+        if settings.TENANT_USAGE_RECOUNT_INTERVAL_MINUTES > 0:
+            self.scheduler.add_job(
+                self._tenant_usage_recount,
+                IntervalTrigger(minutes=settings.TENANT_USAGE_RECOUNT_INTERVAL_MINUTES),
+                id="tenant_usage_recount",
+                name="Tenant Kullanım Sayacı Düzeltme",
+                replace_existing=True,
+            )
+            logger.info(
+                f"Scheduled tenant usage recount: every {settings.TENANT_USAGE_RECOUNT_INTERVAL_MINUTES} min"
+            )
+
+        if settings.PARTITION_MAINTENANCE_INTERVAL_MINUTES > 0:
+            # İlk çalıştırma hemen: uygulama kapalıyken ay dönmüş olabilir
+            self.scheduler.add_job(
+                self._partition_maintenance,
+                IntervalTrigger(minutes=settings.PARTITION_MAINTENANCE_INTERVAL_MINUTES),
+                id="partition_maintenance",
+                name="Tablo Bölüm Bakımı",
+                next_run_time=datetime.now(),
+                replace_existing=True,
+            )
+            logger.info(
+                f"Scheduled partition maintenance: every {settings.PARTITION_MAINTENANCE_INTERVAL_MINUTES} min"
             )
-        except Exception as e:
-            logger.error(f"Failed to schedule backup job: {e}")
+
+        if not settings.BACKUP_ENABLED:
+            logger.info("Backup scheduling disabled in settings")
+        else:
+            # Otomatik yedekleme görevini ekle
+            try:
+                # Cron formatı: "minute hour day month day_of_week"
+                # Varsayılan: "0 2 * * *" = Her gün saat 02:00
+                self.scheduler.add_job(
+                    self._auto_backup,
+                    CronTrigger.from_crontab(settings.BACKUP_SCHEDULE_CRON),
+                    id="auto_backup",
+                    name="Otomatik Veritabanı Yedekleme",
+                    replace_existing=True,
+                )
+                logger.info(
+                    f"Scheduled auto backup: {settings.BACKUP_SCHEDULE_CRON}"
+                )
+            except Exception as e:
+                logger.error(f"Failed to schedule backup job: {e}")
 
         # Scheduler'ı başlat
         self.scheduler.start()
@@ -81,5 +135,46 @@ class SchedulerService:
             logger.error(f"Auto backup error: {e}", exc_info=True)
 
 
+    async def _orphan_repair(self):
+        """Adisyonu olmayan aktif siparişleri açık adisyonlara bağla (tüm şubeler)"""
+        from ..routers.adisyon import _attach_orphan_siparisler
+
+        try:
+            await _attach_orphan_siparisler()
+        except Exception as e:
+            logger.error(f"Orphan order repair error: {e}", exc_info=True)
+
+    async def _adisyon_reconcile(self):
+        """Artımlı adisyon toplamlarındaki sapmaları raporla ve düzelt (tüm şubeler)"""
+        from ..routers.adisyon import _reconcile_adisyon_totals
+
+        try:
+            rapor = await _reconcile_adisyon_totals()
+            if rapor:
+                logger.warning(f"Adisyon reconciliation fixed {len(rapor)} drifted adisyon(s)")
+        except Exception as e:
+            logger.error(f"Adisyon reconciliation error: {e}", exc_info=True)
+
+    async def _tenant_usage_recount(self):
+        """Abonelik limit sayaçlarını DB ile yeniden say (cache'teki tenant'lar)"""
+        from .tenant_usage import recount_tenant_usage
+
+        try:
+            drift = await recount_tenant_usage()
+            if drift:
+                logger.warning(f"Tenant usage recount corrected {len(drift)} tenant(s)")
+        except Exception as e:
+            logger.error(f"Tenant usage recount error: {e}", exc_info=True)
+
+    async def _partition_maintenance(self):
+        """Bölümlenmiş tablolarda ileri ay bölümlerini aç, süresi dolanları arşivle"""
+        from .partitioning import maintain_partitions
+
+        try:
+            await maintain_partitions()
+        except Exception as e:
+            logger.error(f"Partition maintenance error: {e}", exc_info=True)
+
+
 # Global scheduler instance
 scheduler_service = SchedulerService()
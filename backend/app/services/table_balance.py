@@ -0,0 +1,177 @@
+# backend/app/services/table_balance.py
+"""
+Masa Bakiye Motoru
+Kasa ekranındaki masa özetini (aktif/hazir/odendi/tüm sipariş toplamları,
+ödemeler, seans başlangıcı) tek bir aggregate sorgu ile hesaplar.
+
+Eskiden _hesap_ozet_core her masa için 7'ye kadar ardışık fetch_one yapıyordu;
+TenantAwareDatabase her birini ayrı transaction + SET LOCAL ile sardığı için
+bu 14+ round-trip demekti. Burada tüm toplamlar FILTER clause'ları ile tek
+sorguda alınır, bakiye hesaplama kuralları ise compute_bakiye içinde aynen korunur.
+"""
+from typing import Any, Dict, Mapping, Optional
+
+from databases import Database
+
+from ..db.database import db
+
+# Seans tespiti:
+# - Masada açık adisyon varsa: siparişler adisyon_id ile, seans başlangıcı acilis_zamani
+# - Yoksa: siparişler masa adı ile, seans başlangıcı aktif siparişlerin MIN(created_at)'i
+#   (odendi/tümü toplamları ve ödemeler bu başlangıçtan sonrası ile sınırlanır)
+TABLE_BALANCE_SQL = """
+WITH ad AS (
+    SELECT id, acilis_zamani
+    FROM adisyons
+    WHERE sube_id = :sid
+      AND masa = :masa
+      AND durum = 'acik'
+    ORDER BY acilis_zamani DESC
+    LIMIT 1
+), sess AS (
+    SELECT ad.id AS adisyon_id, ad.acilis_zamani AS session_start
+    FROM ad
+    UNION ALL
+    SELECT NULL::bigint,
+           (
+               SELECT MIN(created_at)
+               FROM siparisler
+               WHERE masa = :masa AND sube_id = :sid AND durum IN ('yeni', 'hazirlaniyor', 'hazir')
+           )
+    WHERE NOT EXISTS (SELECT 1 FROM ad)
+), sip AS (
+    SELECT s.tutar, s.durum, s.created_at
+    FROM siparisler s
+    JOIN sess ON sess.adisyon_id IS NOT NULL AND s.adisyon_id = sess.adisyon_id
+    WHERE s.sube_id = :sid
+    UNION ALL
+    SELECT s.tutar, s.durum, s.created_at
+    FROM siparisler s
+    JOIN sess ON sess.adisyon_id IS NULL
+    WHERE s.sube_id = :sid AND s.masa = :masa
+), agg AS (
+    SELECT
+        COALESCE(SUM(sip.tutar) FILTER (WHERE sip.durum IN ('yeni', 'hazirlaniyor', 'hazir')), 0) AS siparis_toplam,
+        COALESCE(SUM(sip.tutar) FILTER (WHERE sip.durum = 'hazir'), 0) AS hazir_toplam,
+        COALESCE(SUM(sip.tutar) FILTER (
+            WHERE sip.durum = 'odendi'
+              AND (sess.adisyon_id IS NOT NULL OR sess.session_start IS NULL OR sip.created_at >= sess.session_start)
+        ), 0) AS odendi_toplam,
+        COALESCE(SUM(sip.tutar) FILTER (
+            WHERE sip.durum <> 'iptal'
+              AND (sess.adisyon_id IS NOT NULL OR sess.session_start IS NULL OR sip.created_at >= sess.session_start)
+        ), 0) AS tum_toplam
+    FROM sip
+    CROSS JOIN sess
+), odm_rows AS (
+    SELECT o.tutar
+    FROM odemeler o
+    JOIN sess ON sess.adisyon_id IS NOT NULL AND o.adisyon_id = sess.adisyon_id
+    WHERE o.sube_id = :sid
+      AND o.iptal = FALSE
+      AND (sess.session_start IS NULL OR o.created_at >= sess.session_start)
+    UNION ALL
+    SELECT o.tutar
+    FROM odemeler o
+    JOIN sess ON sess.adisyon_id IS NULL AND sess.session_start IS NOT NULL
+    WHERE o.sube_id = :sid
+      AND o.masa = :masa
+      AND o.iptal = FALSE
+      AND o.adisyon_id IS NULL
+      AND o.created_at >= sess.session_start
+), odm AS (
+    SELECT COALESCE(SUM(tutar), 0) AS odeme_toplam FROM odm_rows
+)
+SELECT sess.adisyon_id,
+       sess.session_start,
+       agg.siparis_toplam,
+       agg.hazir_toplam,
+       agg.odendi_toplam,
+       agg.tum_toplam,
+       odm.odeme_toplam
+FROM sess
+CROSS JOIN agg
+CROSS JOIN odm
+"""
+
+
+def compute_bakiye(
+    siparis_toplam: float,
+    hazir_toplam: float,
+    odendi_toplam: float,
+    odeme_toplam: float,
+) -> float:
+    """
+    Bakiye hesaplama mantığı (kasa ekranı ile birebir aynı):
+    - "hazir" siparişler henüz ödenmemiş kabul edilir; ödemeler önce "odendi"
+      siparişlere, kalanı "hazir" siparişlere uygulanır.
+    - "hazir" yoksa ama aktif sipariş varsa: aktif toplam - ödemeler
+    - Aktif sipariş yoksa seans finalize edilmiştir, bakiye 0
+    """
+    if hazir_toplam > 0:
+        odendi_icin_odeme = min(odeme_toplam, odendi_toplam)
+        hazir_icin_odeme = max(0.0, odeme_toplam - odendi_icin_odeme)
+        if hazir_icin_odeme >= hazir_toplam:
+            bakiye = 0.0
+        else:
+            bakiye = hazir_toplam - hazir_icin_odeme
+    elif siparis_toplam > 0:
+        bakiye = max(0.0, siparis_toplam - odeme_toplam)
+    else:
+        # Aktif sipariş yok: tümü ödenmiş veya finalize edilmiş, her iki durumda da 0
+        bakiye = 0.0
+    return round(max(0.0, bakiye), 2)
+
+
+def build_hesap_ozet(masa: str, row: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """TABLE_BALANCE_SQL satırını kasa özet formatına dönüştürür."""
+    if row is None:
+        return {
+            "masa": masa,
+            "siparis_toplam": 0.0,
+            "odeme_toplam": 0.0,
+            "bakiye": 0.0,
+            "tum_toplam": 0.0,
+            "adisyon_id": None,
+            "session_start": None,
+        }
+
+    siparis_toplam = float(row["siparis_toplam"] or 0)
+    odeme_toplam = float(row["odeme_toplam"] or 0)
+    session_start = row["session_start"]
+    bakiye = compute_bakiye(
+        siparis_toplam=siparis_toplam,
+        hazir_toplam=float(row["hazir_toplam"] or 0),
+        odendi_toplam=float(row["odendi_toplam"] or 0),
+        odeme_toplam=odeme_toplam,
+    )
+    return {
+        "masa": masa,
+        "siparis_toplam": siparis_toplam,
+        "odeme_toplam": odeme_toplam,
+        "bakiye": bakiye,
+        "tum_toplam": float(row["tum_toplam"] or 0),
+        "adisyon_id": row["adisyon_id"],
+        "session_start": session_start.isoformat() if session_start else None,
+    }
+
+
+async def fetch_table_balance(
+    masa: str,
+    sube_id: int,
+    database: Optional[Database] = None,
+) -> Dict[str, Any]:
+    """
+    Masanın güncel hesap özetini tek round-trip ile döndürür.
+
+    Args:
+        masa: Masa adı
+        sube_id: Şube ID
+        database: Opsiyonel DB bağlantısı (benchmark scriptleri için); varsayılan global db
+
+    Returns:
+        {"masa", "siparis_toplam", "odeme_toplam", "bakiye", "tum_toplam", "adisyon_id", "session_start"}
+    """
+    conn = database if database is not None else db
+    row = await conn.fetch_one(TABLE_BALANCE_SQL, {"sid": sube_id, "masa": masa})
+    return build_hesap_ozet(masa, row)
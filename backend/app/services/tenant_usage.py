@@ -0,0 +1,207 @@
+# backend/app/services/tenant_usage.py
+"""
+Tenant kullanım sayaçları (abonelik limit kontrolleri için).
+
+SubscriptionLimitMiddleware her limitli yazımda subeler/users/menu üzerinde COUNT
+çalıştırıyordu. Burada tenant başına üç sayaç tutulur:
+
+- subeler: aktif şube sayısı
+- kullanicilar: aktif kullanıcı sayısı
+- menu_items: tenant şubelerindeki aktif menü ürünü sayısı
+
+Sayaçlar ilk ihtiyaçta tek sorguyla okunur; ekleme/silme uçları farkı
+record_usage_change ile artımlı uygular, etkisi kesin bilinemeyen yazımlar
+(toplu CSV, aktiflik değişimi, cascade silme) forget_tenant_usage ile sayacı
+düşürür. Değişiklikler pg_notify ile diğer worker'lara yayılır; zamanlanmış
+recount_tenant_usage kaymaları düzeltir. Abonelik durumu ve limitler
+core/auth_context'ten gelir.
+"""
+import json
+import logging
+import uuid
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from ..core.config import settings
+from ..core.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+TENANT_USAGE_CHANNEL = "neso_tenant_usage"
+USAGE_KINDS = ("subeler", "kullanicilar", "menu_items")
+
+_usage = LRUCache(maxsize=settings.TENANT_USAGE_CACHE_SIZE, ttl=settings.TENANT_USAGE_TTL_SECONDS)
+# Kendi yayınladığımız bildirimleri tekrar uygulamamak için worker kimliği
+_ORIGIN = uuid.uuid4().hex
+_listening = False
+
+_COUNT_SQL = """
+    SELECT
+        i.id AS tenant_id,
+        (SELECT COUNT(*) FROM subeler s
+          WHERE s.isletme_id = i.id AND s.aktif = TRUE) AS subeler,
+        (SELECT COUNT(u.id) FROM users u
+          WHERE u.tenant_id = i.id AND u.aktif = TRUE) AS kullanicilar,
+        (SELECT COUNT(*) FROM menu m JOIN subeler s ON m.sube_id = s.id
+          WHERE s.isletme_id = i.id AND m.aktif = TRUE) AS menu_items
+    FROM isletmeler i
+    WHERE i.id = ANY(:ids)
+"""
+
+
+async def _count(tenant_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+    from ..db.database import db, current_tenant_id
+
+    ids = [int(t) for t in tenant_ids]
+    if not ids:
+        return {}
+    # Sayımlar RLS tenant filtresinden bağımsız yapılır (middleware/scheduler bağlamı)
+    token = current_tenant_id.set(None)
+    try:
+        rows = await db.fetch_all(_COUNT_SQL, {"ids": ids})
+    finally:
+        current_tenant_id.reset(token)
+    return {r["tenant_id"]: {k: int(r[k] or 0) for k in USAGE_KINDS} for r in rows}
+
+
+async def get_tenant_usage(tenant_id: int) -> Dict[str, int]:
+    """Tenant'ın güncel kullanım sayaçları (cache'te yoksa DB'den sayılır)."""
+    usage = _usage.get(tenant_id)
+    if usage is not None:
+        return usage
+    counted = await _count([tenant_id])
+    usage = counted.get(tenant_id) or {k: 0 for k in USAGE_KINDS}
+    _usage.set(tenant_id, usage)
+    return usage
+
+
+async def tenant_of_sube(sube_id: int) -> Optional[int]:
+    """Şubenin işletme id'si (core/branch_access indeksinden; şube pasifse None)."""
+    from ..core.branch_access import get_branch_index
+
+    index = await get_branch_index(sube_id=sube_id)
+    return index.tenant_of(sube_id)
+
+
+def _apply(tenant_id: int, kind: str, delta: int) -> None:
+    usage = _usage.get(tenant_id)
+    if usage is not None:
+        usage[kind] = max(0, usage.get(kind, 0) + delta)
+
+
+async def _publish(payload: Dict[str, Any]) -> None:
+    from ..db.database import db
+
+    try:
+        await db.execute(
+            "SELECT pg_notify(:channel, :payload)",
+            {"channel": TENANT_USAGE_CHANNEL, "payload": json.dumps({**payload, "origin": _ORIGIN})},
+        )
+    except Exception as e:
+        # Diğer worker'lar recount/TTL ile düzelir
+        logger.warning(f"[TENANT_USAGE] Bildirim gönderilemedi: {e}")
+
+
+async def record_usage_change(tenant_id: Optional[int], kind: str, delta: int) -> None:
+    """Bir ekleme/silmenin sayaca etkisini uygular (tenant_id None ise yok sayılır)."""
+    if tenant_id is None or not delta:
+        return
+    if kind not in USAGE_KINDS:
+        raise ValueError(f"Bilinmeyen kullanım tipi: {kind}")
+    _apply(tenant_id, kind, delta)
+    await _publish({"op": "delta", "tenant_id": tenant_id, "kind": kind, "delta": delta})
+
+
+async def record_membership_change(
+    kind: str,
+    before_tenant_id: Optional[int],
+    before_aktif: Optional[bool],
+    after_tenant_id: Optional[int],
+    after_aktif: Optional[bool],
+) -> None:
+    """
+    Upsert gibi önceki/sonraki hali bilinen yazımlar için: kaydın eski tenant'taki
+    aktif sayımını düşer, yeni tenant'ta aktifse ekler.
+    """
+    if before_tenant_id == after_tenant_id and bool(before_aktif) == bool(after_aktif):
+        return
+    if before_aktif:
+        await record_usage_change(before_tenant_id, kind, -1)
+    if after_aktif:
+        await record_usage_change(after_tenant_id, kind, 1)
+
+
+async def record_user_usage(before: Optional[Mapping[str, Any]], after: Optional[Mapping[str, Any]]) -> None:
+    """Kullanıcı upsert'inin etkisi; before/after: users satırının tenant_id + aktif alanları (yoksa None)."""
+    await record_membership_change(
+        "kullanicilar",
+        before["tenant_id"] if before else None,
+        before["aktif"] if before else False,
+        after["tenant_id"] if after else None,
+        after["aktif"] if after else False,
+    )
+
+
+async def forget_tenant_usage(tenant_id: Optional[int]) -> None:
+    """Sayaçları düşürür; bir sonraki limit kontrolünde yeniden sayılır."""
+    if tenant_id is None:
+        return
+    _usage.pop(tenant_id)
+    await _publish({"op": "forget", "tenant_id": tenant_id})
+
+
+async def _on_usage_event(channel: str, payload: Dict[str, Any]) -> None:
+    if payload.get("origin") == _ORIGIN:
+        return
+    try:
+        tenant_id = int(payload["tenant_id"])
+    except (KeyError, TypeError, ValueError):
+        return
+    if payload.get("op") == "delta" and payload.get("kind") in USAGE_KINDS:
+        _apply(tenant_id, payload["kind"], int(payload.get("delta") or 0))
+    else:
+        _usage.pop(tenant_id)
+
+
+async def start_tenant_usage_listener() -> None:
+    """Startup: diğer worker'ların sayaç değişikliklerine abone olur."""
+    global _listening
+    if _listening:
+        return
+    from .event_bus import event_bus
+
+    await event_bus.register(TENANT_USAGE_CHANNEL, _on_usage_event)
+    await event_bus.start_listener()
+    _listening = True
+
+
+async def recount_tenant_usage() -> Dict[int, Dict[str, Any]]:
+    """
+    Cache'teki tenant'ları yeniden sayar ve sayaçları düzeltir.
+
+    Returns:
+        Sapma görülen tenant'lar: {tenant_id: {kind: {"cached": x, "actual": y}}}
+    """
+    tenant_ids = _usage.keys()
+    if not tenant_ids:
+        return {}
+    counted = await _count(tenant_ids)
+    drift: Dict[int, Dict[str, Any]] = {}
+    for tenant_id in tenant_ids:
+        actual = counted.get(tenant_id)
+        if actual is None:
+            # İşletme silinmiş
+            _usage.pop(tenant_id)
+            continue
+        cached = _usage.get(tenant_id)
+        if cached is not None:
+            diff = {k: {"cached": cached.get(k), "actual": actual[k]} for k in USAGE_KINDS if cached.get(k) != actual[k]}
+            if diff:
+                drift[tenant_id] = diff
+        _usage.set(tenant_id, actual)
+    if drift:
+        logger.warning(f"[TENANT_USAGE] Sayaç sapması düzeltildi: {drift}")
+    return drift
+
+
+def tenant_usage_stats() -> Dict[str, Any]:
+    return _usage.stats()
@@ -0,0 +1,378 @@
+# backend/app/services/usage_metering.py
+"""
+API kullanım ölçümü (LLM / REST API çağrıları).
+
+Her çağrı için api_usage_logs'a satır yazmak yerine sayaçlar bellekte
+(tenant, api_type, model, endpoint, method, dakika) anahtarıyla toplanır ve
+API_USAGE_FLUSH_INTERVAL_SECONDS'ta bir api_usage_minutely tablosuna tek
+çok satırlı upsert ile eklenir. Ham satır olarak sadece hatalar
+(API_USAGE_RAW_LOG_ERRORS) ve API_USAGE_RAW_SAMPLE_RATE oranında örneklenen
+başarılı çağrılar yazılır.
+
+Toplu yazım başarısız olursa satırlar tek tek denenir (audit writer gibi): bağlantı
+hatasında satır bir sonraki tura geri eklenir, veri/kısıt hatası veren satır
+düşürülüp sayılır (rejected) ki her turda tüm chunk'ı tekrar düşürmesin. Bekleyen
+anahtar/satır sayısı API_USAGE_MAX_BUFFERED ile sınırlıdır. Shutdown'da kalanlar
+yazılır. Meter çalışmıyorsa (script, test) her kayıt hemen yazılır.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (bucket_epoch, isletme_id, api_type, model, endpoint, method)
+UsageKey = Tuple[int, int, str, str, str, str]
+
+_KEY_COLUMNS = ("bucket", "isletme_id", "api_type", "model", "endpoint", "method")
+_COUNTER_COLUMNS = (
+    "call_count", "request_count", "success_count", "error_count",
+    "prompt_tokens", "completion_tokens", "total_tokens", "cost_usd", "cost_tl",
+    "response_time_ms_sum", "response_time_count",
+)
+_RAW_COLUMNS = (
+    "isletme_id", "api_key_id", "api_type", "endpoint", "method",
+    "status", "status_code", "response_time_ms", "error_message",
+    "metadata", "cost_tl", "cost_usd",
+    "model", "prompt_tokens", "completion_tokens", "total_tokens",
+    "request_count", "created_at",
+)
+
+
+@lru_cache(maxsize=64)
+def _rollup_sql(row_count: int) -> str:
+    """row_count satırlık upsert; aynı dakikaya önceki flush'lardan gelen değerlerin üzerine ekler"""
+    columns = _KEY_COLUMNS + _COUNTER_COLUMNS
+    rows = ",\n".join(
+        "(" + ", ".join(f":{col}_{i}" for col in columns) + ")" for i in range(row_count)
+    )
+    updates = ",\n    ".join(f"{col} = m.{col} + EXCLUDED.{col}" for col in _COUNTER_COLUMNS)
+    return (
+        f"INSERT INTO api_usage_minutely AS m ({', '.join(columns)}) VALUES\n{rows}\n"
+        f"ON CONFLICT ({', '.join(_KEY_COLUMNS)}) DO UPDATE SET\n    {updates}"
+    )
+
+
+@lru_cache(maxsize=64)
+def _raw_sql(row_count: int) -> str:
+    rows = ",\n".join(
+        "(" + ", ".join(
+            f"CAST(:{col}_{i} AS JSONB)" if col == "metadata" else f":{col}_{i}"
+            for col in _RAW_COLUMNS
+        ) + ")"
+        for i in range(row_count)
+    )
+    return f"INSERT INTO api_usage_logs ({', '.join(_RAW_COLUMNS)}) VALUES\n{rows}"
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """Geçici (bağlantı/zaman aşımı) hata mı; öyleyse satır tekrar denenmeye değer"""
+    return isinstance(error, (
+        OSError,
+        asyncio.TimeoutError,
+        asyncpg.exceptions.InterfaceError,
+        asyncpg.exceptions.PostgresConnectionError,
+        asyncpg.exceptions.CannotConnectNowError,
+    ))
+
+
+def _new_counters() -> Dict[str, Any]:
+    return {col: 0.0 if col.startswith("cost_") else 0 for col in _COUNTER_COLUMNS}
+
+
+class UsageMeter:
+    """API kullanım sayaçlarını dakikalık toplayıp periyodik yazan ölçüm servisi"""
+
+    # Tek bir INSERT'teki satır sayısı (parametre sayısı sınırı için)
+    BATCH_SIZE = 500
+
+    def __init__(self):
+        self._counters: Dict[UsageKey, Dict[str, Any]] = {}
+        self._raw_rows: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self.recorded = 0
+        self.raw_sampled = 0
+        self.rollup_rows_written = 0
+        self.raw_rows_written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.flush_errors = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="api-usage-meter")
+        logger.info(
+            f"[USAGE_METER] Başladı: flush={settings.API_USAGE_FLUSH_INTERVAL_SECONDS}s, "
+            f"ham örnekleme={settings.API_USAGE_RAW_SAMPLE_RATE}"
+        )
+
+    async def stop(self) -> None:
+        """Periyodik flush'ı durdurur ve bekleyen sayaçları yazar."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        logger.info(f"[USAGE_METER] Durdu: {self.stats()}")
+
+    async def _run(self) -> None:
+        interval = max(0.5, settings.API_USAGE_FLUSH_INTERVAL_SECONDS)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"[USAGE_METER] Flush hatası: {e}", exc_info=True)
+
+    def record(
+        self,
+        isletme_id: int,
+        api_type: str,
+        endpoint: str,
+        *,
+        model: Optional[str] = None,
+        method: Optional[str] = None,
+        api_key_id: Optional[int] = None,
+        status: str = "success",
+        status_code: Optional[int] = None,
+        response_time_ms: Optional[int] = None,
+        error_message: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        request_count: int = 1,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        total_tokens: int = 0,
+        cost_usd: float = 0.0,
+        cost_tl: float = 0.0,
+    ) -> None:
+        """Bir çağrıyı sayaçlara ekler (I/O yapmaz)."""
+        now = time.time()
+        key: UsageKey = (
+            int(now // 60) * 60, int(isletme_id), api_type, model or "", endpoint, method or "",
+        )
+        counters = self._counters.get(key)
+        if counters is None:
+            if len(self._counters) >= settings.API_USAGE_MAX_BUFFERED:
+                self._drop(f"rollup {api_type} {endpoint}")
+                return
+            counters = self._counters[key] = _new_counters()
+        counters["call_count"] += 1
+        counters["request_count"] += int(request_count or 0)
+        if status == "success":
+            counters["success_count"] += 1
+        elif status == "error":
+            counters["error_count"] += 1
+        counters["prompt_tokens"] += int(prompt_tokens or 0)
+        counters["completion_tokens"] += int(completion_tokens or 0)
+        counters["total_tokens"] += int(total_tokens or 0)
+        counters["cost_usd"] += float(cost_usd or 0)
+        counters["cost_tl"] += float(cost_tl or 0)
+        if response_time_ms is not None:
+            counters["response_time_ms_sum"] += int(response_time_ms)
+            counters["response_time_count"] += 1
+        self.recorded += 1
+
+        if not self._should_sample(status):
+            return
+        if len(self._raw_rows) >= settings.API_USAGE_MAX_BUFFERED:
+            self._drop(f"ham satır {api_type} {endpoint}")
+            return
+        self._raw_rows.append({
+            "isletme_id": isletme_id,
+            "api_key_id": api_key_id,
+            "api_type": api_type,
+            "endpoint": endpoint,
+            "method": method,
+            "status": status,
+            "status_code": status_code,
+            "response_time_ms": response_time_ms,
+            "error_message": error_message,
+            "metadata": json.dumps(metadata or {}, ensure_ascii=False, default=str),
+            "cost_tl": cost_tl,
+            "cost_usd": cost_usd,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens,
+            "request_count": request_count,
+            "created_at": datetime.fromtimestamp(now, tz=timezone.utc),
+        })
+        self.raw_sampled += 1
+
+    @staticmethod
+    def _should_sample(status: str) -> bool:
+        if status != "success":
+            return settings.API_USAGE_RAW_LOG_ERRORS
+        rate = settings.API_USAGE_RAW_SAMPLE_RATE
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def _drop(self, what: str) -> None:
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 1000 == 0:
+            logger.error(f"[USAGE_METER] Tampon dolu, kayıt düşürüldü (toplam {self.dropped}): {what}")
+
+    async def flush(self) -> None:
+        """Bekleyen sayaçları ve ham satırları yazar; bağlantı hatasında bir sonraki tura bırakır."""
+        async with self._flush_lock:
+            counters, self._counters = self._counters, {}
+            raw_rows, self._raw_rows = self._raw_rows, []
+            if not counters and not raw_rows:
+                return
+            from ..db.database import current_tenant_id
+
+            start = time.perf_counter()
+            # Çok tenant'lı toplu yazım: RLS tenant filtresi uygulanmasın
+            token = current_tenant_id.set(None)
+            try:
+                items = list(counters.items())
+                for i in range(0, len(items), self.BATCH_SIZE):
+                    await self._write_rollup(items[i:i + self.BATCH_SIZE])
+                for i in range(0, len(raw_rows), self.BATCH_SIZE):
+                    await self._write_raw(raw_rows[i:i + self.BATCH_SIZE])
+            finally:
+                current_tenant_id.reset(token)
+            self.flushes += 1
+            self.last_flush_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    async def _write_rollup(self, chunk: List[Tuple[UsageKey, Dict[str, Any]]]) -> None:
+        from ..db.database import db
+
+        try:
+            await db.execute(_rollup_sql(len(chunk)), self._rollup_params(chunk))
+            self.rollup_rows_written += len(chunk)
+            return
+        except Exception as e:
+            self.flush_errors += 1
+            if _is_connection_error(e):
+                logger.error(f"[USAGE_METER] Özet yazılamadı ({len(chunk)} satır), tekrar denenecek: {e}")
+                self._requeue_counters(chunk)
+                return
+            # Sorunlu satırı ayıklamak için tek tek dene
+            logger.error(f"[USAGE_METER] Toplu özet yazımı başarısız ({len(chunk)} satır), tek tek deneniyor: {e}")
+        for item in chunk:
+            try:
+                await db.execute(_rollup_sql(1), self._rollup_params([item]))
+                self.rollup_rows_written += 1
+            except Exception as row_error:
+                if _is_connection_error(row_error):
+                    self._requeue_counters([item])
+                else:
+                    self.rejected += 1
+                    logger.error(f"[USAGE_METER] Özet satırı düşürüldü {item[0]}: {row_error}")
+
+    async def _write_raw(self, chunk: List[Dict[str, Any]]) -> None:
+        from ..db.database import db
+
+        try:
+            await db.execute(_raw_sql(len(chunk)), self._raw_params(chunk))
+            self.raw_rows_written += len(chunk)
+            return
+        except Exception as e:
+            self.flush_errors += 1
+            if _is_connection_error(e):
+                logger.error(f"[USAGE_METER] Ham satırlar yazılamadı ({len(chunk)} satır), tekrar denenecek: {e}")
+                self._requeue_raw(chunk)
+                return
+            logger.error(f"[USAGE_METER] Toplu ham satır yazımı başarısız ({len(chunk)} satır), tek tek deneniyor: {e}")
+        for row in chunk:
+            try:
+                await db.execute(_raw_sql(1), self._raw_params([row]))
+                self.raw_rows_written += 1
+            except Exception as row_error:
+                if _is_connection_error(row_error):
+                    self._requeue_raw([row])
+                else:
+                    self.rejected += 1
+                    logger.error(f"[USAGE_METER] Ham satır düşürüldü ({row['api_type']} {row['endpoint']}): {row_error}")
+
+    @staticmethod
+    def _raw_params(chunk: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {f"{col}_{n}": row[col] for n, row in enumerate(chunk) for col in _RAW_COLUMNS}
+
+    @staticmethod
+    def _rollup_params(chunk: List[Tuple[UsageKey, Dict[str, Any]]]) -> Dict[str, Any]:
+        params: Dict[str, Any] = {}
+        for n, (key, counters) in enumerate(chunk):
+            bucket, isletme_id, api_type, model, endpoint, method = key
+            params[f"bucket_{n}"] = datetime.fromtimestamp(bucket, tz=timezone.utc)
+            params[f"isletme_id_{n}"] = isletme_id
+            params[f"api_type_{n}"] = api_type
+            params[f"model_{n}"] = model
+            params[f"endpoint_{n}"] = endpoint
+            params[f"method_{n}"] = method
+            for col in _COUNTER_COLUMNS:
+                params[f"{col}_{n}"] = counters[col]
+        return params
+
+    def _requeue_counters(self, chunk: List[Tuple[UsageKey, Dict[str, Any]]]) -> None:
+        for key, counters in chunk:
+            current = self._counters.get(key)
+            if current is None:
+                if len(self._counters) >= settings.API_USAGE_MAX_BUFFERED:
+                    self.dropped += counters["call_count"]
+                    continue
+                self._counters[key] = counters
+            else:
+                for col in _COUNTER_COLUMNS:
+                    current[col] += counters[col]
+
+    def _requeue_raw(self, rows: List[Dict[str, Any]]) -> None:
+        room = max(0, settings.API_USAGE_MAX_BUFFERED - len(self._raw_rows))
+        self._raw_rows[:0] = rows[:room]
+        self.dropped += len(rows) - len(rows[:room])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "pending_rollup_keys": len(self._counters),
+            "pending_raw_rows": len(self._raw_rows),
+            "recorded": self.recorded,
+            "raw_sampled": self.raw_sampled,
+            "rollup_rows_written": self.rollup_rows_written,
+            "raw_rows_written": self.raw_rows_written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "flush_errors": self.flush_errors,
+            "flushes": self.flushes,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+usage_meter = UsageMeter()
+
+
+async def record_api_usage(isletme_id: int, api_type: str, endpoint: str, **fields: Any) -> None:
+    """
+    Çağrıyı ölçüme ekler. Meter çalışmıyorsa (script, test) hemen yazar.
+    Ölçüm hatası asla çağıranı engellemez.
+    """
+    try:
+        usage_meter.record(isletme_id, api_type, endpoint, **fields)
+        if not usage_meter.running:
+            await usage_meter.flush()
+    except Exception as e:
+        logger.error(f"[USAGE_METER] Kullanım kaydedilemedi: {e}", exc_info=True)
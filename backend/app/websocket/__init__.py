@@ -1,6 +1,17 @@
 # backend/app/websocket/__init__.py
-from .manager import manager, ConnectionManager, Topics
+from .manager import manager, ConnectionManager, Topics, topic_key
+from .broker import BrokerBackend, InMemoryBroker, PostgresBroker, RedisBroker, create_broker
 
-__all__ = ["manager", "ConnectionManager", "Topics"]
+__all__ = [
+    "manager",
+    "ConnectionManager",
+    "Topics",
+    "topic_key",
+    "BrokerBackend",
+    "InMemoryBroker",
+    "PostgresBroker",
+    "RedisBroker",
+    "create_broker",
+]
 
 
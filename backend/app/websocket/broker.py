@@ -0,0 +1,225 @@
+# backend/app/websocket/broker.py
+"""
+WebSocket fan-out broker'ları.
+
+ConnectionManager bağlantıları tek process'in belleğinde tutar; birden fazla
+uvicorn worker'ı / node varken A worker'ındaki broadcast B'ye bağlı ekranlara
+ulaşmaz. Broker, her broadcast'i diğer worker'lara taşır; her worker mesajı
+kendi yerel abonelerine dağıtır.
+
+Backend'ler (WS_BROKER_BACKEND):
+    redis    : cache_service Redis client'ı ile pub/sub
+    postgres : services.event_bus LISTEN döngüsü + pg_notify
+    memory   : process içi hub (testler ve tek worker için stand-in)
+    auto     : Redis aktifse redis, değilse postgres
+    none     : sadece yerel dağıtım
+
+Zarf: {"o": origin, "topic": ..., "tenant_id": ..., "message": {...}}
+Her broker kendi yayınladığı mesajı (origin) yok sayar; yerel dağıtımı
+ConnectionManager yayın anında zaten yapmıştır.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EnvelopeHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class BrokerBackend:
+    """Broker temel sınıfı: zarf serileştirme, origin filtresi ve boyut sınırı"""
+
+    name = "base"
+    # Backend'in taşıyabildiği en büyük payload (byte, None = sınırsız)
+    max_payload: Optional[int] = None
+
+    def __init__(self, channel: Optional[str] = None):
+        self.channel = channel or settings.WS_BROKER_CHANNEL
+        self.origin = uuid.uuid4().hex
+        self._handler: Optional[EnvelopeHandler] = None
+        self.published = 0
+        self.received = 0
+
+    async def start(self, handler: EnvelopeHandler) -> None:
+        self._handler = handler
+
+    async def stop(self) -> None:
+        self._handler = None
+
+    async def _send(self, raw: str) -> None:
+        raise NotImplementedError
+
+    def _encode(self, envelope: Dict[str, Any]) -> Optional[str]:
+        raw = json.dumps({"o": self.origin, **envelope}, ensure_ascii=False, default=str)
+        if self.max_payload is None or len(raw.encode("utf-8")) <= self.max_payload:
+            return raw
+        # Büyük delta listesini çıkar: alıcı ekranlar "orders" yoksa kuyruğu yeniden yükler
+        message = {k: v for k, v in (envelope.get("message") or {}).items() if k != "orders"}
+        raw = json.dumps({"o": self.origin, **envelope, "message": message}, ensure_ascii=False, default=str)
+        if len(raw.encode("utf-8")) <= self.max_payload:
+            return raw
+        logger.warning(f"[WS_BROKER] Mesaj {self.name} payload sınırını aşıyor, relay edilmedi (topic={envelope.get('topic')})")
+        return None
+
+    async def publish(self, envelope: Dict[str, Any]) -> None:
+        raw = self._encode(envelope)
+        if raw is None:
+            return
+        try:
+            await self._send(raw)
+            self.published += 1
+        except Exception as e:
+            logger.warning(f"[WS_BROKER] {self.name} publish hatası: {e}")
+
+    async def _receive(self, raw: Any) -> None:
+        if self._handler is None:
+            return
+        try:
+            data = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+        except (TypeError, ValueError):
+            logger.warning(f"[WS_BROKER] Çözülemeyen mesaj yok sayıldı: {str(raw)[:200]}")
+            return
+        if not isinstance(data, dict) or data.get("o") == self.origin:
+            return
+        self.received += 1
+        try:
+            await self._handler(data)
+        except Exception:
+            logger.exception("[WS_BROKER] Yerel dağıtım hatası")
+
+
+class InMemoryBroker(BrokerBackend):
+    """
+    Process içi hub. Aynı kanaldaki tüm InMemoryBroker örnekleri birbirinin
+    mesajını alır; testlerde iki ConnectionManager'ı iki worker gibi bağlamak için.
+    """
+
+    name = "memory"
+    _hub: Dict[str, List["InMemoryBroker"]] = {}
+
+    async def start(self, handler: EnvelopeHandler) -> None:
+        await super().start(handler)
+        peers = self._hub.setdefault(self.channel, [])
+        if self not in peers:
+            peers.append(self)
+
+    async def stop(self) -> None:
+        peers = self._hub.get(self.channel, [])
+        if self in peers:
+            peers.remove(self)
+        await super().stop()
+
+    async def _send(self, raw: str) -> None:
+        for peer in list(self._hub.get(self.channel, [])):
+            if peer is not self:
+                await peer._receive(raw)
+
+
+class PostgresBroker(BrokerBackend):
+    """services.event_bus LISTEN bağlantısı üzerinden dinler, pg_notify ile yayınlar."""
+
+    name = "postgres"
+    # NOTIFY payload sınırı 8000 byte
+    max_payload = 7900
+
+    async def start(self, handler: EnvelopeHandler) -> None:
+        from ..services.event_bus import event_bus
+
+        await super().start(handler)
+        await event_bus.register(self.channel, self._on_event)
+        await event_bus.start_listener()
+
+    async def stop(self) -> None:
+        from ..services.event_bus import event_bus
+
+        await event_bus.unregister(self.channel, self._on_event)
+        await super().stop()
+
+    async def _on_event(self, channel: str, payload: Dict[str, Any]) -> None:
+        await self._receive(payload)
+
+    async def _send(self, raw: str) -> None:
+        from ..db.database import db
+
+        await db.execute("SELECT pg_notify(:channel, :payload)", {"channel": self.channel, "payload": raw})
+
+
+class RedisBroker(BrokerBackend):
+    """cache_service Redis client'ı ile pub/sub."""
+
+    name = "redis"
+
+    def __init__(self, channel: Optional[str] = None):
+        super().__init__(channel)
+        self._pubsub = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    def _client(self):
+        from ..services.cache import cache_service
+
+        client = cache_service.get_redis_client()
+        if client is None:
+            raise RuntimeError("Redis aktif değil")
+        return client
+
+    async def start(self, handler: EnvelopeHandler) -> None:
+        await super().start(handler)
+        self._pubsub = self._client().pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def stop(self) -> None:
+        if self._reader_task:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(self.channel)
+                await self._pubsub.close()
+            except Exception:
+                pass
+            self._pubsub = None
+        await super().stop()
+
+    async def _read_loop(self) -> None:
+        while True:
+            try:
+                # Kısa timeout: REDIS_SOCKET_TIMEOUT'a takılmadan boşta bekler
+                item = await self._pubsub.get_message(timeout=1.0)
+                if item and item.get("type") == "message":
+                    await self._receive(item.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[WS_BROKER] Redis okuma hatası, yeniden abone olunuyor: {e}")
+                await asyncio.sleep(1)
+                try:
+                    await self._pubsub.subscribe(self.channel)
+                except Exception:
+                    pass
+
+    async def _send(self, raw: str) -> None:
+        await self._client().publish(self.channel, raw)
+
+
+def create_broker(kind: Optional[str] = None) -> Optional[BrokerBackend]:
+    """
+    WS_BROKER_BACKEND ayarından broker oluşturur (none → None, sadece yerel dağıtım).
+    """
+    kind = (kind or settings.WS_BROKER_BACKEND or "none").lower()
+    if kind == "auto":
+        from ..services.cache import cache_service
+
+        kind = "redis" if cache_service.is_enabled() else "postgres"
+    if kind == "redis":
+        return RedisBroker()
+    if kind == "postgres":
+        return PostgresBroker()
+    if kind == "memory":
+        return InMemoryBroker()
+    return None
@@ -2,35 +2,139 @@
 """
 WebSocket connection manager for real-time updates.
 Manages active connections and broadcasts messages to subscribed clients.
+
+Topic'ler tenant bazında isim alanına ayrılır ("t{tenant_id}:{topic}"):
+tenant'lı bağlantılar sadece kendi tenant'ının yayınlarını alır. Tenant'sız
+kimlikli bağlantılar (super admin) ham topic'e abone olur ve tüm yayınları alır.
+Kimliksiz bağlantılar (eski /ws/connect) da ham topic'e abone olur ama yalnızca
+tenant'ı çözülemeyen yayınları alır; hiçbir tenant'ın sipariş içeriği onlara gitmez.
+
+Birden fazla worker/node için broadcast'ler broker (websocket/broker.py)
+üzerinden diğer worker'lara taşınır; start_broker lifespan'de çağrılır.
+
+Gönderim bloklamaz: her bağlantının sınırlı bir giden kuyruğu ve onu boşaltan
+kendi writer task'ı vardır. Broadcast mesajı bir kez serileştirip kuyruklara
+bırakır; kuyruğu dolan (WS_SEND_QUEUE_SIZE) veya gönderimi WS_SEND_TIMEOUT_SECONDS
+içinde bitmeyen yavaş istemciler düşürülür. Broker'a yayın da aynı şekilde
+sınırlı bir kuyruğa (WS_BROKER_QUEUE_SIZE) bırakılır ve arka plandaki publisher
+task'ı tarafından sırayla gönderilir; broker yavaşlasa da broadcast beklemez.
 """
 import asyncio
+import json
 import logging
-from typing import Dict, Set
+from typing import Any, Dict, Optional, Set
 from fastapi import WebSocket
 
+from ..core.config import settings
+
 logger = logging.getLogger(__name__)
 
+# sube_id -> isletme_id (yayın anında tenant çözümü için; şubeler tenant değiştirmez)
+_sube_tenants: Dict[int, Optional[int]] = {}
+
+
+def topic_key(topic: str, tenant_id: Optional[int] = None) -> str:
+    """Tenant isim alanlı abonelik anahtarı (tenant yoksa ham topic)"""
+    return f"t{tenant_id}:{topic}" if tenant_id is not None else topic
+
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, broker=None):
         # Active connections: {connection_id: WebSocket}
         self.active_connections: Dict[str, WebSocket] = {}
-        # Subscriptions: {topic: Set[connection_id]}
+        # Subscriptions: {topic_key: Set[connection_id]}
         self.subscriptions: Dict[str, Set[str]] = {}
-        # Connection topics: {connection_id: Set[topic]}
+        # Connection topics: {connection_id: Set[topic_key]}
         self.connection_topics: Dict[str, Set[str]] = {}
+        # Connection tenants: {connection_id: tenant_id | None}
+        self.connection_tenants: Dict[str, Optional[int]] = {}
+        # Kimliksiz bağlantılar: tenant'lı yayınları almaz
+        self.anonymous_connections: Set[str] = set()
+        # Cross-worker fan-out (None → sadece yerel dağıtım)
+        self.broker = broker
+        # Giden kuyruklar ve writer task'ları: {connection_id: ...}
+        self.send_queues: Dict[str, asyncio.Queue] = {}
+        self.writer_tasks: Dict[str, asyncio.Task] = {}
+        # Broker'a giden yayın kuyruğu ve onu boşaltan publisher task'ı
+        self.publish_queue: Optional[asyncio.Queue] = None
+        self.publisher_task: Optional[asyncio.Task] = None
+        self.metrics: Dict[str, int] = {
+            "broadcasts": 0,
+            "messages_enqueued": 0,
+            "messages_sent": 0,
+            "messages_dropped": 0,
+            "send_errors": 0,
+            "slow_consumers_evicted": 0,
+            "broker_enqueued": 0,
+            "broker_dropped": 0,
+        }
 
-    async def connect(self, websocket: WebSocket, connection_id: str):
-        """Accept new WebSocket connection"""
+    async def connect(
+        self,
+        websocket: WebSocket,
+        connection_id: str,
+        tenant_id: Optional[int] = None,
+        anonymous: bool = False,
+    ):
+        """Accept new WebSocket connection (anonymous: kimliksiz, sadece tenant'sız yayınlar)"""
         await websocket.accept()
         self.active_connections[connection_id] = websocket
         self.connection_topics[connection_id] = set()
-        logger.info(f"WebSocket connected: {connection_id}")
+        self.connection_tenants[connection_id] = tenant_id
+        if anonymous:
+            self.anonymous_connections.add(connection_id)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.send_queues[connection_id] = queue
+        self.writer_tasks[connection_id] = asyncio.create_task(self._writer(connection_id, websocket, queue))
+        logger.info(f"WebSocket connected: {connection_id} (tenant={tenant_id})")
+
+    async def _writer(self, connection_id: str, websocket: WebSocket, queue: asyncio.Queue) -> None:
+        """Bağlantının kuyruğunu sırayla gönderir; gönderim takılır veya hata verirse bağlantıyı düşürür"""
+        while True:
+            text = await queue.get()
+            try:
+                await asyncio.wait_for(websocket.send_text(text), timeout=settings.WS_SEND_TIMEOUT_SECONDS)
+                self.metrics["messages_sent"] += 1
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                self._evict(connection_id, "gönderim zaman aşımı")
+                return
+            except Exception as e:
+                self.metrics["send_errors"] += 1
+                logger.debug(f"Error sending to {connection_id}: {e}")
+                self.disconnect(connection_id)
+                return
+
+    def _evict(self, connection_id: str, reason: str) -> None:
+        """Yavaş istemciyi düşür (1013: try again later); istemci yeniden bağlanıp replay ile toparlar"""
+        websocket = self.active_connections.get(connection_id)
+        queue = self.send_queues.get(connection_id)
+        backlog = queue.qsize() if queue is not None else 0
+        self.metrics["slow_consumers_evicted"] += 1
+        self.metrics["messages_dropped"] += backlog
+        logger.warning(f"[WS] Yavaş istemci düşürüldü: {connection_id} ({reason}, kuyruk={backlog})")
+        self.disconnect(connection_id)
+        if websocket is not None:
+            asyncio.create_task(self._close_quietly(websocket, code=1013))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket, code: int) -> None:
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
 
     def disconnect(self, connection_id: str):
         """Remove connection and clean up subscriptions"""
         if connection_id in self.active_connections:
             del self.active_connections[connection_id]
+        self.connection_tenants.pop(connection_id, None)
+        self.anonymous_connections.discard(connection_id)
+        self.send_queues.pop(connection_id, None)
+        writer = self.writer_tasks.pop(connection_id, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
         
         # Remove from all subscriptions
         if connection_id in self.connection_topics:
@@ -47,66 +151,222 @@ class ConnectionManager:
         if connection_id not in self.active_connections:
             return False
         
-        if topic not in self.subscriptions:
-            self.subscriptions[topic] = set()
+        key = topic_key(topic, self.connection_tenants.get(connection_id))
+        if key not in self.subscriptions:
+            self.subscriptions[key] = set()
         
-        self.subscriptions[topic].add(connection_id)
+        self.subscriptions[key].add(connection_id)
         
         if connection_id in self.connection_topics:
-            self.connection_topics[connection_id].add(topic)
+            self.connection_topics[connection_id].add(key)
         
-        logger.info(f"Subscribed {connection_id} to {topic}")
+        logger.debug(f"Subscribed {connection_id} to {key}")
         return True
 
     def unsubscribe(self, connection_id: str, topic: str):
         """Unsubscribe connection from a topic"""
-        if topic in self.subscriptions:
-            self.subscriptions[topic].discard(connection_id)
+        key = topic_key(topic, self.connection_tenants.get(connection_id))
+        if key in self.subscriptions:
+            self.subscriptions[key].discard(connection_id)
         
         if connection_id in self.connection_topics:
-            self.connection_topics[connection_id].discard(topic)
+            self.connection_topics[connection_id].discard(key)
         
-        logger.info(f"Unsubscribed {connection_id} from {topic}")
+        logger.debug(f"Unsubscribed {connection_id} from {topic}")
+
+    @staticmethod
+    def _serialize(message: dict) -> str:
+        # starlette send_json ile aynı format
+        return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+    def _enqueue(self, text: str, connection_id: str) -> bool:
+        queue = self.send_queues.get(connection_id)
+        if queue is None:
+            return False
+        try:
+            queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.metrics["messages_dropped"] += 1
+            self._evict(connection_id, "kuyruk dolu")
+            return False
+        self.metrics["messages_enqueued"] += 1
+        return True
 
     async def send_personal_message(self, message: dict, connection_id: str):
-        """Send message to a specific connection"""
+        """Send message to a specific connection (kuyruğa bırakır, gönderimi beklemez)"""
         if connection_id not in self.active_connections:
             return False
-        
         try:
-            await self.active_connections[connection_id].send_json(message)
-            return True
-        except Exception as e:
-            logger.error(f"Error sending to {connection_id}: {e}")
-            self.disconnect(connection_id)
+            text = self._serialize(message)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error serializing message for {connection_id}: {e}")
             return False
+        return self._enqueue(text, connection_id)
+
+    async def _resolve_tenant(self, message: dict) -> Optional[int]:
+        """
+        Yayının tenant'ı: istek context'indeki tenant (get_current_user), yoksa
+        mesajdaki sube_id'nin işletmesi. Çözülemezse None (sadece tenant'sız abonelere gider).
+        """
+        from ..db.database import current_tenant_id
 
-    async def broadcast(self, message: dict, topic: str = None):
-        """Broadcast message to all subscribers of a topic, or all connections if no topic"""
+        tid = current_tenant_id.get()
+        if tid is not None:
+            return tid
+        sube_id = message.get("sube_id") if isinstance(message, dict) else None
+        if sube_id is None:
+            return None
+        try:
+            sube_id = int(sube_id)
+        except (TypeError, ValueError):
+            return None
+        if sube_id not in _sube_tenants:
+            try:
+                from ..db.database import db
+                row = await db.fetch_one("SELECT isletme_id FROM subeler WHERE id = :sid", {"sid": sube_id})
+                _sube_tenants[sube_id] = row["isletme_id"] if row else None
+            except Exception as e:
+                logger.warning(f"[WS] Şube tenant'ı çözülemedi (sube_id={sube_id}): {e}")
+                return None
+        return _sube_tenants[sube_id]
+
+    def _local_targets(self, topic: Optional[str], tenant_id: Optional[int]) -> Set[str]:
         if topic:
-            # Broadcast to topic subscribers only
-            if topic not in self.subscriptions:
-                logger.warning(f"Topic '{topic}' has no subscribers")
-                return
-            
-            connection_ids = list(self.subscriptions[topic])
-            logger.info(f"Topic '{topic}' has {len(connection_ids)} subscribers: {connection_ids}")
-        else:
-            # Broadcast to all active connections
-            connection_ids = list(self.active_connections.keys())
-        
+            targets = set(self.subscriptions.get(topic, ()))
+            if tenant_id is not None:
+                # Tenant'lı yayın kimliksiz bağlantılara gitmez
+                targets -= self.anonymous_connections
+                targets |= self.subscriptions.get(topic_key(topic, tenant_id), set())
+            return targets
+        if tenant_id is None:
+            return set(self.active_connections.keys())
+        return {
+            conn_id
+            for conn_id in self.active_connections
+            if self.connection_tenants.get(conn_id) in (None, tenant_id)
+            and conn_id not in self.anonymous_connections
+        }
+
+    def _deliver_local(self, message: dict, topic: Optional[str], tenant_id: Optional[int]) -> int:
+        connection_ids = self._local_targets(topic, tenant_id)
         if not connection_ids:
-            logger.warning(f"No connections to broadcast to (topic: {topic})")
+            return 0
+        try:
+            text = self._serialize(message)
+        except (TypeError, ValueError) as e:
+            logger.error(f"[WS] Mesaj serileştirilemedi (topic={topic}): {e}")
+            return 0
+        # Tek serileştirme, bağlantı başına sadece kuyruğa bırakma (gönderim writer task'larında)
+        return sum(1 for conn_id in connection_ids if self._enqueue(text, conn_id))
+
+    async def broadcast(self, message: dict, topic: str = None, tenant_id: Optional[int] = None):
+        """
+        Broadcast message to all subscribers of a topic, or all connections if no topic.
+        Yerel abonelere hemen gönderilir, broker varsa diğer worker'lara da taşınır.
+        """
+        if tenant_id is None:
+            tenant_id = await self._resolve_tenant(message)
+
+        self.metrics["broadcasts"] += 1
+        sent = self._deliver_local(message, topic, tenant_id)
+        if self.broker is not None:
+            self._enqueue_publish({"topic": topic, "tenant_id": tenant_id, "message": message})
+
+        logger.debug(f"Broadcasted to {sent} local connections on topic '{topic}' (tenant={tenant_id})")
+
+    def _enqueue_publish(self, envelope: Dict[str, Any]) -> None:
+        """
+        Yayını broker kuyruğuna bırakır (gönderimi beklemez); kuyruk doluysa düşürür.
+        Publisher task'ı start_broker'da (lifespan) açılır; istek içinde açılsaydı isteğin
+        context'ini (tenant, DB bağlantısı/transaction'ı) devralırdı.
+        """
+        queue = self.publish_queue
+        if queue is not None and self.publisher_task is not None and not self.publisher_task.done():
+            try:
+                queue.put_nowait(envelope)
+                self.metrics["broker_enqueued"] += 1
+                return
+            except asyncio.QueueFull:
+                pass
+        self.metrics["broker_dropped"] += 1
+        dropped = self.metrics["broker_dropped"]
+        if dropped == 1 or dropped % 1000 == 0:
+            logger.error(f"[WS_BROKER] Yayın kuyruğu dolu/kapalı, yayın sadece yerelde kaldı (toplam {dropped})")
+
+    async def _publisher(self, broker, queue: asyncio.Queue) -> None:
+        """Broker kuyruğunu sırayla yayınlar (None → dur)"""
+        while True:
+            envelope = await queue.get()
+            if envelope is None:
+                return
+            try:
+                await broker.publish(envelope)
+            except Exception as e:
+                logger.warning(f"[WS_BROKER] Yayın gönderilemedi: {e}")
+
+    async def _stop_publisher(self) -> None:
+        """Kuyrukta kalan yayınları gönderir ve publisher task'ını kapatır"""
+        task, queue = self.publisher_task, self.publish_queue
+        self.publisher_task = None
+        self.publish_queue = None
+        if task is None or task.done():
             return
-        
-        # Send to all connections in parallel
-        tasks = [
-            self.send_personal_message(message, conn_id)
-            for conn_id in connection_ids
-        ]
-        await asyncio.gather(*tasks, return_exceptions=True)
-        
-        logger.info(f"Broadcasted to {len(connection_ids)} connections on topic '{topic}'")
+        try:
+            await asyncio.wait_for(queue.put(None), timeout=5)
+            await asyncio.wait_for(task, timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning(f"[WS_BROKER] Publisher zamanında kapanmadı; kuyrukta {queue.qsize()} yayın kaldı")
+            task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Bağlantı/kuyruk metrikleri (kuyruk derinliği, düşürülen mesaj ve istemciler)"""
+        depths = [q.qsize() for q in self.send_queues.values()]
+        return {
+            "connections": len(self.active_connections),
+            "topics": {key: len(ids) for key, ids in self.subscriptions.items() if ids},
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths) if depths else 0,
+            "queue_limit": settings.WS_SEND_QUEUE_SIZE,
+            "broker": self.broker.name if self.broker is not None else None,
+            "broker_queue_depth": self.publish_queue.qsize() if self.publish_queue is not None else 0,
+            **self.metrics,
+        }
+
+    async def _on_broker_message(self, envelope: Dict[str, Any]) -> None:
+        """Başka bir worker'ın yayınını yerel abonelere dağıt"""
+        message = envelope.get("message")
+        if not isinstance(message, dict):
+            return
+        self._deliver_local(message, envelope.get("topic"), envelope.get("tenant_id"))
+
+    async def start_broker(self, broker=None) -> None:
+        """
+        Cross-worker broker'ı başlat (varsayılan: WS_BROKER_BACKEND).
+        Başlatılamazsa yerel dağıtımla devam edilir.
+        """
+        from .broker import create_broker
+
+        broker = broker or create_broker()
+        if broker is None:
+            logger.info("[WS_BROKER] Kapalı, sadece yerel dağıtım")
+            return
+        try:
+            await broker.start(self._on_broker_message)
+        except Exception as e:
+            logger.warning(f"[WS_BROKER] {broker.name} başlatılamadı, sadece yerel dağıtım: {e}")
+            return
+        await self._stop_publisher()
+        self.broker = broker
+        self.publish_queue = asyncio.Queue(maxsize=settings.WS_BROKER_QUEUE_SIZE)
+        self.publisher_task = asyncio.create_task(self._publisher(broker, self.publish_queue), name="ws-broker-publisher")
+        logger.info(f"[WS_BROKER] {broker.name} broker aktif (kanal={broker.channel})")
+
+    async def stop_broker(self) -> None:
+        broker, self.broker = self.broker, None
+        # Yeni yayın kuyruğa girmez; kalanlar broker kapanmadan gönderilir
+        await self._stop_publisher()
+        if broker is not None:
+            await broker.stop()
 
 
 # Global manager instance
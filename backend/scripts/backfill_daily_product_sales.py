@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+daily_product_sales özetini ödenmiş siparişlerden yeniden oluşturur.
+
+Trigger, kurulduktan sonraki ödemeleri artımlı işler; bu script mevcut geçmişi
+doldurmak (ilk kurulum) veya bir aralığı onarmak için kullanılır. Her şube ayrı
+transaction'da işlenir; aynı aralık tekrar çalıştırılabilir (idempotent).
+
+Kullanım:
+    cd backend
+    python scripts/backfill_daily_product_sales.py                       # tüm şubeler, tüm geçmiş
+    python scripts/backfill_daily_product_sales.py --sube-id 3 --sube-id 5
+    python scripts/backfill_daily_product_sales.py --since 2025-10-01 --until 2026-10-01
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.db.database import db
+from app.db.schema import create_tables
+from app.services.product_sales_rollup import rebuild_daily_product_sales
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="daily_product_sales backfill")
+    parser.add_argument("--sube-id", type=int, action="append", help="Sadece bu şube(ler)")
+    parser.add_argument("--since", type=date.fromisoformat, help="Başlangıç günü (dahil, YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="Bitiş günü (hariç, YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    await db.connect()
+    try:
+        # Tablo/fonksiyon/trigger yoksa oluştur (idempotent)
+        await create_tables(db)
+        if args.sube_id:
+            sube_ids = args.sube_id
+        else:
+            rows = await db.fetch_all("SELECT id FROM subeler ORDER BY id")
+            sube_ids = [r["id"] for r in rows]
+
+        toplam = 0
+        for sid in sube_ids:
+            t0 = time.perf_counter()
+            written = await rebuild_daily_product_sales(sid, start=args.since, end=args.until)
+            toplam += written
+            print(f"[OK] sube_id={sid}: {written} satir ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        print(f"[OK] {len(sube_ids)} sube, toplam {toplam} ozet satiri yazildi")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
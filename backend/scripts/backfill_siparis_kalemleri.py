@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+siparis_kalemleri tablosunu mevcut siparişlerin sepetlerinden doldurur.
+
+Trigger, kurulduktan sonraki siparişleri yazar; geçmiş siparişleri migration
+2026_10_17_0005 doldurur. Bu script migration'sız kurulumlar (tablo create_tables
+ile açıldıysa), yarıda kalan veya belirli şubeler için tekrar doldurma içindir. Siparişler id sırasıyla parça parça işlenir,
+kalemi olan siparişler atlanır; yarıda kesilirse tekrar çalıştırılabilir.
+
+Kullanım:
+    cd backend
+    python scripts/backfill_siparis_kalemleri.py                      # tüm şubeler
+    python scripts/backfill_siparis_kalemleri.py --sube-id 3 --sube-id 5
+    python scripts/backfill_siparis_kalemleri.py --batch-size 2000 --after-id 1500000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.db.database import db
+from app.db.schema import create_tables
+from app.services.order_lines import backfill_order_lines
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="siparis_kalemleri backfill")
+    parser.add_argument("--sube-id", type=int, action="append", help="Sadece bu şube(ler)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Parça başına sipariş sayısı")
+    parser.add_argument("--after-id", type=int, default=0, help="Bu sipariş id'sinden sonrasını işle")
+    args = parser.parse_args()
+
+    await db.connect()
+    try:
+        # Tablo/fonksiyon/trigger yoksa oluştur (idempotent)
+        await create_tables(db)
+        toplam = 0
+        for sid in args.sube_id or [None]:
+            t0 = time.perf_counter()
+            written = await backfill_order_lines(sid, batch_size=args.batch_size, after_id=args.after_id)
+            toplam += written
+            hedef = f"sube_id={sid}" if sid is not None else "tum subeler"
+            print(f"[OK] {hedef}: {written} siparis ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        print(f"[OK] toplam {toplam} siparisin kalemleri yazildi")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Kasa hesap özeti micro-benchmark'ı.
+
+Eski _hesap_ozet_core (7'ye kadar ardışık sorgu) ile tek sorguluk masa bakiye
+motorunu (app.services.table_balance) aynı seed'lenmiş local Postgres üzerinde
+karşılaştırır. Sorgular TenantAwareDatabase üzerinden çalıştırılır, yani her
+sorgunun transaction + SET LOCAL maliyeti de ölçüme dahildir.
+
+Kullanım:
+    cd backend
+    python scripts/bench_hesap_ozet.py --tables 40 --orders 8 --iterations 200
+
+Script kendi işletme/şubesini oluşturur ve iş bitince siler.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.core.config import settings
+from app.db.database import TenantAwareDatabase, _normalize_db_url, current_tenant_id
+from app.db.schema import create_tables
+from app.services.table_balance import compute_bakiye, fetch_table_balance
+
+
+async def _legacy_hesap_ozet(db, masa: str, sube_id: int) -> Dict[str, Any]:
+    """Eski _hesap_ozet_core'un sorgu deseni (karşılaştırma için birebir kopya)."""
+    params_base = {"sid": sube_id, "masa": masa}
+    adisyon_row = await db.fetch_one(
+        """
+        SELECT id, acilis_zamani FROM adisyons
+        WHERE sube_id = :sid AND masa = :masa AND durum = 'acik'
+        ORDER BY acilis_zamani DESC LIMIT 1
+        """,
+        params_base,
+    )
+    adisyon_id = adisyon_row["id"] if adisyon_row else None
+    session_start_dt = adisyon_row["acilis_zamani"] if adisyon_row else None
+
+    orders_params: Dict[str, Any] = {"sid": sube_id}
+    if adisyon_id is not None:
+        orders_condition = "adisyon_id = :aid"
+        orders_params["aid"] = adisyon_id
+    else:
+        orders_condition = "masa = :masa"
+        orders_params["masa"] = masa
+        start_row = await db.fetch_one(
+            """
+            SELECT MIN(created_at) AS first_created FROM siparisler
+            WHERE masa = :masa AND sube_id = :sid AND durum IN ('yeni', 'hazirlaniyor', 'hazir')
+            """,
+            params_base,
+        )
+        session_start_dt = start_row["first_created"] if start_row else None
+
+    time_filter_clause = ""
+    if session_start_dt is not None and adisyon_id is None:
+        orders_params["start_time"] = session_start_dt
+        time_filter_clause = " AND created_at >= :start_time"
+
+    async def _sum(durum_clause: str, extra: str = "") -> float:
+        row = await db.fetch_one(
+            f"""
+            SELECT COALESCE(SUM(tutar),0) AS toplam FROM siparisler
+            WHERE {orders_condition} AND {durum_clause} AND sube_id = :sid {extra}
+            """,
+            orders_params,
+        )
+        return float(row["toplam"] or 0)
+
+    sip_toplam = await _sum("durum IN ('yeni', 'hazirlaniyor', 'hazir')")
+    hazir_toplam = await _sum("durum = 'hazir'")
+    odendi_toplam = await _sum("durum = 'odendi'", time_filter_clause)
+    await _sum("durum <> 'iptal'", time_filter_clause)
+
+    od_toplam = 0.0
+    if adisyon_id is not None:
+        payment_params: Dict[str, Any] = {"sid": sube_id, "aid": adisyon_id}
+        extra = ""
+        if session_start_dt is not None:
+            payment_params["start_time"] = session_start_dt
+            extra = " AND created_at >= :start_time"
+        row2 = await db.fetch_one(
+            f"""
+            SELECT COALESCE(SUM(tutar),0) AS toplam FROM odemeler
+            WHERE sube_id = :sid AND adisyon_id = :aid AND iptal = FALSE {extra}
+            """,
+            payment_params,
+        )
+        od_toplam = float(row2["toplam"] or 0)
+    elif session_start_dt is not None:
+        row2 = await db.fetch_one(
+            """
+            SELECT COALESCE(SUM(tutar),0) AS toplam FROM odemeler
+            WHERE sube_id = :sid AND masa = :masa AND iptal = FALSE
+              AND adisyon_id IS NULL AND created_at >= :start_time
+            """,
+            {"sid": sube_id, "masa": masa, "start_time": session_start_dt},
+        )
+        od_toplam = float(row2["toplam"] or 0)
+
+    return {
+        "masa": masa,
+        "siparis_toplam": sip_toplam,
+        "odeme_toplam": od_toplam,
+        "bakiye": compute_bakiye(sip_toplam, hazir_toplam, odendi_toplam, od_toplam),
+        "adisyon_id": adisyon_id,
+    }
+
+
+async def _seed(db, tables: int, orders: int) -> Dict[str, Any]:
+    tag = uuid.uuid4().hex[:8]
+    isletme = await db.fetch_one(
+        "INSERT INTO isletmeler (ad, aktif) VALUES (:ad, TRUE) RETURNING id",
+        {"ad": f"bench-{tag}"},
+    )
+    sube = await db.fetch_one(
+        "INSERT INTO subeler (isletme_id, ad, aktif) VALUES (:iid, :ad, TRUE) RETURNING id",
+        {"iid": isletme["id"], "ad": f"bench-sube-{tag}"},
+    )
+    sid = sube["id"]
+    masalar: List[str] = []
+    durumlar = ["yeni", "hazirlaniyor", "hazir", "odendi", "iptal"]
+    for t in range(tables):
+        masa = f"B{t + 1}"
+        masalar.append(masa)
+        # Masaların yarısı adisyonlu, yarısı eski (adisyonsuz) akışta
+        adisyon_id = None
+        if t % 2 == 0:
+            row = await db.fetch_one(
+                "INSERT INTO adisyons (sube_id, masa, durum) VALUES (:sid, :masa, 'acik') RETURNING id",
+                {"sid": sid, "masa": masa},
+            )
+            adisyon_id = row["id"]
+        await db.execute_many(
+            """
+            INSERT INTO siparisler (sube_id, masa, adisyon_id, sepet, durum, tutar)
+            VALUES (:sid, :masa, :aid, '[]'::jsonb, :durum, :tutar)
+            """,
+            [
+                {
+                    "sid": sid,
+                    "masa": masa,
+                    "aid": adisyon_id,
+                    "durum": random.choice(durumlar),
+                    "tutar": round(random.uniform(40, 400), 2),
+                }
+                for _ in range(orders)
+            ],
+        )
+        await db.execute(
+            """
+            INSERT INTO odemeler (sube_id, masa, adisyon_id, tutar, yontem)
+            VALUES (:sid, :masa, :aid, :tutar, 'nakit')
+            """,
+            {"sid": sid, "masa": masa, "aid": adisyon_id, "tutar": round(random.uniform(10, 200), 2)},
+        )
+    return {"isletme_id": isletme["id"], "sube_id": sid, "masalar": masalar}
+
+
+async def _cleanup(db, seed: Dict[str, Any]) -> None:
+    sid = seed["sube_id"]
+    await db.execute("DELETE FROM odemeler WHERE sube_id = :sid", {"sid": sid})
+    await db.execute("DELETE FROM siparisler WHERE sube_id = :sid", {"sid": sid})
+    await db.execute("DELETE FROM adisyons WHERE sube_id = :sid", {"sid": sid})
+    await db.execute("DELETE FROM isletmeler WHERE id = :iid", {"iid": seed["isletme_id"]})
+
+
+def _report(label: str, samples: List[float]) -> None:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    print(
+        f"{label:<10} n={len(samples):<5} "
+        f"mean={statistics.mean(samples):7.3f}ms  p50={statistics.median(samples):7.3f}ms  p95={p95:7.3f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Kasa hesap özeti benchmark")
+    parser.add_argument("--tables", type=int, default=40)
+    parser.add_argument("--orders", type=int, default=8, help="Masa başına sipariş sayısı")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    db = TenantAwareDatabase(_normalize_db_url(settings.DATABASE_URL), min_size=1, max_size=2)
+    await db.connect()
+    await create_tables(db)
+    seed = await _seed(db, args.tables, args.orders)
+    current_tenant_id.set(seed["isletme_id"])
+    try:
+        sid = seed["sube_id"]
+        # Doğruluk kontrolü: iki yol aynı sonucu vermeli
+        for masa in seed["masalar"]:
+            old = await _legacy_hesap_ozet(db, masa, sid)
+            new = await fetch_table_balance(masa, sid, database=db)
+            for key in ("siparis_toplam", "odeme_toplam", "bakiye", "adisyon_id"):
+                if abs(float(old[key] or 0) - float(new[key] or 0)) > 0.005:
+                    raise SystemExit(f"[FAIL] masa={masa} {key}: eski={old[key]} yeni={new[key]}")
+        print(f"[OK] {len(seed['masalar'])} masa için eski/yeni sonuçlar eşit\n")
+
+        legacy_ms: List[float] = []
+        engine_ms: List[float] = []
+        for i in range(args.iterations):
+            masa = seed["masalar"][i % len(seed["masalar"])]
+            t0 = time.perf_counter()
+            await _legacy_hesap_ozet(db, masa, sid)
+            legacy_ms.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            await fetch_table_balance(masa, sid, database=db)
+            engine_ms.append((time.perf_counter() - t0) * 1000)
+
+        _report("eski", legacy_ms)
+        _report("yeni", engine_ms)
+        print(f"\nHızlanma (p50): {statistics.median(legacy_ms) / statistics.median(engine_ms):.1f}x")
+    finally:
+        current_tenant_id.set(None)
+        await _cleanup(db, seed)
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
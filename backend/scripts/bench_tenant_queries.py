@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+İstek başına DB round-trip benchmark'ı (RLS tenant ayarı).
+
+Gerçek FastAPI uygulamasını (middleware'ler + dependency'ler dahil) httpx
+ASGITransport üzerinden local Postgres'e karşı çalıştırır ve kasa / siparis
+uçları için istek başına asyncpg round-trip sayısını ve süresini iki modda ölçer:
+
+    sorgu-basi : her sorgu BEGIN + SET LOCAL app.current_tenant + sorgu + COMMIT
+    istek-basi : tenant ayarı istek bağlantısına bir kez (DB_REQUEST_SCOPED_TENANT)
+
+Round-trip'ler asyncpg.Connection seviyesinde sayılır (BEGIN/COMMIT/SET/RESET dahil).
+
+Kullanım:
+    cd backend
+    RATE_LIMIT_PER_MINUTE=100000 python scripts/bench_tenant_queries.py --iterations 100
+
+Script kendi işletme/şube/kullanıcısını oluşturur ve iş bitince siler.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import asyncpg
+import httpx
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.db.database import db
+from app.db.schema import create_tables
+from app.main import app
+
+_counter = {"n": 0}
+
+
+def _install_roundtrip_counter() -> None:
+    """asyncpg Connection'ın sunucuya giden metodlarını sayaçla sarar."""
+    for name in ("execute", "executemany", "fetch", "fetchrow", "fetchval"):
+        original = getattr(asyncpg.Connection, name)
+
+        def wrapper(self, *args, __original=original, **kwargs):
+            _counter["n"] += 1
+            return __original(self, *args, **kwargs)
+
+        setattr(asyncpg.Connection, name, wrapper)
+
+
+async def _seed() -> Dict[str, Any]:
+    tag = uuid.uuid4().hex[:8]
+    isletme = await db.fetch_one(
+        "INSERT INTO isletmeler (ad, aktif) VALUES (:ad, TRUE) RETURNING id",
+        {"ad": f"bench-{tag}"},
+    )
+    sube = await db.fetch_one(
+        "INSERT INTO subeler (isletme_id, ad, aktif) VALUES (:iid, :ad, TRUE) RETURNING id",
+        {"iid": isletme["id"], "ad": f"bench-sube-{tag}"},
+    )
+    username = f"bench-{tag}"
+    await db.execute(
+        "INSERT INTO users (username, role, tenant_id, aktif) VALUES (:u, 'admin', :tid, TRUE)",
+        {"u": username, "tid": isletme["id"]},
+    )
+    await db.execute(
+        "INSERT INTO menu (sube_id, ad, fiyat, kategori, aktif) VALUES (:sid, 'Bench Çay', 25, 'İçecek', TRUE)",
+        {"sid": sube["id"]},
+    )
+    return {
+        "isletme_id": isletme["id"],
+        "sube_id": sube["id"],
+        "username": username,
+        "token": create_access_token({"sub": username, "tenant_id": isletme["id"]}),
+    }
+
+
+async def _cleanup(seed: Dict[str, Any]) -> None:
+    sid = seed["sube_id"]
+    await db.execute("DELETE FROM odemeler WHERE sube_id = :sid", {"sid": sid})
+    await db.execute("DELETE FROM siparisler WHERE sube_id = :sid", {"sid": sid})
+    await db.execute("DELETE FROM adisyons WHERE sube_id = :sid", {"sid": sid})
+    await db.execute("DELETE FROM users WHERE username = :u", {"u": seed["username"]})
+    await db.execute("DELETE FROM isletmeler WHERE id = :iid", {"iid": seed["isletme_id"]})
+
+
+def _scenarios() -> List[Tuple[str, str, str, Dict[str, Any]]]:
+    return [
+        ("POST /siparis/ekle", "POST", "/siparis/ekle", {"json": {"masa": "B1", "sepet": [{"urun": "Bench Çay", "adet": 2}]}}),
+        ("GET /siparis/liste", "GET", "/siparis/liste", {}),
+        ("GET /kasa/masalar", "GET", "/kasa/masalar", {}),
+        ("GET /kasa/hesap/ozet", "GET", "/kasa/hesap/ozet", {"params": {"masa": "B1"}}),
+        ("GET /kasa/siparisler", "GET", "/kasa/siparisler", {}),
+    ]
+
+
+async def _run_mode(client: httpx.AsyncClient, iterations: int) -> Dict[str, Dict[str, List[float]]]:
+    results: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: {"rt": [], "ms": []})
+    for _ in range(iterations):
+        for label, method, path, kwargs in _scenarios():
+            _counter["n"] = 0
+            t0 = time.perf_counter()
+            resp = await client.request(method, path, **kwargs)
+            elapsed = (time.perf_counter() - t0) * 1000
+            if resp.status_code >= 400:
+                raise SystemExit(f"[FAIL] {label}: HTTP {resp.status_code} {resp.text[:200]}")
+            results[label]["rt"].append(_counter["n"])
+            results[label]["ms"].append(elapsed)
+    return results
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="İstek başına DB round-trip benchmark")
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    await db.connect()
+    await create_tables(db)
+    seed = await _seed()
+    _install_roundtrip_counter()
+
+    headers = {"Authorization": f"Bearer {seed['token']}", "X-Sube-Id": str(seed["sube_id"])}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+            modes: Dict[str, Dict[str, Dict[str, List[float]]]] = {}
+            for mode, enabled in (("sorgu-basi", False), ("istek-basi", True)):
+                settings.DB_REQUEST_SCOPED_TENANT = enabled
+                await _run_mode(client, 3)  # ısınma (menü snapshot, cache'ler)
+                modes[mode] = await _run_mode(client, args.iterations)
+
+        print(f"{'uç':<22} {'mod':<11} {'round-trip/istek':>17} {'p50 ms':>9} {'mean ms':>9}")
+        for label, _, _, _ in _scenarios():
+            for mode, results in modes.items():
+                r = results[label]
+                print(
+                    f"{label:<22} {mode:<11} {statistics.mean(r['rt']):>17.1f} "
+                    f"{statistics.median(r['ms']):>9.2f} {statistics.mean(r['ms']):>9.2f}"
+                )
+            before = statistics.mean(modes["sorgu-basi"][label]["rt"])
+            after = statistics.mean(modes["istek-basi"][label]["rt"])
+            print(f"{'':<22} {'fark':<11} {before - after:>17.1f}\n")
+    finally:
+        await _cleanup(seed)
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Sıcak yol sorguları için plan regresyon kontrolü (EXPLAIN).
+
+Local Postgres'e gerçekçi hacimde veri basar (birkaç şube, aylara yayılmış
+ödenmiş siparişler + kapalı adisyonlar + ödemeler, her masada açık adisyon ve
+aktif siparişler), VACUUM ANALYZE çalıştırır ve kasa / adisyon / mutfak /
+siparis uçlarının sorgularını EXPLAIN (FORMAT JSON) ile kontrol eder:
+siparisler / odemeler / adisyons (ve bölümleri) üzerinde Seq Scan görülürse
+sorgu hatalı sayılır ve script hata koduyla çıkar. Kullanılan index'ler yazdırılır.
+
+Sorgular router'lardaki SQL'in birebir şeklidir; router'da sorgu değişirse
+buradaki karşılığı da güncellenmelidir. Index tanımları: schema.HOT_PATH_INDEX_STATEMENTS
+
+Kullanım:
+    cd backend
+    python scripts/explain_hot_queries.py                       # 200k sipariş, 5 şube
+    python scripts/explain_hot_queries.py --orders 1000000 --subes 20
+    python scripts/explain_hot_queries.py --keep --verbose      # veriyi silme, planları yazdır
+
+Script kendi işletme/şubelerini oluşturur ve (--keep verilmezse) iş bitince siler.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.db.database import db
+from app.db.schema import create_tables
+
+HOT_TABLES = ("siparisler", "odemeler", "adisyons")
+MASA_COUNT = 30
+ORDERS_PER_ADISYON = 8
+ACTIVE_STATES = ("yeni", "hazirlaniyor", "hazir")
+
+
+async def _fast_load() -> None:
+    """Toplu yüklemede trigger'ları atla (süper kullanıcı gerekir; yoksa trigger'larla devam)."""
+    try:
+        await db.execute("SET LOCAL session_replication_role = replica")
+    except Exception as e:
+        print(f"[INFO] trigger'lar atlanamadı, yükleme yavaş olabilir: {e}")
+
+
+async def _seed(orders: int, sube_count: int, days: int) -> Dict[str, Any]:
+    tag = uuid.uuid4().hex[:8]
+    isletme = await db.fetch_one(
+        "INSERT INTO isletmeler (ad, aktif) VALUES (:ad, TRUE) RETURNING id",
+        {"ad": f"explain-{tag}"},
+    )
+    sube_ids = []
+    for i in range(sube_count):
+        row = await db.fetch_one(
+            "INSERT INTO subeler (isletme_id, ad, aktif) VALUES (:iid, :ad, TRUE) RETURNING id",
+            {"iid": isletme["id"], "ad": f"explain-{tag}-{i}"},
+        )
+        sube_ids.append(row["id"])
+
+    adisyon_count = max(1, orders // ORDERS_PER_ADISYON)
+    params = {"subes": sube_ids, "n": sube_count, "masalar": MASA_COUNT, "days": days}
+    async with db.transaction():
+        await _fast_load()
+        # Kapalı adisyonlar: a = 0..adisyon_count-1, şube/masa a'dan türetilir
+        await db.execute(
+            """
+            INSERT INTO adisyons (sube_id, masa, acilis_zamani, kapanis_zamani, durum, toplam_tutar, odeme_toplam, bakiye)
+            SELECT (CAST(:subes AS BIGINT[]))[a % :n + 1],
+                   'M' || (a / :n % :masalar + 1),
+                   NOW() - make_interval(mins => (:acount - a) * :days * 1440 / :acount + 60),
+                   NOW() - make_interval(mins => (:acount - a) * :days * 1440 / :acount),
+                   'kapali', 400, 400, 0
+            FROM generate_series(0, :acount - 1) AS a
+            """,
+            {**params, "acount": adisyon_count},
+        )
+        # Ödenmiş/iptal siparişler: her adisyona ORDERS_PER_ADISYON sipariş
+        await db.execute(
+            f"""
+            INSERT INTO siparisler (sube_id, masa, adisyon_id, sepet, durum, tutar, created_at)
+            SELECT a.sube_id, a.masa, a.id,
+                   '[{{"urun": "Çay", "adet": 2, "fiyat": 25}}]',
+                   CASE WHEN g.i % 33 = 0 THEN 'iptal' ELSE 'odendi' END,
+                   50, a.acilis_zamani + make_interval(mins => g.i * 5)
+            FROM adisyons a
+            CROSS JOIN generate_series(0, {ORDERS_PER_ADISYON - 1}) AS g(i)
+            WHERE a.sube_id = ANY(:subes) AND a.durum = 'kapali'
+            """,
+            {"subes": sube_ids},
+        )
+        await db.execute(
+            """
+            INSERT INTO odemeler (sube_id, masa, adisyon_id, tutar, yontem, iptal, created_at)
+            SELECT a.sube_id, a.masa, a.id, 400,
+                   CASE WHEN a.id % 3 = 0 THEN 'kart' ELSE 'nakit' END,
+                   a.id % 50 = 0, a.kapanis_zamani
+            FROM adisyons a
+            WHERE a.sube_id = ANY(:subes) AND a.durum = 'kapali'
+            """,
+            {"subes": sube_ids},
+        )
+        # Her masada açık adisyon + aktif siparişler + kısmi ödeme
+        await db.execute(
+            """
+            INSERT INTO adisyons (sube_id, masa, acilis_zamani, durum)
+            SELECT s.id, 'M' || m, NOW() - INTERVAL '40 minutes', 'acik'
+            FROM unnest(CAST(:subes AS BIGINT[])) AS s(id)
+            CROSS JOIN generate_series(1, :masalar) AS m
+            """,
+            params,
+        )
+        await db.execute(
+            """
+            INSERT INTO siparisler (sube_id, masa, adisyon_id, sepet, durum, tutar, created_at)
+            SELECT a.sube_id, a.masa, a.id, '[{"urun": "Çay", "adet": 1, "fiyat": 25}]',
+                   (ARRAY['yeni', 'hazirlaniyor', 'hazir'])[g.i], 25,
+                   NOW() - make_interval(mins => 30 - g.i * 5)
+            FROM adisyons a CROSS JOIN generate_series(1, 3) AS g(i)
+            WHERE a.sube_id = ANY(:subes) AND a.durum = 'acik'
+            """,
+            {"subes": sube_ids},
+        )
+        await db.execute(
+            """
+            INSERT INTO odemeler (sube_id, masa, adisyon_id, tutar, yontem, iptal, created_at)
+            SELECT a.sube_id, a.masa, a.id, 20, 'nakit', FALSE, NOW() - INTERVAL '5 minutes'
+            FROM adisyons a WHERE a.sube_id = ANY(:subes) AND a.durum = 'acik'
+            """,
+            {"subes": sube_ids},
+        )
+
+    sid = sube_ids[0]
+    acik = await db.fetch_one(
+        "SELECT id, acilis_zamani FROM adisyons WHERE sube_id = :sid AND masa = 'M1' AND durum = 'acik'",
+        {"sid": sid},
+    )
+    since = await db.fetch_one("SELECT MAX(id) - 500 AS id FROM siparisler WHERE sube_id = :sid", {"sid": sid})
+    return {
+        "isletme_id": isletme["id"],
+        "sube_ids": sube_ids,
+        "sid": sid,
+        "masa": "M1",
+        "aid": acik["id"],
+        "acilis": acik["acilis_zamani"].isoformat(),
+        "since": since["id"],
+    }
+
+
+async def _cleanup(seed: Dict[str, Any]) -> None:
+    subes = {"subes": seed["sube_ids"]}
+    async with db.transaction():
+        await _fast_load()
+        await db.execute("DELETE FROM odemeler WHERE sube_id = ANY(:subes)", subes)
+        await db.execute("DELETE FROM siparisler WHERE sube_id = ANY(:subes)", subes)
+        await db.execute("DELETE FROM adisyons WHERE sube_id = ANY(:subes)", subes)
+        await db.execute("DELETE FROM daily_product_sales WHERE sube_id = ANY(:subes)", subes)
+        await db.execute("DELETE FROM subeler WHERE id = ANY(:subes)", subes)
+        await db.execute("DELETE FROM isletmeler WHERE id = :iid", {"iid": seed["isletme_id"]})
+
+
+def _queries(seed: Dict[str, Any]) -> List[Tuple[str, str]]:
+    sid, masa, aid = seed["sid"], f"'{seed['masa']}'", seed["aid"]
+    acilis = f"CAST('{seed['acilis']}' AS TIMESTAMPTZ)"
+    aktif = "('yeni', 'hazirlaniyor', 'hazir')"
+    return [
+        ("kasa: ödeme sonrası kapanacak siparişler", f"""
+            SELECT id, sepet, durum FROM siparisler
+            WHERE sube_id = {sid} AND masa = {masa} AND durum IN {aktif}
+            ORDER BY created_at ASC, id ASC"""),
+        ("kasa: masanın açık adisyonu", f"""
+            SELECT id FROM adisyons
+            WHERE sube_id = {sid} AND masa = {masa} AND durum = 'acik'
+            ORDER BY acilis_zamani DESC LIMIT 1"""),
+        ("kasa: /kasa/siparisler masa bakiyeleri", f"""
+            WITH sip AS (
+              SELECT masa, COALESCE(SUM(tutar),0) AS sip_toplam FROM siparisler
+              WHERE sube_id = {sid} AND durum IN {aktif} GROUP BY masa
+            ), od AS (
+              SELECT masa, COALESCE(SUM(tutar),0) AS od_toplam FROM odemeler
+              WHERE sube_id = {sid} AND iptal = FALSE GROUP BY masa
+            ), balance AS (
+              SELECT sip.masa, sip.sip_toplam, COALESCE(od.od_toplam, 0) AS od_toplam,
+                     CAST(sip.sip_toplam - COALESCE(od.od_toplam, 0) AS FLOAT) AS bakiye
+              FROM sip LEFT JOIN od USING (masa)
+            )
+            SELECT s.id, s.masa, s.durum, s.tutar, s.sepet, s.created_at, b.bakiye
+            FROM siparisler s JOIN balance b ON b.masa = s.masa
+            WHERE s.sube_id = {sid} AND s.durum IN {aktif} AND b.bakiye > 0
+            ORDER BY s.created_at DESC, s.id DESC LIMIT 200"""),
+        ("kasa: günlük ciro", f"""
+            SELECT COALESCE(SUM(tutar),0) AS ciro FROM siparisler
+            WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1
+              AND durum = 'odendi' AND sube_id = {sid}"""),
+        ("kasa: günlük ödeme dağılımı", f"""
+            SELECT yontem, COALESCE(SUM(tutar),0) AS toplam FROM odemeler
+            WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1
+              AND iptal = FALSE AND sube_id = {sid}
+            GROUP BY yontem ORDER BY toplam DESC"""),
+        ("adisyon: sipariş toplamları", f"""
+            SELECT COALESCE(SUM(CASE WHEN durum <> 'iptal' THEN tutar ELSE 0 END), 0) AS toplam,
+                   COUNT(CASE WHEN durum IN {aktif} THEN 1 END) AS aktif
+            FROM siparisler WHERE adisyon_id = {aid}"""),
+        ("adisyon: ödeme toplamı (açılıştan sonra)", f"""
+            SELECT COALESCE(SUM(tutar), 0) AS toplam, COUNT(*) AS odeme_sayisi FROM odemeler
+            WHERE adisyon_id = {aid} AND sube_id = {sid} AND iptal = FALSE AND created_at >= {acilis}"""),
+        ("adisyon: iskonto için aktif sipariş toplamı", f"""
+            SELECT COALESCE(SUM(tutar), 0) AS toplam FROM siparisler
+            WHERE adisyon_id = {aid} AND sube_id = {sid} AND durum IN {aktif}"""),
+        ("adisyon: sipariş detayı", f"""
+            SELECT id, masa, durum, tutar, created_at FROM siparisler
+            WHERE adisyon_id = {aid} AND sube_id = {sid} ORDER BY created_at ASC"""),
+        ("mutfak: kuyruk (aktif)", f"""
+            SELECT id, masa, durum, tutar, sepet, created_at FROM siparisler
+            WHERE sube_id = {sid} AND created_at >= NOW() - INTERVAL '24 hours'
+              AND durum IN ('yeni','hazirlaniyor')
+            ORDER BY created_at ASC, id ASC LIMIT 200"""),
+        ("mutfak: poll (id > since)", f"""
+            SELECT id, masa, durum, tutar, sepet, created_at FROM siparisler
+            WHERE sube_id = {sid} AND id > {seed['since']} AND durum IN ('yeni','hazirlaniyor')
+            ORDER BY id ASC LIMIT 100"""),
+        ("siparis: liste", f"""
+            SELECT id, masa, durum, tutar, created_at FROM siparisler
+            WHERE sube_id = {sid} ORDER BY created_at DESC, id DESC LIMIT 10"""),
+    ]
+
+
+def _nodes(plan: Any) -> Iterable[Dict[str, Any]]:
+    if isinstance(plan, dict):
+        if "Node Type" in plan:
+            yield plan
+        for value in plan.values():
+            yield from _nodes(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _nodes(item)
+
+
+def _is_hot(relation: str) -> bool:
+    return any(relation == t or relation.startswith(f"{t}_") for t in HOT_TABLES)
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Sıcak yol sorguları EXPLAIN kontrolü")
+    parser.add_argument("--orders", type=int, default=200_000, help="Ödenmiş sipariş sayısı")
+    parser.add_argument("--subes", type=int, default=5, help="Şube sayısı")
+    parser.add_argument("--days", type=int, default=180, help="Siparişlerin yayıldığı gün sayısı")
+    parser.add_argument("--keep", action="store_true", help="Basılan veriyi silme")
+    parser.add_argument("--verbose", action="store_true", help="Planları yazdır")
+    args = parser.parse_args()
+
+    await db.connect()
+    failures = 0
+    seed = None
+    try:
+        await create_tables(db)
+        t0 = time.perf_counter()
+        seed = await _seed(args.orders, args.subes, args.days)
+        for table in HOT_TABLES:
+            await db.execute(f"VACUUM ANALYZE {table}")
+        print(f"[INFO] veri hazır ({(time.perf_counter() - t0):.1f} s): {seed}")
+
+        for label, sql in _queries(seed):
+            row = await db.fetch_one(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = row["QUERY PLAN"]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = [
+                (n["Node Type"], n.get("Relation Name"), n.get("Index Name"))
+                for n in _nodes(plan)
+                if (n.get("Relation Name") and _is_hot(n["Relation Name"])) or n["Node Type"] == "Bitmap Index Scan"
+            ]
+            seq = [s for s in scans if s[0] == "Seq Scan"]
+            indexes = sorted({s[2] for s in scans if s[2]})
+            status = "FAIL" if seq else "OK"
+            if seq:
+                failures += 1
+            print(f"[{status}] {label}: index={indexes}" + (f" seq_scan={[s[1] for s in seq]}" if seq else ""))
+            if args.verbose or seq:
+                print(json.dumps(plan, indent=2, ensure_ascii=False))
+    finally:
+        if seed and not args.keep:
+            await _cleanup(seed)
+        await db.disconnect()
+
+    print(f"{failures} sorguda Seq Scan" if failures else "Tüm sıcak sorgular index kullanıyor")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Bölümlenmiş tablolarda partition pruning kontrolü (EXPLAIN).
+
+Analitik uçların kullandığı created_at aralıklı sorgu şekilleri için
+EXPLAIN (FORMAT JSON) alınır ve planda taranan bölümler, aralığın düştüğü ay
+bölümleriyle karşılaştırılır. Fazladan bölüm (ör. tüm aylar veya _default)
+taranıyorsa script hata koduyla çıkar. Bölümlenmemiş tablolar atlanır.
+
+Kullanım:
+    cd backend
+    python scripts/explain_partition_pruning.py
+    python scripts/explain_partition_pruning.py --verbose     # planları da yazdır
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Iterable, List, Set, Tuple
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.db.database import db
+from app.services.partitioning import (
+    PARTITION_TIMEZONE,
+    PARTITIONED_TABLES,
+    add_months,
+    current_month,
+    is_partitioned,
+    month_start,
+    partition_name,
+)
+
+# (tablo, açıklama, sorgu şablonu); {start}/{end} timestamptz literal'leri ile doldurulur
+QUERIES: List[Tuple[str, str, str]] = [
+    (
+        "siparisler",
+        "şube günlük/aylık ciro",
+        "SELECT COUNT(*), COALESCE(SUM(tutar), 0) FROM siparisler "
+        "WHERE sube_id = 1 AND durum <> 'iptal' AND created_at >= {start} AND created_at < {end}",
+    ),
+    (
+        "siparisler",
+        "mutfak geçmişi (son siparişler)",
+        "SELECT id, masa, durum FROM siparisler "
+        "WHERE sube_id = 1 AND created_at >= {start} AND created_at < {end} ORDER BY created_at DESC LIMIT 50",
+    ),
+    (
+        "odemeler",
+        "ödeme yöntemi dağılımı",
+        "SELECT yontem, COALESCE(SUM(tutar), 0) FROM odemeler "
+        "WHERE sube_id = 1 AND iptal = FALSE AND created_at >= {start} AND created_at < {end} GROUP BY yontem",
+    ),
+    (
+        "audit_logs",
+        "audit log listesi",
+        "SELECT id, action, username FROM audit_logs "
+        "WHERE created_at >= {start} AND created_at < {end} ORDER BY created_at DESC LIMIT 100",
+    ),
+    (
+        "api_usage_logs",
+        "işletme API hataları",
+        "SELECT id, endpoint, error_message FROM api_usage_logs "
+        "WHERE isletme_id = 1 AND status = 'error' AND created_at >= {start} AND created_at < {end}",
+    ),
+]
+
+
+def _literal(day: date) -> str:
+    return f"CAST('{day.isoformat()} 00:00:00 {PARTITION_TIMEZONE}' AS TIMESTAMPTZ)"
+
+
+def _ranges() -> List[Tuple[str, date, date]]:
+    current = current_month()
+    previous = add_months(current, -1)
+    return [
+        ("geçen ay", previous, current),
+        ("bu ayın ilk haftası", current, current + timedelta(days=7)),
+        ("son iki ay", previous, add_months(current, 1)),
+    ]
+
+
+def _expected(table: str, start: date, end: date) -> Set[str]:
+    months = set()
+    month = month_start(start)
+    while month < end:
+        months.add(partition_name(table, month))
+        month = add_months(month, 1)
+    return months
+
+
+def _scanned(plan: Any) -> Iterable[str]:
+    if isinstance(plan, dict):
+        if "Relation Name" in plan:
+            yield plan["Relation Name"]
+        for value in plan.values():
+            yield from _scanned(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _scanned(item)
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Partition pruning EXPLAIN kontrolü")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    await db.connect()
+    failures = 0
+    checked = 0
+    try:
+        partitioned = {t for t in PARTITIONED_TABLES if await is_partitioned(t)}
+        for table in PARTITIONED_TABLES:
+            if table not in partitioned:
+                print(f"[SKIP] {table}: bölümlenmemiş")
+        for table, label, template in QUERIES:
+            if table not in partitioned:
+                continue
+            for range_label, start, end in _ranges():
+                sql = template.format(start=_literal(start), end=_literal(end))
+                row = await db.fetch_one(f"EXPLAIN (FORMAT JSON) {sql}")
+                plan = row["QUERY PLAN"]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                scanned = {name for name in _scanned(plan) if name.startswith(f"{table}_")}
+                extra = scanned - _expected(table, start, end)
+                checked += 1
+                status = "OK" if not extra else "FAIL"
+                print(f"[{status}] {table} / {label} / {range_label}: taranan={sorted(scanned)}")
+                if extra:
+                    failures += 1
+                    print(f"       beklenmeyen bölümler: {sorted(extra)}")
+                if args.verbose or extra:
+                    print(json.dumps(plan, indent=2, ensure_ascii=False))
+    finally:
+        await db.disconnect()
+
+    print(f"{checked} sorgu kontrol edildi, {failures} hatalı")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
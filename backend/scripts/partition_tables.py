@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+siparisler / odemeler / audit_logs / api_usage_logs tablolarını aylık
+bölümlenmiş (created_at range partitioning) tablolara çevirir.
+
+Geçiş opt-in'dir ve tablo başına tek transaction'da yapılır; süre boyunca o
+tabloya yazımlar bekler, bu yüzden bakım penceresinde çalıştırın. Eski veri
+<tablo>_legacy olarak kalır (--drop-legacy ile silinir). Ayrıntılar:
+app/services/partitioning.py
+
+Kullanım:
+    cd backend
+    python scripts/partition_tables.py --status
+    python scripts/partition_tables.py --table audit_logs --table api_usage_logs
+    python scripts/partition_tables.py --all --drop-legacy
+    python scripts/partition_tables.py --maintain      # ileri bölümler + arşiv (zamanlayıcı ile aynı iş)
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.db.database import db
+from app.db.schema import create_tables
+from app.services.partitioning import (
+    PARTITIONED_TABLES,
+    convert_to_partitioned,
+    is_partitioned,
+    list_partitions,
+    maintain_partitions,
+)
+
+
+async def print_status() -> None:
+    for table in PARTITIONED_TABLES:
+        if not await is_partitioned(table):
+            print(f"{table}: bölümlenmemiş")
+            continue
+        parts = await list_partitions(table)
+        print(f"{table}: {len(parts)} bölüm")
+        for p in parts:
+            print(f"    {p['name']:<32} ~{p['approx_rows']:>10} satır  {p['bound']}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Aylık tablo bölümleme")
+    parser.add_argument("--table", action="append", choices=PARTITIONED_TABLES, help="Çevrilecek tablo(lar)")
+    parser.add_argument("--all", action="store_true", help="Tüm desteklenen tabloları çevir")
+    parser.add_argument("--drop-legacy", action="store_true", help="Kopyalama sonrası <tablo>_legacy'yi sil")
+    parser.add_argument("--status", action="store_true", help="Bölüm durumunu göster")
+    parser.add_argument("--maintain", action="store_true", help="Bakımı şimdi çalıştır")
+    args = parser.parse_args()
+
+    tables = list(PARTITIONED_TABLES) if args.all else (args.table or [])
+    if not tables and not args.status and not args.maintain:
+        parser.error("--table, --all, --status veya --maintain verin")
+
+    await db.connect()
+    try:
+        if tables:
+            # Tablolar/trigger fonksiyonları yoksa önce oluştur (idempotent)
+            await create_tables(db)
+        for table in tables:
+            t0 = time.perf_counter()
+            result = await convert_to_partitioned(table, drop_legacy=args.drop_legacy)
+            print(f"[OK] {table}: {result} ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        if args.maintain:
+            print(f"[OK] bakım: {await maintain_partitions()}")
+        if args.status or tables:
+            await print_status()
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
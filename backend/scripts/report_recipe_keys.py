@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Reçete menu_id/stok_id eşleşme raporu.
+
+Reçeteler menü ürününe ve stok kalemine normalize ad (neso_urun_key) ile yazma
+anında bağlanır. Bu script bağlanamamış reçete satırlarını ve şube içinde aynı
+normalize ada düşen menü/stok kayıtlarını (unique index'i engelleyen çakışmalar)
+listeler. --resolve verilirse bağlanmamış satırlar tekrar çözülmeye çalışılır.
+
+Kullanım:
+    cd backend
+    python scripts/report_recipe_keys.py
+    python scripts/report_recipe_keys.py --sube-id 3 --resolve
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.db.database import db
+from app.db.schema import (
+    NAME_KEY_DUPLICATES_SQL,
+    NAME_KEY_UNIQUE_INDEXES,
+    RECIPE_KEY_STATEMENTS,
+    RECIPE_UNMATCHED_SQL,
+)
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Reçete menü/stok eşleşme raporu")
+    parser.add_argument("--sube-id", type=int, help="Sadece bu şube")
+    parser.add_argument("--resolve", action="store_true", help="Bağlanmamış satırları tekrar çöz")
+    args = parser.parse_args()
+
+    await db.connect()
+    try:
+        if args.resolve:
+            for stmt in RECIPE_KEY_STATEMENTS:
+                await db.execute(stmt)
+            print("[OK] Kolonlar/trigger'lar güncel, bağlanmamış satırlar yeniden çözüldü")
+
+        for table in NAME_KEY_UNIQUE_INDEXES:
+            rows = await db.fetch_all(NAME_KEY_DUPLICATES_SQL.format(table=table))
+            rows = [r for r in rows if args.sube_id is None or r["sube_id"] == args.sube_id]
+            print(f"[{'UYARI' if rows else 'OK'}] {table}: {len(rows)} çakışan normalize ad")
+            for r in rows:
+                print(f"  sube_id={r['sube_id']} ad_key={r['ad_key']!r} adlar={list(r['adlar'])}")
+
+        rows = await db.fetch_all(RECIPE_UNMATCHED_SQL)
+        rows = [r for r in rows if args.sube_id is None or r["sube_id"] == args.sube_id]
+        print(f"[{'UYARI' if rows else 'OK'}] receteler: {len(rows)} eşleşmeyen satır")
+        for r in rows:
+            eksik = ", ".join(k for k, v in (("menu", r["menu_eksik"]), ("stok", r["stok_eksik"])) if v)
+            print(f"  id={r['id']} sube_id={r['sube_id']} urun={r['urun']!r} stok={r['stok']!r} eksik={eksik}")
+    finally:
+        await db.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
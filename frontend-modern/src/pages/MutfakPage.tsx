@@ -1,4 +1,4 @@
-import { useEffect, useState, useCallback } from 'react';
+import { useEffect, useState, useCallback, useRef } from 'react';
 import toast from 'react-hot-toast';
 import { mutfakApi, normalizeApiUrl } from '../lib/api';
 import { Clock, CheckCircle, Wifi, WifiOff, AlertTriangle, Play, Check, BarChart3, RefreshCw } from 'lucide-react';
@@ -26,6 +26,11 @@ interface KitchenOrder {
   hazir_at?: string;
 }
 
+// WS "kitchen" topic delta'sı: ekrandan düşen siparişler (odendi/iptal) sadece id/masa/durum taşır
+type KitchenDelta = Pick<KitchenOrder, 'id' | 'masa' | 'durum'> & Partial<KitchenOrder>;
+
+const KITCHEN_VISIBLE_STATES = ['yeni', 'hazirlaniyor', 'hazir'];
+
 interface KitchenStats {
   total_orders: number;
   ready_orders: number;
@@ -47,10 +52,17 @@ export default function MutfakPage() {
     return () => clearInterval(timer);
   }, []);
   
+  // Son uygulanan delta'nın cursor'ı: yeniden bağlanınca sadece kaçırılanlar istenir
+  const cursorRef = useRef(0);
+  const filterRef = useRef(filter);
+  filterRef.current = filter;
+  const statsTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
+
   const loadOrders = useCallback(async () => {
     try {
       const durum = filter === 'tumu' ? 'tumu' : filter;
       const response = await mutfakApi.kuyruk({ limit: 150, durum });
+      cursorRef.current = Number(response.headers?.['x-mutfak-cursor']) || 0;
       setOrders(response.data || []);
     } catch (err) {
       console.error('Mutfak kuyruğu yüklenemedi:', err);
@@ -58,6 +70,27 @@ export default function MutfakPage() {
       setLoading(false);
     }
   }, [filter]);
+  const loadOrdersRef = useRef(loadOrders);
+  loadOrdersRef.current = loadOrders;
+
+  // Delta'ları yerel listeye uygula (kuyruk yeniden sorgulanmaz)
+  const applyDeltas = useCallback((deltas: KitchenDelta[]) => {
+    const current = filterRef.current;
+    const visible = (durum: string) =>
+      current === 'tumu' ? KITCHEN_VISIBLE_STATES.includes(durum) : durum === current;
+    setOrders((prev) => {
+      const byId = new Map(prev.map((o) => [o.id, o]));
+      for (const d of deltas) {
+        byId.delete(d.id);
+        if (visible(d.durum) && d.created_at) {
+          byId.set(d.id, { sepet: [], tutar: 0, ...d } as KitchenOrder);
+        }
+      }
+      return Array.from(byId.values()).sort(
+        (a, b) => a.created_at.localeCompare(b.created_at) || a.id - b.id
+      );
+    });
+  }, []);
 
   const loadStats = useCallback(async () => {
     try {
@@ -91,22 +124,57 @@ export default function MutfakPage() {
     }
   }, []);
 
+  // Olay patlamalarında istatistikleri tek istekte tazele
+  const scheduleStats = useCallback(() => {
+    if (statsTimerRef.current) return;
+    statsTimerRef.current = setTimeout(() => {
+      statsTimerRef.current = null;
+      loadStats();
+    }, 2000);
+  }, [loadStats]);
+
   const ws = useWebSocket({
     url: WS_URL,
-    topics: ['kitchen', 'orders'],
+    topics: ['kitchen'],
     auth: true,
+    onConnect: () => {
+      if (cursorRef.current > 0) {
+        const subeId = Number(localStorage.getItem('neso.subeId') || sessionStorage.getItem('neso.subeId') || '1');
+        ws.sendMessage({ type: 'resume', sube_id: subeId, cursor: cursorRef.current });
+      }
+    },
     onMessage: (data) => {
-      if (['new_order', 'order_added', 'order_update', 'status_change'].includes(data.type)) {
-        if (data.type === 'new_order' || data.type === 'order_added') {
-          playChime();
-          toast.success('Yeni sipariş geldi!', { icon: '🔔' });
+      if (data.type === 'kitchen_replay') {
+        if (data.resync) {
+          loadOrdersRef.current();
+        } else if (data.orders?.length) {
+          applyDeltas(data.orders);
         }
-        loadOrders();
-        loadStats();
+        cursorRef.current = Math.max(cursorRef.current, Number(data.cursor) || 0);
+        scheduleStats();
+        return;
+      }
+      if (!['new_order', 'order_added', 'order_update', 'status_change'].includes(data.type)) return;
+      if (data.type === 'new_order' || data.type === 'order_added') {
+        playChime();
+        toast.success('Yeni sipariş geldi!', { icon: '🔔' });
       }
+      if (Array.isArray(data.orders)) {
+        // Replay ile zaten uygulanmış delta'yı atla
+        if (data.cursor && data.cursor <= cursorRef.current) return;
+        applyDeltas(data.orders);
+        if (data.cursor) cursorRef.current = data.cursor;
+      } else {
+        loadOrdersRef.current();
+      }
+      scheduleStats();
     },
   });
 
+  useEffect(() => () => {
+    if (statsTimerRef.current) clearTimeout(statsTimerRef.current);
+  }, []);
+
   // Sekme başlığında bekleyen sipariş sayısı — kasiyer başka sekmedeyken de görünür
   useEffect(() => {
     const pending = (stats?.new_orders || 0) + (stats?.in_prep_orders || 0);
@@ -120,9 +188,9 @@ export default function MutfakPage() {
 
   const handleStatusChange = async (id: number, newStatus: string) => {
     try {
-      await mutfakApi.updateStatus(id, newStatus);
-      loadOrders();
-      loadStats();
+      const response = await mutfakApi.updateStatus(id, newStatus);
+      if (response.data) applyDeltas([response.data]);
+      scheduleStats();
     } catch (err) {
       console.error('Durum güncellenemedi:', err);
     }